@@ -14,7 +14,11 @@ from src.db.session import Base
 import src.models.user
 import src.models.oauth_account
 import src.models.link
-import src.models.click_event # make sure models are registered
+import src.models.click_event
+import src.models.click_rollup
+import src.models.user_agent
+import src.models.dimension_value
+import src.models.id_block # make sure models are registered
 
 config = context.config
 fileConfig(config.config_file_name)
@@ -49,6 +53,8 @@ def run_migrations_online() -> None:
             connection=connection,
             target_metadata=target_metadata,
             compare_type=True,
+            # some migrations commit part of their work (autocommit_block)
+            transaction_per_migration=True,
         )
 
         with context.begin_transaction():
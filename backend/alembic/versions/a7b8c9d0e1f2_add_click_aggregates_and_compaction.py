@@ -0,0 +1,49 @@
+"""add_click_aggregates_and_compaction
+
+Revision ID: a7b8c9d0e1f2
+Revises: f6a7b8c9d0e1
+Create Date: 2025-03-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7b8c9d0e1f2'
+down_revision: Union[str, None] = 'f6a7b8c9d0e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create the daily aggregates of compacted clicks and the retention watermark."""
+    op.create_table(
+        'click_aggregate_daily',
+        sa.Column('link_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('dimension', sa.String(length=16), nullable=False),
+        sa.Column('value', sa.String(length=255), nullable=False),
+        sa.Column('clicks', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('visitors', sa.BigInteger(), server_default='0', nullable=False),
+        sa.ForeignKeyConstraint(['link_id'], ['links.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('link_id', 'day', 'dimension', 'value'),
+    )
+    op.create_index('ix_click_aggregate_daily_day', 'click_aggregate_daily', ['day'], unique=False)
+
+    op.create_table(
+        'click_compaction',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('compacted_before', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('folded_max_id', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('name'),
+    )
+
+
+def downgrade() -> None:
+    """Drop the retention tables. Raw events already deleted are not restored."""
+    op.drop_table('click_compaction')
+    op.drop_index('ix_click_aggregate_daily_day', table_name='click_aggregate_daily')
+    op.drop_table('click_aggregate_daily')
@@ -0,0 +1,69 @@
+"""add_click_rollup_tables
+
+Revision ID: b7c1d2e3f4a5
+Revises: a1b2c3d4e5f6
+Create Date: 2025-02-10 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7c1d2e3f4a5'
+down_revision: Union[str, None] = 'a1b2c3d4e5f6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create hourly and per-country daily click rollups and backfill them from click_events."""
+    op.create_table(
+        'click_rollup_hourly',
+        sa.Column('link_id', sa.Integer(), nullable=False),
+        sa.Column('hour', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('clicks', sa.BigInteger(), server_default='0', nullable=False),
+        sa.ForeignKeyConstraint(['link_id'], ['links.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('link_id', 'hour'),
+    )
+    op.create_index('ix_click_rollup_hourly_hour', 'click_rollup_hourly', ['hour'], unique=False)
+
+    op.create_table(
+        'click_rollup_country_daily',
+        sa.Column('link_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('country', sa.String(length=2), nullable=False),
+        sa.Column('clicks', sa.BigInteger(), server_default='0', nullable=False),
+        sa.ForeignKeyConstraint(['link_id'], ['links.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('link_id', 'day', 'country'),
+    )
+    op.create_index('ix_click_rollup_country_daily_day', 'click_rollup_country_daily', ['day'], unique=False)
+
+    # Buckets are UTC. SQLite stores DateTime as text in SQLAlchemy's
+    # "YYYY-MM-DD HH:MM:SS.ffffff" format, which the rollup keys must match.
+    if op.get_bind().dialect.name == 'postgresql':
+        hour = "date_trunc('hour', clicked_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'"
+        day = "(clicked_at AT TIME ZONE 'UTC')::date"
+    else:
+        hour = "strftime('%Y-%m-%d %H:00:00.000000', clicked_at)"
+        day = "date(clicked_at)"
+
+    op.execute(
+        f"INSERT INTO click_rollup_hourly (link_id, hour, clicks) "
+        f"SELECT link_id, {hour}, count(*) FROM click_events GROUP BY link_id, {hour}"
+    )
+    op.execute(
+        f"INSERT INTO click_rollup_country_daily (link_id, day, country, clicks) "
+        f"SELECT link_id, {day}, country, count(*) FROM click_events "
+        f"WHERE country IS NOT NULL GROUP BY link_id, {day}, country"
+    )
+
+
+def downgrade() -> None:
+    """Drop click rollup tables."""
+    op.drop_index('ix_click_rollup_country_daily_day', table_name='click_rollup_country_daily')
+    op.drop_table('click_rollup_country_daily')
+    op.drop_index('ix_click_rollup_hourly_hour', table_name='click_rollup_hourly')
+    op.drop_table('click_rollup_hourly')
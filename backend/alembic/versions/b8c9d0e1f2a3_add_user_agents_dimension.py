@@ -0,0 +1,151 @@
+"""add_user_agents_dimension
+
+Revision ID: b8c9d0e1f2a3
+Revises: a7b8c9d0e1f2
+Create Date: 2025-03-24 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.links.utils import ua_hash
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8c9d0e1f2a3'
+down_revision: Union[str, None] = 'a7b8c9d0e1f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+UA_FIELDS = {
+    'device_category': 20,
+    'browser_name': 50,
+    'browser_version': 20,
+    'os_name': 50,
+    'os_version': 20,
+    'engine': 20,
+}
+
+click_events = sa.table(
+    'click_events',
+    sa.column('id', sa.BigInteger()),
+    sa.column('clicked_at', sa.DateTime(timezone=True)),
+    sa.column('ua_id', sa.Integer()),
+    sa.column('ua_raw', sa.String()),
+    *[sa.column(name, sa.String()) for name in UA_FIELDS],
+)
+
+user_agents = sa.table(
+    'user_agents',
+    sa.column('id', sa.Integer()),
+    sa.column('ua_hash', sa.String()),
+    sa.column('ua_raw', sa.String()),
+    *[sa.column(name, sa.String()) for name in UA_FIELDS],
+)
+
+
+def _set_by_key(bind, values: list[dict]) -> None:
+    """
+    UPDATE click_events rows by id. On PostgreSQL clicked_at is matched too,
+    so each update only touches the partition holding the row.
+    """
+    names = [k for k in values[0] if not k.startswith('b_')]
+    stmt = click_events.update().where(click_events.c.id == sa.bindparam('b_id'))
+    if bind.dialect.name == 'postgresql':
+        stmt = stmt.where(click_events.c.clicked_at == sa.bindparam('b_clicked_at'))
+    else:
+        values = [{k: v for k, v in row.items() if k != 'b_clicked_at'} for row in values]
+    bind.execute(stmt.values({name: sa.bindparam(name) for name in names}), values)
+
+
+def upgrade() -> None:
+    """Create user_agents, point click_events at it through ua_id and drop the per-click UA columns."""
+    op.create_table(
+        'user_agents',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('ua_hash', sa.String(length=64), nullable=False),
+        sa.Column('ua_raw', sa.String(length=1024), nullable=False),
+        *[sa.Column(name, sa.String(length=length), nullable=True) for name, length in UA_FIELDS.items()],
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('ua_hash'),
+    )
+    with op.batch_alter_table('click_events') as batch_op:
+        batch_op.add_column(sa.Column('ua_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('click_events_ua_id_fkey', 'user_agents', ['ua_id'], ['id'])
+
+    # Walk click_events by id, BATCH_SIZE rows at a time; each distinct
+    # string becomes a user_agents row with the parsed fields of its first click.
+    bind = op.get_bind()
+    known: dict[str, int] = {}
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(click_events.c.id, click_events.c.clicked_at, click_events.c.ua_raw,
+                      *[click_events.c[name] for name in UA_FIELDS])
+            .where(click_events.c.id > last_id, click_events.c.ua_raw.isnot(None))
+            .order_by(click_events.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        new: dict[str, dict] = {}
+        for row in rows:
+            key = ua_hash(row.ua_raw)
+            if key not in known and key not in new:
+                new[key] = {'ua_hash': key, 'ua_raw': row.ua_raw, **{name: row._mapping[name] for name in UA_FIELDS}}
+        if new:
+            bind.execute(user_agents.insert(), list(new.values()))
+            for key, ua_id in bind.execute(
+                sa.select(user_agents.c.ua_hash, user_agents.c.id).where(user_agents.c.ua_hash.in_(list(new)))
+            ):
+                known[key] = ua_id
+        _set_by_key(bind, [
+            {'b_id': row.id, 'b_clicked_at': row.clicked_at, 'ua_id': known[ua_hash(row.ua_raw)]}
+            for row in rows
+        ])
+
+    with op.batch_alter_table('click_events') as batch_op:
+        for name in ['ua_raw', *UA_FIELDS]:
+            batch_op.drop_column(name)
+
+
+def downgrade() -> None:
+    """Copy the user agent columns back onto click_events and drop user_agents."""
+    with op.batch_alter_table('click_events') as batch_op:
+        batch_op.add_column(sa.Column('ua_raw', sa.String(length=1024), nullable=True))
+        for name, length in UA_FIELDS.items():
+            batch_op.add_column(sa.Column(name, sa.String(length=length), nullable=True))
+
+    bind = op.get_bind()
+    agents: dict[int, dict] = {}
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(click_events.c.id, click_events.c.clicked_at, click_events.c.ua_id)
+            .where(click_events.c.id > last_id, click_events.c.ua_id.isnot(None))
+            .order_by(click_events.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        missing = {row.ua_id for row in rows} - agents.keys()
+        if missing:
+            for agent in bind.execute(sa.select(user_agents).where(user_agents.c.id.in_(missing))):
+                agents[agent.id] = {'ua_raw': agent.ua_raw, **{name: agent._mapping[name] for name in UA_FIELDS}}
+        _set_by_key(bind, [
+            {'b_id': row.id, 'b_clicked_at': row.clicked_at, **agents[row.ua_id]}
+            for row in rows
+        ])
+
+    with op.batch_alter_table('click_events') as batch_op:
+        batch_op.drop_constraint('click_events_ua_id_fkey', type_='foreignkey')
+        batch_op.drop_column('ua_id')
+    op.drop_table('user_agents')
@@ -0,0 +1,94 @@
+"""add_click_visitor_sketches
+
+Revision ID: c3d4e5f6a7b8
+Revises: b7c1d2e3f4a5
+Create Date: 2025-02-17 12:00:00.000000
+
+"""
+from datetime import timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.core.hll import HyperLogLog
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3d4e5f6a7b8'
+down_revision: Union[str, None] = 'b7c1d2e3f4a5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SKETCH_PRECISION = 12
+BATCH_SIZE = 1000
+
+
+def upgrade() -> None:
+    """Create hourly visitor sketches and backfill them from click_events."""
+    sketches = op.create_table(
+        'click_visitor_sketch_hourly',
+        sa.Column('link_id', sa.Integer(), nullable=False),
+        sa.Column('hour', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('country', sa.String(length=2), nullable=False),
+        sa.Column('sketch', sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(['link_id'], ['links.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('link_id', 'hour', 'country'),
+    )
+    op.create_index('ix_click_visitor_sketch_hourly_hour', 'click_visitor_sketch_hourly', ['hour'], unique=False)
+
+    # Sketches are built in Python (the same HyperLogLog the app uses), one
+    # link at a time in clicked_at order so only the current hour is in memory.
+    events = sa.table(
+        'click_events',
+        sa.column('link_id', sa.Integer()),
+        sa.column('clicked_at', sa.DateTime(timezone=True)),
+        sa.column('country', sa.String()),
+        sa.column('visitor_hash', sa.String()),
+    )
+    bind = op.get_bind()
+    # streaming is set on the statement: Connection.execution_options() would
+    # turn it on for every later statement on alembic's connection
+    rows = bind.execute(
+        sa.select(events.c.link_id, events.c.clicked_at, events.c.country, events.c.visitor_hash)
+        .where(events.c.visitor_hash.isnot(None))
+        .order_by(events.c.link_id, events.c.clicked_at)
+        .execution_options(stream_results=True, yield_per=BATCH_SIZE)
+    )
+
+    current: tuple | None = None
+    open_sketches: dict[str, HyperLogLog] = {}
+    pending: list[dict] = []
+
+    def close_hour() -> None:
+        link_id, hour = current
+        for country, sketch in open_sketches.items():
+            pending.append({'link_id': link_id, 'hour': hour, 'country': country, 'sketch': sketch.to_bytes()})
+        open_sketches.clear()
+        if len(pending) >= BATCH_SIZE:
+            op.bulk_insert(sketches, pending)
+            pending.clear()
+
+    for link_id, clicked_at, country, visitor_hash in rows:
+        # UTC hours; SQLite returns naive values that are already UTC
+        if clicked_at.tzinfo is None:
+            clicked_at = clicked_at.replace(tzinfo=timezone.utc)
+        hour = clicked_at.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        if (link_id, hour) != current:
+            if current is not None:
+                close_hour()
+            current = (link_id, hour)
+        sketch = open_sketches.get(country or '')
+        if sketch is None:
+            sketch = open_sketches[country or ''] = HyperLogLog(SKETCH_PRECISION)
+        sketch.add(visitor_hash)
+    if current is not None:
+        close_hour()
+    if pending:
+        op.bulk_insert(sketches, pending)
+
+
+def downgrade() -> None:
+    """Drop click visitor sketches."""
+    op.drop_index('ix_click_visitor_sketch_hourly_hour', table_name='click_visitor_sketch_hourly')
+    op.drop_table('click_visitor_sketch_hourly')
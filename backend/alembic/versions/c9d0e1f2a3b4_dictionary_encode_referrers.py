@@ -0,0 +1,136 @@
+"""dictionary_encode_referrers
+
+Revision ID: c9d0e1f2a3b4
+Revises: b8c9d0e1f2a3
+Create Date: 2025-03-26 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9d0e1f2a3b4'
+down_revision: Union[str, None] = 'b8c9d0e1f2a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+DIMENSION = 'referrer'
+
+click_events = sa.table(
+    'click_events',
+    sa.column('id', sa.BigInteger()),
+    sa.column('clicked_at', sa.DateTime(timezone=True)),
+    sa.column('referrer_host', sa.String()),
+    sa.column('referrer_id', sa.Integer()),
+)
+
+dimension_values = sa.table(
+    'dimension_values',
+    sa.column('id', sa.Integer()),
+    sa.column('dimension', sa.String()),
+    sa.column('value', sa.String()),
+)
+
+
+def _set_by_key(bind, values: list[dict]) -> None:
+    """
+    UPDATE click_events rows by id. On PostgreSQL clicked_at is matched too,
+    so each update only touches the partition holding the row.
+    """
+    names = [k for k in values[0] if not k.startswith('b_')]
+    stmt = click_events.update().where(click_events.c.id == sa.bindparam('b_id'))
+    if bind.dialect.name == 'postgresql':
+        stmt = stmt.where(click_events.c.clicked_at == sa.bindparam('b_clicked_at'))
+    else:
+        values = [{k: v for k, v in row.items() if k != 'b_clicked_at'} for row in values]
+    bind.execute(stmt.values({name: sa.bindparam(name) for name in names}), values)
+
+
+def upgrade() -> None:
+    """Create dimension_values and replace click_events.referrer_host with referrer_id."""
+    op.create_table(
+        'dimension_values',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('dimension', sa.String(length=20), nullable=False),
+        sa.Column('value', sa.String(length=255), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('dimension', 'value', name='uq_dimension_values_dimension_value'),
+    )
+    with op.batch_alter_table('click_events') as batch_op:
+        batch_op.add_column(sa.Column('referrer_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('click_events_referrer_id_fkey', 'dimension_values', ['referrer_id'], ['id'])
+
+    # Walk click_events by id, BATCH_SIZE rows at a time, adding each host
+    # the dictionary doesn't have yet.
+    bind = op.get_bind()
+    known: dict[str, int] = {}
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(click_events.c.id, click_events.c.clicked_at, click_events.c.referrer_host)
+            .where(click_events.c.id > last_id, click_events.c.referrer_host.isnot(None))
+            .order_by(click_events.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        new = sorted({row.referrer_host for row in rows} - known.keys())
+        if new:
+            bind.execute(dimension_values.insert(), [{'dimension': DIMENSION, 'value': host} for host in new])
+            for value_id, host in bind.execute(
+                sa.select(dimension_values.c.id, dimension_values.c.value)
+                .where(dimension_values.c.dimension == DIMENSION, dimension_values.c.value.in_(new))
+            ):
+                known[host] = value_id
+        _set_by_key(bind, [
+            {'b_id': row.id, 'b_clicked_at': row.clicked_at, 'referrer_id': known[row.referrer_host]}
+            for row in rows
+        ])
+
+    with op.batch_alter_table('click_events') as batch_op:
+        batch_op.drop_column('referrer_host')
+
+
+def downgrade() -> None:
+    """Copy referrer hosts back onto click_events and drop dimension_values."""
+    with op.batch_alter_table('click_events') as batch_op:
+        batch_op.add_column(sa.Column('referrer_host', sa.String(length=255), nullable=True))
+
+    bind = op.get_bind()
+    hosts: dict[int, str] = {}
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(click_events.c.id, click_events.c.clicked_at, click_events.c.referrer_id)
+            .where(click_events.c.id > last_id, click_events.c.referrer_id.isnot(None))
+            .order_by(click_events.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        missing = {row.referrer_id for row in rows} - hosts.keys()
+        if missing:
+            hosts.update(
+                (row.id, row.value)
+                for row in bind.execute(
+                    sa.select(dimension_values.c.id, dimension_values.c.value)
+                    .where(dimension_values.c.id.in_(missing))
+                )
+            )
+        _set_by_key(bind, [
+            {'b_id': row.id, 'b_clicked_at': row.clicked_at, 'referrer_host': hosts[row.referrer_id]}
+            for row in rows
+        ])
+
+    with op.batch_alter_table('click_events') as batch_op:
+        batch_op.drop_constraint('click_events_referrer_id_fkey', type_='foreignkey')
+        batch_op.drop_column('referrer_id')
+    op.drop_table('dimension_values')
@@ -0,0 +1,29 @@
+"""add_link_sort_indexes
+
+Revision ID: d4e5f6a7b8c9
+Revises: c3d4e5f6a7b8
+Create Date: 2025-02-24 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4e5f6a7b8c9'
+down_revision: Union[str, None] = 'c3d4e5f6a7b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Index links for keyset pagination by click count and by last click."""
+    op.create_index('ix_links_user_click_count', 'links', ['user_id', 'click_count', 'id'], unique=False)
+    op.create_index('ix_links_user_last_clicked_at', 'links', ['user_id', 'last_clicked_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Drop the link sort indexes."""
+    op.drop_index('ix_links_user_last_clicked_at', table_name='links')
+    op.drop_index('ix_links_user_click_count', table_name='links')
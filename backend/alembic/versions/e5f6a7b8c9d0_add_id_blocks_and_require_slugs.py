@@ -0,0 +1,60 @@
+"""add_id_blocks_and_require_slugs
+
+Revision ID: e5f6a7b8c9d0
+Revises: d4e5f6a7b8c9
+Create Date: 2025-03-03 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.links.slug import slug_for_id
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5f6a7b8c9d0'
+down_revision: Union[str, None] = 'd4e5f6a7b8c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+
+def upgrade() -> None:
+    """Create the id block table, seed it from links and make links.slug NOT NULL."""
+    id_blocks = op.create_table(
+        'id_blocks',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('next_value', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('name'),
+    )
+
+    bind = op.get_bind()
+    links = sa.table('links', sa.column('id', sa.Integer()), sa.column('slug', sa.String()))
+
+    # rows left without a slug by a failed create_link get the one it would have set
+    while True:
+        ids = bind.execute(
+            sa.select(links.c.id).where(links.c.slug.is_(None)).order_by(links.c.id).limit(BATCH_SIZE)
+        ).scalars().all()
+        if not ids:
+            break
+        bind.execute(
+            links.update().where(links.c.id == sa.bindparam('b_id')).values(slug=sa.bindparam('b_slug')),
+            [{'b_id': link_id, 'b_slug': slug_for_id(link_id)} for link_id in ids],
+        )
+
+    with op.batch_alter_table('links') as batch_op:
+        batch_op.alter_column('slug', existing_type=sa.String(length=32), nullable=False)
+
+    next_id = bind.execute(sa.select(sa.func.coalesce(sa.func.max(links.c.id), 0) + 1)).scalar_one()
+    op.bulk_insert(id_blocks, [{'name': 'links', 'next_value': next_id}])
+
+
+def downgrade() -> None:
+    """Allow NULL slugs again and drop the id block table."""
+    with op.batch_alter_table('links') as batch_op:
+        batch_op.alter_column('slug', existing_type=sa.String(length=32), nullable=True)
+    op.drop_table('id_blocks')
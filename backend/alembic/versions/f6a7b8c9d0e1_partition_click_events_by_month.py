@@ -0,0 +1,222 @@
+"""partition_click_events_by_month
+
+Revision ID: f6a7b8c9d0e1
+Revises: e5f6a7b8c9d0
+Create Date: 2025-03-10 12:00:00.000000
+
+On PostgreSQL, click_events becomes range-partitioned on clicked_at, one
+partition per UTC month plus click_events_default, and its primary key
+becomes (id, clicked_at). The upgrade copies the rows while click_events
+keeps taking clicks:
+
+1. click_events_partitioned is created empty, with its partitions, indexes
+   and foreign keys.
+2. A SHARE lock, held until in-flight inserts commit, fixes the highest id;
+   the rows up to it are copied one month per transaction.
+3. One transaction locks click_events, copies the rows inserted since step 2
+   and swaps the tables. Click inserts only wait for this step; dropping the
+   old table's foreign keys also locks links for its duration.
+
+Copies skip rows already there, so a failed upgrade (e.g. a link deleted
+while its clicks were being copied) can simply be re-run.
+
+The downgrade copies every row back in one transaction, during which
+click_events can be neither read nor written: plan downtime for it.
+
+The DDL lives here rather than in src.links.partitions so that later changes
+to the app can't change what this revision does.
+"""
+import re
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6a7b8c9d0e1'
+down_revision: Union[str, None] = 'e5f6a7b8c9d0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PARENT = 'click_events'
+STAGING = 'click_events_partitioned'
+DEFAULT_PARTITION = 'click_events_default'
+# the app's partition maintenance keeps CLICK_PARTITION_MONTHS_AHEAD ready from then on
+MONTHS_AHEAD = 3
+
+
+def _month_start(dt: datetime) -> datetime:
+    dt = dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+    return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _add_months(month: datetime, n: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + n
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def _months(bind, now: datetime | None, months_ahead: int) -> list[datetime]:
+    """Month starts from the oldest stored click through `months_ahead` months from now."""
+    current = _month_start(now or datetime.now(timezone.utc))
+    oldest = bind.execute(sa.text(f'SELECT min(clicked_at) FROM {PARENT}')).scalar_one()
+    month = min(_month_start(oldest), current) if oldest is not None else current
+    months = []
+    while month <= _add_months(current, months_ahead):
+        months.append(month)
+        month = _add_months(month, 1)
+    return months
+
+
+@contextmanager
+def _transaction(bind):
+    """An explicit transaction on a connection in AUTOCOMMIT mode."""
+    bind.execute(sa.text('BEGIN'))
+    try:
+        yield
+    except BaseException:
+        bind.execute(sa.text('ROLLBACK'))
+        raise
+    bind.execute(sa.text('COMMIT'))
+
+
+def _is_partitioned(bind) -> bool:
+    return bind.execute(sa.text(
+        'SELECT EXISTS (SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid '
+        'WHERE c.relname = :name AND pg_table_is_visible(c.oid))'
+    ), {'name': PARENT}).scalar_one()
+
+
+def _index_definitions(bind, table: str) -> list[str]:
+    """CREATE INDEX statements of `table`'s indexes, primary key excluded."""
+    return list(bind.execute(sa.text(
+        'SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = :table '
+        "AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(:table) AND contype = 'p')"
+    ), {'table': table}).scalars())
+
+
+def _foreign_keys(bind, table: str) -> list[tuple[str, str]]:
+    return list(bind.execute(sa.text(
+        'SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint '
+        "WHERE conrelid = to_regclass(:table) AND contype = 'f'"
+    ), {'table': table}).tuples())
+
+
+def _retarget_index(definition: str, table: str, suffix: str = '') -> str:
+    """`definition` rewritten to create the index on `table`, its name followed by `suffix`."""
+    return re.sub(
+        r'^(CREATE (?:UNIQUE )?INDEX )(\S+)( ON (?:ONLY )?)(\S+\.)?\S+ ',
+        lambda m: f'{m[1]}{m[2]}{suffix}{m[3]}{m[4] or ""}{table} ',
+        definition,
+        count=1,
+    )
+
+
+def _index_name(definition: str) -> str:
+    return re.match(r'CREATE (?:UNIQUE )?INDEX (\S+)', definition)[1]
+
+
+def _move_sequence(bind, source: str, target: str) -> None:
+    # the sequence is owned by the old column and would be dropped with it
+    sequence = bind.execute(sa.text("SELECT pg_get_serial_sequence(:table, 'id')"), {'table': source}).scalar_one()
+    if sequence:
+        bind.execute(sa.text(f'ALTER SEQUENCE {sequence} OWNED BY {target}.id'))
+
+
+def _create_staging(bind, months: list[datetime]) -> None:
+    """Empty click_events_partitioned with the monthly partitions, keys and indexes of click_events."""
+    bind.execute(sa.text(
+        f'CREATE TABLE {STAGING} (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+        'PARTITION BY RANGE (clicked_at)'
+    ))
+    for month in months:
+        bind.execute(sa.text(
+            f'CREATE TABLE {PARENT}_p{month:%Y%m} PARTITION OF {STAGING} '
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+        ))
+    bind.execute(sa.text(f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {STAGING} DEFAULT'))
+    bind.execute(sa.text(f'ALTER TABLE {STAGING} ADD CONSTRAINT {STAGING}_pkey PRIMARY KEY (id, clicked_at)'))
+    # suffixed until the swap, index names being unique per schema
+    for definition in _index_definitions(bind, PARENT):
+        bind.execute(sa.text(_retarget_index(definition, STAGING, '_new')))
+    for name, definition in _foreign_keys(bind, PARENT):
+        bind.execute(sa.text(f'ALTER TABLE {STAGING} ADD CONSTRAINT {name} {definition}'))
+
+
+def partition_click_events(bind, *, months_ahead: int, now: datetime | None = None) -> None:
+    """
+    Steps 1-3 of the module docstring. `bind` must be in AUTOCOMMIT mode:
+    each month is copied in a transaction of its own.
+    """
+    months = _months(bind, now, months_ahead)
+    staged = bind.execute(sa.text('SELECT to_regclass(:table) IS NOT NULL'), {'table': STAGING}).scalar_one()
+    if not staged:
+        with _transaction(bind):
+            _create_staging(bind, months)
+
+    with _transaction(bind):
+        # waits for in-flight inserts, so every id up to the watermark is committed
+        bind.execute(sa.text(f'LOCK TABLE {PARENT} IN SHARE MODE'))
+        watermark = bind.execute(sa.text(f'SELECT coalesce(max(id), 0) FROM {PARENT}')).scalar_one()
+
+    copy = f'INSERT INTO {STAGING} SELECT * FROM {PARENT} WHERE id <= :watermark AND '
+    for month in months:
+        bind.execute(
+            sa.text(copy + 'clicked_at >= :start AND clicked_at < :end ON CONFLICT DO NOTHING'),
+            {'watermark': watermark, 'start': month, 'end': _add_months(month, 1)},
+        )
+    bind.execute(
+        sa.text(copy + '(clicked_at < :start OR clicked_at >= :end) ON CONFLICT DO NOTHING'),
+        {'watermark': watermark, 'start': months[0], 'end': _add_months(months[-1], 1)},
+    )
+
+    with _transaction(bind):
+        bind.execute(sa.text(f'LOCK TABLE {PARENT} IN ACCESS EXCLUSIVE MODE'))
+        bind.execute(
+            sa.text(f'INSERT INTO {STAGING} SELECT * FROM {PARENT} WHERE id > :watermark ON CONFLICT DO NOTHING'),
+            {'watermark': watermark},
+        )
+        indexes = [_index_name(definition) for definition in _index_definitions(bind, PARENT)]
+        _move_sequence(bind, PARENT, STAGING)
+        bind.execute(sa.text(f'DROP TABLE {PARENT}'))
+        bind.execute(sa.text(f'ALTER TABLE {STAGING} RENAME TO {PARENT}'))
+        bind.execute(sa.text(f'ALTER TABLE {PARENT} RENAME CONSTRAINT {STAGING}_pkey TO {PARENT}_pkey'))
+        for name in indexes:
+            bind.execute(sa.text(f'ALTER INDEX {name}_new RENAME TO {name}'))
+
+
+def unpartition_click_events(bind) -> None:
+    """Copy a partitioned click_events back into one plain table keyed by id, in the caller's transaction."""
+    bind.execute(sa.text(f'ALTER TABLE {PARENT} RENAME TO {STAGING}'))
+    bind.execute(sa.text(f'CREATE TABLE {PARENT} (LIKE {STAGING} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+    bind.execute(sa.text(f'INSERT INTO {PARENT} SELECT * FROM {STAGING}'))
+
+    indexes = _index_definitions(bind, STAGING)
+    foreign_keys = _foreign_keys(bind, STAGING)
+    _move_sequence(bind, STAGING, PARENT)
+    bind.execute(sa.text(f'DROP TABLE {STAGING}'))
+
+    bind.execute(sa.text(f'ALTER TABLE {PARENT} ADD CONSTRAINT {PARENT}_pkey PRIMARY KEY (id)'))
+    for definition in indexes:
+        bind.execute(sa.text(_retarget_index(definition, PARENT)))
+    for name, definition in foreign_keys:
+        bind.execute(sa.text(f'ALTER TABLE {PARENT} ADD CONSTRAINT {name} {definition}'))
+
+
+def upgrade() -> None:
+    """On PostgreSQL, move click_events into monthly range partitions on clicked_at."""
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql' or _is_partitioned(bind):
+        return
+    with op.get_context().autocommit_block():
+        partition_click_events(op.get_bind(), months_ahead=MONTHS_AHEAD)
+
+
+def downgrade() -> None:
+    """On PostgreSQL, fold the partitions back into a single click_events table."""
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql' or not _is_partitioned(bind):
+        return
+    unpartition_click_events(bind)
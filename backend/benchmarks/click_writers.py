@@ -0,0 +1,151 @@
+"""
+Compare click_events write throughput: ORM add_all + flush, Core
+executemany INSERT and COPY FROM STDIN (PostgreSQL with psycopg2 only).
+
+Each strategy writes --rows enriched clicks in transactions of --batch rows
+to a scratch user and link, which are deleted again afterwards. Only the
+event insert is timed; rollup maintenance is the same for every strategy
+and is left out.
+
+Usage (from backend/):
+
+  python -m benchmarks.click_writers [--database-url URL] [--rows 50000] [--batch 500]
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+from sqlalchemy import create_engine, delete, event, insert
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.core.config import settings
+from src.links.click_writer import copy_rows, copy_supported
+from src.links.rollups import _rollup_flushed_clicks
+from src.links.dictionary import referrer_hosts
+from src.links.service import RawClick, create_link, enrich_click
+from src.links.user_agents import user_agent_ids
+from src.models.click_event import ClickEvent
+from src.models.click_rollup import ClickRollupCountryDaily, ClickRollupHourly, ClickVisitorSketchHourly
+from src.models.link import Link
+from src.models.user import User
+import src.models.oauth_account
+import src.models.user_agent
+import src.models.dimension_value
+import src.models.id_block  # make sure models are registered
+
+_USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0",
+]
+_REFERRER = "news.ycombinator.com"
+
+
+def make_rows(db: Session, link_id: int, n: int) -> list[dict]:
+    # GeoIP is skipped (no IPs): the benchmark is about the write, not enrichment
+    start = datetime.now(timezone.utc) - timedelta(days=1)
+    ua_ids = user_agent_ids.resolve(db, _USER_AGENTS)
+    referrer_ids = referrer_hosts.encode(db, [_REFERRER])
+    rows = []
+    for i in range(n):
+        raw = RawClick(
+            link_id=link_id,
+            clicked_at=start + timedelta(milliseconds=i),
+            ip=None,
+            ua=_USER_AGENTS[i % len(_USER_AGENTS)],
+            referrer_host=_REFERRER if i % 2 else None,
+        )
+        rows.append(enrich_click(raw, ua_id=ua_ids[raw.ua], referrer_id=referrer_ids.get(raw.referrer_host)))
+    return rows
+
+
+@contextmanager
+def _orm_rollups_off():
+    event.remove(Session, "after_flush", _rollup_flushed_clicks)
+    try:
+        yield
+    finally:
+        event.listen(Session, "after_flush", _rollup_flushed_clicks)
+
+
+def write_orm(db: Session, rows: list[dict]) -> None:
+    db.add_all([ClickEvent(**row) for row in rows])
+    db.flush()
+
+
+def write_executemany(db: Session, rows: list[dict]) -> None:
+    db.execute(insert(ClickEvent.__table__), rows)
+
+
+def write_copy(db: Session, rows: list[dict]) -> None:
+    copy_rows(db.connection(), ClickEvent.__tablename__, rows)
+
+
+def run(db: Session, write: Callable[[Session, list[dict]], None], rows: list[dict], batch: int) -> float:
+    """Rows per second writing `rows` with `write`, one transaction per `batch` rows."""
+    start = time.perf_counter()
+    for i in range(0, len(rows), batch):
+        write(db, rows[i:i + batch])
+        db.commit()
+    elapsed = time.perf_counter() - start
+    db.expunge_all()
+    return len(rows) / elapsed
+
+
+def _cleanup(db: Session, user_id: int, link_id: int) -> None:
+    for model in (ClickEvent, ClickRollupHourly, ClickRollupCountryDaily, ClickVisitorSketchHourly):
+        db.execute(delete(model).where(model.link_id == link_id))
+    db.execute(delete(Link).where(Link.id == link_id))
+    db.execute(delete(User).where(User.id == user_id))
+    db.commit()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark click_events write strategies")
+    parser.add_argument("--database-url", default=settings.database_url)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--batch", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    engine = create_engine(args.database_url)
+    db = sessionmaker(bind=engine, autoflush=False)()
+    user = User(email=f"bench-{uuid.uuid4().hex}@example.invalid")
+    db.add(user)
+    db.commit()
+    user_id = user.id
+    link_id = create_link(db, user_id=user_id, target_url="https://example.com/bench").id
+    try:
+        rows = make_rows(db, link_id, args.rows)
+        strategies: dict[str, Callable[[Session, list[dict]], None]] = {
+            "orm add_all": write_orm,
+            "core executemany": write_executemany,
+        }
+        if copy_supported(db.connection()):
+            strategies["copy"] = write_copy
+        else:
+            print(f"COPY skipped: needs postgresql+psycopg2, not {engine.dialect.name}+{engine.dialect.driver}")
+        db.commit()
+
+        print(f"{args.rows} rows, {args.batch} per transaction, {engine.dialect.name}+{engine.dialect.driver}")
+        baseline = None
+        for name, write in strategies.items():
+            with _orm_rollups_off():
+                rate = run(db, write, rows, args.batch)
+            baseline = baseline or rate
+            print(f"  {name:<18} {rate:>12,.0f} rows/s  {rate / baseline:5.1f}x")
+    finally:
+        db.rollback()
+        _cleanup(db, user_id, link_id)
+        db.close()
+        engine.dispose()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
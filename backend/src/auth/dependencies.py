@@ -1,15 +1,21 @@
 from fastapi import Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 
-from src.db.session import get_db
+from src.core.config import settings
+from src.db.async_session import Database, get_database
 from src.models.user import User
 
-def get_current_user(request: Request, db: Session = Depends(get_db)) -> User:
+
+def _get_user(db: Session, user_id: int) -> User | None:
+    return db.query(User).filter_by(id=user_id).one_or_none()
+
+
+async def get_current_user(request: Request, db: Database = Depends(get_database)) -> User:
     user_id = request.session.get("user_id")
     if not user_id:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
-    user = db.query(User).filter_by(id=user_id).one_or_none()
+    user = await db.run(_get_user, user_id)
     if not user:
         # stale cookie -> clear it
         request.session.pop("user_id", None)
@@ -17,3 +23,13 @@ def get_current_user(request: Request, db: Session = Depends(get_db)) -> User:
 
     return user
 
+
+def is_admin(user: User) -> bool:
+    admins = {email.strip().lower() for email in settings.admin_emails.split(",") if email.strip()}
+    return user.email.lower() in admins
+
+
+async def get_current_admin(user: User = Depends(get_current_user)) -> User:
+    if not is_admin(user):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return user
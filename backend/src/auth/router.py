@@ -4,7 +4,7 @@ from starlette.responses import RedirectResponse
 
 from src.core.oauth import oauth
 from src.core.config import settings
-from src.db.session import get_db
+from src.db.async_session import Database, get_database
 from src.models.user import User
 from src.models.oauth_account import OAuthAccount
 from src.auth.dependencies import get_current_user
@@ -20,11 +20,8 @@ async def google_login(request: Request):
     )
 
 
-@router.get("/google/callback")
-async def google_callback(request: Request, db: Session = Depends(get_db)):
-    token = await oauth.google.authorize_access_token(request)
-    info = token.get("userinfo") or await oauth.google.userinfo(token=token)
-
+def _upsert_google_user(db: Session, info: dict) -> int:
+    """Find or create the user for a Google identity; returns the user id."""
     provider = "google"
     sub = info["sub"]
     email = info["email"]
@@ -63,16 +60,25 @@ async def google_callback(request: Request, db: Session = Depends(get_db)):
         db.add(oauth_row)
 
     db.commit()
+    return user.id
+
+
+@router.get("/google/callback")
+async def google_callback(request: Request, db: Database = Depends(get_database)):
+    token = await oauth.google.authorize_access_token(request)
+    info = token.get("userinfo") or await oauth.google.userinfo(token=token)
+
+    user_id = await db.run(_upsert_google_user, info)
 
     # 3) Create YOUR app session
-    request.session["user_id"] = user.id
+    request.session["user_id"] = user_id
 
     # 4) Redirect back to frontend
     return RedirectResponse(url=f"{settings.frontend_url}/auth/callback?success=true")
 
 
 @router.get("/me")
-def me(current_user: User = Depends(get_current_user)):
+async def me(current_user: User = Depends(get_current_user)):
     return {
         "user": {
             "id": current_user.id,
@@ -84,7 +90,7 @@ def me(current_user: User = Depends(get_current_user)):
 
 
 @router.post("/logout")
-def logout(request: Request):
+async def logout(request: Request):
     request.session.pop("user_id", None)
     return {"ok": True}
 
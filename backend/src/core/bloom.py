@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import threading
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings.
+
+    might_contain() never returns False for something that was added; it
+    returns True for something that wasn't with probability ~fp_rate as long
+    as no more than `capacity` items are added. Uses double hashing of one
+    128-bit blake2b digest to derive the k bit positions.
+    Adds are serialized (setting a bit is a read-modify-write of a byte);
+    lookups take no lock.
+    """
+
+    def __init__(self, *, capacity: int, fp_rate: float = 0.01) -> None:
+        if capacity < 1:
+            raise ValueError("capacity must be >= 1")
+        if not 0 < fp_rate < 1:
+            raise ValueError("fp_rate must be between 0 and 1")
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        # optimal m and k for n items at the target false-positive rate
+        self.num_bits = max(8, math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._lock = threading.Lock()
+
+    def _positions(self, item: str) -> list[int]:
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        m = self.num_bits
+        return [(h1 + i * h2) % m for i in range(self.num_hashes)]
+
+    def add(self, item: str) -> bool:
+        """Returns False if every bit was already set (a repeat add isn't counted)."""
+        positions = self._positions(item)
+        with self._lock:
+            changed = False
+            for pos in positions:
+                byte, mask = pos >> 3, 1 << (pos & 7)
+                if not self._bits[byte] & mask:
+                    self._bits[byte] |= mask
+                    changed = True
+            if changed:
+                self.count += 1
+            return changed
+
+    def might_contain(self, item: str) -> bool:
+        bits = self._bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self._bits)
+
+    def estimated_fp_rate(self) -> float:
+        """Expected false-positive rate for the number of items added so far."""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+def _default_sizeof(key: Any, value: Any) -> int:
+    return sys.getsizeof(key) + sys.getsizeof(value)
+
+
+class TTLCache:
+    """
+    Thread-safe in-process LRU cache with per-entry TTL and size/memory caps.
+
+    Entries are evicted least-recently-used first whenever either max_entries
+    or max_bytes would be exceeded. Memory is an estimate computed by `sizeof`
+    when an entry is stored; pass a cheaper/more accurate function for your
+    value type if the default sys.getsizeof is not representative.
+
+    `on_evict(key, value)` is called, outside the lock, for each entry evicted
+    to make room; expired entries are dropped silently.
+
+    Invalidation bumps a generation counter. Callers that read from the DB on
+    a miss should grab `generation()` before the read and pass it to `set()`,
+    so a result fetched before a concurrent invalidation is never cached.
+    """
+
+    def __init__(
+        self,
+        *,
+        name: str,
+        max_entries: int,
+        ttl_seconds: float | None = None,
+        max_bytes: int | None = None,
+        sizeof: Callable[[Any, Any], int] = _default_sizeof,
+        clock: Callable[[], float] = time.monotonic,
+        on_evict: Callable[[Any, Any], None] | None = None,
+    ) -> None:
+        if max_entries < 1:
+            raise ValueError("max_entries must be >= 1")
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._clock = clock
+        self._on_evict = on_evict
+
+        # key -> (value, expires_at | None, size)
+        self._data: OrderedDict[Hashable, tuple[Any, float | None, int]] = OrderedDict()
+        self._bytes = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, expires_at, size = entry
+            if expires_at is not None and expires_at <= self._clock():
+                del self._data[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        *,
+        ttl_seconds: float | None = None,
+        generation: int | None = None,
+    ) -> bool:
+        """
+        Store a value. Returns False if the write was skipped, either because
+        the cache was invalidated after `generation` was read or because the
+        entry alone is larger than max_bytes.
+        """
+        size = self._sizeof(key, value)
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        expires_at = self._clock() + ttl if ttl is not None else None
+
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return False
+            if self.max_bytes is not None and size > self.max_bytes:
+                return False
+
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            evicted = self._evict_locked()
+        if self._on_evict is not None:
+            for evicted_key, evicted_value in evicted:
+                self._on_evict(evicted_key, evicted_value)
+        return True
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._generation += 1
+            entry = self._data.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[2]
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict[str, int | float | None]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+    def _evict_locked(self) -> list[tuple[Hashable, Any]]:
+        evicted = []
+        while len(self._data) > self.max_entries or (
+            self.max_bytes is not None and self._bytes > self.max_bytes
+        ):
+            key, (value, _, size) = self._data.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            evicted.append((key, value))
+        return evicted
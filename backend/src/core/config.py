@@ -8,6 +8,20 @@ class Settings(BaseSettings):
 
     # Database
     database_url: str
+    # Serve routes from an async engine (asyncpg/aiosqlite) instead of the threadpool
+    db_async_enabled: bool = False
+    # Defaults to database_url with the async driver swapped in
+    async_database_url: str | None = None
+    # Connection pool, per engine and process. Background click workers and
+    # the counter flusher check out connections too, so size for them as well.
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout_seconds: float = 30.0  # max wait for a connection
+    db_pool_recycle_seconds: int = 1800
+    db_pool_pre_ping: bool = True
+    db_pool_warmup: bool = True  # open db_pool_size connections at startup
+    # PostgreSQL statement_timeout for every connection; 0 leaves the server default
+    db_statement_timeout_ms: int = 0
 
     # OAuth
     google_client_id: str
@@ -21,6 +35,95 @@ class Settings(BaseSettings):
     session_secret_key: str
     session_expire_minutes: int = 30
 
+    # Ops: /api/ops/metrics is off unless enabled, and then only served to
+    # signed-in users whose email is in admin_emails (comma-separated)
+    metrics_enabled: bool = False
+    admin_emails: str = ""
+
+    # Link ids are reserved this many at a time per process (hi-lo); unused
+    # ids of a block are skipped when the process exits
+    link_id_block_size: int = 100
+
+    # POST /api/links/bulk: most URLs accepted in one request
+    bulk_links_max_items: int = 50_000
+
+    # Redirect slug cache (per process; TTL bounds staleness across workers)
+    link_cache_max_entries: int = 10_000
+    link_cache_ttl_seconds: float = 60.0
+    link_cache_max_bytes: int = 16 * 1024 * 1024
+
+    # Dashboard response cache (per process; clicks persisted by this process
+    # invalidate a user's entries, the TTL bounds staleness across workers)
+    dashboard_cache_enabled: bool = True
+    dashboard_cache_ttl_seconds: float = 30.0
+    dashboard_cache_max_entries: int = 1_000
+    dashboard_cache_max_bytes: int = 32 * 1024 * 1024
+
+    # GeoIP: "ip-api" (remote), "local" (GEO1 file at geoip_database_path) or "none"
+    geoip_provider: str = "ip-api"
+    geoip_database_path: str | None = None
+    geoip_timeout_seconds: float = 3.0
+    # Remote lookups are cached per /24 (IPv4) or /48 (IPv6); 0 disables the cache
+    geoip_cache_max_entries: int = 50_000
+    geoip_cache_ttl_seconds: float = 24 * 3600
+    geoip_cache_negative_ttl_seconds: float = 3600
+    geoip_cache_error_ttl_seconds: float = 60
+
+    # Parsed user-agent cache (only strings new to the user_agents table are parsed),
+    # and the user_agents id cache; warm-up loads the most frequent recent UAs at startup
+    ua_cache_max_entries: int = 20_000
+    ua_cache_max_bytes: int = 32 * 1024 * 1024
+    ua_id_cache_max_entries: int = 50_000
+    ua_cache_warmup_limit: int = 1_000
+    ua_cache_warmup_days: int = 1
+
+    # Dictionary-encoded click dimensions (referrer hosts): value <-> id entries kept in memory
+    dimension_cache_max_entries: int = 100_000
+
+    # Bloom filter of existing slugs so unknown slugs 404 without a DB lookup
+    slug_filter_enabled: bool = True
+    slug_filter_fp_rate: float = 0.01
+    slug_filter_headroom: float = 2.0  # capacity = row count * headroom
+    slug_filter_refresh_seconds: float = 1.0
+
+    # Click ingestion: "async" enqueues clicks for background workers, "sync" writes inline
+    click_ingest_mode: str = "async"
+    click_ingest_workers: int = 2
+    click_queue_max_size: int = 10_000
+    click_queue_policy: str = "drop"  # drop | block | spill
+    click_queue_block_timeout_seconds: float = 0.05
+    click_queue_spill_path: str = "click_spill.ndjson"
+    # replays a spilled click may fail (other than for an unreachable database)
+    # before it is moved to <spill path>.dead
+    click_spill_max_attempts: int = 5
+    click_ingest_shutdown_timeout_seconds: float = 10.0
+    click_batch_max_size: int = 500
+    click_batch_max_wait_ms: int = 200
+    # Write click batches with COPY FROM STDIN on PostgreSQL (psycopg2); other
+    # databases, or false, use an executemany INSERT
+    click_copy_enabled: bool = True
+    # PostgreSQL: monthly click_events partitions are created this many months
+    # ahead, checked at startup and then every interval (0 disables the check)
+    click_partition_months_ahead: int = 3
+    click_partition_maintenance_interval_seconds: float = 86_400
+
+    # Link counters: "deferred" folds per-process click deltas into links every
+    # flush interval, "inline" updates the links row in each click batch
+    click_counter_mode: str = "deferred"
+    click_counter_flush_interval_seconds: float = 1.0
+
+    # Raw click retention: events older than this many days are folded into
+    # daily aggregates and deleted (0 keeps them forever), checked every interval;
+    # deletes go in batches of this many rows with a pause in between
+    click_retention_days: int = 0
+    click_retention_interval_seconds: float = 3_600
+    click_retention_delete_batch: int = 5_000
+    click_retention_batch_pause_ms: int = 50
+
+    # Unique visitors: ranges with more clicks than this are estimated from hourly
+    # HyperLogLog sketches (~1.6% standard error) instead of counted exactly
+    unique_visitors_exact_max_clicks: int = 100_000
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
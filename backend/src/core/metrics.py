@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+from typing import Any, Callable
+
+# name -> zero-arg callable returning a JSON-serializable dict
+_collectors: dict[str, Callable[[], dict[str, Any]]] = {}
+
+
+def register_metrics(name: str, collect: Callable[[], dict[str, Any]]) -> None:
+    """Register (or replace) a metrics source exposed under `name`."""
+    _collectors[name] = collect
+
+
+def collect_metrics() -> dict[str, dict[str, Any]]:
+    snapshot: dict[str, dict[str, Any]] = {}
+    for name, collect in sorted(_collectors.items()):
+        try:
+            snapshot[name] = collect()
+        except Exception as e:
+            # one broken collector shouldn't hide the rest
+            snapshot[name] = {"error": str(e)}
+    return snapshot
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Callable, TypeVar
+
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from src.core.config import settings
+from src.core.metrics import register_metrics
+from src.db.pool import PoolMetrics, engine_options
+from src.db.session import get_db
+
+T = TypeVar("T")
+
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+
+def to_async_url(url: str) -> str:
+    """sqlite:///x.db -> sqlite+aiosqlite:///x.db, postgresql://... -> postgresql+asyncpg://..."""
+    scheme, sep, rest = url.partition("://")
+    return f"{_ASYNC_DRIVERS.get(scheme, scheme)}{sep}{rest}"
+
+
+_async_engine: AsyncEngine | None = None
+_async_sessionmaker: async_sessionmaker[AsyncSession] | None = None
+async_pool_metrics = PoolMetrics()
+
+
+def get_async_engine() -> AsyncEngine:
+    """Created on first use so sync-only deployments don't need asyncpg/aiosqlite installed."""
+    global _async_engine, _async_sessionmaker
+    if _async_engine is None:
+        url = settings.async_database_url or to_async_url(settings.database_url)
+        _async_engine = create_async_engine(url, **engine_options(url, async_pool_metrics, is_async=True))
+        async_pool_metrics.instrument(_async_engine.sync_engine)
+        register_metrics("db_async_pool", async_pool_metrics.stats)
+        # expire_on_commit=False: attribute access after commit must not lazy-load
+        # outside the greenlet (MissingGreenlet)
+        _async_sessionmaker = async_sessionmaker(bind=_async_engine, autoflush=False, expire_on_commit=False)
+    return _async_engine
+
+
+async def dispose_async_engine() -> None:
+    global _async_engine, _async_sessionmaker
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = _async_sessionmaker = None
+
+
+def AsyncSessionLocal() -> AsyncSession:
+    get_async_engine()
+    return _async_sessionmaker()
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+class Database(ABC):
+    """
+    What routes depend on instead of a raw Session.
+
+    Service functions stay plain sync functions taking a Session; routes call
+    `await db.run(service_fn, ...)`. With DB_ASYNC_ENABLED the function runs on
+    the async engine via AsyncSession.run_sync (greenlet, no thread), otherwise
+    it runs on the blocking engine in Starlette's threadpool as before.
+    """
+
+    @abstractmethod
+    async def run(self, fn: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+        """Call fn(session, *args, **kwargs) and return its result."""
+
+    @abstractmethod
+    async def rollback(self) -> None:
+        """Roll back the session's transaction."""
+
+
+class ThreadpoolDatabase(Database):
+    def __init__(self, session: Session) -> None:
+        self.session = session
+
+    async def run(self, fn: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+        return await run_in_threadpool(fn, self.session, *args, **kwargs)
+
+    async def rollback(self) -> None:
+        await run_in_threadpool(self.session.rollback)
+
+
+class AsyncDatabase(Database):
+    def __init__(self, session: AsyncSession) -> None:
+        self.session = session
+
+    async def run(self, fn: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+        return await self.session.run_sync(lambda sync_session: fn(sync_session, *args, **kwargs))
+
+    async def rollback(self) -> None:
+        await self.session.rollback()
+
+
+if settings.db_async_enabled:
+    async def get_database(session: AsyncSession = Depends(get_async_db)) -> Database:
+        return AsyncDatabase(session)
+else:
+    async def get_database(session: Session = Depends(get_db)) -> Database:
+        return ThreadpoolDatabase(session)
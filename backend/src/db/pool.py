@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PoolMetrics:
+    """
+    Counters for one engine's connection pool, fed by SQLAlchemy pool events
+    (connect, checkout, checkin, invalidate) and by the pool class from
+    pool_class(), which times how long each checkout waited for a connection.
+    The wait average and maximum cover every attempt, timed-out ones included.
+    stats() adds the pool's live size, in-use and overflow counts.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._pool: Pool | None = None
+        self.connects = 0
+        self.checkouts = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        # checkout attempts timed by _TimedCheckout, successful or not
+        self.waits = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.max_in_use_seen = 0
+        self._in_use = 0
+
+    def pool_class(self, base: type[QueuePool]) -> type[QueuePool]:
+        """`base` with checkout waits reported here; survives engine.dispose()."""
+        return type(f"Timed{base.__name__}", (_TimedCheckout, base), {"metrics": self})
+
+    def instrument(self, engine: Engine) -> None:
+        self._pool = engine.pool
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        event.listen(engine, "invalidate", self._on_invalidate)
+        event.listen(engine, "engine_disposed", self._on_disposed)
+
+    def record_wait(self, seconds: float, *, timed_out: bool = False) -> None:
+        with self._lock:
+            self.waits += 1
+            self.wait_seconds_total += seconds
+            if seconds > self.wait_seconds_max:
+                self.wait_seconds_max = seconds
+            if timed_out:
+                self.timeouts += 1
+
+    def stats(self) -> dict[str, Any]:
+        pool = self._pool
+        with self._lock:
+            stats: dict[str, Any] = {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "in_use": self._in_use,
+                "max_in_use_seen": self.max_in_use_seen,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "wait_ms_avg": round(self.wait_seconds_total / self.waits * 1000, 3) if self.waits else 0.0,
+                "wait_ms_max": round(self.wait_seconds_max * 1000, 3),
+            }
+        if isinstance(pool, QueuePool):
+            stats.update(size=pool.size(), idle=pool.checkedin(), overflow=max(0, pool.overflow()))
+        return stats
+
+    def _on_connect(self, dbapi_connection, connection_record) -> None:
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self._in_use += 1
+            if self._in_use > self.max_in_use_seen:
+                self.max_in_use_seen = self._in_use
+
+    def _on_checkin(self, dbapi_connection, connection_record) -> None:
+        with self._lock:
+            # connections invalidated while checked out are checked in without a DBAPI connection
+            self._in_use = max(0, self._in_use - 1)
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception) -> None:
+        with self._lock:
+            self.invalidations += 1
+
+    def _on_disposed(self, engine: Engine) -> None:
+        self._pool = engine.pool
+
+
+class _TimedCheckout:
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except sa_exc.TimeoutError:
+            self.metrics.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        self.metrics.record_wait(time.perf_counter() - start)
+        return connection
+
+
+def _is_sqlite_memory(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")
+
+
+def engine_options(url: str, metrics: PoolMetrics, *, is_async: bool = False) -> dict[str, Any]:
+    """create_engine() keyword arguments for `url` from the DB_POOL_* / DB_STATEMENT_TIMEOUT_MS settings."""
+    backend = make_url(url).get_backend_name()
+    options: dict[str, Any] = {
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "pool_recycle": settings.db_pool_recycle_seconds,
+    }
+    # in-memory SQLite keeps one connection per thread; there's no pool to size
+    if not _is_sqlite_memory(url):
+        options.update(
+            poolclass=metrics.pool_class(AsyncAdaptedQueuePool if is_async else QueuePool),
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout_seconds,
+        )
+
+    connect_args: dict[str, Any] = {}
+    if backend == "sqlite" and not is_async:
+        # required for SQLite when used with FastAPI threads
+        connect_args["check_same_thread"] = False
+    if backend == "postgresql" and settings.db_statement_timeout_ms > 0:
+        timeout = str(settings.db_statement_timeout_ms)
+        if is_async:
+            connect_args["server_settings"] = {"statement_timeout": timeout}
+        else:
+            connect_args["options"] = f"-c statement_timeout={timeout}"
+    if connect_args:
+        options["connect_args"] = connect_args
+    return options
+
+
+def warm_pool(engine: Engine, connections: int) -> int:
+    """
+    Open up to `connections` pooled connections (never more than the pool
+    keeps idle) so the first requests don't pay for connecting. Returns how
+    many were opened.
+    """
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return 0
+    opened = []
+    try:
+        for _ in range(min(connections, pool.size())):
+            opened.append(engine.connect())
+    finally:
+        for conn in opened:
+            conn.close()
+    return len(opened)
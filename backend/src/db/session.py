@@ -1,20 +1,21 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 from src.core.config import settings
+from src.core.metrics import register_metrics
+from src.db.pool import PoolMetrics, engine_options
 
 class Base(DeclarativeBase):
     pass
 
-connect_args = {}
-if settings.database_url.startswith("sqlite"):
-    # required for SQLite when used with FastAPI threads
-    connect_args = {"check_same_thread": False}
+pool_metrics = PoolMetrics()
 
 engine = create_engine(
     settings.database_url,
-    connect_args=connect_args,
     future=True,
+    **engine_options(settings.database_url, pool_metrics),
 )
+pool_metrics.instrument(engine)
+register_metrics("db_pool", pool_metrics.stats)
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
@@ -24,4 +25,3 @@ def get_db():
         yield db
     finally:
         db.close()
-
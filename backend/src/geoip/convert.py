@@ -0,0 +1,108 @@
+"""
+Build a GEO1 database (see database.py) from a CSV of IP ranges.
+
+Supported inputs (header rows and comment lines are skipped):
+
+  range   start,end,country[,...]    dotted/colon addresses or integers
+                                     (DB-IP lite, IP2Location LITE DB1, ...)
+  cidr    network,country[,...]      e.g. "1.0.0.0/24,AU"
+
+Usage (from backend/):
+
+  python -m src.geoip.convert ip2country.csv geoip.bin [--format range|cidr]
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import ipaddress
+import sys
+from typing import Iterable, Iterator
+
+from src.geoip.database import Range, write_database
+
+# country values that mean "unknown" in the common free datasets
+_UNKNOWN = {"", "-", "ZZ", "XX", "--"}
+
+
+def _parse_addr(value: str) -> ipaddress.IPv4Address | ipaddress.IPv6Address:
+    value = value.strip()
+    if value.isdigit():
+        n = int(value)
+        return ipaddress.IPv4Address(n) if n <= 0xFFFFFFFF else ipaddress.IPv6Address(n)
+    return ipaddress.ip_address(value)
+
+
+def parse_rows(rows: Iterable[list[str]], fmt: str = "auto") -> Iterator[tuple[int, int, int, str]]:
+    """Yield (ip_version, first, last, country) for every usable row."""
+    for row in rows:
+        if not row or row[0].lstrip().startswith("#"):
+            continue
+        row_fmt = fmt
+        if row_fmt == "auto":
+            row_fmt = "cidr" if "/" in row[0] else "range"
+        try:
+            if row_fmt == "cidr":
+                net = ipaddress.ip_network(row[0].strip(), strict=False)
+                first, last, cc = net.network_address, net.broadcast_address, row[1]
+            else:
+                first, last, cc = _parse_addr(row[0]), _parse_addr(row[1]), row[2]
+        except (ValueError, IndexError):
+            # header line or junk
+            continue
+
+        cc = cc.strip().upper()
+        if cc in _UNKNOWN or len(cc) != 2 or first.version != last.version:
+            continue
+        yield first.version, int(first), int(last), cc
+
+
+def build_ranges(parsed: Iterable[tuple[int, int, int, str]]) -> tuple[list[Range], list[Range], int]:
+    """
+    Sort, drop overlaps (first range wins) and merge adjacent ranges with the
+    same country. Returns (v4, v6, dropped_count).
+    """
+    by_version: dict[int, list[Range]] = {4: [], 6: []}
+    for version, first, last, cc in parsed:
+        by_version[version].append((first, last, cc))
+
+    dropped = 0
+    out: dict[int, list[Range]] = {}
+    for version, ranges in by_version.items():
+        ranges.sort()
+        merged: list[Range] = []
+        for first, last, cc in ranges:
+            if merged:
+                p_first, p_last, p_cc = merged[-1]
+                if first <= p_last:
+                    dropped += 1
+                    continue
+                if first == p_last + 1 and cc == p_cc:
+                    merged[-1] = (p_first, last, cc)
+                    continue
+            merged.append((first, last, cc))
+        out[version] = merged
+    return out[4], out[6], dropped
+
+
+def convert(src_path: str, dest_path: str, fmt: str = "auto") -> tuple[int, int, int]:
+    with open(src_path, newline="", encoding="utf-8") as f:
+        v4, v6, dropped = build_ranges(parse_rows(csv.reader(f), fmt))
+    v4_count, v6_count = write_database(dest_path, v4, v6)
+    return v4_count, v6_count, dropped
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Convert a CSV IP range list to a GEO1 database")
+    parser.add_argument("src", help="input CSV")
+    parser.add_argument("dest", help="output .bin")
+    parser.add_argument("--format", choices=["auto", "range", "cidr"], default="auto")
+    args = parser.parse_args(argv)
+
+    v4_count, v6_count, dropped = convert(args.src, args.dest, args.format)
+    print(f"wrote {args.dest}: {v4_count} IPv4 ranges, {v6_count} IPv6 ranges ({dropped} overlapping dropped)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
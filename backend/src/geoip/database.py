@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import ipaddress
+import mmap
+import os
+import struct
+from typing import Iterable
+
+# File layout (all integers big-endian):
+#
+#   header   magic "GEO1" | version u16 | reserved u16 | v4_count u32 | v6_count u32
+#   v4       v4_count x (start u32 | end u32 | country 2s)      10 bytes each
+#   v6       v6_count x (start 16s | end 16s | country 2s)      34 bytes each
+#
+# Ranges are inclusive, sorted by start and non-overlapping. Addresses are
+# stored big-endian so comparing the raw bytes compares the numbers, which
+# lets IPv6 lookups binary-search without building ints.
+
+MAGIC = b"GEO1"
+VERSION = 1
+_HEADER = struct.Struct(">4sHHII")
+_V4 = struct.Struct(">II2s")
+_V6 = struct.Struct(">16s16s2s")
+
+Range = tuple[int, int, str]  # (first address, last address, country code)
+
+
+class GeoIPDatabaseError(ValueError):
+    pass
+
+
+def write_database(path: str, v4_ranges: Iterable[Range], v6_ranges: Iterable[Range]) -> tuple[int, int]:
+    """Write sorted, non-overlapping ranges to `path`. Returns (v4_count, v6_count)."""
+    v4 = _check_sorted(v4_ranges)
+    v6 = _check_sorted(v6_ranges)
+
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, 0, len(v4), len(v6)))
+        for start, end, cc in v4:
+            f.write(_V4.pack(start, end, cc.encode("ascii")))
+        for start, end, cc in v6:
+            f.write(_V6.pack(start.to_bytes(16, "big"), end.to_bytes(16, "big"), cc.encode("ascii")))
+    return len(v4), len(v6)
+
+
+def _check_sorted(ranges: Iterable[Range]) -> list[Range]:
+    out = list(ranges)
+    prev_end = -1
+    for start, end, cc in out:
+        if start > end or start <= prev_end:
+            raise GeoIPDatabaseError(f"ranges must be sorted and non-overlapping (at {start})")
+        if len(cc) != 2:
+            raise GeoIPDatabaseError(f"invalid country code {cc!r}")
+        prev_end = end
+    return out
+
+
+class GeoIPDatabase:
+    """
+    Read-only, memory-mapped range -> country table.
+    Lookups are a binary search over the mapped file (no parsing at load time),
+    so opening is O(1) and the page cache is shared between worker processes.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        if os.path.getsize(path) < _HEADER.size:
+            raise GeoIPDatabaseError(f"{path}: file too small")
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, _, self.v4_count, self.v6_count = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise GeoIPDatabaseError(f"{path}: not a GEO1 v{VERSION} database")
+
+        self._v4_offset = _HEADER.size
+        self._v6_offset = self._v4_offset + self.v4_count * _V4.size
+        expected = self._v6_offset + self.v6_count * _V6.size
+        if len(self._mm) != expected:
+            raise GeoIPDatabaseError(f"{path}: size {len(self._mm)} != expected {expected}")
+
+    def close(self) -> None:
+        self._mm.close()
+
+    def lookup(self, addr: ipaddress.IPv4Address | ipaddress.IPv6Address) -> str | None:
+        if addr.version == 4:
+            return self._lookup_v4(int(addr))
+        if addr.ipv4_mapped is not None:
+            return self._lookup_v4(int(addr.ipv4_mapped))
+        return self._lookup_v6(addr.packed)
+
+    def _lookup_v4(self, value: int) -> str | None:
+        mm, base, size = self._mm, self._v4_offset, _V4.size
+        lo, hi = 0, self.v4_count
+        # rightmost record with start <= value
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if struct.unpack_from(">I", mm, base + mid * size)[0] <= value:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return None
+        _, end, cc = _V4.unpack_from(mm, base + (lo - 1) * size)
+        return cc.decode("ascii") if value <= end else None
+
+    def _lookup_v6(self, packed: bytes) -> str | None:
+        mm, base, size = self._mm, self._v6_offset, _V6.size
+        lo, hi = 0, self.v6_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            off = base + mid * size
+            if mm[off:off + 16] <= packed:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return None
+        off = base + (lo - 1) * size
+        if packed > mm[off + 16:off + 32]:
+            return None
+        return mm[off + 32:off + 34].decode("ascii")
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import ipaddress
+import logging
+import threading
+from abc import ABC, abstractmethod
+
+import httpx
+
+from src.core.cache import TTLCache
+from src.core.config import settings
+from src.core.metrics import register_metrics
+from src.geoip.database import GeoIPDatabase
+
+logger = logging.getLogger(__name__)
+
+IPAddress = ipaddress.IPv4Address | ipaddress.IPv6Address
+
+
+class GeoIPProvider(ABC):
+    """Resolve a public IP address to an ISO 3166-1 alpha-2 code, or None."""
+
+    name = "base"
+
+    @abstractmethod
+    def lookup(self, addr: IPAddress) -> str | None:
+        """Country code of a public address, or None when unknown."""
+
+
+class NullProvider(GeoIPProvider):
+    name = "none"
+
+    def lookup(self, addr: IPAddress) -> str | None:
+        return None
+
+
+class IpApiProvider(GeoIPProvider):
+    """
+    ip-api.com free tier (no API key, 45 req/min, HTTP only).
+    Blocking network call - only suitable off the request path.
+    """
+
+    name = "ip-api"
+
+    def __init__(self, *, timeout: float = 3.0) -> None:
+        self.timeout = timeout
+
+    def lookup(self, addr: IPAddress) -> str | None:
+        with httpx.Client(timeout=self.timeout) as client:
+            response = client.get(
+                f"http://ip-api.com/json/{addr}",
+                params={"fields": "countryCode"},
+            )
+            response.raise_for_status()
+            data = response.json()
+
+        # Check if the response has an error status
+        if data.get("status") == "fail":
+            return None
+
+        # Return None if countryCode is empty string or missing
+        country_code = data.get("countryCode")
+        if country_code and len(country_code) == 2:
+            return country_code.upper()  # Ensure uppercase (US, GB, etc.)
+        return None
+
+
+class LocalProvider(GeoIPProvider):
+    """Offline lookups against a memory-mapped GEO1 file (build one with src.geoip.convert)."""
+
+    name = "local"
+
+    def __init__(self, path: str) -> None:
+        self.db = GeoIPDatabase(path)
+
+    def lookup(self, addr: IPAddress) -> str | None:
+        return self.db.lookup(addr)
+
+
+_MISS = object()
+
+
+def prefix_key(addr: IPAddress) -> tuple[int, int]:
+    """Cache key: the /24 for IPv4, the /48 for IPv6."""
+    if addr.version == 4:
+        return 4, int(addr) >> 8
+    return 6, int(addr) >> 80
+
+
+class _Flight:
+    __slots__ = ("done", "result")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: str | None = None
+
+
+class CachingProvider(GeoIPProvider):
+    """
+    Prefix-keyed TTL/LRU cache in front of a slow provider.
+
+    Clients behind the same carrier/NAT range share a /24 (v4) or /48 (v6), so
+    one lookup answers them all. "No country" answers are cached for
+    negative_ttl and provider errors for error_ttl, so a failing or
+    rate-limited upstream isn't hammered. Concurrent misses for the same prefix
+    are collapsed into a single upstream call (single-flight).
+    """
+
+    def __init__(
+        self,
+        inner: GeoIPProvider,
+        *,
+        max_entries: int,
+        ttl_seconds: float,
+        negative_ttl_seconds: float,
+        error_ttl_seconds: float,
+        wait_timeout: float = 5.0,
+    ) -> None:
+        self.inner = inner
+        self.name = f"cached-{inner.name}"
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.error_ttl_seconds = error_ttl_seconds
+        self.wait_timeout = wait_timeout
+        self.cache = TTLCache(name="geoip", max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+        self._flights: dict[tuple[int, int], _Flight] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+        self.upstream_calls = 0
+        self.upstream_errors = 0
+
+    def lookup(self, addr: IPAddress) -> str | None:
+        key = prefix_key(addr)
+        cached = self.cache.get(key, _MISS)
+        if cached is not _MISS:
+            return cached
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait(self.wait_timeout)
+            return flight.result
+
+        try:
+            flight.result = self._fetch(key, addr)
+            return flight.result
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _fetch(self, key: tuple[int, int], addr: IPAddress) -> str | None:
+        with self._lock:
+            self.upstream_calls += 1
+        try:
+            result = self.inner.lookup(addr)
+        except Exception:
+            with self._lock:
+                self.upstream_errors += 1
+            logger.debug("GeoIP lookup failed for %s", addr, exc_info=True)
+            self.cache.set(key, None, ttl_seconds=self.error_ttl_seconds)
+            return None
+
+        ttl = None if result is not None else self.negative_ttl_seconds
+        self.cache.set(key, result, ttl_seconds=ttl)
+        return result
+
+    def stats(self) -> dict[str, int | float | str | None]:
+        stats = self.cache.stats()
+        with self._lock:
+            stats.update(
+                provider=self.inner.name,
+                in_flight=len(self._flights),
+                coalesced=self.coalesced,
+                upstream_calls=self.upstream_calls,
+                upstream_errors=self.upstream_errors,
+            )
+        return stats
+
+
+def create_provider(name: str, *, database_path: str | None = None, timeout: float = 3.0) -> GeoIPProvider:
+    if name == "ip-api":
+        return IpApiProvider(timeout=timeout)
+    if name == "local":
+        if not database_path:
+            raise ValueError("GEOIP_PROVIDER=local requires GEOIP_DATABASE_PATH")
+        return LocalProvider(database_path)
+    if name == "none":
+        return NullProvider()
+    raise ValueError(f"unknown GeoIP provider {name!r}")
+
+
+_provider: GeoIPProvider | None = None
+_provider_lock = threading.Lock()
+
+
+def build_provider() -> GeoIPProvider:
+    """Provider from settings, wrapped in the prefix cache unless it's already local/cheap."""
+    provider = create_provider(
+        settings.geoip_provider,
+        database_path=settings.geoip_database_path,
+        timeout=settings.geoip_timeout_seconds,
+    )
+    if settings.geoip_cache_max_entries <= 0 or isinstance(provider, (LocalProvider, NullProvider)):
+        # an mmap binary search is as cheap as the cache lookup itself
+        return provider
+
+    cached = CachingProvider(
+        provider,
+        max_entries=settings.geoip_cache_max_entries,
+        ttl_seconds=settings.geoip_cache_ttl_seconds,
+        negative_ttl_seconds=settings.geoip_cache_negative_ttl_seconds,
+        error_ttl_seconds=settings.geoip_cache_error_ttl_seconds,
+    )
+    register_metrics("geoip_cache", cached.stats)
+    return cached
+
+
+def get_provider() -> GeoIPProvider:
+    """Process-wide provider built from settings on first use."""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = build_provider()
+    return _provider
+
+
+def set_provider(provider: GeoIPProvider | None) -> None:
+    """Swap the process-wide provider (None rebuilds it from settings on next use)."""
+    global _provider
+    with _provider_lock:
+        _provider = provider
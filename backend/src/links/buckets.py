@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import math
+import re
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from functools import reduce
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import literal_column
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ColumnElement
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.types import BigInteger
+
+MAX_BUCKETS = 5_000
+
+_NAMED = {"hour": (1, "h"), "day": (1, "d"), "week": (1, "w"), "month": (1, "mo")}
+_PATTERN = re.compile(r"^(\d+)(m|h|d|w|mo)$")
+_FIXED_SECONDS = {"m": 60, "h": 3600}
+
+
+@dataclass(frozen=True, slots=True)
+class Granularity:
+    count: int
+    unit: str  # m, h, d, w or mo
+
+    @property
+    def fixed_seconds(self) -> int | None:
+        """Width in seconds for minute/hour buckets; None for calendar buckets."""
+        unit = _FIXED_SECONDS.get(self.unit)
+        return self.count * unit if unit else None
+
+
+def parse_granularity(granularity: str) -> Granularity:
+    """
+    "hour", "day", "week", "month" or a count and unit: "5m", "15m", "6h",
+    "2d", "1w". Raises ValueError for anything else.
+    """
+    if granularity in _NAMED:
+        return Granularity(*_NAMED[granularity])
+    match = _PATTERN.match(granularity)
+    if not match or int(match.group(1)) < 1 or (match.group(2) == "mo" and match.group(1) != "1"):
+        raise ValueError(f"unsupported granularity {granularity!r}")
+    return Granularity(int(match.group(1)), match.group(2))
+
+
+@dataclass(frozen=True, slots=True)
+class BucketGrid:
+    """
+    Buckets covering [start, end]: bucket i is [edges[i], edges[i + 1]).
+    Edges are aware UTC datetimes; labels are the bucket starts in `tz`.
+    Every edge lies on a multiple of `base_seconds` since the Unix epoch, so
+    counts grouped by epoch // base_seconds (or by hour, when base_seconds is
+    a whole number of hours) map onto buckets exactly.
+    """
+    edges: list[datetime]
+    tz: ZoneInfo
+    base_seconds: int
+
+    def __len__(self) -> int:
+        return len(self.edges) - 1
+
+    @property
+    def hour_aligned(self) -> bool:
+        return self.base_seconds % 3600 == 0
+
+    def index(self, t: datetime) -> int:
+        """Bucket of an instant inside the grid."""
+        return bisect_right(self.edges, t) - 1
+
+    def cell_start(self, cell: int) -> datetime:
+        return datetime.fromtimestamp(cell * self.base_seconds, timezone.utc)
+
+    def series(self, counts: list[int], *, fill_gaps: bool) -> list[dict]:
+        return [
+            {"timestamp": self.edges[i].astimezone(self.tz).isoformat(), "value": value}
+            for i, value in enumerate(counts)
+            if fill_gaps or value > 0
+        ]
+
+
+def _local_midnight(t: datetime, tz: ZoneInfo) -> date:
+    return t.astimezone(tz).date()
+
+
+def _at_local_midnight(day: date, tz: ZoneInfo) -> datetime:
+    return datetime(day.year, day.month, day.day, tzinfo=tz).astimezone(timezone.utc)
+
+
+def _add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def bucket_grid(start: datetime, end: datetime, granularity: str, tz: str = "UTC") -> BucketGrid:
+    """
+    Buckets of `granularity` in time zone `tz` (an IANA name) covering
+    [start, end]. Day, week (from Monday) and month buckets follow the local
+    calendar, so they are 23 or 25 hours long across DST changes; minute and
+    hour buckets are fixed-width, counted from local midnight of the start day.
+    Raises ValueError for an unknown granularity or zone, an empty range or
+    more than MAX_BUCKETS buckets.
+    """
+    spec = parse_granularity(granularity)
+    try:
+        zone = ZoneInfo(tz)
+    except (ValueError, KeyError) as e:  # ZoneInfoNotFoundError is a KeyError
+        raise ValueError(f"unknown time zone {tz!r}") from e
+    if end < start:
+        raise ValueError("end must not be before start")
+
+    first_day = _local_midnight(start, zone)
+    width = spec.fixed_seconds
+    if width is not None:
+        origin = _at_local_midnight(first_day, zone)
+        offset = int((start - origin).total_seconds()) // width * width
+        first = origin + timedelta(seconds=offset)
+        n = int((end - first).total_seconds()) // width + 1
+        if n > MAX_BUCKETS:
+            raise ValueError(f"more than {MAX_BUCKETS} buckets")
+        edges = [first + timedelta(seconds=i * width) for i in range(n + 1)]
+    else:
+        if spec.unit == "mo":
+            day = first_day.replace(day=1)
+            step = lambda d: _add_months(d, 1)
+        else:
+            if spec.unit == "w":
+                day = first_day - timedelta(days=first_day.weekday())
+                days = 7 * spec.count
+            else:
+                day = first_day
+                days = spec.count
+            step = lambda d: d + timedelta(days=days)
+        edges = [_at_local_midnight(day, zone)]
+        while edges[-1] <= end:
+            if len(edges) > MAX_BUCKETS:
+                raise ValueError(f"more than {MAX_BUCKETS} buckets")
+            day = step(day)
+            edges.append(_at_local_midnight(day, zone))
+
+    base = reduce(math.gcd, (int(edge.timestamp()) for edge in edges))
+    return BucketGrid(edges, zone, base or 1)
+
+
+def fill_counts(grid: BucketGrid, counts: dict[datetime, int]) -> list[int]:
+    """Per-bucket totals of counts keyed by instants (hours or epoch cells) inside the grid."""
+    totals = [0] * len(grid)
+    for t, count in counts.items():
+        totals[grid.index(t)] += count
+    return totals
+
+
+class epoch_bucket(FunctionElement):
+    """
+    `seconds since the Unix epoch // width` of a timestamp column, as an
+    integer, on SQLite and PostgreSQL.
+    """
+    type = BigInteger()
+    inherit_cache = True
+
+    def __init__(self, column: ColumnElement, width: int) -> None:
+        # the width is inlined (and part of the statement cache key) so the
+        # division stays integer division on both dialects
+        super().__init__(column, literal_column(str(int(width))))
+
+
+def _compile_args(element: epoch_bucket, compiler, **kw) -> tuple[str, str]:
+    column, width = element.clauses
+    return compiler.process(column, **kw), compiler.process(width, **kw)
+
+
+@compiles(epoch_bucket)
+def _epoch_bucket_postgresql(element: epoch_bucket, compiler, **kw) -> str:
+    column, width = _compile_args(element, compiler, **kw)
+    return f"(CAST(floor(EXTRACT(EPOCH FROM {column})) AS BIGINT) / {width})"
+
+
+@compiles(epoch_bucket, "sqlite")
+def _epoch_bucket_sqlite(element: epoch_bucket, compiler, **kw) -> str:
+    column, width = _compile_args(element, compiler, **kw)
+    return f"(CAST(strftime('%s', {column}) AS INTEGER) / {width})"
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import itertools
+import sys
+import threading
+from dataclasses import dataclass
+from typing import Hashable, Iterable
+
+from src.core.cache import TTLCache
+from src.core.config import settings
+from src.core.metrics import register_metrics
+
+
+@dataclass(frozen=True, slots=True)
+class CachedLink:
+    """The minimal slice of an active Link a redirect needs."""
+    id: int
+    slug: str
+    target_url: str
+
+
+def _sizeof_link(key: str, value: CachedLink) -> int:
+    return (
+        sys.getsizeof(key)
+        + sys.getsizeof(value)
+        + sys.getsizeof(value.slug)
+        + sys.getsizeof(value.target_url)
+    )
+
+
+# Only active links are cached; a status change must call invalidate(slug).
+link_cache = TTLCache(
+    name="link_slug",
+    max_entries=settings.link_cache_max_entries,
+    ttl_seconds=settings.link_cache_ttl_seconds,
+    max_bytes=settings.link_cache_max_bytes,
+    sizeof=_sizeof_link,
+)
+
+register_metrics("link_cache", link_cache.stats)
+
+
+class DashboardCache:
+    """
+    Serialized dashboard responses per user and request (range, granularity,
+    time zone...), for a short TTL.
+
+    Each user has a version number that is part of every key. Persisting a
+    click for one of the user's links, creating a link or changing its status
+    bumps the version, so older entries become unreachable and age out.
+    The links of a user are registered with watch() before the response is
+    computed; a click that lands while it is being computed bumps the version
+    the entry is stored under, so it is never served. Clicks written by other
+    processes are only picked up when the TTL expires.
+
+    Versions and link owners are bounded caches. Versions come from one
+    process-wide counter and are never reused, so a user whose version was
+    dropped just starts from a fresh one; evicting a link's owner bumps the
+    owner's version, since clicks on that link could no longer reach it.
+    """
+
+    def __init__(self, *, max_entries: int, ttl_seconds: float, max_bytes: int) -> None:
+        self._entries = TTLCache(
+            name="dashboard",
+            max_entries=max_entries,
+            ttl_seconds=ttl_seconds,
+            max_bytes=max_bytes,
+            sizeof=lambda key, value: sys.getsizeof(key) + len(value),
+        )
+        # link_id -> user_id, kept a little longer than the entries they guard
+        self._owners = TTLCache(
+            name="dashboard_owners",
+            max_entries=max(max_entries * 100, 1),
+            ttl_seconds=ttl_seconds * 2,
+            on_evict=lambda link_id, user_id: self.invalidate_user(user_id),
+        )
+        # user_id -> version; outlives the entries stored under it
+        self._versions = TTLCache(name="dashboard_versions", max_entries=max(max_entries * 10, 1), ttl_seconds=ttl_seconds * 2)
+        self._next_version = itertools.count(1)
+        self._lock = threading.Lock()
+        self.version_bumps = 0
+
+    def version(self, user_id: int) -> int:
+        version = self._versions.get(user_id)
+        if version is None:
+            with self._lock:
+                version = self._versions.get(user_id)
+                if version is None:
+                    version = next(self._next_version)
+                    self._versions.set(user_id, version)
+        return version
+
+    def get(self, user_id: int, key: Hashable) -> bytes | None:
+        return self._entries.get((user_id, self.version(user_id), key))
+
+    def watch(self, user_id: int, link_ids: Iterable[int]) -> None:
+        """Route clicks on these links to user_id's version."""
+        for link_id in link_ids:
+            self._owners.set(link_id, user_id)
+
+    def set(self, user_id: int, key: Hashable, body: bytes, *, version: int) -> None:
+        """Store a response computed after reading `version` (and calling watch())."""
+        self._entries.set((user_id, version, key), body)
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            self._versions.set(user_id, next(self._next_version))
+            self.version_bumps += 1
+
+    def links_clicked(self, link_ids: Iterable[int]) -> None:
+        users = {self._owners.get(link_id) for link_id in link_ids}
+        users.discard(None)
+        for user_id in users:
+            self.invalidate_user(user_id)
+
+    def clear(self) -> None:
+        # versions are kept: a response being computed must still not be stored under a reachable key
+        self._entries.clear()
+        self._owners.clear()
+
+    def stats(self) -> dict[str, int | float | None]:
+        stats = self._entries.stats()
+        stats["watched_links"] = len(self._owners)
+        stats["versioned_users"] = len(self._versions)
+        stats["version_bumps"] = self.version_bumps
+        return stats
+
+
+dashboard_cache = DashboardCache(
+    max_entries=settings.dashboard_cache_max_entries,
+    ttl_seconds=settings.dashboard_cache_ttl_seconds,
+    max_bytes=settings.dashboard_cache_max_bytes,
+)
+
+register_metrics("dashboard_cache", dashboard_cache.stats)
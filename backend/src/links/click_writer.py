@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import io
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from src.core.config import settings
+from src.links.rollups import to_utc
+from src.models.click_event import ClickEvent
+
+
+def copy_supported(conn: Connection) -> bool:
+    """COPY FROM STDIN needs PostgreSQL through psycopg2 (cursor.copy_expert)."""
+    return conn.dialect.name == "postgresql" and conn.dialect.driver == "psycopg2"
+
+
+def _copy_field(value) -> str:
+    # COPY text format: \N is NULL; backslash, tab and line breaks are escaped
+    if value is None:
+        return "\\N"
+    if isinstance(value, datetime):
+        return to_utc(value).isoformat()
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def copy_buffer(rows: Iterable[dict], columns: list[str]) -> io.StringIO:
+    """`rows` as a COPY text-format stream of `columns`."""
+    buffer = io.StringIO()
+    buffer.writelines("\t".join(_copy_field(row[c]) for c in columns) + "\n" for row in rows)
+    buffer.seek(0)
+    return buffer
+
+
+def copy_rows(conn: Connection, table: str, rows: list[dict]) -> None:
+    """COPY rows (dicts with the same keys) into `table` in the connection's transaction."""
+    columns = list(rows[0])
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(sql, copy_buffer(rows, columns))
+    finally:
+        cursor.close()
+
+
+def write_click_events(db: Session, rows: list[dict]) -> None:
+    """
+    Insert click_events rows (enrich_click() dicts) in the session's
+    transaction: streamed with COPY on PostgreSQL/psycopg2 when
+    CLICK_COPY_ENABLED, otherwise one executemany INSERT.
+    """
+    if not rows:
+        return
+    conn = db.connection()
+    if settings.click_copy_enabled and copy_supported(conn):
+        copy_rows(conn, ClickEvent.__tablename__, rows)
+    else:
+        db.execute(insert(ClickEvent.__table__), rows)
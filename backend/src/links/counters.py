@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Iterable
+
+from sqlalchemy import bindparam, case, or_
+from sqlalchemy.orm import Session
+
+from src.core.config import settings
+from src.core.metrics import register_metrics
+from src.db.session import SessionLocal
+from src.models.link import Link
+
+logger = logging.getLogger(__name__)
+
+MODES = ("inline", "deferred")
+
+# link_id -> (clicks, latest clicked_at)
+Deltas = dict[int, tuple[int, datetime]]
+
+
+def _utc(dt: datetime) -> datetime:
+    # SQLite hands back naive datetimes for timezone=True columns
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt
+
+
+def merge_deltas(into: Deltas, link_id: int, clicks: int, latest: datetime) -> None:
+    current = into.get(link_id)
+    if current is None:
+        into[link_id] = (clicks, latest)
+    else:
+        into[link_id] = (current[0] + clicks, max(current[1], latest, key=_utc))
+
+
+def apply_click_deltas(db: Session, deltas: Deltas) -> None:
+    """
+    One UPDATE per link: click_count + delta, last_clicked_at = max(current, latest).
+    Does not commit.
+    """
+    if not deltas:
+        return
+    links = Link.__table__
+    ts = bindparam("ts", type_=links.c.last_clicked_at.type)
+    db.execute(
+        links.update()
+        .where(links.c.id == bindparam("link_id"))
+        .values(
+            click_count=links.c.click_count + bindparam("delta"),
+            # portable greatest(): Postgres has greatest(), SQLite's max() returns NULL on NULL
+            last_clicked_at=case(
+                (or_(links.c.last_clicked_at.is_(None), links.c.last_clicked_at < ts), ts),
+                else_=links.c.last_clicked_at,
+            ),
+        ),
+        # sorted so concurrent writers lock link rows in the same order
+        [
+            {"link_id": link_id, "delta": delta, "ts": latest}
+            for link_id, (delta, latest) in sorted(deltas.items())
+        ],
+    )
+
+
+class ClickCounter:
+    """
+    Per-process click counter deltas, folded into links.click_count periodically.
+
+    In "deferred" mode the click writer only inserts events and calls add();
+    a background thread applies the accumulated deltas every flush_interval
+    seconds, so a viral link costs one row update per interval per process
+    instead of one per batch, and redirects never wait on that row's lock.
+    In "inline" mode add() is never called and the writer updates links itself.
+
+    totals() is the read API: stored count plus whatever this process has not
+    folded yet, including a fold that is in progress. Deltas pending in other
+    processes are not visible, so totals lag by at most one flush interval.
+    Deltas that fail to apply are put back and retried on the next flush; a
+    hard crash loses at most one interval of counter increments (the click
+    events themselves are already committed).
+    """
+
+    def __init__(
+        self,
+        *,
+        mode: str = "deferred",
+        flush_interval: float = 1.0,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ) -> None:
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        self.mode = mode
+        self.flush_interval = flush_interval
+        self._session_factory = session_factory
+
+        self._pending: Deltas = {}
+        self._in_flight: Deltas = {}
+        self._lock = threading.Lock()
+        # serializes flushes so _in_flight belongs to one fold at a time
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+        self.added = 0
+        self.flushes = 0
+        self.rows_updated = 0
+        self.failures = 0
+        self.last_flush_ms = 0.0
+
+    @property
+    def deferred(self) -> bool:
+        return self.mode == "deferred"
+
+    def add(self, deltas: Deltas) -> None:
+        with self._lock:
+            for link_id, (clicks, latest) in deltas.items():
+                merge_deltas(self._pending, link_id, clicks, latest)
+                self.added += clicks
+
+    def pending(self, link_id: int) -> tuple[int, datetime | None]:
+        """Clicks (and latest click time) not yet visible in the links row."""
+        with self._lock:
+            clicks, latest = 0, None
+            for source in (self._in_flight, self._pending):
+                entry = source.get(link_id)
+                if entry is not None:
+                    clicks += entry[0]
+                    latest = entry[1] if latest is None else max(latest, entry[1], key=_utc)
+            return clicks, latest
+
+    def pending_total(self, link_ids: Iterable[int]) -> int:
+        with self._lock:
+            if not self._pending and not self._in_flight:
+                return 0
+            return sum(
+                source[link_id][0]
+                for link_id in link_ids
+                for source in (self._in_flight, self._pending)
+                if link_id in source
+            )
+
+    def totals(self, link: Link) -> tuple[int, datetime | None]:
+        """(click_count, last_clicked_at) for a loaded Link, including pending deltas."""
+        clicks, latest = self.pending(link.id)
+        stored = link.last_clicked_at
+        if latest is None:
+            return link.click_count + clicks, stored
+        if stored is None:
+            return link.click_count + clicks, latest
+        return link.click_count + clicks, max(stored, latest, key=_utc)
+
+    def flush(self) -> int:
+        """Apply pending deltas in one transaction. Returns the number of links updated."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                self._in_flight, self._pending = self._pending, {}
+                batch = self._in_flight
+
+            started = time.perf_counter()
+            db = self._session_factory()
+            try:
+                apply_click_deltas(db, batch)
+                db.commit()
+            except Exception:
+                db.rollback()
+                logger.exception("failed to fold click counters for %d link(s)", len(batch))
+                with self._lock:
+                    for link_id, (clicks, latest) in batch.items():
+                        merge_deltas(self._pending, link_id, clicks, latest)
+                    self._in_flight = {}
+                    self.failures += 1
+                return 0
+            finally:
+                db.close()
+
+            with self._lock:
+                self._in_flight = {}
+                self.flushes += 1
+                self.rows_updated += len(batch)
+                self.last_flush_ms = (time.perf_counter() - started) * 1000
+            return len(batch)
+
+    def start(self) -> None:
+        if self._thread is not None or not self.deferred:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="click-counter", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None) -> None:
+        """Stop the flusher and fold whatever is still pending."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def stats(self) -> dict[str, int | float | str]:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "pending_links": len(self._pending),
+                "pending_clicks": sum(c for c, _ in self._pending.values()),
+                "in_flight_links": len(self._in_flight),
+                "added": self.added,
+                "flushes": self.flushes,
+                "rows_updated": self.rows_updated,
+                "failures": self.failures,
+                "last_flush_ms": self.last_flush_ms,
+            }
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+
+click_counter = ClickCounter(
+    mode=settings.click_counter_mode,
+    flush_interval=settings.click_counter_flush_interval_seconds,
+)
+
+register_metrics("click_counter", click_counter.stats)
@@ -0,0 +1,324 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, distinct, func, null, or_, select
+from sqlalchemy.orm import Session
+
+from src.core.config import settings
+from src.core.hll import HyperLogLog
+from src.links.rollups import (
+    DAY,
+    HOUR,
+    NO_COUNTRY,
+    SKETCH_PRECISION,
+    RangeSplit,
+    country_rollup_query,
+    floor_hour,
+    raw_edges,
+    split_range,
+    to_utc,
+)
+from src.links.buckets import bucket_grid, fill_counts
+from src.links.retention import compacted_before
+from src.links.service import (
+    UniqueCount,
+    get_clicks_time_series,
+    get_total_links_for_user,
+    list_links_page,
+)
+from src.models.click_event import ClickEvent
+from src.models.click_rollup import ClickRollupHourly, ClickVisitorSketchHourly
+from src.models.link import Link
+
+_STREAM_BATCH = 5_000
+_TICK = timedelta(microseconds=1)
+
+
+def normalize_live_range(
+    start: datetime, end: datetime, *, now: datetime | None = None
+) -> tuple[datetime, datetime]:
+    """
+    Snap a preset range (24h/7d/30d: end is whenever the preset was picked,
+    so no two requests agree) to whole UTC hours: the end moves up to just
+    before the next hour and the start keeps the length, rounded to whole
+    hours. Requests for the same preset within an hour then share a cache
+    entry, and all but the current hour come from the rollups. Only call it
+    for presets; custom ranges must be kept as asked. Ranges ending more than
+    an hour ago, or in the future, are left alone.
+    """
+    now = now or datetime.now(timezone.utc)
+    start, end = to_utc(start), to_utc(end)
+    if not now - HOUR <= end <= now + timedelta(minutes=5):
+        return start, end
+    boundary = floor_hour(end) + HOUR
+    hours = max(1, round((end - start) / HOUR))
+    return boundary - hours * HOUR, boundary - _TICK
+
+
+@dataclass
+class DashboardData:
+    """Everything the dashboard page shows, for a period and the one before it."""
+    total_clicks: int
+    previous_clicks: int
+    total_links: int
+    unique_visitors: UniqueCount
+    previous_unique_visitors: UniqueCount
+    time_series: list[dict]
+    countries: list[dict]
+    links: list[Link]
+    link_unique_visitors: dict[int, int]
+    next_links_cursor: str | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class _Window:
+    start: datetime | None
+    end: datetime | None
+    end_inclusive: bool = True
+
+    def contains(self, t: datetime) -> bool:
+        if self.start is not None and t < self.start:
+            return False
+        if self.end is not None:
+            return t <= self.end if self.end_inclusive else t < self.end
+        return True
+
+    def clause(self):
+        conds = []
+        if self.start is not None:
+            conds.append(ClickEvent.clicked_at >= self.start)
+        if self.end is not None:
+            conds.append(ClickEvent.clicked_at <= self.end if self.end_inclusive else ClickEvent.clicked_at < self.end)
+        return and_(*conds)
+
+
+def _edges(split: RangeSplit) -> list[_Window]:
+    return [_Window(*edge) for edge in raw_edges(split)]
+
+
+def _in_rollup(split: RangeSplit, hour: datetime) -> bool:
+    return not split.raw_only and split.rollup_start <= hour < split.rollup_end
+
+
+def _rollup_hours(column, split: RangeSplit):
+    return and_(column >= split.rollup_start, column < split.rollup_end)
+
+
+def _distinct_visitors(db: Session, link_ids, window: _Window, group=None) -> dict:
+    """COUNT(DISTINCT visitor_hash) of the clicks in `window`, per `group` column (a single entry keyed None without)."""
+    stmt = (
+        select(group if group is not None else null(), func.count(distinct(ClickEvent.visitor_hash)))
+        .where(ClickEvent.link_id.in_(link_ids), ClickEvent.visitor_hash.isnot(None), window.clause())
+    )
+    if group is not None:
+        stmt = stmt.where(group.isnot(None)).group_by(group)
+    return {key: int(n) for key, n in db.execute(stmt) if n}
+
+
+class _Sketches:
+    def __init__(self) -> None:
+        self.groups: dict = {}
+
+    def get(self, key) -> HyperLogLog:
+        sketch = self.groups.get(key)
+        if sketch is None:
+            sketch = self.groups[key] = HyperLogLog(SKETCH_PRECISION)
+        return sketch
+
+    def counts(self) -> dict:
+        estimates = {key: sketch.estimate() for key, sketch in self.groups.items()}
+        return {key: value for key, value in estimates.items() if value}
+
+
+def build_dashboard(
+    db: Session,
+    *,
+    user_id: int,
+    start_date: datetime,
+    end_date: datetime,
+    granularity: str = "hour",
+    tz: str = "UTC",
+    fill_gaps: bool = False,
+    link_limit: int = 100,
+    link_sort: str = "created",
+    link_cursor: str | None = None,
+) -> DashboardData:
+    """
+    Dashboard KPIs for [start_date, end_date] and the equally long period
+    before it, the click time series, the country breakdown and one page of
+    `link_limit` links (see list_links_page) with their unique visitors.
+
+    Gives the same numbers as calling get_total_clicks_for_user,
+    get_unique_visitor_count_for_user, get_previous_period_metrics,
+    get_clicks_time_series, get_clicks_by_country and
+    get_unique_visitors_per_link separately, but reads each source once for
+    both periods: one pass over the hourly rollup, one over the country
+    rollup, one streamed scan of the click_events rows in the partial hours
+    and days at the edges and, only for estimated counts, one pass over the
+    visitor sketches. Exact unique visitor counts are COUNT(DISTINCT) queries
+    run by the database, not sets built here. Time series buckets that don't fall
+    on whole UTC hours (sub-hour widths, half-hour zones) need one more query.
+    Raises ValueError for an unsupported granularity or time zone, or an
+    invalid link cursor.
+    """
+    start, end = to_utc(start_date), to_utc(end_date)
+    grid = bucket_grid(start, end, granularity, tz)
+    prev_start, prev_end = start - (end - start), start
+    threshold = settings.unique_visitors_exact_max_clicks
+
+    page = list_links_page(db, user_id=user_id, limit=link_limit, sort=link_sort, cursor=link_cursor)
+    links = page.items
+    # a complete first page already gives the count
+    if link_cursor is None and page.next_cursor is None:
+        total_links = len(links)
+    else:
+        total_links = get_total_links_for_user(db, user_id=user_id)
+    listed = {link.id for link in links}
+    user_links = select(Link.id).where(Link.user_id == user_id)
+
+    raw_from = compacted_before(db)
+    cur = split_range(start, end, unit=HOUR, raw_from=raw_from)
+    prev = split_range(prev_start, prev_end, unit=HOUR, raw_from=raw_from)
+    cur_days = split_range(start, end, unit=DAY, raw_from=raw_from)
+
+    # whole hours of both periods
+    cur_clicks = prev_clicks = listed_clicks = 0
+    hours: dict[datetime, int] = {}
+    rollup_splits = [s for s in (cur, prev) if not s.raw_only]
+    if rollup_splits:
+        t = ClickRollupHourly
+        stmt = select(t.link_id, t.hour, t.clicks).where(
+            t.link_id.in_(user_links), or_(*[_rollup_hours(t.hour, s) for s in rollup_splits])
+        )
+        for link_id, hour, clicks in db.execute(stmt.execution_options(yield_per=_STREAM_BATCH)):
+            hour = floor_hour(hour)
+            if _in_rollup(cur, hour):
+                cur_clicks += clicks
+                hours[hour] = hours.get(hour, 0) + clicks
+                if link_id in listed:
+                    listed_clicks += clicks
+            if _in_rollup(prev, hour):
+                prev_clicks += clicks
+
+    # whole days of the current period, per country
+    countries: dict[str, int] = {}
+    if not cur_days.raw_only:
+        for row in db.execute(country_rollup_query(user_links, cur_days)):
+            countries[row.country] = countries.get(row.country, 0) + int(row.clicks)
+
+    # Raw events of the partial hours and days at the edges of both periods.
+    cur_edges, prev_edges = _edges(cur), _edges(prev)
+    day_edges = _edges(cur_days)
+    # (link_id, country, visitor_hash) seen in the edges, for the sketch estimates
+    cur_edge_hashes: set[tuple] = set()
+    prev_edge_hashes: set[tuple] = set()
+    scanned = [w.clause() for w in cur_edges + prev_edges + day_edges]
+    if scanned:
+        stmt = (
+            select(ClickEvent.link_id, ClickEvent.clicked_at, ClickEvent.country, ClickEvent.visitor_hash)
+            .where(ClickEvent.link_id.in_(user_links), or_(*scanned))
+            .execution_options(yield_per=_STREAM_BATCH)
+        )
+        for link_id, clicked_at, country, visitor_hash in db.execute(stmt):
+            clicked_at = to_utc(clicked_at)
+            if any(w.contains(clicked_at) for w in cur_edges):
+                cur_clicks += 1
+                hour = floor_hour(clicked_at)
+                hours[hour] = hours.get(hour, 0) + 1
+                if link_id in listed:
+                    listed_clicks += 1
+                if visitor_hash is not None:
+                    cur_edge_hashes.add((link_id, country, visitor_hash))
+            if country is not None and any(w.contains(clicked_at) for w in day_edges):
+                countries[country] = countries.get(country, 0) + 1
+            if any(w.contains(clicked_at) for w in prev_edges):
+                prev_clicks += 1
+                if visitor_hash is not None:
+                    prev_edge_hashes.add((link_id, country, visitor_hash))
+
+    # same rule as count_unique_visitors, applied to each count separately;
+    # exact counts are left to the database
+    cur_exact = not cur.compacted and (cur.raw_only or cur_clicks <= threshold)
+    listed_exact = not cur.compacted and (cur.raw_only or listed_clicks <= threshold)
+    prev_exact = not prev.compacted and (prev.raw_only or prev_clicks <= threshold)
+    cur_window = _Window(start, end)
+    cur_counts: dict = {}
+    if cur_exact:
+        cur_counts = _distinct_visitors(db, user_links, cur_window)
+        country_uniques = _distinct_visitors(db, user_links, cur_window, ClickEvent.country)
+    if listed_exact and listed:
+        link_uniques = _distinct_visitors(db, listed, cur_window, ClickEvent.link_id)
+    elif listed_exact:
+        link_uniques = {}
+    prev_counts = _distinct_visitors(db, user_links, _Window(prev_start, prev_end)) if prev_exact else {}
+
+    cur_sketches, prev_sketches = _Sketches(), _Sketches()
+    sketch_splits = [cur] if not (cur_exact and listed_exact) else []
+    if not prev_exact:
+        sketch_splits.append(prev)
+    sketch_splits = [s for s in sketch_splits if not s.raw_only]
+    if sketch_splits:
+        t = ClickVisitorSketchHourly
+        stmt = select(t.link_id, t.hour, t.country, t.sketch).where(
+            t.link_id.in_(user_links), or_(*[_rollup_hours(t.hour, s) for s in sketch_splits])
+        )
+        for link_id, hour, country, blob in db.execute(stmt.execution_options(yield_per=_STREAM_BATCH)):
+            hour = floor_hour(hour)
+            if _in_rollup(cur, hour):
+                if not cur_exact:
+                    cur_sketches.get(None).merge_bytes(blob)
+                    if country != NO_COUNTRY:
+                        cur_sketches.get(("country", country)).merge_bytes(blob)
+                if not listed_exact and link_id in listed:
+                    cur_sketches.get(("link", link_id)).merge_bytes(blob)
+            if not prev_exact and _in_rollup(prev, hour):
+                prev_sketches.get(None).merge_bytes(blob)
+    for link_id, country, visitor_hash in cur_edge_hashes:
+        if not cur_exact:
+            cur_sketches.get(None).add(visitor_hash)
+            if country is not None:
+                cur_sketches.get(("country", country)).add(visitor_hash)
+        if not listed_exact and link_id in listed:
+            cur_sketches.get(("link", link_id)).add(visitor_hash)
+    if not prev_exact:
+        for _, _, visitor_hash in prev_edge_hashes:
+            prev_sketches.get(None).add(visitor_hash)
+
+    cur_estimates, prev_estimates = cur_sketches.counts(), prev_sketches.counts()
+
+    def period_uniques(exact: bool, counts: dict, estimates: dict) -> UniqueCount:
+        if exact:
+            return UniqueCount(counts.get(None, 0))
+        value = estimates.get(None, 0)
+        return UniqueCount(value, exact=False) if value else UniqueCount(0)
+
+    if not cur_exact:
+        country_uniques = {key[1]: n for key, n in cur_estimates.items() if key and key[0] == "country"}
+    if not listed_exact:
+        link_uniques = {key[1]: n for key, n in cur_estimates.items() if key and key[0] == "link"}
+
+    if grid.hour_aligned:
+        time_series = grid.series(fill_counts(grid, hours), fill_gaps=fill_gaps)
+    else:
+        time_series = get_clicks_time_series(
+            db, user_id=user_id, start_date=start, end_date=end, granularity=granularity, tz=tz, fill_gaps=fill_gaps
+        )
+
+    return DashboardData(
+        total_clicks=cur_clicks,
+        previous_clicks=prev_clicks,
+        total_links=total_links,
+        unique_visitors=period_uniques(cur_exact, cur_counts, cur_estimates),
+        previous_unique_visitors=period_uniques(prev_exact, prev_counts, prev_estimates),
+        time_series=time_series,
+        countries=[
+            {"country_code": country, "clicks": count, "unique_visitors": country_uniques.get(country, 0)}
+            for country, count in sorted(countries.items(), key=lambda item: (-item[1], item[0]))
+            if count > 0
+        ],
+        links=links,
+        link_unique_visitors=link_uniques,
+        next_links_cursor=page.next_cursor,
+    )
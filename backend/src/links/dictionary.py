@@ -0,0 +1,142 @@
+"""
+Dictionary encoding of click dimensions. Each distinct value of a dimension
+is stored once in dimension_values and click_events carries its integer id
+(referrer_id), which is narrower than the string and cheaper to GROUP BY.
+Ids are decoded back to strings at the edges: breakdowns decode the grouped
+ids, export joins dimension_values, and schemas.ClickEventItem decodes recent
+clicks.
+
+DimensionDictionary is the in-process bidirectional map of one dimension.
+Rows are never changed or deleted, so cached entries can't go stale. New
+values are inserted in a short transaction of their own, committed before
+any click refers to them, like user_agents (links/user_agents.py).
+"""
+from __future__ import annotations
+
+from typing import Iterable
+
+from sqlalchemy import select
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.core.cache import TTLCache
+from src.core.config import settings
+from src.core.metrics import register_metrics
+from src.links.rollups import dialect_insert
+from src.models.dimension_value import DimensionValue
+
+# values per IN (...) lookup
+_LOOKUP_CHUNK = 500
+
+
+class DimensionDictionary:
+    """In-process map of one dimension's values to their dimension_values ids, and back."""
+
+    def __init__(self, dimension: str, *, max_entries: int) -> None:
+        self.dimension = dimension
+        self._ids = TTLCache(name=f"{dimension}_ids", max_entries=max_entries)
+        self._values = TTLCache(name=f"{dimension}_values", max_entries=max_entries)
+        self.inserted = 0
+
+    def encode(self, db: Session, values: Iterable[str | None]) -> dict[str, int]:
+        """
+        Ids of the given values (empty ones are left out), inserting the ones
+        the dictionary doesn't have yet. Call it before the session writes
+        anything: on SQLite the insert waits for open write transactions.
+        """
+        ids: dict[str, int] = {}
+        missing = []
+        for value in set(values):
+            if not value:
+                continue
+            value_id = self._ids.get(value)
+            if value_id is None:
+                missing.append(value)
+            else:
+                ids[value] = value_id
+        if missing:
+            with db.get_bind().engine.begin() as conn:
+                self._load(conn, missing, ids)
+                new = [value for value in missing if value not in ids]
+                if new:
+                    self._insert(conn, new)
+                    self._load(conn, new, ids)
+        return ids
+
+    def decode(self, db: Session, ids: Iterable[int | None]) -> dict[int, str]:
+        """Values of the given ids; unknown ids (and None) are left out."""
+        values: dict[int, str] = {}
+        missing = []
+        for value_id in set(ids):
+            if value_id is None:
+                continue
+            cached = self._values.get(value_id)
+            if cached is None:
+                missing.append(value_id)
+            else:
+                values[value_id] = cached
+        for i in range(0, len(missing), _LOOKUP_CHUNK):
+            stmt = select(DimensionValue.id, DimensionValue.value).where(
+                DimensionValue.dimension == self.dimension,
+                DimensionValue.id.in_(missing[i:i + _LOOKUP_CHUNK]),
+            )
+            for value_id, value in db.execute(stmt):
+                self._remember(value, value_id)
+                values[value_id] = value
+        return values
+
+    def _remember(self, value: str, value_id: int) -> None:
+        self._ids.set(value, value_id)
+        self._values.set(value_id, value)
+
+    def _load(self, conn: Connection, values: list[str], ids: dict[str, int]) -> None:
+        for i in range(0, len(values), _LOOKUP_CHUNK):
+            stmt = select(DimensionValue.id, DimensionValue.value).where(
+                DimensionValue.dimension == self.dimension,
+                DimensionValue.value.in_(values[i:i + _LOOKUP_CHUNK]),
+            )
+            for value_id, value in conn.execute(stmt):
+                ids[value] = value_id
+                self._remember(value, value_id)
+
+    def _insert(self, conn: Connection, values: list[str]) -> None:
+        t = DimensionValue.__table__
+        # sorted so concurrent writers take the unique index locks in the same order
+        rows = [{"dimension": self.dimension, "value": value} for value in sorted(values)]
+        insert = dialect_insert(conn)
+        if insert is not None:
+            inserted = conn.execute(
+                insert(t).on_conflict_do_nothing(index_elements=["dimension", "value"]), rows
+            ).rowcount
+        else:
+            inserted = 0
+            for row in rows:
+                try:
+                    with conn.begin_nested():
+                        conn.execute(t.insert().values(**row))
+                    inserted += 1
+                except IntegrityError:
+                    pass  # another writer inserted it first
+        self.inserted += max(inserted, 0)
+
+    def clear(self) -> None:
+        self._ids.clear()
+        self._values.clear()
+
+    def stats(self) -> dict[str, int | float | None]:
+        ids = self._ids.stats()
+        return {
+            "entries": ids["entries"],
+            "hits": ids["hits"],
+            "misses": ids["misses"],
+            "hit_ratio": ids["hit_ratio"],
+            "evictions": ids["evictions"],
+            "decoded_entries": len(self._values),
+            "inserted": self.inserted,
+        }
+
+
+referrer_hosts = DimensionDictionary("referrer", max_entries=settings.dimension_cache_max_entries)
+
+register_metrics("referrer_hosts", referrer_hosts.stats)
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import threading
+
+from sqlalchemy import event, func, insert, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.core.config import settings
+from src.core.metrics import register_metrics
+from src.links.slug import slug_for_id
+from src.models.id_block import IdBlock
+from src.models.link import Link
+
+
+class IdBlockAllocator:
+    """
+    Hi-lo allocator for the ids of one table.
+
+    Each process reserves block_size ids at a time by advancing a row of
+    id_blocks in its own short transaction, then hands them out from memory,
+    so a new row knows its id (and anything derived from it, like a slug)
+    before it is inserted. Reservations are committed straight away and never
+    rolled back: ids of failed inserts and of blocks unused at shutdown are
+    skipped, so ids are unique and increase within a process, but have gaps.
+    The row is seeded from max(id) + 1 of the table the first time it is needed.
+    On SQLite a reservation waits for any open write transaction, including
+    the caller's, so callers take ids before they write.
+    """
+
+    def __init__(self, name: str, column, *, block_size: int) -> None:
+        if block_size < 1:
+            raise ValueError("block_size must be >= 1")
+        self.name = name
+        self.block_size = block_size
+        self._column = column
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+        self.blocks = 0
+
+    def allocate(self, engine: Engine, n: int = 1) -> list[int]:
+        """n ids, fetching new blocks from the database as needed."""
+        ids: list[int] = []
+        with self._lock:
+            while len(ids) < n:
+                if self._next >= self._end:
+                    # big requests take one block that fits them
+                    size = max(self.block_size, n - len(ids))
+                    self._next = self._reserve(engine, size)
+                    self._end = self._next + size
+                    self.blocks += 1
+                take = min(n - len(ids), self._end - self._next)
+                ids.extend(range(self._next, self._next + take))
+                self._next += take
+        return ids
+
+    def next(self, engine: Engine) -> int:
+        return self.allocate(engine, 1)[0]
+
+    def reset(self) -> None:
+        """Forget the current block (the rest of it is never used)."""
+        with self._lock:
+            self._next = self._end = 0
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"block_size": self.block_size, "blocks": self.blocks, "remaining": self._end - self._next}
+
+    def _reserve(self, engine: Engine, size: int) -> int:
+        t = IdBlock.__table__
+        advance = (
+            update(t)
+            .where(t.c.name == self.name)
+            .values(next_value=t.c.next_value + size)
+            .returning(t.c.next_value)
+        )
+        # its own connection: the reservation must survive the caller's rollback
+        with engine.begin() as conn:
+            end = conn.execute(advance).scalar_one_or_none()
+            if end is not None:
+                return end - size
+        try:
+            with engine.begin() as conn:
+                start = conn.execute(select(func.coalesce(func.max(self._column), 0) + 1)).scalar_one()
+                conn.execute(insert(t).values(name=self.name, next_value=start + size))
+                return start
+        except IntegrityError:
+            # another process seeded the row first
+            with engine.begin() as conn:
+                return conn.execute(advance).scalar_one() - size
+
+
+link_ids = IdBlockAllocator("links", Link.id, block_size=settings.link_id_block_size)
+
+register_metrics("link_ids", link_ids.stats)
+
+
+@event.listens_for(Session, "before_flush")
+def _assign_link_ids(session: Session, flush_context, instances) -> None:
+    # before any INSERT of the flush, so the block is fetched while this
+    # session holds no write locks
+    new = [obj for obj in session.new if isinstance(obj, Link) and obj.id is None]
+    if not new:
+        return
+    for link, link_id in zip(new, link_ids.allocate(session.get_bind().engine, len(new))):
+        link.id = link_id
+        if link.slug is None:
+            link.slug = slug_for_id(link_id)
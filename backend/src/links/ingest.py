@@ -0,0 +1,398 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from dataclasses import asdict
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.orm import Session
+
+from src.core.config import settings
+from src.core.metrics import register_metrics
+from src.db.session import SessionLocal
+from src.links.service import RawClick, persist_click_batch
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ("drop", "block", "spill")
+
+_STOP = object()
+
+
+# replay backoff after a replay left clicks behind: doubles up to the max
+_RETRY_BACKOFF = 1.0
+_RETRY_BACKOFF_MAX = 300.0
+
+# the database can't be reached: stop the replay rather than try every click
+_UNAVAILABLE = (OperationalError, InterfaceError)
+
+
+def _dump_click(raw: RawClick, attempts: int = 0) -> str:
+    data = asdict(raw)
+    data["clicked_at"] = raw.clicked_at.isoformat()
+    if attempts:
+        data["attempts"] = attempts
+    return json.dumps(data, separators=(",", ":"))
+
+
+def _load_click(line: str) -> tuple[RawClick, int]:
+    """A spilled click and how many replays have failed to write it."""
+    data = json.loads(line)
+    attempts = data.pop("attempts", 0)
+    data["clicked_at"] = datetime.fromisoformat(data["clicked_at"])
+    return RawClick(**data), attempts
+
+
+class ClickIngestor:
+    """
+    Bounded in-memory queue + background workers that enrich and persist clicks.
+
+    The redirect only calls submit(); GeoIP, UA parsing and the DB write happen
+    on worker threads. Each worker collects up to batch_max_size clicks or waits
+    at most batch_max_wait seconds, then writes the batch in one transaction.
+    If a batch fails it is retried click by click so one bad row doesn't lose
+    the rest. When the queue is full the policy decides what happens:
+
+    - "drop":  discard the click (counted in `dropped`)
+    - "block": wait up to block_timeout for space, then drop
+    - "spill": append the click to an NDJSON file; workers replay it once the
+               queue is idle, and any leftover file is replayed on next start
+
+    A replay moves the spill file aside (<spill>.replay) so new spills start a
+    fresh one, and writes clicks it couldn't persist to <spill>.retry with
+    their attempt count. If the database can't be reached the replay stops
+    there; the next one waits retry_backoff seconds, doubling after each
+    failed replay up to retry_backoff_max. A click that fails max_attempts
+    replays on its own (a poison row) goes to <spill>.dead and is counted in
+    `dead_lettered`.
+
+    stop() stops accepting new clicks, drains the queue and the spill file,
+    and joins the workers.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_size: int,
+        policy: str = "drop",
+        workers: int = 1,
+        block_timeout: float = 0.05,
+        spill_path: str | None = None,
+        batch_max_size: int = 500,
+        batch_max_wait: float = 0.2,
+        max_attempts: int = 5,
+        retry_backoff: float = _RETRY_BACKOFF,
+        retry_backoff_max: float = _RETRY_BACKOFF_MAX,
+        session_factory: Callable[[], Session] = SessionLocal,
+        persist: Callable[[Session, list[RawClick]], None] = persist_click_batch,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {POLICIES}")
+        if policy == "spill" and not spill_path:
+            raise ValueError("spill policy requires spill_path")
+
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.spill_path = spill_path
+        self.num_workers = max(1, workers)
+        self.batch_max_size = max(1, batch_max_size)
+        self.batch_max_wait = batch_max_wait
+        self.max_attempts = max(1, max_attempts)
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self._session_factory = session_factory
+        self._persist = persist
+        self._clock = clock
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_size)
+        self._threads: list[threading.Thread] = []
+        self._accepting = False
+        self._spill_lock = threading.Lock()
+        self._replaying = False
+        self._backoff = 0.0
+        self._retry_at = 0.0
+        self._stats_lock = threading.Lock()
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.persisted = 0
+        self.failed = 0
+        self.dead_lettered = 0
+        self.batches = 0
+        self.max_depth_seen = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads)
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        self._accepting = True
+        for i in range(self.num_workers):
+            t = threading.Thread(target=self._run, name=f"click-ingest-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout: float | None = None) -> None:
+        """Flush everything queued (and spilled) to the DB, then stop the workers."""
+        if not self._threads:
+            return
+        self._accepting = False
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+        # anything spilled after the last idle replay, backing off or not
+        self._replay_spill(force=True)
+
+    def submit(self, raw: RawClick) -> bool:
+        """Enqueue a click. Never raises; returns False if the click was dropped."""
+        if not self._accepting:
+            self._count("dropped")
+            return False
+
+        try:
+            if self.policy == "block":
+                self._queue.put(raw, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(raw)
+        except queue.Full:
+            if self.policy == "spill" and self._spill(raw):
+                return True
+            self._count("dropped")
+            return False
+
+        with self._stats_lock:
+            self.enqueued += 1
+            depth = self._queue.qsize()
+            if depth > self.max_depth_seen:
+                self.max_depth_seen = depth
+        return True
+
+    def stats(self) -> dict[str, int | str]:
+        with self._stats_lock:
+            return {
+                "policy": self.policy,
+                "workers": len(self._threads),
+                "depth": self._queue.qsize(),
+                "capacity": self._queue.maxsize,
+                "max_depth_seen": self.max_depth_seen,
+                "enqueued": self.enqueued,
+                "dropped": self.dropped,
+                "spilled": self.spilled,
+                "replayed": self.replayed,
+                "persisted": self.persisted,
+                "failed": self.failed,
+                "dead_lettered": self.dead_lettered,
+                "batches": self.batches,
+            }
+
+    def _count(self, attr: str, n: int = 1) -> None:
+        with self._stats_lock:
+            setattr(self, attr, getattr(self, attr) + n)
+
+    def _run(self) -> None:
+        # a crash may have left clicks on disk from the previous process
+        self._replay_spill()
+        while True:
+            try:
+                item = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                self._replay_spill()
+                continue
+            if item is _STOP:
+                return
+
+            batch, stop = self._collect_batch(item)
+            self._handle(batch)
+            if stop:
+                return
+
+    def _collect_batch(self, first: RawClick) -> tuple[list[RawClick], bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.batch_max_wait
+        while len(batch) < self.batch_max_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _handle(self, batch: list[RawClick]) -> list[RawClick]:
+        """Persist a batch; returns the clicks that didn't make it to the DB."""
+        if self._write(batch):
+            self._count("batches")
+            self._count("persisted", len(batch))
+            return []
+        if len(batch) == 1:
+            self._count("failed")
+            return batch
+
+        failed = [raw for raw in batch if not self._write([raw])]
+        self._count("failed", len(failed))
+        self._count("persisted", len(batch) - len(failed))
+        return failed
+
+    def _write(self, batch: list[RawClick]) -> bool:
+        return self._try_write(batch) is None
+
+    def _try_write(self, batch: list[RawClick]) -> Exception | None:
+        """Persist a batch; returns the error if it failed."""
+        db = self._session_factory()
+        try:
+            self._persist(db, batch)
+            return None
+        except Exception as exc:
+            db.rollback()
+            logger.exception("failed to persist %d click(s)", len(batch))
+            return exc
+        finally:
+            db.close()
+
+    def _spill(self, raw: RawClick) -> bool:
+        try:
+            with self._spill_lock, open(self.spill_path, "a", encoding="utf-8") as f:
+                f.write(_dump_click(raw) + "\n")
+        except OSError:
+            logger.exception("failed to spill click to %s", self.spill_path)
+            return False
+        self._count("spilled")
+        return True
+
+    def _replay_spill(self, *, force: bool = False) -> None:
+        if not self.spill_path:
+            return
+        replay_path = self.spill_path + ".replay"
+        retry_path = self.spill_path + ".retry"
+        with self._spill_lock:
+            # only one worker replays; new spills go to a fresh file meanwhile.
+            # A leftover .replay file means a previous process died mid-replay
+            # (delivery is at-least-once).
+            if self._replaying or (not force and self._clock() < self._retry_at):
+                return
+            if not os.path.exists(replay_path) and os.path.exists(self.spill_path):
+                os.replace(self.spill_path, replay_path)
+            sources = [path for path in (retry_path, replay_path) if os.path.exists(path)]
+            if not sources:
+                return
+            self._replaying = True
+
+        done = False
+        try:
+            # the sources are only removed once what's left of them is on disk
+            tmp_path = retry_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as leftover:
+                kept = self._replay_files(sources, leftover)
+            if kept:
+                os.replace(tmp_path, retry_path)
+            else:
+                os.unlink(tmp_path)
+                if os.path.exists(retry_path):
+                    os.unlink(retry_path)
+            if os.path.exists(replay_path):
+                os.unlink(replay_path)
+            done = not kept
+        finally:
+            with self._spill_lock:
+                if done:
+                    self._backoff = self._retry_at = 0.0
+                else:
+                    self._backoff = min(max(self._backoff * 2, self.retry_backoff), self.retry_backoff_max)
+                    self._retry_at = self._clock() + self._backoff
+                self._replaying = False
+
+    def _replay_files(self, paths: list[str], leftover) -> int:
+        """Replay spilled clicks in batches; returns how many were written to `leftover`."""
+        kept = 0
+        unavailable = False
+
+        def keep(raw: RawClick, attempts: int) -> None:
+            nonlocal kept
+            if attempts >= self.max_attempts:
+                self._dead_letter(_dump_click(raw, attempts))
+                return
+            leftover.write(_dump_click(raw, attempts) + "\n")
+            kept += 1
+
+        def replay(batch: list[tuple[RawClick, int]]) -> None:
+            nonlocal unavailable
+            if unavailable:
+                for raw, attempts in batch:
+                    keep(raw, attempts)
+                return
+            error = self._try_write([raw for raw, _ in batch])
+            if error is None:
+                self._count("batches")
+                self._count("persisted", len(batch))
+                self._count("replayed", len(batch))
+                return
+            for i, (raw, attempts) in enumerate(batch):
+                if not isinstance(error, _UNAVAILABLE) and len(batch) > 1:
+                    error = self._try_write([raw])
+                if error is None:
+                    self._count("persisted")
+                    self._count("replayed")
+                elif isinstance(error, _UNAVAILABLE):
+                    # not the click's fault: keep the rest without an attempt
+                    unavailable = True
+                    for rest in batch[i:]:
+                        keep(*rest)
+                    return
+                else:
+                    keep(raw, attempts + 1)
+
+        batch: list[tuple[RawClick, int]] = []
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        batch.append(_load_click(line))
+                    except (ValueError, TypeError):
+                        self._dead_letter(line.rstrip("\n"))
+                        continue
+                    if len(batch) >= self.batch_max_size:
+                        replay(batch)
+                        batch = []
+        if batch:
+            replay(batch)
+        return kept
+
+    def _dead_letter(self, line: str) -> None:
+        try:
+            with open(self.spill_path + ".dead", "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError:
+            logger.exception("failed to dead-letter click to %s.dead", self.spill_path)
+        self._count("failed")
+        self._count("dead_lettered")
+
+click_ingestor = ClickIngestor(
+    max_size=settings.click_queue_max_size,
+    policy=settings.click_queue_policy,
+    workers=settings.click_ingest_workers,
+    block_timeout=settings.click_queue_block_timeout_seconds,
+    batch_max_size=settings.click_batch_max_size,
+    batch_max_wait=settings.click_batch_max_wait_ms / 1000,
+    # each worker process needs its own spill file when running several
+    spill_path=settings.click_queue_spill_path if settings.click_queue_policy == "spill" else None,
+    max_attempts=settings.click_spill_max_attempts,
+)
+
+register_metrics("click_ingest", click_ingestor.stats)
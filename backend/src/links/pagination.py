@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import Select, or_, tuple_
+from sqlalchemy.orm import InstrumentedAttribute
+
+from src.links.rollups import to_utc
+from src.models.link import Link
+
+
+@dataclass(frozen=True, slots=True)
+class LinkSort:
+    """A keyset order for link listings: `column` descending, then id descending."""
+    column: InstrumentedAttribute
+    nullable: bool = False
+
+    def key(self, link: Link):
+        return getattr(link, self.column.key)
+
+
+# each is backed by an index on (user_id, <column>, id)
+LINK_SORTS = {
+    "created": LinkSort(Link.created_at),
+    "clicks": LinkSort(Link.click_count),
+    "last_clicked": LinkSort(Link.last_clicked_at, nullable=True),
+}
+
+
+@dataclass(frozen=True, slots=True)
+class Page:
+    items: list
+    next_cursor: str | None
+
+
+def _encode_value(value):
+    return to_utc(value).isoformat() if isinstance(value, datetime) else value
+
+
+def encode_cursor(sort: str, link: Link) -> str:
+    """Opaque cursor pointing just past `link` in `sort` order."""
+    payload = json.dumps([sort, _encode_value(LINK_SORTS[sort].key(link)), link.id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).rstrip(b"=").decode()
+
+
+def decode_cursor(sort: str, cursor: str) -> tuple:
+    """(sort value, id) of a cursor. Raises ValueError if it is malformed or from another sort."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, value, link_id = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError) as e:
+        raise ValueError("invalid cursor") from e
+    if cursor_sort != sort or not isinstance(link_id, int):
+        raise ValueError("invalid cursor")
+    try:
+        if LINK_SORTS[sort].column is Link.click_count:
+            if not isinstance(value, int):
+                raise ValueError
+        elif value is not None:
+            value = to_utc(datetime.fromisoformat(value))
+        elif not LINK_SORTS[sort].nullable:
+            raise ValueError
+    except (ValueError, TypeError) as e:
+        raise ValueError("invalid cursor") from e
+    return value, link_id
+
+
+def seek(stmt: Select, sort: str, cursor: str | None) -> Select:
+    """
+    Order `stmt` (a select of Link) for `sort` and, given a cursor, keep only
+    the rows after it. Rows with a NULL sort value come last, by id.
+    """
+    spec = LINK_SORTS[sort]
+    col = spec.column
+    order = col.desc().nulls_last() if spec.nullable else col.desc()
+    stmt = stmt.order_by(order, Link.id.desc())
+    if cursor is None:
+        return stmt
+
+    value, link_id = decode_cursor(sort, cursor)
+    if value is None:
+        return stmt.where(col.is_(None), Link.id < link_id)
+    after = tuple_(col, Link.id) < (value, link_id)
+    if spec.nullable:
+        after = or_(after, col.is_(None))
+    return stmt.where(after)
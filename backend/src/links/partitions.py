@@ -0,0 +1,193 @@
+"""
+Monthly range partitions of click_events on PostgreSQL.
+
+click_events is partitioned by RANGE (clicked_at), one partition per UTC
+month (click_events_pYYYYMM) plus click_events_default for rows outside
+every month. Partitions are created ahead of time by PartitionMaintainer
+(started with the app) or by hand:
+
+  python -m src.links.partitions [--months-ahead 3]
+
+Other databases keep a plain click_events table; everything here is then a
+no-op.
+
+The table is converted by the partition_click_events_by_month migration.
+A month can't be created once click_events_default holds rows for it, so
+keep CLICK_PARTITION_MONTHS_AHEAD comfortably above how long the app may
+run without maintenance.
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from src.core.config import settings
+from src.core.metrics import register_metrics
+
+logger = logging.getLogger(__name__)
+
+PARENT = "click_events"
+DEFAULT_PARTITION = f"{PARENT}_default"
+
+
+def month_start(dt: datetime) -> datetime:
+    """First instant of dt's UTC month."""
+    dt = dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+    return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month: datetime, n: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + n
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"{PARENT}_p{month:%Y%m}"
+
+
+def create_partition_sql(month: datetime) -> str:
+    start, end = month_start(month), add_months(month_start(month), 1)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(start)} PARTITION OF {PARENT} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+
+def is_partitioned(conn: Connection) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = :name AND pg_table_is_visible(c.oid))"
+    ), {"name": PARENT}).scalar_one()
+
+
+def existing_partitions(conn: Connection) -> list[str]:
+    return list(conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :name AND pg_table_is_visible(p.oid) ORDER BY c.relname"
+    ), {"name": PARENT}).scalars())
+
+
+def ensure_partitions(conn: Connection, *, months_ahead: int, now: datetime | None = None) -> list[str]:
+    """
+    Create the missing monthly partitions from the current month through
+    `months_ahead` months later, and the default partition. Returns the names
+    of the partitions created.
+    """
+    current = month_start(now or datetime.now(timezone.utc))
+    existing = set(existing_partitions(conn))
+    created = []
+    for n in range(months_ahead + 1):
+        month = add_months(current, n)
+        if partition_name(month) not in existing:
+            conn.execute(text(create_partition_sql(month)))
+            created.append(partition_name(month))
+    if DEFAULT_PARTITION not in existing:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT} DEFAULT"))
+        created.append(DEFAULT_PARTITION)
+    return created
+
+
+def maintain_partitions(engine: Engine, *, months_ahead: int | None = None) -> list[str]:
+    """ensure_partitions() in its own transaction when click_events is partitioned."""
+    if engine.dialect.name != "postgresql":
+        return []
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            return []
+        return ensure_partitions(
+            conn, months_ahead=settings.click_partition_months_ahead if months_ahead is None else months_ahead
+        )
+
+
+class PartitionMaintainer:
+    """Runs maintain_partitions() at start and then every `interval` seconds in a thread."""
+
+    def __init__(self, *, interval: float) -> None:
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+        self.runs = 0
+        self.failures = 0
+        self.created = 0
+        self.last_run_ms = 0.0
+
+    def run_once(self, engine: Engine) -> list[str]:
+        started = time.perf_counter()
+        try:
+            created = maintain_partitions(engine)
+        except Exception:
+            self.failures += 1
+            logger.exception("click_events partition maintenance failed")
+            return []
+        self.runs += 1
+        self.created += len(created)
+        self.last_run_ms = (time.perf_counter() - started) * 1000
+        if created:
+            logger.info("created click_events partitions: %s", ", ".join(created))
+        return created
+
+    def start(self, engine: Engine) -> None:
+        if self._thread is not None or self.interval <= 0 or engine.dialect.name != "postgresql":
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(engine,), name="click-partitions", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "runs": self.runs,
+            "failures": self.failures,
+            "created": self.created,
+            "last_run_ms": self.last_run_ms,
+        }
+
+    def _run(self, engine: Engine) -> None:
+        self.run_once(engine)
+        while not self._stop.wait(self.interval):
+            self.run_once(engine)
+
+
+partition_maintainer = PartitionMaintainer(interval=settings.click_partition_maintenance_interval_seconds)
+
+register_metrics("click_partitions", partition_maintainer.stats)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Pre-create monthly click_events partitions")
+    parser.add_argument("--months-ahead", type=int, default=settings.click_partition_months_ahead)
+    args = parser.parse_args(argv)
+
+    from src.db.session import engine
+
+    if engine.dialect.name != "postgresql":
+        print(f"click_events is not partitioned on {engine.dialect.name}; nothing to do")
+        return 0
+    with engine.connect() as conn:
+        if not is_partitioned(conn):
+            print("click_events is not partitioned yet; run `alembic upgrade head` first")
+            return 1
+    created = maintain_partitions(engine, months_ahead=args.months_ahead)
+    print(f"created {len(created)} partition(s)" + (f": {', '.join(created)}" if created else ""))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
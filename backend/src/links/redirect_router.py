@@ -1,25 +1,35 @@
 from __future__ import annotations
 
 from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from starlette.responses import RedirectResponse
 
-from src.db.session import get_db
-from src.links.service import get_active_link_by_slug, record_click
+from src.core.config import settings
+from src.db.async_session import Database, get_database
+from src.links.ingest import click_ingestor
+from src.links.service import capture_click, resolve_active_link, record_click
 
 router = APIRouter(tags=["redirect"])
 
 
 @router.get("/{slug}")
-def redirect(slug: str, request: Request, db: Session = Depends(get_db)):
-    link = get_active_link_by_slug(db, slug=slug)
+async def redirect(slug: str, request: Request, db: Database = Depends(get_database)):
+    link = await db.run(resolve_active_link, slug=slug)
     if not link:
         raise HTTPException(status_code=404, detail="Link not found")
 
     try:
-        record_click(db, link=link, request=request)
+        if settings.click_ingest_mode == "async":
+            raw = capture_click(link=link, request=request)
+            if click_ingestor.policy == "drop":
+                click_ingestor.submit(raw)
+            else:
+                # "block" waits for queue space and "spill" writes to disk
+                # when the queue is full; keep both off the event loop
+                await run_in_threadpool(click_ingestor.submit, raw)
+        else:
+            await db.run(record_click, link=link, request=request)
     except Exception:
-        db.rollback()  # never block redirect due to analytics
+        await db.rollback()  # never block redirect due to analytics
 
     return RedirectResponse(url=link.target_url, status_code=302)
-
@@ -0,0 +1,369 @@
+"""
+Raw click retention: fold click_events older than CLICK_RETENTION_DAYS into
+per-day aggregates (click_aggregate_daily), then delete them.
+
+Each step folds the next UTC day in one transaction, under a lock on the
+click_compaction row, and moves its watermark (compacted_before,
+folded_max_id) forward. The folded rows are then deleted in batches of
+CLICK_RETENTION_DELETE_BATCH, each in its own short transaction. A run can
+stop anywhere and the next one picks up from the watermark. Clicks that
+arrive late for a day that is already folded (a spill replay, say) are
+added on top of that day's aggregates by the next step. Their visitors are
+added too, so they may count someone the day already had.
+
+The hourly and per-country rollups and the visitor sketches are kept, so
+click totals, series and unique visitor estimates stay complete. Reads
+widen edges before compacted_before to whole rollup units
+(rollups.split_range).
+
+Runs in the app every CLICK_RETENTION_INTERVAL_SECONDS when
+CLICK_RETENTION_DAYS is set, or by hand:
+
+  python -m src.links.retention [--days 90] [--max-days N]
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+from sqlalchemy import delete, distinct, func, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.core.config import settings
+from src.core.metrics import register_metrics
+from src.db.session import SessionLocal
+from src.links.buckets import epoch_bucket
+from src.links.dictionary import referrer_hosts
+from src.links.rollups import DAY, floor_day, to_utc, upsert_counts
+from src.models.click_event import ClickEvent
+from src.links.user_agents import user_agent_ids
+from src.models.click_rollup import ClickAggregateDaily, ClickCompaction
+from src.models.user_agent import UserAgent
+
+logger = logging.getLogger(__name__)
+
+STATE = "click_events"
+# stored for clicks without a value (and as the value of "total")
+UNKNOWN = ""
+
+# dimension -> click_events or user_agents column (None: one row per link and day)
+DIMENSIONS = {
+    "total": None,
+    "country": ClickEvent.country,
+    "device": UserAgent.device_category,
+    "browser": UserAgent.browser_name,
+    "referrer": ClickEvent.referrer_id,
+}
+
+
+def group_column(column):
+    """
+    What to GROUP BY for a dimension column: user agent fields are grouped by
+    the integer ua_id, and like referrer ids decoded afterwards with
+    decode_values().
+    """
+    return ClickEvent.ua_id if column is not None and column.class_ is UserAgent else column
+
+
+def decode_values(db: Session, column, keys) -> dict:
+    """group_column() values -> the dimension's values (None when unknown)."""
+    if column is ClickEvent.referrer_id:
+        hosts = referrer_hosts.decode(db, keys)
+        return {key: hosts.get(key) for key in keys}
+    if column is None or column.class_ is not UserAgent:
+        return {key: key for key in keys}
+    fields = user_agent_ids.fields(db, keys)
+    return {key: fields[key][column.key] if key in fields else None for key in keys}
+
+
+def compacted_before(db: Session) -> datetime | None:
+    """Instant before which raw click events may have been deleted, or None."""
+    value = db.scalar(select(ClickCompaction.compacted_before).where(ClickCompaction.name == STATE))
+    return to_utc(value) if value is not None else None
+
+
+def _lock_state(db: Session, cutoff: datetime) -> ClickCompaction | None:
+    """
+    The watermark row, locked. Created at the oldest raw day when missing and
+    there is something before `cutoff` to fold.
+    """
+    stmt = select(ClickCompaction).where(ClickCompaction.name == STATE).with_for_update()
+    state = db.scalar(stmt)
+    if state is not None:
+        return state
+    oldest = db.scalar(select(func.min(ClickEvent.clicked_at)))
+    if oldest is None or floor_day(oldest) >= cutoff:
+        return None
+    db.add(ClickCompaction(name=STATE, compacted_before=floor_day(oldest), folded_max_id=0))
+    try:
+        db.commit()
+    except IntegrityError:
+        # another runner created it first
+        db.rollback()
+    return db.scalar(stmt)
+
+
+def _aggregate_rows(db: Session, where) -> list[dict]:
+    day = epoch_bucket(ClickEvent.clicked_at, int(DAY.total_seconds()))
+    rows: dict[tuple, dict] = {}
+    for dimension, column in DIMENSIONS.items():
+        key = group_column(column)
+        group = [ClickEvent.link_id, day] + ([key] if key is not None else [])
+        stmt = (
+            select(*group, func.count(ClickEvent.id), func.count(distinct(ClickEvent.visitor_hash)))
+            .where(where)
+            .group_by(*group)
+        )
+        result = db.execute(stmt).all()
+        values = decode_values(db, column, {row[2] for row in result}) if key is not None else {}
+        for row in result:
+            value = values[row[2]] if key is not None else UNKNOWN
+            row_key = (row[0], row[1], dimension, value if value is not None else UNKNOWN)
+            # visitor hashes include the user agent, so the distinct visitors
+            # of different ua_ids never overlap and add up
+            if row_key in rows:
+                rows[row_key]["clicks"] += row[-2]
+                rows[row_key]["visitors"] += row[-1]
+                continue
+            rows[row_key] = {
+                "link_id": row[0],
+                "day": datetime.fromtimestamp(row[1] * DAY.total_seconds(), timezone.utc).date(),
+                "dimension": dimension,
+                "value": row_key[3],
+                "clicks": row[-2],
+                "visitors": row[-1],
+            }
+    return list(rows.values())
+
+
+def fold_next_day(db: Session, *, cutoff: datetime) -> datetime | None:
+    """
+    Fold the next day with raw events before `cutoff` (a UTC midnight), plus
+    late events for days already folded, and move the watermark past it.
+    Returns the new compacted_before, or None when there was nothing to do.
+    Once the watermark is at the cutoff, a step folds late events only.
+    """
+    state = _lock_state(db, cutoff)
+    if state is None:
+        db.rollback()
+        return None
+    start, folded_max_id = to_utc(state.compacted_before), state.folded_max_id
+    if start >= cutoff:
+        # nothing new to fold, but late events may have arrived for folded days
+        late = select(ClickEvent.id).where(ClickEvent.clicked_at < start, ClickEvent.id > folded_max_id)
+        if db.scalar(late.limit(1)) is None:
+            db.rollback()
+            return None
+        end = start
+    else:
+        # skip straight over days without raw events
+        next_click = db.scalar(select(func.min(ClickEvent.clicked_at)).where(ClickEvent.clicked_at >= start))
+        end = min(floor_day(next_click) + DAY, cutoff) if next_click is not None else cutoff
+    max_id = max(db.scalar(select(func.max(ClickEvent.id))) or 0, folded_max_id)
+
+    # everything below (end, max_id) that the watermark didn't cover yet
+    rows = _aggregate_rows(db, (
+        (ClickEvent.clicked_at < end)
+        & (ClickEvent.id <= max_id)
+        & or_(ClickEvent.clicked_at >= start, ClickEvent.id > folded_max_id)
+    ))
+    upsert_counts(
+        db.connection(),
+        ClickAggregateDaily.__table__,
+        ["link_id", "day", "dimension", "value"],
+        rows,
+        counts=("clicks", "visitors"),
+    )
+    state.compacted_before = end
+    state.folded_max_id = max_id
+    db.commit()
+    return end
+
+
+def delete_compacted(db: Session, *, batch: int, pause_seconds: float = 0.0) -> int:
+    """
+    Delete folded raw events, `batch` rows per transaction, pausing between
+    batches. Returns how many were deleted.
+    """
+    state = db.scalar(select(ClickCompaction).where(ClickCompaction.name == STATE))
+    if state is None:
+        return 0
+    before, max_id = to_utc(state.compacted_before), state.folded_max_id
+    db.rollback()
+    folded = (ClickEvent.clicked_at < before) & (ClickEvent.id <= max_id)
+    total = 0
+    while True:
+        # a bulk DELETE: the rollups keep these clicks
+        ids = select(ClickEvent.id).where(folded).limit(batch).scalar_subquery()
+        deleted = db.execute(
+            delete(ClickEvent)
+            .where(ClickEvent.clicked_at < before, ClickEvent.id.in_(ids))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        total += deleted
+        if deleted < batch:
+            return total
+        if pause_seconds:
+            time.sleep(pause_seconds)
+
+
+@dataclass(frozen=True, slots=True)
+class RetentionResult:
+    days_folded: int
+    rows_deleted: int
+    compacted_before: datetime | None
+
+
+def run_retention(
+    session_factory: Callable[[], Session] = SessionLocal,
+    *,
+    days: int,
+    batch: int,
+    pause_seconds: float = 0.0,
+    max_days: int | None = None,
+    now: datetime | None = None,
+) -> RetentionResult:
+    """
+    Fold and delete raw events older than `days` days, one UTC day at a time
+    (at most `max_days` of them). Leftovers of an interrupted run go first.
+    """
+    cutoff = floor_day(now or datetime.now(timezone.utc)) - timedelta(days=days)
+    db = session_factory()
+    try:
+        deleted = delete_compacted(db, batch=batch, pause_seconds=pause_seconds)
+        folded = 0
+        while max_days is None or folded < max_days:
+            if fold_next_day(db, cutoff=cutoff) is None:
+                break
+            folded += 1
+            deleted += delete_compacted(db, batch=batch, pause_seconds=pause_seconds)
+        return RetentionResult(folded, deleted, compacted_before(db))
+    finally:
+        db.close()
+
+
+def aggregate_breakdown_query(link_ids, dimension: str, start: datetime | None, end: datetime):
+    """(value, clicks) of click_aggregate_daily for the days in [start, end)."""
+    t = ClickAggregateDaily
+    stmt = (
+        select(t.value, func.sum(t.clicks))
+        .where(t.link_id.in_(link_ids), t.dimension == dimension, t.day < end.date())
+        .group_by(t.value)
+    )
+    if start is not None:
+        stmt = stmt.where(t.day >= floor_day(start).date())
+    return stmt
+
+
+class RetentionJob:
+    """Runs run_retention() every `interval` seconds in a thread while `days` > 0."""
+
+    def __init__(self, *, days: int, interval: float, session_factory: Callable[[], Session] = SessionLocal) -> None:
+        self.days = days
+        self.interval = interval
+        self.session_factory = session_factory
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+        self.runs = 0
+        self.failures = 0
+        self.days_folded = 0
+        self.rows_deleted = 0
+        self.last_run_ms = 0.0
+        self.compacted_before: datetime | None = None
+
+    def run_once(self) -> RetentionResult | None:
+        started = time.perf_counter()
+        try:
+            result = run_retention(
+                self.session_factory,
+                days=self.days,
+                batch=settings.click_retention_delete_batch,
+                pause_seconds=settings.click_retention_batch_pause_ms / 1000,
+            )
+        except Exception:
+            self.failures += 1
+            logger.exception("click retention run failed")
+            return None
+        self.runs += 1
+        self.days_folded += result.days_folded
+        self.rows_deleted += result.rows_deleted
+        self.compacted_before = result.compacted_before
+        self.last_run_ms = (time.perf_counter() - started) * 1000
+        return result
+
+    def start(self) -> None:
+        if self._thread is not None or self.days <= 0 or self.interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="click-retention", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self) -> dict[str, int | float | str | None]:
+        return {
+            "days": self.days,
+            "runs": self.runs,
+            "failures": self.failures,
+            "days_folded": self.days_folded,
+            "rows_deleted": self.rows_deleted,
+            "last_run_ms": self.last_run_ms,
+            "compacted_before": self.compacted_before.isoformat() if self.compacted_before else None,
+        }
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+
+retention_job = RetentionJob(
+    days=settings.click_retention_days,
+    interval=settings.click_retention_interval_seconds,
+)
+
+register_metrics("click_retention", retention_job.stats)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Fold old raw click events into daily aggregates and delete them")
+    parser.add_argument("--days", type=int, default=settings.click_retention_days, help="keep this many days of raw events")
+    parser.add_argument("--batch", type=int, default=settings.click_retention_delete_batch)
+    parser.add_argument("--max-days", type=int, default=None, help="fold at most this many days")
+    args = parser.parse_args(argv)
+    if args.days <= 0:
+        parser.error("--days (or CLICK_RETENTION_DAYS) must be positive")
+
+    # register every mapped class before the first query
+    import src.models.dimension_value
+    import src.models.id_block
+    import src.models.link
+    import src.models.oauth_account
+    import src.models.user
+    import src.models.user_agent  # noqa: F401
+
+    result = run_retention(
+        days=args.days,
+        batch=args.batch,
+        pause_seconds=settings.click_retention_batch_pause_ms / 1000,
+        max_days=args.max_days,
+    )
+    before = result.compacted_before.isoformat() if result.compacted_before else "-"
+    print(f"folded {result.days_folded} day(s), deleted {result.rows_deleted} raw events; raw events kept from {before}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
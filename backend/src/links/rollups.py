@@ -0,0 +1,314 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterable
+
+from sqlalchemy import Select, bindparam, event, func, null, select, tuple_
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from src.core.hll import HyperLogLog
+from src.models.click_event import ClickEvent
+from src.models.click_rollup import ClickRollupCountryDaily, ClickRollupHourly, ClickVisitorSketchHourly
+
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+
+SKETCH_PRECISION = 12
+# sketch rows use '' for clicks without a country so the column can be part of the key
+NO_COUNTRY = ""
+
+
+def to_utc(dt: datetime) -> datetime:
+    """Aware UTC datetime; naive values (SQLite) are taken to already be UTC."""
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+
+def floor_hour(dt: datetime) -> datetime:
+    return to_utc(dt).replace(minute=0, second=0, microsecond=0)
+
+
+def floor_day(dt: datetime) -> datetime:
+    return to_utc(dt).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _ceil(dt: datetime, floor, unit: timedelta) -> datetime:
+    floored = floor(dt)
+    return floored if floored == to_utc(dt) else floored + unit
+
+
+# Maintenance
+
+def dialect_insert(conn: Connection):
+    """INSERT construct with on_conflict_* support, or None for other dialects."""
+    if conn.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    if conn.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    return None
+
+
+def upsert_counts(
+    conn: Connection, table, key_columns: list[str], rows: list[dict], counts: tuple[str, ...] = ("clicks",)
+) -> None:
+    """Insert rows, or add their `counts` columns to the stored row with the same key."""
+    if not rows:
+        return
+    # sorted so concurrent writers lock rollup rows in the same order
+    rows = sorted(rows, key=lambda r: tuple(r[k] for k in key_columns))
+    insert = dialect_insert(conn)
+    if insert is not None:
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={c: table.c[c] + stmt.excluded[c] for c in counts},
+        )
+        conn.execute(stmt, rows)
+        return
+
+    for row in rows:
+        where = [table.c[k] == row[k] for k in key_columns]
+        updated = conn.execute(table.update().where(*where).values({c: table.c[c] + row[c] for c in counts}))
+        if updated.rowcount == 0:
+            conn.execute(table.insert().values(**row))
+
+
+def _merge_sketches(conn: Connection, sketches: dict[tuple[int, datetime, str], HyperLogLog]) -> None:
+    """Union new visitors into the stored sketches (read, merge, write back under a row lock)."""
+    if not sketches:
+        return
+    t = ClickVisitorSketchHourly.__table__
+    keys = sorted(sketches)
+    empty = HyperLogLog(SKETCH_PRECISION).to_bytes()
+    placeholders = [{"link_id": l, "hour": h, "country": c, "sketch": empty} for l, h, c in keys]
+
+    # make sure every row exists so the locking read below sees all of them
+    insert = dialect_insert(conn)
+    if insert is not None:
+        conn.execute(insert(t).on_conflict_do_nothing(index_elements=["link_id", "hour", "country"]), placeholders)
+    else:
+        present = set(conn.execute(
+            select(t.c.link_id, t.c.hour, t.c.country)
+            .where(tuple_(t.c.link_id, t.c.hour, t.c.country).in_(keys))
+        ).all())
+        missing = [p for p in placeholders if (p["link_id"], p["hour"], p["country"]) not in present]
+        if missing:
+            conn.execute(t.insert(), missing)
+
+    stored = conn.execute(
+        select(t.c.link_id, t.c.hour, t.c.country, t.c.sketch)
+        .where(tuple_(t.c.link_id, t.c.hour, t.c.country).in_(keys))
+        .order_by(t.c.link_id, t.c.hour, t.c.country)
+        .with_for_update()
+    ).all()
+    updates = []
+    for link_id, hour, country, blob in stored:
+        key = (link_id, floor_hour(hour), country)
+        sketch = sketches.get(key)
+        if sketch is None:
+            continue
+        sketch.merge_bytes(blob)
+        updates.append({"b_link_id": link_id, "b_hour": key[1], "b_country": country, "b_sketch": sketch.to_bytes()})
+    conn.execute(
+        t.update()
+        .where(
+            t.c.link_id == bindparam("b_link_id"),
+            t.c.hour == bindparam("b_hour"),
+            t.c.country == bindparam("b_country"),
+        )
+        .values(sketch=bindparam("b_sketch")),
+        updates,
+    )
+
+
+ClickTuple = tuple[int, datetime, "str | None", "str | None"]
+
+
+def apply_click_rollups(conn: Connection, events: Iterable[ClickTuple], sign: int = 1) -> None:
+    """
+    Add (link_id, clicked_at, country, visitor_hash) events to the rollup
+    tables, in the caller's transaction. sign=-1 removes them from the click
+    counts again; visitor sketches can't forget a visitor and are left as is.
+    """
+    hourly: dict[tuple[int, datetime], int] = {}
+    country: dict[tuple[int, date, str], int] = {}
+    sketches: dict[tuple[int, datetime, str], HyperLogLog] = {}
+    for link_id, clicked_at, country_code, visitor_hash in events:
+        hour = floor_hour(clicked_at)
+        hourly[(link_id, hour)] = hourly.get((link_id, hour), 0) + sign
+        if country_code:
+            key = (link_id, hour.date(), country_code)
+            country[key] = country.get(key, 0) + sign
+        if visitor_hash and sign > 0:
+            key = (link_id, hour, country_code or NO_COUNTRY)
+            sketch = sketches.get(key)
+            if sketch is None:
+                sketch = sketches[key] = HyperLogLog(SKETCH_PRECISION)
+            sketch.add(visitor_hash)
+
+    upsert_counts(
+        conn,
+        ClickRollupHourly.__table__,
+        ["link_id", "hour"],
+        [{"link_id": l, "hour": h, "clicks": n} for (l, h), n in hourly.items()],
+    )
+    upsert_counts(
+        conn,
+        ClickRollupCountryDaily.__table__,
+        ["link_id", "day", "country"],
+        [{"link_id": l, "day": d, "country": c, "clicks": n} for (l, d, c), n in country.items()],
+    )
+    _merge_sketches(conn, sketches)
+
+
+# Events added or deleted through the ORM (the batch writer uses Core or COPY
+# and calls apply_click_rollups itself) keep the rollups in step in the same flush.
+
+def _as_tuple(e: ClickEvent) -> ClickTuple:
+    return e.link_id, e.clicked_at, e.country, e.visitor_hash
+
+
+@event.listens_for(Session, "before_flush")
+def _stamp_new_clicks(session: Session, flush_context, instances) -> None:
+    # clicked_at has a server default; the rollup needs the value at flush time
+    for obj in session.new:
+        if isinstance(obj, ClickEvent) and obj.clicked_at is None:
+            obj.clicked_at = datetime.now(timezone.utc)
+
+
+@event.listens_for(Session, "after_flush")
+def _rollup_flushed_clicks(session: Session, flush_context) -> None:
+    added = [_as_tuple(e) for e in session.new if isinstance(e, ClickEvent)]
+    removed = [_as_tuple(e) for e in session.deleted if isinstance(e, ClickEvent)]
+    if added:
+        apply_click_rollups(session.connection(), added)
+    if removed:
+        apply_click_rollups(session.connection(), removed, sign=-1)
+
+
+# Queries
+
+@dataclass(frozen=True, slots=True)
+class RangeSplit:
+    """
+    [start, end] (either side open when None) split into whole units served by
+    a rollup, [rollup_start, rollup_end), and the partial units at either edge
+    that must be read from raw events: [start, rollup_start) and [rollup_end, end].
+    When the range has no whole unit, `raw_only` is set and only raw events are used.
+    `compacted` is set when the range reaches back before the raw events kept
+    by the retention job; see split_range.
+    """
+    start: datetime | None
+    end: datetime | None
+    rollup_start: datetime | None
+    rollup_end: datetime | None
+    raw_only: bool
+    compacted: bool = False
+
+    @property
+    def head(self) -> tuple[datetime, datetime] | None:
+        if self.raw_only or self.start is None or self.start == self.rollup_start:
+            return None
+        return self.start, self.rollup_start
+
+    @property
+    def tail(self) -> tuple[datetime, datetime] | None:
+        # rollup_end is past end when a compacted end was widened to its unit
+        if self.raw_only or self.end is None or self.rollup_end > self.end:
+            return None
+        return self.rollup_end, self.end
+
+
+def split_range(
+    start: datetime | None, end: datetime | None, *, unit: timedelta, raw_from: datetime | None = None
+) -> RangeSplit:
+    """
+    Split [start, end] for `unit` rollups. Raw events before `raw_from` (the
+    retention job's compacted_before, a UTC midnight) are gone, so an edge
+    before it is widened to its whole unit and served from the rollup (and a
+    click at exactly an aligned end before it is no longer counted).
+    """
+    floor = floor_hour if unit == HOUR else floor_day
+    start = to_utc(start) if start is not None else None
+    end = to_utc(end) if end is not None else None
+    rollup_start = _ceil(start, floor, unit) if start is not None else None
+    rollup_end = floor(end) if end is not None else None
+    compacted = False
+    if raw_from is not None:
+        compacted = start is None or start < raw_from
+        if start is not None and start < raw_from:
+            start = rollup_start = floor(start)
+        if end is not None and end < raw_from:
+            rollup_end = _ceil(end, floor, unit)
+    raw_only = rollup_start is not None and rollup_end is not None and rollup_start >= rollup_end
+    return RangeSplit(start, end, rollup_start, rollup_end, raw_only, compacted)
+
+
+def hourly_rollup_query(link_ids: Select | list[int], split: RangeSplit) -> Select:
+    """(hour, clicks) rows for the whole hours of a split."""
+    t = ClickRollupHourly
+    stmt = (
+        select(t.hour, func.sum(t.clicks).label("clicks"))
+        .where(t.link_id.in_(link_ids))
+        .group_by(t.hour)
+    )
+    if split.rollup_start is not None:
+        stmt = stmt.where(t.hour >= split.rollup_start)
+    if split.rollup_end is not None:
+        stmt = stmt.where(t.hour < split.rollup_end)
+    return stmt
+
+
+def country_rollup_query(link_ids: Select | list[int], split: RangeSplit) -> Select:
+    """(country, clicks) rows for the whole days of a split."""
+    t = ClickRollupCountryDaily
+    stmt = (
+        select(t.country, func.sum(t.clicks).label("clicks"))
+        .where(t.link_id.in_(link_ids))
+        .group_by(t.country)
+    )
+    if split.rollup_start is not None:
+        stmt = stmt.where(t.day >= split.rollup_start.date())
+    if split.rollup_end is not None:
+        stmt = stmt.where(t.day < split.rollup_end.date())
+    return stmt
+
+
+def visitor_sketch_query(link_ids: Select | list[int], split: RangeSplit, group_by=None) -> Select:
+    """
+    (group, sketch) rows for the whole hours of a split; group is None, or the
+    value of `group_by` (a ClickVisitorSketchHourly column). Grouping by country
+    leaves out clicks without one.
+    """
+    t = ClickVisitorSketchHourly
+    stmt = select(group_by if group_by is not None else null(), t.sketch).where(t.link_id.in_(link_ids))
+    if group_by is t.country:
+        stmt = stmt.where(t.country != NO_COUNTRY)
+    if split.rollup_start is not None:
+        stmt = stmt.where(t.hour >= split.rollup_start)
+    if split.rollup_end is not None:
+        stmt = stmt.where(t.hour < split.rollup_end)
+    return stmt
+
+
+def raw_edges(split: RangeSplit) -> list[tuple[datetime | None, datetime | None, bool]]:
+    """(start, end, end_inclusive) windows that must be read from click_events."""
+    if split.raw_only:
+        return [(split.start, split.end, True)]
+    edges = []
+    if split.head is not None:
+        edges.append((split.head[0], split.head[1], False))
+    if split.tail is not None:
+        edges.append((split.tail[0], split.tail[1], True))
+    return edges
+
+
+def where_clicked_between(stmt: Select, start: datetime | None, end: datetime | None, end_inclusive: bool) -> Select:
+    if start is not None:
+        stmt = stmt.where(ClickEvent.clicked_at >= start)
+    if end is not None:
+        stmt = stmt.where(ClickEvent.clicked_at <= end if end_inclusive else ClickEvent.clicked_at < end)
+    return stmt
@@ -1,36 +1,51 @@
 from __future__ import annotations
 
+import json
 from datetime import datetime, timezone
-from fastapi import APIRouter, Depends, Request, HTTPException, Query
+from typing import Literal
+from fastapi import APIRouter, Depends, Request, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from src.auth.dependencies import get_current_user
+from src.core.config import settings
+from src.db.async_session import Database, get_database
 from src.db.session import get_db
+from src.models.link import Link
 from src.models.user import User
 
 from src.links.schemas import (
-    LinkCreateRequest, LinkResponse, LinkListItem, LinkStatsResponse, ClickEventItem,
+    LinkCreateRequest, LinkResponse, LinkListItem, BulkLinkCreateResponse, BulkLinkItemResult, LinkStatsResponse, ClickEventItem,
+    BreakdownItem,
     DashboardResponse, KPIData, CountryData, LinkTableData, SparklinePoint
 )
 from src.links.service import (
-    create_link, list_links_for_user, get_link_for_user, count_clicks_last_24h, recent_click_events,
-    get_total_clicks_for_user, get_total_links_for_user, get_unique_visitors_for_user,
-    get_unique_visitors_per_link, get_unique_visitors_for_link, get_clicks_by_country, get_clicks_time_series,
-    get_previous_period_metrics, update_link_status
+    create_link, create_links_bulk, list_links_page, get_link_for_user, count_clicks_last_24h, recent_click_events,
+    get_unique_visitor_count_for_link, update_link_status, get_live_click_counts, list_link_ids_for_user,
+    get_click_breakdown,
 )
+from src.links.buckets import bucket_grid
+from src.links.pagination import decode_cursor
+from src.links.export import FORMATS, click_export_query, parse_columns, stream_click_export
+from src.links.cache import dashboard_cache
+from src.links.dashboard import build_dashboard, normalize_live_range
+from src.links.dictionary import referrer_hosts
 from src.links.country_names import get_country_name
 
 router = APIRouter(prefix="/links", tags=["links"])
 
 
 @router.post("", response_model=LinkResponse, status_code=201)
-def create_link_endpoint(
+async def create_link_endpoint(
     payload: LinkCreateRequest,
     request: Request,
-    db: Session = Depends(get_db),
+    db: Database = Depends(get_database),
     user: User = Depends(get_current_user),
 ) -> LinkResponse:
-    link = create_link(db, user_id=user.id, target_url=str(payload.target_url))
+    link = await db.run(create_link, user_id=user.id, target_url=str(payload.target_url))
 
     base = str(request.base_url).rstrip("/")
     short_url = f"{base}/{link.slug}"
@@ -47,15 +62,121 @@ def create_link_endpoint(
 
 
 
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+def _bulk_item(value) -> tuple[str | None, str | None]:
+    """(normalized URL, None) or (None, error) for one bulk item: a URL or {"target_url": ...}."""
+    if isinstance(value, str):
+        value = {"target_url": value}
+    try:
+        return str(LinkCreateRequest.model_validate(value).target_url), None
+    except ValidationError as e:
+        return None, e.errors()[0]["msg"]
+
+
+async def _read_bulk_items(request: Request) -> list[tuple[str | None, str | None]]:
+    """
+    Items of a bulk request: a JSON array, or NDJSON (one item per line),
+    which is parsed as it arrives. Raises HTTPException for a malformed
+    array or too many items.
+    """
+    limit = settings.bulk_links_max_items
+    too_many = HTTPException(status_code=413, detail=f"at most {limit} links per request")
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+
+    if content_type not in NDJSON_TYPES:
+        try:
+            values = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="body must be a JSON array or NDJSON")
+        if not isinstance(values, list):
+            raise HTTPException(status_code=400, detail="body must be a JSON array or NDJSON")
+        if len(values) > limit:
+            raise too_many
+        return [_bulk_item(value) for value in values]
+
+    items: list[tuple[str | None, str | None]] = []
+    pending = b""
+
+    def add_line(line: bytes) -> None:
+        if not line.strip():
+            return
+        if len(items) >= limit:
+            raise too_many
+        try:
+            items.append(_bulk_item(json.loads(line)))
+        except ValueError:
+            items.append((None, "invalid JSON"))
+
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            add_line(line)
+    add_line(pending)
+    return items
+
+
+@router.post("/bulk", response_model=BulkLinkCreateResponse)
+async def create_links_bulk_endpoint(
+    request: Request,
+    db: Database = Depends(get_database),
+    user: User = Depends(get_current_user),
+):
+    """
+    Create many links at once from a JSON array or NDJSON of URLs (or
+    {"target_url": ...} objects). Every item gets a result in request order;
+    invalid URLs and rows that couldn't be saved are reported per item and
+    don't stop the rest.
+    """
+    items = await _read_bulk_items(request)
+    valid = [(index, url) for index, (url, _) in enumerate(items) if url is not None]
+    created = await db.run(create_links_bulk, user_id=user.id, target_urls=[url for _, url in valid])
+
+    base = str(request.base_url).rstrip("/")
+    results = [BulkLinkItemResult(index=index, ok=False, error=error) for index, (_, error) in enumerate(items)]
+    for (index, url), result in zip(valid, created):
+        if result.error is not None:
+            results[index] = BulkLinkItemResult(index=index, ok=False, target_url=url, error=result.error)
+        else:
+            results[index] = BulkLinkItemResult(
+                index=index, ok=True, target_url=url, id=result.id, slug=result.slug,
+                short_url=f"{base}/{result.slug}",
+            )
+    ok = sum(r.ok for r in results)
+    return BulkLinkCreateResponse(created=ok, failed=len(results) - ok, results=results)
+
+
+LinkSortParam = Literal["created", "clicks", "last_clicked"]
+DashboardPresetParam = Literal["24h", "7d", "30d", "all"]
+
+
 @router.get("", response_model=list[LinkListItem])
-def list_my_links(
+async def list_my_links(
     request: Request,
+    response: Response,
     limit: int = Query(10, ge=1, le=100),
     offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db),
+    cursor: str | None = Query(None, description="X-Next-Cursor of the previous page"),
+    sort: LinkSortParam = Query("created", description="created, clicks or last_clicked (all descending)"),
+    db: Database = Depends(get_database),
     user: User = Depends(get_current_user),
 ):
-    links = list_links_for_user(db, user_id=user.id, limit=limit, offset=offset)
+    """
+    The user's links, one page at a time. When there are more, the
+    X-Next-Cursor response header holds the cursor for the next page.
+    """
+    try:
+        page = await db.run(
+            list_links_page, user_id=user.id, limit=limit, sort=sort, cursor=cursor, offset=offset
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if page.next_cursor is not None:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+    links = page.items
+    counts = get_live_click_counts(links)
     base = str(request.base_url).rstrip("/")
 
     return [
@@ -65,8 +186,8 @@ def list_my_links(
             target_url=l.target_url,
             is_active=l.is_active,
             created_at=l.created_at,
-            click_count=l.click_count,
-            last_clicked_at=l.last_clicked_at,
+            click_count=counts[l.id][0],
+            last_clicked_at=counts[l.id][1],
             short_url=f"{base}/{l.slug}",
         )
         for l in links
@@ -74,20 +195,26 @@ def list_my_links(
 
 
 @router.get("/{link_id}/stats", response_model=LinkStatsResponse)
-def link_stats(
+async def link_stats(
     link_id: int,
     request: Request,
-    db: Session = Depends(get_db),
+    db: Database = Depends(get_database),
     user: User = Depends(get_current_user),
 ):
-    link = get_link_for_user(db, user_id=user.id, link_id=link_id)
+    link = await db.run(get_link_for_user, user_id=user.id, link_id=link_id)
     if not link:
         raise HTTPException(status_code=404, detail="Link not found")
 
     base = str(request.base_url).rstrip("/")
-    clicks_24h = count_clicks_last_24h(db, link_id=link.id)
-    unique_visitors = get_unique_visitors_for_link(db, link_id=link.id)
-    recent = recent_click_events(db, link_id=link.id, limit=50)
+    clicks_24h = await db.run(count_clicks_last_24h, link_id=link.id)
+    unique_visitors = await db.run(get_unique_visitor_count_for_link, link_id=link.id)
+    recent = await db.run(recent_click_events, link_id=link.id, limit=50)
+    referrers = await db.run(referrer_hosts.decode, [e.referrer_id for e in recent])
+    breakdowns = {
+        dimension: await db.run(get_click_breakdown, link_ids=[link.id], dimension=dimension, limit=10)
+        for dimension in ("referrer", "device", "browser")
+    }
+    click_count, last_clicked_at = get_live_click_counts([link])[link.id]
 
     return LinkStatsResponse(
         link=LinkListItem(
@@ -96,41 +223,107 @@ def link_stats(
             target_url=link.target_url,
             is_active=link.is_active,
             created_at=link.created_at,
-            click_count=link.click_count,
-            last_clicked_at=link.last_clicked_at,
+            click_count=click_count,
+            last_clicked_at=last_clicked_at,
             short_url=f"{base}/{link.slug}",
         ),
         clicks_last_24h=clicks_24h,
-        unique_visitors=unique_visitors,
+        unique_visitors=unique_visitors.value,
+        unique_visitors_exact=unique_visitors.exact,
+        unique_visitors_error=unique_visitors.error,
+        top_referrers=[BreakdownItem(**item) for item in breakdowns["referrer"]],
+        devices=[BreakdownItem(**item) for item in breakdowns["device"]],
+        browsers=[BreakdownItem(**item) for item in breakdowns["browser"]],
         recent_clicks=[
-            ClickEventItem(
-                id=e.id,
-                clicked_at=e.clicked_at,
-                referrer_host=getattr(e, "referrer_host", None),
-                country=getattr(e, "country", None),
-                device_category=getattr(e, "device_category", None),
-                browser_name=getattr(e, "browser_name", None),
-                browser_version=getattr(e, "browser_version", None),
-                os_name=getattr(e, "os_name", None),
-                os_version=getattr(e, "os_version", None),
-                engine=getattr(e, "engine", None),
-            )
-            for e in recent
+            ClickEventItem.model_validate(e, context={"referrer_hosts": referrers}) for e in recent
         ],
     )
 
 
+ExportFormatParam = Literal["csv", "ndjson"]
+
+
+def _export_response(
+    db: Session, link_ids, *, filename: str, fmt: str, columns: str | None,
+    start_date: datetime | None, end_date: datetime | None,
+) -> StreamingResponse:
+    try:
+        names = parse_columns(columns)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if start_date is not None and end_date is not None and end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    stmt = click_export_query(link_ids, columns=names, start_date=start_date, end_date=end_date)
+    return StreamingResponse(
+        stream_click_export(db, stmt, names, fmt),
+        media_type=FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
+
+
+# Exports stream from a blocking Session for the lifetime of the response
+# (Starlette iterates the generator in its threadpool), so they take the
+# session directly rather than going through Database.
+
+@router.get("/events/export")
+async def export_my_click_events(
+    format: ExportFormatParam = Query("csv"),
+    columns: str | None = Query(None, description="Comma-separated columns; all when omitted"),
+    start_date: datetime | None = Query(None, description="ISO datetime, inclusive"),
+    end_date: datetime | None = Query(None, description="ISO datetime, inclusive"),
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """Stream the click events of all the user's links as CSV or NDJSON, oldest first."""
+    return _export_response(
+        db, select(Link.id).where(Link.user_id == user.id), filename="clicks", fmt=format,
+        columns=columns, start_date=start_date, end_date=end_date,
+    )
+
+
+@router.get("/{link_id}/events/export")
+async def export_link_click_events(
+    link_id: int,
+    format: ExportFormatParam = Query("csv"),
+    columns: str | None = Query(None, description="Comma-separated columns; all when omitted"),
+    start_date: datetime | None = Query(None, description="ISO datetime, inclusive"),
+    end_date: datetime | None = Query(None, description="ISO datetime, inclusive"),
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """Stream one link's click events as CSV or NDJSON, oldest first."""
+    link = await run_in_threadpool(get_link_for_user, db, user_id=user.id, link_id=link_id)
+    if not link:
+        raise HTTPException(status_code=404, detail="Link not found")
+    return _export_response(
+        db, [link.id], filename=f"clicks-{link.slug}", fmt=format,
+        columns=columns, start_date=start_date, end_date=end_date,
+    )
+
+
 @router.get("/dashboard", response_model=DashboardResponse)
-def get_dashboard_data(
+async def get_dashboard_data(
     request: Request,
     start_date: str = Query(..., description="ISO datetime string for start of date range"),
     end_date: str = Query(..., description="ISO datetime string for end of date range"),
-    db: Session = Depends(get_db),
+    granularity: str | None = Query(
+        None, description='Sparkline bucket: "hour", "day", "week", "month" or a width like "5m", "15m", "6h"'
+    ),
+    tz: str = Query("UTC", description="IANA time zone for sparkline buckets"),
+    links_limit: int = Query(100, ge=1, le=100),
+    links_sort: LinkSortParam = Query("created", description="created, clicks or last_clicked (all descending)"),
+    links_cursor: str | None = Query(None, description="links_next_cursor of the previous page"),
+    preset: DashboardPresetParam | None = Query(
+        None, description="Preset the range was picked from (24h, 7d, 30d, all); lets a range ending now be hour-aligned"
+    ),
+    db: Database = Depends(get_database),
     user: User = Depends(get_current_user),
 ):
     """
     Get dashboard analytics data for the authenticated user.
     Includes KPIs, sparkline data, country breakdown, and links table.
+    The sparkline has a point for every bucket in the range, zero when empty.
+    The links table is paged like GET /links; links_next_cursor fetches the next page.
     """
     try:
         start_dt = datetime.fromisoformat(start_date.replace("Z", "+00:00"))
@@ -143,35 +336,50 @@ def get_dashboard_data(
         start_dt = start_dt.replace(tzinfo=timezone.utc)
     if end_dt.tzinfo is None:
         end_dt = end_dt.replace(tzinfo=timezone.utc)
+    if preset is not None:
+        start_dt, end_dt = normalize_live_range(start_dt, end_dt)
     
     base = str(request.base_url).rstrip("/")
     
-    # Get current period metrics
-    total_clicks = get_total_clicks_for_user(db, user_id=user.id, start_date=start_dt, end_date=end_dt)
-    total_links = get_total_links_for_user(db, user_id=user.id)
-    unique_visitors = get_unique_visitors_for_user(db, user_id=user.id, start_date=start_dt, end_date=end_dt)
-    
-    # Get previous period for comparison
-    prev_metrics = get_previous_period_metrics(db, user_id=user.id, current_start=start_dt, current_end=end_dt)
-    
     # Determine granularity for sparkline based on date range
-    duration = end_dt - start_dt
-    if duration.days <= 1:
-        granularity = "hour"
-    elif duration.days <= 30:
-        granularity = "day"
-    else:
-        granularity = "month"
-    
-    # Get sparkline data
-    sparkline_data = get_clicks_time_series(
-        db, user_id=user.id, start_date=start_dt, end_date=end_dt, granularity=granularity
+    if granularity is None:
+        duration = end_dt - start_dt
+        if duration.days <= 1:
+            granularity = "hour"
+        elif duration.days <= 30:
+            granularity = "day"
+        else:
+            granularity = "month"
+    try:
+        bucket_grid(start_dt, end_dt, granularity, tz)
+        if links_cursor is not None:
+            decode_cursor(links_sort, links_cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    cache_key = (start_dt, end_dt, granularity, tz, base, links_limit, links_sort, links_cursor)
+    if settings.dashboard_cache_enabled:
+        body = dashboard_cache.get(user.id, cache_key)
+        if body is not None:
+            return Response(content=body, media_type="application/json")
+        version = dashboard_cache.version(user.id)
+        dashboard_cache.watch(user.id, await db.run(list_link_ids_for_user, user_id=user.id))
+
+    # KPIs for both periods, sparkline, countries and links in one pass
+    data = await db.run(
+        build_dashboard,
+        user_id=user.id,
+        start_date=start_dt,
+        end_date=end_dt,
+        granularity=granularity,
+        tz=tz,
+        fill_gaps=True,
+        link_limit=links_limit,
+        link_sort=links_sort,
+        link_cursor=links_cursor,
     )
-    
-    # Get country data
-    country_data_raw = get_clicks_by_country(db, user_id=user.id, start_date=start_dt, end_date=end_dt)
-    total_country_clicks = sum(c["clicks"] for c in country_data_raw) if country_data_raw else 1
-    
+
+    total_country_clicks = sum(c["clicks"] for c in data.countries) if data.countries else 1
     countries = [
         CountryData(
             country_code=item["country_code"],
@@ -180,28 +388,22 @@ def get_dashboard_data(
             unique_visitors=item["unique_visitors"],
             percentage=(item["clicks"] / total_country_clicks * 100) if total_country_clicks > 0 else 0.0,
         )
-        for item in country_data_raw
+        for item in data.countries
     ]
-    
-    # Get links with unique visitors
-    links = list_links_for_user(db, user_id=user.id, limit=100, offset=0)
-    link_ids = [link.id for link in links]
-    unique_visitors_map = get_unique_visitors_per_link(
-        db, link_ids=link_ids, start_date=start_dt, end_date=end_dt
-    )
-    
+
+    counts = get_live_click_counts(data.links)
     links_table_data = [
         LinkTableData(
             id=link.id,
             short_url=f"{base}/{link.slug}",
             long_url=link.target_url,
             status="active" if link.is_active else "inactive",
-            clicks=link.click_count,
-            unique_visitors=unique_visitors_map.get(link.id, 0),
-            last_clicked=link.last_clicked_at,
+            clicks=counts[link.id][0],
+            unique_visitors=data.link_unique_visitors.get(link.id, 0),
+            last_clicked=counts[link.id][1],
             created=link.created_at,
         )
-        for link in links
+        for link in data.links
     ]
     
     # Calculate deltas (percentage changes)
@@ -210,43 +412,51 @@ def get_dashboard_data(
             return 100.0 if current > 0 else 0.0
         return ((current - previous) / previous) * 100.0
     
-    return DashboardResponse(
+    response = DashboardResponse(
         kpis=KPIData(
-            total_clicks=total_clicks,
-            total_links=total_links,
-            unique_visitors=unique_visitors,
-            previous_period_clicks=prev_metrics["total_clicks"],
-            previous_period_links=prev_metrics["total_links"],
-            previous_period_unique_visitors=prev_metrics["unique_visitors"],
+            total_clicks=data.total_clicks,
+            total_links=data.total_links,
+            unique_visitors=data.unique_visitors.value,
+            unique_visitors_exact=data.unique_visitors.exact,
+            unique_visitors_error=data.unique_visitors.error,
+            previous_period_clicks=data.previous_clicks,
+            previous_period_links=data.total_links,
+            previous_period_unique_visitors=data.previous_unique_visitors.value,
         ),
-        sparkline_data=[SparklinePoint(**point) for point in sparkline_data],
+        sparkline_data=[SparklinePoint(**point) for point in data.time_series],
         countries=countries,
         links=links_table_data,
+        links_next_cursor=data.next_links_cursor,
     )
+    body = response.model_dump_json().encode()
+    if settings.dashboard_cache_enabled:
+        dashboard_cache.set(user.id, cache_key, body, version=version)
+    return Response(content=body, media_type="application/json")
 
 
 @router.patch("/{link_id}/status", response_model=LinkListItem)
-def update_link_status_endpoint(
+async def update_link_status_endpoint(
     request: Request,
     link_id: int,
     is_active: bool = Query(..., description="New active status for the link"),
-    db: Session = Depends(get_db),
+    db: Database = Depends(get_database),
     user: User = Depends(get_current_user),
 ):
     """Update the active/inactive status of a link."""
-    link = update_link_status(db, user_id=user.id, link_id=link_id, is_active=is_active)
+    link = await db.run(update_link_status, user_id=user.id, link_id=link_id, is_active=is_active)
     if not link:
         raise HTTPException(status_code=404, detail="Link not found")
     
     base = str(request.base_url).rstrip("/")
+    click_count, last_clicked_at = get_live_click_counts([link])[link.id]
     return LinkListItem(
         id=link.id,
         slug=link.slug,
         target_url=link.target_url,
         is_active=link.is_active,
         created_at=link.created_at,
-        click_count=link.click_count,
-        last_clicked_at=link.last_clicked_at,
+        click_count=click_count,
+        last_clicked_at=last_clicked_at,
         short_url=f"{base}/{link.slug}",
     )
 
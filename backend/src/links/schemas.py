@@ -1,7 +1,9 @@
 from __future__ import annotations
 
 from datetime import datetime
-from pydantic import BaseModel, HttpUrl, field_serializer
+from typing import Any
+
+from pydantic import BaseModel, HttpUrl, ValidationInfo, field_serializer, model_validator
 
 
 class LinkCreateRequest(BaseModel):
@@ -20,6 +22,22 @@ class LinkResponse(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class BulkLinkItemResult(BaseModel):
+    index: int  # position in the request
+    ok: bool
+    target_url: str | None = None
+    id: int | None = None
+    slug: str | None = None
+    short_url: str | None = None
+    error: str | None = None
+
+
+class BulkLinkCreateResponse(BaseModel):
+    created: int
+    failed: int
+    results: list[BulkLinkItemResult]
+
+
 class LinkListItem(BaseModel):
     id: int
     slug: str
@@ -33,6 +51,10 @@ class LinkListItem(BaseModel):
     model_config = {"from_attributes": True}
 
 
+# ClickEventItem fields read from the click's user_agents row
+_USER_AGENT_FIELDS = ("device_category", "browser_name", "browser_version", "os_name", "os_version", "engine")
+
+
 class ClickEventItem(BaseModel):
     id: int
     clicked_at: datetime
@@ -47,11 +69,42 @@ class ClickEventItem(BaseModel):
 
     model_config = {"from_attributes": True}
 
+    @model_validator(mode="before")
+    @classmethod
+    def _decode_event(cls, data: Any, info: ValidationInfo) -> Any:
+        """
+        Build from a ClickEvent: referrer_id is decoded with the {id: host}
+        map passed as context["referrer_hosts"] (referrer_hosts.decode) and
+        the user agent fields come from its user_agents row.
+        """
+        if isinstance(data, dict):
+            return data
+        hosts = (info.context or {}).get("referrer_hosts", {})
+        return {
+            "id": data.id,
+            "clicked_at": data.clicked_at,
+            "referrer_host": hosts.get(data.referrer_id),
+            "country": data.country,
+            **{name: getattr(data.user_agent, name, None) for name in _USER_AGENT_FIELDS},
+        }
+
+
+class BreakdownItem(BaseModel):
+    value: str | None  # None: clicks without a value (no referrer, unparsed user agent)
+    clicks: int
+
 
 class LinkStatsResponse(BaseModel):
     link: LinkListItem
     clicks_last_24h: int
     unique_visitors: int
+    # False when unique_visitors is a HyperLogLog estimate; error is its relative standard error
+    unique_visitors_exact: bool = True
+    unique_visitors_error: float = 0.0
+    # all-time top values, compacted days included; recent_clicks only lists raw events
+    top_referrers: list[BreakdownItem] = []
+    devices: list[BreakdownItem] = []
+    browsers: list[BreakdownItem] = []
     recent_clicks: list[ClickEventItem]
 
 
@@ -66,6 +119,8 @@ class KPIData(BaseModel):
     total_clicks: int
     total_links: int
     unique_visitors: int
+    unique_visitors_exact: bool = True
+    unique_visitors_error: float = 0.0
     previous_period_clicks: int
     previous_period_links: int
     previous_period_unique_visitors: int
@@ -107,4 +162,5 @@ class DashboardResponse(BaseModel):
     kpis: KPIData
     sparkline_data: list[SparklinePoint]
     countries: list[CountryData]
-    links: list[LinkTableData]
\ No newline at end of file
+    links: list[LinkTableData]
+    links_next_cursor: str | None = None  # pass back as links_cursor for the next page
\ No newline at end of file
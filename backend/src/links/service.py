@@ -1,81 +1,279 @@
 from __future__ import annotations
 
+import logging
+from dataclasses import dataclass
 from datetime import datetime, timezone, timedelta
 
 from fastapi import Request
-from sqlalchemy import select, func, desc, and_, distinct, text
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func, desc, and_, distinct, text, insert, null
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, joinedload
 from src.core.config import settings
-
-from src.links.slug import slug_for_id
+from src.core.hll import HyperLogLog
+
+from src.links.buckets import BucketGrid, bucket_grid, epoch_bucket, fill_counts
+from src.links.cache import CachedLink, dashboard_cache, link_cache
+from src.links.slug_filter import slug_filter
+from src.links.rollups import (
+    DAY,
+    HOUR,
+    SKETCH_PRECISION,
+    apply_click_rollups,
+    country_rollup_query,
+    floor_day,
+    floor_hour,
+    hourly_rollup_query,
+    raw_edges,
+    split_range,
+    to_utc,
+    visitor_sketch_query,
+    where_clicked_between,
+)
+from src.links.click_writer import write_click_events
+from src.links.ids import link_ids
+from src.links.pagination import Page, encode_cursor, seek
+from src.links.retention import (
+    DIMENSIONS,
+    UNKNOWN,
+    aggregate_breakdown_query,
+    compacted_before,
+    decode_values,
+    group_column,
+)
+from src.links.dictionary import referrer_hosts
+from src.links.counters import Deltas, apply_click_deltas, click_counter, merge_deltas
+from src.links.slug import id_for_slug, slug_for_id
 from src.links.utils import (
     get_client_ip,
     get_referrer_host,
     get_ua_raw,
     make_visitor_hash,
     get_country_from_ip,
-    parse_user_agent,
 )
+from src.links.user_agents import user_agent_ids
 from src.models.link import Link
 from src.models.click_event import ClickEvent
+from src.models.click_rollup import ClickVisitorSketchHourly
+
+logger = logging.getLogger(__name__)
 
 
 def create_link(db: Session, *, user_id: int, target_url: str) -> Link:
-    link = Link(user_id=user_id, target_url=target_url, is_active=True)
+    # the id is known up front, so id and slug go out in one INSERT
+    link_id = link_ids.next(db.get_bind().engine)
+    link = Link(id=link_id, slug=slug_for_id(link_id), user_id=user_id, target_url=target_url, is_active=True)
     db.add(link)
-    db.flush()  # assigns link.id
-
-    link.slug = slug_for_id(link.id)
-
     db.commit()
+    slug_filter.add(link.slug)
+    dashboard_cache.invalidate_user(user_id)
     db.refresh(link)
     return link
 
 
+BULK_INSERT_CHUNK = 1_000
+
+
+@dataclass(frozen=True, slots=True)
+class BulkLinkResult:
+    """Outcome of one URL of create_links_bulk: the new link's id and slug, or an error."""
+    target_url: str
+    id: int | None = None
+    slug: str | None = None
+    error: str | None = None
+
+
+def create_links_bulk(db: Session, *, user_id: int, target_urls: list[str]) -> list[BulkLinkResult]:
+    """
+    Create one link per URL, BULK_INSERT_CHUNK at a time: each chunk takes
+    its ids from the link id allocator, computes the slugs in memory and is
+    written with a single multi-row INSERT and committed. A chunk that fails
+    is rolled back and reported per URL; the others are kept. Results are in
+    the order of `target_urls`.
+    """
+    results: list[BulkLinkResult] = []
+    created: list[str] = []
+    t = Link.__table__
+    for i in range(0, len(target_urls), BULK_INSERT_CHUNK):
+        chunk = target_urls[i:i + BULK_INSERT_CHUNK]
+        try:
+            ids = link_ids.allocate(db.get_bind().engine, len(chunk))
+            now = datetime.now(timezone.utc)
+            rows = [
+                {"id": link_id, "user_id": user_id, "slug": slug_for_id(link_id), "target_url": url,
+                 "is_active": True, "created_at": now}
+                for link_id, url in zip(ids, chunk)
+            ]
+            db.execute(insert(t), rows)
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            logger.exception("bulk link insert of %d rows failed", len(chunk))
+            results.extend(BulkLinkResult(url, error="could not be saved") for url in chunk)
+            continue
+        results.extend(BulkLinkResult(r["target_url"], r["id"], r["slug"]) for r in rows)
+        created.extend(r["slug"] for r in rows)
+
+    for slug in created:
+        slug_filter.add(slug)
+    if created:
+        dashboard_cache.invalidate_user(user_id)
+    return results
+
+
+_MAX_ROW_ID = 2**63 - 1  # BIGINT
+
+
 def get_active_link_by_slug(db: Session, *, slug: str) -> Link | None:
-    stmt = select(Link).where(Link.slug == slug, Link.is_active == True)  # noqa: E712
+    link_id = id_for_slug(slug)
+    if link_id is not None and link_id > _MAX_ROW_ID:
+        return None
+    if link_id is None:
+        # legacy slug: only the slug index can find it
+        stmt = select(Link).where(Link.slug == slug, Link.is_active == True)  # noqa: E712
+    else:
+        # primary key lookup; the slug check rejects strings that decode to an
+        # existing id without being that link's slug (e.g. legacy links)
+        stmt = select(Link).where(Link.id == link_id, Link.slug == slug, Link.is_active == True)  # noqa: E712
     return db.execute(stmt).scalar_one_or_none()
 
 
-def record_click(db: Session, *, link: Link, request: Request) -> None:
+def resolve_active_link(db: Session, *, slug: str) -> CachedLink | None:
     """
-    Record a click event with full analytics data.
-    Extracts IP, user agent, referrer from request, creates visitor hash,
-    looks up country (using raw IP but not storing it), and records everything.
+    Cached variant of get_active_link_by_slug for the redirect hot path.
+    Only hits the DB on a cache miss; misses for unknown/inactive slugs are not
+    cached, but slugs the slug filter has never seen are rejected without a query.
     """
-    # Extract analytics data from request
-    ip = get_client_ip(request)
-    ua = get_ua_raw(request)
-    referrer_host = get_referrer_host(request)
-    visitor_hash = make_visitor_hash(ip, ua)
-    
-    # Look up country using raw IP (but don't store the IP itself)
-    country = get_country_from_ip(ip)
-    
-    # Parse user agent for structured data
-    parsed_ua = parse_user_agent(ua)
-    
-    # Create click event with all analytics fields
-    evt = ClickEvent(
+    cached = link_cache.get(slug)
+    if cached is not None:
+        return cached
+    if not slug_filter.might_exist(db, slug):
+        return None
+
+    generation = link_cache.generation()
+    link = get_active_link_by_slug(db, slug=slug)
+    if not link:
+        slug_filter.record_not_found()
+        return None
+
+    entry = CachedLink(id=link.id, slug=link.slug, target_url=link.target_url)
+    link_cache.set(slug, entry, generation=generation)
+    return entry
+
+
+@dataclass(frozen=True, slots=True)
+class RawClick:
+    """
+    What the redirect captures from the request before responding.
+    Everything expensive (GeoIP, UA parsing, DB writes) happens later in enrich/persist.
+    """
+    link_id: int
+    clicked_at: datetime
+    ip: str | None
+    ua: str | None
+    referrer_host: str | None
+
+
+def capture_click(*, link: Link | CachedLink, request: Request) -> RawClick:
+    """Cheap header extraction only - safe to run on the redirect path."""
+    return RawClick(
         link_id=link.id,
-        referrer_host=referrer_host,
-        ua_raw=ua,
-        visitor_hash=visitor_hash,
-        country=country,
-        device_category=parsed_ua["device_category"],
-        browser_name=parsed_ua["browser_name"],
-        browser_version=parsed_ua["browser_version"],
-        os_name=parsed_ua["os_name"],
-        os_version=parsed_ua["os_version"],
-        engine=parsed_ua["engine"],
+        clicked_at=datetime.now(timezone.utc),
+        ip=get_client_ip(request),
+        ua=get_ua_raw(request),
+        referrer_host=get_referrer_host(request),
     )
-    db.add(evt)
 
-    # Update link statistics
-    link.click_count += 1
-    link.last_clicked_at = datetime.now(timezone.utc)
 
-    db.commit()
+def enrich_click(raw: RawClick, *, ua_id: int | None = None, referrer_id: int | None = None) -> dict:
+    """
+    Build the ClickEvent column values for a raw click, `ua_id` being its
+    user agent's row in user_agents (see user_agent_ids.resolve) and
+    `referrer_id` its referrer host's dictionary id (referrer_hosts.encode).
+    Looks up country using the raw IP but never stores the IP itself.
+    """
+    return {
+        "link_id": raw.link_id,
+        "clicked_at": raw.clicked_at,
+        "referrer_id": referrer_id,
+        "ua_id": ua_id,
+        "visitor_hash": make_visitor_hash(raw.ip, raw.ua),
+        "country": get_country_from_ip(raw.ip),
+    }
+
+
+def persist_click_batch(db: Session, raws: list[RawClick]) -> None:
+    """
+    Enrich and write a batch of clicks in one transaction.
+
+    User agents and referrer hosts are mapped to their ids first
+    (links/user_agents.py, links/dictionary.py; only values new to the tables
+    are inserted). Events go in with
+    one COPY or executemany INSERT (links/click_writer.py), along with their
+    hourly and per-country rollup increments
+    (links/rollups.py). Counters are coalesced per link: with CLICK_COUNTER_MODE=inline each link touched gets exactly one
+    UPDATE in the same transaction; with "deferred" the deltas are handed to
+    click_counter and folded into links periodically (see links/counters.py).
+    """
+    if not raws:
+        return
+
+    ua_ids = user_agent_ids.resolve(db, (raw.ua for raw in raws))
+    referrer_ids = referrer_hosts.encode(db, (raw.referrer_host for raw in raws))
+    rows = [
+        enrich_click(raw, ua_id=ua_ids.get(raw.ua), referrer_id=referrer_ids.get(raw.referrer_host))
+        for raw in raws
+    ]
+    write_click_events(db, rows)
+    apply_click_rollups(
+        db.connection(),
+        [(r["link_id"], r["clicked_at"], r["country"], r["visitor_hash"]) for r in rows],
+    )
+
+    touched: Deltas = {}
+    for raw in raws:
+        merge_deltas(touched, raw.link_id, 1, raw.clicked_at)
+
+    if click_counter.deferred:
+        db.commit()
+        # only counted once the events are durable
+        click_counter.add(touched)
+    else:
+        apply_click_deltas(db, touched)
+        db.commit()
+    dashboard_cache.links_clicked(touched)
+
+
+def persist_click(db: Session, raw: RawClick) -> None:
+    """Enrich a raw click and write it plus the link counters in one transaction."""
+    persist_click_batch(db, [raw])
+
+
+def record_click(db: Session, *, link: Link | CachedLink, request: Request) -> None:
+    """
+    Record a click event with full analytics data, synchronously.
+    The redirect uses the async ingestion pipeline (links/ingest.py) unless
+    CLICK_INGEST_MODE=sync; this is the inline path.
+    """
+    persist_click(db, capture_click(link=link, request=request))
+
+
+def warm_user_agent_cache(db: Session, *, limit: int, days: int = 1) -> int:
+    """
+    Load the user_agents ids of the most frequent UA strings seen in the last
+    `days` so the first clicks after a restart don't all look them up.
+    Returns how many were cached.
+    """
+    if limit <= 0:
+        return 0
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    stmt = (
+        select(ClickEvent.ua_id)
+        .where(ClickEvent.clicked_at >= since, ClickEvent.ua_id.isnot(None))
+        .group_by(ClickEvent.ua_id)
+        .order_by(desc(func.count()))
+        .limit(min(limit, settings.ua_id_cache_max_entries))
+    )
+    return user_agent_ids.warm(db, list(db.execute(stmt).scalars()))
 
 
 def list_links_for_user(db: Session, *, user_id: int, limit: int, offset: int) -> list[Link]:
@@ -89,6 +287,39 @@ def list_links_for_user(db: Session, *, user_id: int, limit: int, offset: int) -
     return list(db.execute(stmt).scalars().all())
 
 
+def list_links_page(
+    db: Session, *, user_id: int, limit: int, sort: str = "created", cursor: str | None = None, offset: int = 0
+) -> Page:
+    """
+    Up to `limit` of a user's links after `cursor`, newest first ("created"),
+    most clicked first ("clicks") or most recently clicked first
+    ("last_clicked", never-clicked links last). The page's next_cursor is None
+    on the last page. Sorting by clicks uses the stored counters, which trail
+    deferred click deltas by up to one flush interval. `offset` skips rows
+    after the cursor, for clients that still page by offset.
+    Raises ValueError for an invalid cursor.
+    """
+    stmt = seek(select(Link).where(Link.user_id == user_id), sort, cursor).limit(limit + 1).offset(offset)
+    links = list(db.execute(stmt).scalars().all())
+    if len(links) <= limit:
+        return Page(links, None)
+    links = links[:limit]
+    return Page(links, encode_cursor(sort, links[-1]))
+
+
+def list_link_ids_for_user(db: Session, *, user_id: int) -> list[int]:
+    return list(db.execute(select(Link.id).where(Link.user_id == user_id)).scalars())
+
+
+def get_live_click_counts(links: list[Link]) -> dict[int, tuple[int, datetime | None]]:
+    """
+    (click_count, last_clicked_at) per link id, including click deltas this
+    process has not folded into the links table yet. Use this instead of the
+    raw columns when showing counts to users.
+    """
+    return {link.id: click_counter.totals(link) for link in links}
+
+
 def get_link_for_user(db: Session, *, user_id: int, link_id: int) -> Link | None:
     stmt = select(Link).where(Link.id == link_id, Link.user_id == user_id)
     return db.execute(stmt).scalar_one_or_none()
@@ -96,16 +327,31 @@ def get_link_for_user(db: Session, *, user_id: int, link_id: int) -> Link | None
 
 def count_clicks_last_24h(db: Session, *, link_id: int) -> int:
     since = datetime.now(timezone.utc) - timedelta(hours=24)
-    stmt = select(func.count()).select_from(ClickEvent).where(
-        ClickEvent.link_id == link_id,
-        ClickEvent.clicked_at >= since,
-    )
-    return int(db.execute(stmt).scalar_one())
+    return _count_clicks(db, link_ids=[link_id], start_date=since, end_date=None)
+
+
+def _count_clicks(
+    db: Session, *, link_ids, start_date: datetime | None, end_date: datetime | None
+) -> int:
+    """
+    Clicks in [start_date, end_date]: whole hours come from click_rollup_hourly,
+    only the partial hours at either edge are counted from click_events.
+    """
+    split = split_range(start_date, end_date, unit=HOUR, raw_from=compacted_before(db))
+    total = 0
+    if not split.raw_only:
+        hourly = hourly_rollup_query(link_ids, split).subquery()
+        total += int(db.execute(select(func.sum(hourly.c.clicks))).scalar_one() or 0)
+    for start, end, end_inclusive in raw_edges(split):
+        stmt = select(func.count(ClickEvent.id)).where(ClickEvent.link_id.in_(link_ids))
+        total += int(db.execute(where_clicked_between(stmt, start, end, end_inclusive)).scalar_one())
+    return total
 
 
 def recent_click_events(db: Session, *, link_id: int, limit: int = 50) -> list[ClickEvent]:
     stmt = (
         select(ClickEvent)
+        .options(joinedload(ClickEvent.user_agent))
         .where(ClickEvent.link_id == link_id)
         .order_by(desc(ClickEvent.clicked_at))
         .limit(limit)
@@ -122,30 +368,16 @@ def get_total_clicks_for_user(
     stmt = select(func.sum(Link.click_count)).where(Link.user_id == user_id)
     
     if start_date or end_date:
-        # If date filtering, we need to count from ClickEvents instead
+        # If date filtering, we need to count clicks in the range instead
         link_ids_stmt = select(Link.id).where(Link.user_id == user_id)
-        click_stmt = select(func.count(ClickEvent.id)).where(ClickEvent.link_id.in_(link_ids_stmt))
-        
-        if start_date:
-            # Ensure UTC for consistent comparison
-            if start_date.tzinfo is not None:
-                start_date_utc = start_date.astimezone(timezone.utc)
-            else:
-                start_date_utc = start_date.replace(tzinfo=timezone.utc)
-            click_stmt = click_stmt.where(ClickEvent.clicked_at >= start_date_utc)
-        if end_date:
-            # Ensure UTC for consistent comparison
-            if end_date.tzinfo is not None:
-                end_date_utc = end_date.astimezone(timezone.utc)
-            else:
-                end_date_utc = end_date.replace(tzinfo=timezone.utc)
-            click_stmt = click_stmt.where(ClickEvent.clicked_at <= end_date_utc)
-        
-        result = db.execute(click_stmt).scalar_one()
-        return int(result) if result else 0
-    
+        return _count_clicks(db, link_ids=link_ids_stmt, start_date=start_date, end_date=end_date)
+
     result = db.execute(stmt).scalar_one()
-    return int(result) if result else 0
+    total = int(result) if result else 0
+    if click_counter.deferred:
+        link_ids = db.execute(select(Link.id).where(Link.user_id == user_id)).scalars()
+        total += click_counter.pending_total(link_ids)
+    return total
 
 
 def get_total_links_for_user(db: Session, *, user_id: int) -> int:
@@ -154,238 +386,290 @@ def get_total_links_for_user(db: Session, *, user_id: int) -> int:
     return int(db.execute(stmt).scalar_one())
 
 
+@dataclass(frozen=True, slots=True)
+class UniqueCount:
+    """A unique-visitor count; approximate counts are HyperLogLog estimates."""
+    value: int
+    exact: bool = True
+
+    @property
+    def error(self) -> float:
+        """Relative standard error of `value` (0.0 for exact counts)."""
+        return 0.0 if self.exact else HyperLogLog.relative_error(SKETCH_PRECISION)
+
+
+_UNIQUE_GROUPS = {
+    None: (None, None),
+    "link": (ClickEvent.link_id, ClickVisitorSketchHourly.link_id),
+    "country": (ClickEvent.country, ClickVisitorSketchHourly.country),
+}
+
+
+def count_unique_visitors(
+    db: Session,
+    *,
+    link_ids,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    by: str | None = None,
+) -> dict:
+    """
+    Distinct visitors in [start_date, end_date], grouped by None (a single
+    entry keyed None), "link" or "country" (clicks without a country are left
+    out). Groups without visitors are missing from the result.
+
+    Ranges with at most `unique_visitors_exact_max_clicks` clicks, and ranges
+    shorter than an hour, are counted exactly from click_events. Larger ranges
+    union the hourly visitor sketches of the whole hours with the visitor
+    hashes of the partial hours at either edge, so the cost no longer grows
+    with the number of clicks. Ranges reaching back before the raw events
+    kept by the retention job are always estimated.
+    """
+    event_group, sketch_group = _UNIQUE_GROUPS[by]
+    split = split_range(start_date, end_date, unit=HOUR, raw_from=compacted_before(db))
+
+    if not split.compacted and (split.raw_only or _count_clicks(
+        db, link_ids=link_ids, start_date=start_date, end_date=end_date
+    ) <= settings.unique_visitors_exact_max_clicks):
+        stmt = (
+            select(event_group if event_group is not None else null(), func.count(distinct(ClickEvent.visitor_hash)))
+            .where(ClickEvent.link_id.in_(link_ids), ClickEvent.visitor_hash.isnot(None))
+        )
+        if event_group is not None:
+            stmt = stmt.where(event_group.isnot(None)).group_by(event_group)
+        stmt = where_clicked_between(stmt, split.start, split.end, True)
+        return {group: UniqueCount(int(n)) for group, n in db.execute(stmt) if n}
+
+    sketches: dict = {}
+
+    def sketch_for(group) -> HyperLogLog:
+        sketch = sketches.get(group)
+        if sketch is None:
+            sketch = sketches[group] = HyperLogLog(SKETCH_PRECISION)
+        return sketch
+
+    for group, blob in db.execute(visitor_sketch_query(link_ids, split, sketch_group)):
+        sketch_for(group).merge_bytes(blob)
+    for start, end, end_inclusive in raw_edges(split):
+        stmt = (
+            select(event_group if event_group is not None else null(), ClickEvent.visitor_hash)
+            .where(ClickEvent.link_id.in_(link_ids), ClickEvent.visitor_hash.isnot(None))
+        )
+        if event_group is not None:
+            stmt = stmt.where(event_group.isnot(None))
+        for group, visitor_hash in db.execute(where_clicked_between(stmt, start, end, end_inclusive)):
+            sketch_for(group).add(visitor_hash)
+
+    counts = {group: UniqueCount(sketch.estimate(), exact=False) for group, sketch in sketches.items()}
+    return {group: count for group, count in counts.items() if count.value}
+
+
+def get_unique_visitor_count_for_user(
+    db: Session, *, user_id: int, start_date: datetime | None = None, end_date: datetime | None = None
+) -> UniqueCount:
+    """Unique visitors across all user's links, with whether the count is exact."""
+    link_ids_stmt = select(Link.id).where(Link.user_id == user_id)
+    counts = count_unique_visitors(db, link_ids=link_ids_stmt, start_date=start_date, end_date=end_date)
+    return counts.get(None, UniqueCount(0))
+
+
+def get_unique_visitor_count_for_link(
+    db: Session, *, link_id: int, start_date: datetime | None = None, end_date: datetime | None = None
+) -> UniqueCount:
+    """Unique visitors of a single link, with whether the count is exact."""
+    counts = count_unique_visitors(db, link_ids=[link_id], start_date=start_date, end_date=end_date)
+    return counts.get(None, UniqueCount(0))
+
+
 def get_unique_visitors_for_user(
     db: Session, *, user_id: int, start_date: datetime | None = None, end_date: datetime | None = None
 ) -> int:
     """Get count of unique visitors (distinct visitor_hash) across all user's links."""
-    link_ids_stmt = select(Link.id).where(Link.user_id == user_id)
-    
-    stmt = (
-        select(func.count(distinct(ClickEvent.visitor_hash)))
-        .where(
-            ClickEvent.link_id.in_(link_ids_stmt),
-            ClickEvent.visitor_hash.isnot(None),
-        )
-    )
-    
-    if start_date:
-        # Ensure UTC for consistent comparison
-        if start_date.tzinfo is not None:
-            start_date_utc = start_date.astimezone(timezone.utc)
-        else:
-            start_date_utc = start_date.replace(tzinfo=timezone.utc)
-        stmt = stmt.where(ClickEvent.clicked_at >= start_date_utc)
-    if end_date:
-        # Ensure UTC for consistent comparison
-        if end_date.tzinfo is not None:
-            end_date_utc = end_date.astimezone(timezone.utc)
-        else:
-            end_date_utc = end_date.replace(tzinfo=timezone.utc)
-        stmt = stmt.where(ClickEvent.clicked_at <= end_date_utc)
-    
-    result = db.execute(stmt).scalar_one()
-    return int(result) if result else 0
+    return get_unique_visitor_count_for_user(db, user_id=user_id, start_date=start_date, end_date=end_date).value
 
 
 def get_unique_visitors_per_link(
     db: Session, *, link_ids: list[int], start_date: datetime | None = None, end_date: datetime | None = None
 ) -> dict[int, int]:
     """Get unique visitor count per link. Returns dict mapping link_id to count."""
-    stmt = (
-        select(
-            ClickEvent.link_id,
-            func.count(distinct(ClickEvent.visitor_hash)).label("unique_count")
-        )
-        .where(
-            ClickEvent.link_id.in_(link_ids),
-            ClickEvent.visitor_hash.isnot(None),
-        )
-        .group_by(ClickEvent.link_id)
-    )
-    
-    if start_date:
-        stmt = stmt.where(ClickEvent.clicked_at >= start_date)
-    if end_date:
-        stmt = stmt.where(ClickEvent.clicked_at <= end_date)
-    
-    results = db.execute(stmt).all()
-    return {row.link_id: int(row.unique_count) for row in results}
+    counts = count_unique_visitors(db, link_ids=link_ids, start_date=start_date, end_date=end_date, by="link")
+    return {link_id: count.value for link_id, count in counts.items()}
 
 
 def get_unique_visitors_for_link(
     db: Session, *, link_id: int, start_date: datetime | None = None, end_date: datetime | None = None
 ) -> int:
     """Get unique visitor count for a single link."""
-    stmt = (
-        select(func.count(distinct(ClickEvent.visitor_hash)))
-        .where(
-            ClickEvent.link_id == link_id,
-            ClickEvent.visitor_hash.isnot(None),
-        )
-    )
-    
-    if start_date:
-        # Ensure UTC for consistent comparison
-        if start_date.tzinfo is not None:
-            start_date_utc = start_date.astimezone(timezone.utc)
-        else:
-            start_date_utc = start_date.replace(tzinfo=timezone.utc)
-        stmt = stmt.where(ClickEvent.clicked_at >= start_date_utc)
-    if end_date:
-        # Ensure UTC for consistent comparison
-        if end_date.tzinfo is not None:
-            end_date_utc = end_date.astimezone(timezone.utc)
-        else:
-            end_date_utc = end_date.replace(tzinfo=timezone.utc)
-        stmt = stmt.where(ClickEvent.clicked_at <= end_date_utc)
-    
-    result = db.execute(stmt).scalar()
-    return int(result) if result else 0
+    return get_unique_visitor_count_for_link(db, link_id=link_id, start_date=start_date, end_date=end_date).value
 
 
 def get_clicks_by_country(
     db: Session, *, user_id: int, start_date: datetime | None = None, end_date: datetime | None = None
 ) -> list[dict[str, int]]:
-    """Get clicks aggregated by country code. Returns list of {country_code, clicks, unique_visitors}."""
+    """
+    Get clicks aggregated by country code. Returns list of {country_code, clicks, unique_visitors}.
+    Clicks for whole UTC days come from click_rollup_country_daily; partial days
+    at either edge are read from click_events. Unique visitors are counted by
+    count_unique_visitors and may be estimates for large ranges.
+    """
     link_ids_stmt = select(Link.id).where(Link.user_id == user_id)
-    
-    stmt = (
-        select(
-            ClickEvent.country,
-            func.count(ClickEvent.id).label("clicks"),
-            func.count(distinct(ClickEvent.visitor_hash)).label("unique_visitors")
-        )
-        .where(
-            ClickEvent.link_id.in_(link_ids_stmt),
-            ClickEvent.country.isnot(None),
+
+    clicks: dict[str, int] = {}
+    split = split_range(start_date, end_date, unit=DAY, raw_from=compacted_before(db))
+    if not split.raw_only:
+        for row in db.execute(country_rollup_query(link_ids_stmt, split)):
+            clicks[row.country] = clicks.get(row.country, 0) + int(row.clicks)
+    for start, end, end_inclusive in raw_edges(split):
+        stmt = (
+            select(ClickEvent.country, func.count(ClickEvent.id).label("clicks"))
+            .where(ClickEvent.link_id.in_(link_ids_stmt), ClickEvent.country.isnot(None))
+            .group_by(ClickEvent.country)
         )
-        .group_by(ClickEvent.country)
-        .order_by(desc("clicks"))
+        for row in db.execute(where_clicked_between(stmt, start, end, end_inclusive)):
+            clicks[row.country] = clicks.get(row.country, 0) + int(row.clicks)
+
+    uniques = count_unique_visitors(
+        db, link_ids=link_ids_stmt, start_date=start_date, end_date=end_date, by="country"
     )
-    
-    # Apply date filters - ensure timezone-aware datetimes work with SQLite
-    if start_date:
-        # Convert to UTC if timezone-aware, or ensure it's timezone-aware
-        if start_date.tzinfo is not None:
-            # Convert to UTC for consistent comparison
-            start_date_utc = start_date.astimezone(timezone.utc)
-        else:
-            start_date_utc = start_date.replace(tzinfo=timezone.utc)
-        stmt = stmt.where(ClickEvent.clicked_at >= start_date_utc)
-    
-    if end_date:
-        # Convert to UTC if timezone-aware, or ensure it's timezone-aware
-        if end_date.tzinfo is not None:
-            # Convert to UTC for consistent comparison
-            end_date_utc = end_date.astimezone(timezone.utc)
-        else:
-            end_date_utc = end_date.replace(tzinfo=timezone.utc)
-        stmt = stmt.where(ClickEvent.clicked_at <= end_date_utc)
-    
-    results = db.execute(stmt).all()
+
     return [
         {
-            "country_code": row.country,
-            "clicks": int(row.clicks),
-            "unique_visitors": int(row.unique_visitors) if row.unique_visitors else 0,
+            "country_code": country,
+            "clicks": count,
+            "unique_visitors": uniques[country].value if country in uniques else 0,
         }
-        for row in results
+        for country, count in sorted(clicks.items(), key=lambda item: (-item[1], item[0]))
+        if count > 0
     ]
 
 
+def get_click_breakdown(
+    db: Session,
+    *,
+    link_ids,
+    dimension: str,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    limit: int = 10,
+) -> list[dict]:
+    """
+    Top `limit` values of a click dimension ("country", "device", "browser" or
+    "referrer") as {value, clicks}, value None for clicks without one. Days
+    the retention job has compacted come from click_aggregate_daily, whole
+    days, and the rest from click_events.
+    """
+    column = DIMENSIONS[dimension]
+    start = to_utc(start_date) if start_date is not None else None
+    end = to_utc(end_date) if end_date is not None else None
+    clicks: dict[str | None, int] = {}
+
+    raw_from = compacted_before(db)
+    if raw_from is not None and (start is None or start < raw_from):
+        folded_end = raw_from if end is None or end >= raw_from else floor_day(end) + DAY
+        for value, count in db.execute(aggregate_breakdown_query(link_ids, dimension, start, folded_end)):
+            key = value if value != UNKNOWN else None
+            clicks[key] = clicks.get(key, 0) + int(count)
+        start = folded_end
+    if end is None or start is None or start <= end:
+        key = group_column(column)
+        stmt = (
+            select(key, func.count(ClickEvent.id))
+            .where(ClickEvent.link_id.in_(link_ids))
+            .group_by(key)
+        )
+        result = db.execute(where_clicked_between(stmt, start, end, True)).all()
+        values = decode_values(db, column, {k for k, _ in result})
+        for k, count in result:
+            clicks[values[k]] = clicks.get(values[k], 0) + int(count)
+
+    ranked = sorted(clicks.items(), key=lambda item: (-item[1], item[0] is None, item[0] or ""))
+    return [{"value": value, "clicks": count} for value, count in ranked[:limit] if count > 0]
+
+
 def get_clicks_time_series(
-    db: Session, *, user_id: int, start_date: datetime, end_date: datetime, granularity: str = "hour"
+    db: Session,
+    *,
+    user_id: int,
+    start_date: datetime,
+    end_date: datetime,
+    granularity: str = "hour",
+    tz: str = "UTC",
+    fill_gaps: bool = False,
 ) -> list[dict[str, int]]:
     """
     Get time-series click data for sparklines.
-    granularity: "hour", "day", "month"
-    Returns list of {timestamp: str (ISO), value: int}
-    Supports both PostgreSQL (date_trunc) and SQLite (strftime).
+    granularity: "hour", "day", "week", "month" or a width like "5m", "15m", "6h"
+    (see links/buckets.py), in time zone `tz`.
+    Returns list of {timestamp: str (ISO, in tz), value: int}; with fill_gaps
+    every bucket in the range is returned, empty ones with value 0.
+    Raises ValueError for an unsupported granularity or time zone.
     """
+    grid = bucket_grid(to_utc(start_date), to_utc(end_date), granularity, tz)
     link_ids_stmt = select(Link.id).where(Link.user_id == user_id)
-    
-    # Check if using SQLite
-    is_sqlite = settings.database_url.startswith("sqlite")
-    
-    # Determine date truncation based on database and granularity
-    if is_sqlite:
-        # SQLite uses strftime for date truncation
-        if granularity == "hour":
-            trunc_func = func.strftime("%Y-%m-%d %H:00:00", ClickEvent.clicked_at)
-        elif granularity == "day":
-            trunc_func = func.date(ClickEvent.clicked_at)
-        elif granularity == "month":
-            trunc_func = func.strftime("%Y-%m-01 00:00:00", ClickEvent.clicked_at)
-        else:
-            trunc_func = func.strftime("%Y-%m-%d %H:00:00", ClickEvent.clicked_at)
+    if grid.hour_aligned:
+        counts = _hourly_click_counts(db, link_ids=link_ids_stmt, start_date=start_date, end_date=end_date)
     else:
-        # PostgreSQL uses date_trunc
-        if granularity == "hour":
-            trunc_func = func.date_trunc("hour", ClickEvent.clicked_at)
-        elif granularity == "day":
-            trunc_func = func.date_trunc("day", ClickEvent.clicked_at)
-        elif granularity == "month":
-            trunc_func = func.date_trunc("month", ClickEvent.clicked_at)
-        else:
-            trunc_func = func.date_trunc("hour", ClickEvent.clicked_at)
-    
+        counts = _epoch_click_counts(db, link_ids=link_ids_stmt, start_date=start_date, end_date=end_date, grid=grid)
+    return grid.series(fill_counts(grid, counts), fill_gaps=fill_gaps)
+
+
+def _hourly_click_counts(db: Session, *, link_ids, start_date: datetime, end_date: datetime) -> dict[datetime, int]:
+    """
+    Clicks per UTC hour in [start_date, end_date]. Whole hours come from
+    click_rollup_hourly; the partial hour at either edge is counted from click_events.
+    """
+    hours: dict[datetime, int] = {}
+    split = split_range(start_date, end_date, unit=HOUR, raw_from=compacted_before(db))
+    if not split.raw_only:
+        for row in db.execute(hourly_rollup_query(link_ids, split)):
+            hour = floor_hour(row.hour)
+            hours[hour] = hours.get(hour, 0) + int(row.clicks)
+    edges = raw_edges(split)
+    if split.raw_only and floor_hour(split.start) < floor_hour(split.end):
+        # a sub-hour range that crosses an hour boundary
+        boundary = floor_hour(split.end)
+        edges = [(split.start, boundary, False), (boundary, split.end, True)]
+    for start, end, end_inclusive in edges:
+        # each edge lies within a single hour
+        stmt = select(func.count(ClickEvent.id)).where(ClickEvent.link_id.in_(link_ids))
+        count = int(db.execute(where_clicked_between(stmt, start, end, end_inclusive)).scalar_one())
+        if count:
+            hour = floor_hour(start)
+            hours[hour] = hours.get(hour, 0) + count
+    return hours
+
+
+def _epoch_click_counts(
+    db: Session, *, link_ids, start_date: datetime, end_date: datetime, grid: BucketGrid
+) -> dict[datetime, int]:
+    """
+    Clicks per grid.base_seconds cell, for buckets that don't fall on whole
+    hours. Grouped by integer epoch division in SQL over the
+    (link_id, clicked_at) index range. Hours whose raw events the retention
+    job has deleted count in the bucket their hour starts in.
+    """
+    start, end = to_utc(start_date), to_utc(end_date)
+    counts: dict[datetime, int] = {}
+    raw_from = compacted_before(db)
+    if raw_from is not None and start < raw_from:
+        split = split_range(start, min(end, raw_from), unit=HOUR, raw_from=raw_from)
+        for row in db.execute(hourly_rollup_query(link_ids, split)):
+            hour = max(floor_hour(row.hour), grid.edges[0])
+            counts[hour] = counts.get(hour, 0) + int(row.clicks)
+        start = raw_from
+        if start > end:
+            return counts
+
+    cell = epoch_bucket(ClickEvent.clicked_at, grid.base_seconds).label("cell")
     stmt = (
-        select(
-            trunc_func.label("time_bucket"),
-            func.count(ClickEvent.id).label("count")
-        )
-        .where(
-            ClickEvent.link_id.in_(link_ids_stmt),
-            ClickEvent.clicked_at >= start_date,
-            ClickEvent.clicked_at <= end_date,
-        )
-        .group_by(trunc_func)
-        .order_by(trunc_func)
+        select(cell, func.count(ClickEvent.id))
+        .where(ClickEvent.link_id.in_(link_ids))
+        .group_by(cell)
     )
-    
-    results = db.execute(stmt).all()
-    
-    # Convert results to proper format
-    formatted_results = []
-    for row in results:
-        time_bucket = row.time_bucket
-        
-        # For SQLite, time_bucket is a string, convert to datetime
-        if isinstance(time_bucket, str):
-            try:
-                # Parse SQLite date/time formats
-                if granularity == "hour":
-                    # Format: "YYYY-MM-DD HH:00:00"
-                    time_bucket = datetime.strptime(time_bucket, "%Y-%m-%d %H:00:00")
-                elif granularity == "day":
-                    # Format: "YYYY-MM-DD"
-                    time_bucket = datetime.strptime(time_bucket, "%Y-%m-%d")
-                elif granularity == "month":
-                    # Format: "YYYY-MM-01 00:00:00"
-                    time_bucket = datetime.strptime(time_bucket, "%Y-%m-%d %H:%M:%S")
-                else:
-                    time_bucket = datetime.strptime(time_bucket, "%Y-%m-%d %H:00:00")
-                # Make timezone-aware (assume UTC)
-                if time_bucket.tzinfo is None:
-                    time_bucket = time_bucket.replace(tzinfo=timezone.utc)
-            except (ValueError, TypeError) as e:
-                # If parsing fails, log and skip this row
-                print(f"Warning: Failed to parse time_bucket '{time_bucket}': {e}")
-                continue
-        
-        # Convert to ISO format string
-        if isinstance(time_bucket, datetime):
-            timestamp_str = time_bucket.isoformat()
-        else:
-            # Fallback: use string as-is (shouldn't happen)
-            timestamp_str = str(time_bucket)
-        
-        formatted_results.append({
-            "timestamp": timestamp_str,
-            "value": int(row.count),
-        })
-    
-    return formatted_results
+    stmt = where_clicked_between(stmt, start, end, True)
+    for n, count in db.execute(stmt):
+        counts[grid.cell_start(n)] = counts.get(grid.cell_start(n), 0) + int(count)
+    return counts
 
 
 def get_previous_period_metrics(
@@ -419,5 +703,9 @@ def update_link_status(db: Session, *, user_id: int, link_id: int, is_active: bo
     link.is_active = is_active
     db.commit()
     db.refresh(link)
+
+    if link.slug:
+        link_cache.invalidate(link.slug)
+    dashboard_cache.invalidate_user(user_id)
     return link
 
@@ -1,12 +1,17 @@
 from __future__ import annotations
 
+import hashlib
+
 _ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
 _BASE = len(_ALPHABET)
+_INDEX = {c: i for i, c in enumerate(_ALPHABET)}
 _MASK_64 = (1 << 64) - 1
 
 # Keep these stable once you ship. MULT must be odd.
 MULT = 11400714819323198485
 XOR_SECRET = 0xA5A5A5A5A5A5A5A5
+FEISTEL_KEY = b"url-shortener-slug-v1"
+FEISTEL_ROUNDS = 8
 
 
 def shuffle_64(x: int) -> int:
@@ -29,10 +34,111 @@ def base62_encode(n: int) -> str:
     return "".join(reversed(out))
 
 
+# Legacy codec: shuffle then reduce mod 62^7. Not invertible and can collide;
+# kept only to document how slugs of existing links were generated.
 SPACE = 62 ** 7
 
-def slug_for_id(id_value: int) -> str:
+
+def legacy_slug_for_id(id_value: int) -> str:
     shuffled = shuffle_64(id_value)
     bounded = shuffled % SPACE
     return base62_encode(bounded)
 
+
+# Current codec: ids are split into consecutive domains and each id is run
+# through a keyed Feistel permutation of its domain, then written fixed-width.
+#
+#   ids [0, 62^6)              -> "0" + 6 chars   (7 chars)
+#   next 62^8 ids              -> 8 chars
+#   next 62^9 ids              -> 9 chars, ...
+#
+# Legacy slugs never start with "0" when they are 7 chars long (base62_encode
+# emits no leading zeros) and are never longer than 7, so the two codecs can't
+# produce the same string and a slug's shape tells which codec made it.
+_LEGACY_MAX_LENGTH = 7
+_FIRST_PREFIX = "0"
+
+
+def _domains():
+    """Yields (length, prefix, size) for each domain in order."""
+    yield _LEGACY_MAX_LENGTH, _FIRST_PREFIX, _BASE ** (_LEGACY_MAX_LENGTH - len(_FIRST_PREFIX))
+    length = _LEGACY_MAX_LENGTH + 1
+    while True:
+        yield length, "", _BASE ** length
+        length += 1
+
+
+def _round(i: int, value: int, modulus: int) -> int:
+    # 16 bytes covers every domain an id can reach; wider halves only come from
+    # decoding over-long strings and must not overflow
+    width = max(16, (value.bit_length() + 7) // 8)
+    digest = hashlib.blake2b(
+        value.to_bytes(width, "big") + bytes([i]), key=FEISTEL_KEY, digest_size=8
+    ).digest()
+    return int.from_bytes(digest, "big") % modulus
+
+
+def _split(size: int, digits: int) -> tuple[int, int]:
+    high = _BASE ** ((digits + 1) // 2)
+    return high, size // high
+
+
+def _permute(x: int, size: int, digits: int) -> int:
+    # FE1-style Feistel over [0, a*b): each round is a bijection of the domain
+    a, b = _split(size, digits)
+    for i in range(FEISTEL_ROUNDS):
+        left, right = divmod(x, b)
+        x = a * right + (left + _round(i, right, a)) % a
+    return x
+
+
+def _unpermute(x: int, size: int, digits: int) -> int:
+    a, b = _split(size, digits)
+    for i in reversed(range(FEISTEL_ROUNDS)):
+        right, w = divmod(x, a)
+        x = b * ((w - _round(i, right, a)) % a) + right
+    return x
+
+
+def _encode_fixed(n: int, width: int) -> str:
+    return base62_encode(n).rjust(width, _ALPHABET[0])
+
+
+def slug_for_id(id_value: int) -> str:
+    """Unique, non-sequential slug for an id; invert with id_for_slug()."""
+    if id_value < 0:
+        raise ValueError("id must be non-negative")
+    offset = 0
+    for length, prefix, size in _domains():
+        if id_value < offset + size:
+            digits = length - len(prefix)
+            return prefix + _encode_fixed(_permute(id_value - offset, size, digits), digits)
+        offset += size
+    raise AssertionError("unreachable")
+
+
+def id_for_slug(slug: str) -> int | None:
+    """
+    The id slug_for_id() produced this slug from, or None for legacy slugs and
+    strings that aren't valid slugs. Any well-formed string decodes to some id,
+    so callers must still check the row's slug matches.
+    """
+    if not _LEGACY_MAX_LENGTH <= len(slug) <= _MAX_LENGTH or any(c not in _INDEX for c in slug):
+        return None
+    offset = 0
+    for length, prefix, size in _domains():
+        if length == len(slug):
+            if not slug.startswith(prefix):
+                return None
+            digits = length - len(prefix)
+            n = 0
+            for c in slug[len(prefix):]:
+                n = n * _BASE + _INDEX[c]
+            return offset + _unpermute(n, size, digits)
+        offset += size
+    return None
+
+
+
+# ids are BIGINT, so no slug is longer than the largest one's
+_MAX_LENGTH = len(slug_for_id(2**63 - 1))
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Callable
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from src.core.bloom import BloomFilter
+from src.core.config import settings
+from src.core.metrics import register_metrics
+from src.db.session import SessionLocal
+from src.links.slug import id_for_slug
+from src.models.link import Link
+
+logger = logging.getLogger(__name__)
+
+# Incremental refreshes re-read this many ids below the watermark, so a link
+# whose transaction committed after a higher id was already seen isn't missed.
+_REFRESH_OVERLAP = 1_000
+
+
+class SlugFilter:
+    """
+    Bloom filter of every existing slug, so the redirect can 404 random
+    strings without a DB round-trip.
+
+    build() sizes the filter from the row count (times `headroom`) and loads
+    all slugs; create_link calls add() for links created in this process.
+    Links created by other processes are picked up by refresh(), an indexed
+    `id > watermark` query that the redirect runs on a negative answer at most
+    once per refresh_interval, so a brand-new link from another worker can
+    404 for at most that long. Link ids come from per-process hi-lo blocks
+    (links/ids.py), so another process can still insert an id far below the
+    watermark that no refresh re-reads; a rejected slug that decodes to an id
+    at or below the watermark is therefore checked with a primary key lookup
+    (and added when found). Random strings decode to ids far above it and
+    stay query-free. When more slugs are added than the filter was sized
+    for, it is rebuilt in the background.
+
+    Until the first build completes (or if it fails) might_exist() is always
+    True, i.e. every lookup goes to the database as before.
+    """
+
+    def __init__(
+        self,
+        *,
+        fp_rate: float = 0.01,
+        headroom: float = 2.0,
+        min_capacity: int = 10_000,
+        refresh_interval: float = 1.0,
+        session_factory: Callable[[], Session] = SessionLocal,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.fp_rate = fp_rate
+        self.headroom = headroom
+        self.min_capacity = min_capacity
+        self.refresh_interval = refresh_interval
+        self._session_factory = session_factory
+        self._clock = clock
+
+        self._bloom: BloomFilter | None = None
+        self._watermark = 0
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+        # slugs added while a rebuild is loading, replayed into the new filter
+        self._rebuild_adds: list[str] | None = None
+
+        self.rejected = 0
+        self.passed = 0
+        self.passed_not_found = 0
+        self.refreshes = 0
+        self.rebuilds = 0
+        self.late_found = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._bloom is not None
+
+    def build(self, db: Session) -> None:
+        rows = db.execute(select(func.count()).select_from(Link)).scalar_one()
+        capacity = max(self.min_capacity, int(rows * self.headroom))
+        bloom = BloomFilter(capacity=capacity, fp_rate=self.fp_rate)
+
+        with self._lock:
+            self._rebuild_adds = []
+        try:
+            watermark = self._load(db, bloom, after_id=0)
+        except Exception:
+            with self._lock:
+                self._rebuild_adds = None
+            raise
+
+        with self._lock:
+            for slug in self._rebuild_adds:
+                bloom.add(slug)
+            self._rebuild_adds = None
+            self._bloom = bloom
+            self._watermark = max(self._watermark, watermark)
+            self._last_refresh = self._clock()
+            self.rebuilds += 1
+
+    def refresh(self, db: Session) -> None:
+        """Add slugs of links created (by any process) since the last build/refresh."""
+        bloom = self._bloom
+        if bloom is None:
+            return
+        watermark = self._load(db, bloom, after_id=max(0, self._watermark - _REFRESH_OVERLAP))
+        with self._lock:
+            self._watermark = max(self._watermark, watermark)
+            self._last_refresh = self._clock()
+            self.refreshes += 1
+        self._maybe_grow()
+
+    def add(self, slug: str) -> None:
+        bloom = self._bloom
+        if bloom is None:
+            return
+        bloom.add(slug)
+        with self._lock:
+            if self._rebuild_adds is not None:
+                self._rebuild_adds.append(slug)
+        self._maybe_grow()
+
+    def might_exist(self, db: Session, slug: str) -> bool:
+        bloom = self._bloom
+        if bloom is None or bloom.might_contain(slug):
+            self._count("passed")
+            return True
+        if self._clock() - self._last_refresh >= self.refresh_interval:
+            self.refresh(db)
+            if self._bloom.might_contain(slug):
+                self._count("passed")
+                return True
+        if self._inserted_late(db, slug):
+            self.add(slug)
+            self._count("passed")
+            self._count("late_found")
+            return True
+        self._count("rejected")
+        return False
+
+    def _inserted_late(self, db: Session, slug: str) -> bool:
+        """Whether the slug belongs to a link with an id at or below the watermark that loads skipped."""
+        link_id = id_for_slug(slug)
+        if link_id is None or link_id > self._watermark:
+            return False
+        return db.scalar(select(Link.slug).where(Link.id == link_id)) == slug
+
+    def record_not_found(self) -> None:
+        """A slug passed the filter but the DB had no active link (false positive or inactive)."""
+        self._count("passed_not_found")
+
+    def reset(self) -> None:
+        with self._lock:
+            self._bloom = None
+            self._watermark = 0
+            self._last_refresh = 0.0
+            self._rebuild_adds = None
+
+    def stats(self) -> dict[str, int | float | bool]:
+        bloom = self._bloom
+        with self._lock:
+            return {
+                "ready": bloom is not None,
+                "items": bloom.count if bloom else 0,
+                "capacity": bloom.capacity if bloom else 0,
+                "num_bits": bloom.num_bits if bloom else 0,
+                "num_hashes": bloom.num_hashes if bloom else 0,
+                "memory_bytes": bloom.memory_bytes if bloom else 0,
+                "target_fp_rate": self.fp_rate,
+                "estimated_fp_rate": bloom.estimated_fp_rate() if bloom else 0.0,
+                # upper bound: also counts slugs of inactive links
+                "observed_fp_rate": (self.passed_not_found / self.passed) if self.passed else 0.0,
+                "rejected": self.rejected,
+                "passed": self.passed,
+                "passed_not_found": self.passed_not_found,
+                "refreshes": self.refreshes,
+                "rebuilds": self.rebuilds,
+                "late_found": self.late_found,
+            }
+
+    def _load(self, db: Session, bloom: BloomFilter, *, after_id: int) -> int:
+        stmt = (
+            select(Link.id, Link.slug)
+            .where(Link.id > after_id, Link.slug.isnot(None))
+            .order_by(Link.id)
+            .execution_options(yield_per=10_000)
+        )
+        watermark = after_id
+        for link_id, slug in db.execute(stmt):
+            bloom.add(slug)
+            watermark = link_id
+        return watermark
+
+    def _maybe_grow(self) -> None:
+        bloom = self._bloom
+        with self._lock:
+            if bloom is None or bloom.count <= bloom.capacity or self._rebuild_adds is not None:
+                return
+            # claim the rebuild so concurrent adds don't start another one
+            self._rebuild_adds = []
+        threading.Thread(target=self._rebuild, name="slug-filter-rebuild", daemon=True).start()
+
+    def _rebuild(self) -> None:
+        with self._lock:
+            self._rebuild_adds = None
+        db = self._session_factory()
+        try:
+            self.build(db)
+        except Exception:
+            logger.exception("slug filter rebuild failed")
+        finally:
+            db.close()
+
+    def _count(self, attr: str) -> None:
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+
+slug_filter = SlugFilter(
+    fp_rate=settings.slug_filter_fp_rate,
+    headroom=settings.slug_filter_headroom,
+    refresh_interval=settings.slug_filter_refresh_seconds,
+)
+
+register_metrics("slug_filter", slug_filter.stats)
@@ -0,0 +1,150 @@
+"""
+The user_agents dimension table. Each distinct user agent string is stored
+once, with its parsed fields, under the SHA-256 of the string; click events
+only carry its integer id (click_events.ua_id).
+
+user_agent_ids maps strings to ids and ids to parsed fields in process.
+Rows are never changed or deleted, so cached entries can't go stale. Strings
+not in the table yet are parsed and inserted in a short transaction of their
+own, committed before any click refers to them; concurrent writers inserting
+the same string both end up with the one row that won.
+"""
+from __future__ import annotations
+
+import sys
+from typing import Iterable
+
+from sqlalchemy import select
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.core.cache import TTLCache
+from src.core.config import settings
+from src.core.metrics import register_metrics
+from src.links.rollups import dialect_insert
+from src.links.utils import parse_user_agent, ua_hash
+from src.models.user_agent import UserAgent
+
+# parsed fields of a user agent, as stored in user_agents
+FIELDS = ("device_category", "browser_name", "browser_version", "os_name", "os_version", "engine")
+
+# hashes per IN (...) lookup
+_LOOKUP_CHUNK = 500
+
+
+def _sizeof_fields(key: int, value: dict[str, str | None]) -> int:
+    return sys.getsizeof(key) + sys.getsizeof(value) + sum(sys.getsizeof(v) for v in value.values())
+
+
+class UserAgentIds:
+    """In-process cache of user_agents: string -> id, and id -> parsed fields."""
+
+    def __init__(self, *, max_entries: int) -> None:
+        self._ids = TTLCache(name="user_agent_ids", max_entries=max_entries)
+        self._fields = TTLCache(name="user_agent_fields", max_entries=max_entries, sizeof=_sizeof_fields)
+        self.inserted = 0
+
+    def resolve(self, db: Session, ua_strings: Iterable[str | None]) -> dict[str, int]:
+        """
+        Ids of the given UA strings (empty ones are left out), inserting the
+        ones the table doesn't have yet. Call it before the session writes
+        anything: on SQLite the insert waits for open write transactions.
+        """
+        ids: dict[str, int] = {}
+        missing: dict[str, str] = {}
+        for ua in set(ua_strings):
+            if not ua:
+                continue
+            ua_id = self._ids.get(ua)
+            if ua_id is None:
+                missing[ua_hash(ua)] = ua
+            else:
+                ids[ua] = ua_id
+        if missing:
+            with db.get_bind().engine.begin() as conn:
+                self._load(conn, missing, ids)
+                new = {h: ua for h, ua in missing.items() if ua not in ids}
+                if new:
+                    self._insert(conn, new)
+                    self._load(conn, new, ids)
+        return ids
+
+    def fields(self, db: Session, ua_ids: Iterable[int | None]) -> dict[int, dict[str, str | None]]:
+        """Parsed fields of the given user_agents ids."""
+        result: dict[int, dict[str, str | None]] = {}
+        missing = []
+        for ua_id in set(ua_ids):
+            if ua_id is None:
+                continue
+            cached = self._fields.get(ua_id)
+            if cached is None:
+                missing.append(ua_id)
+            else:
+                result[ua_id] = cached
+        for i in range(0, len(missing), _LOOKUP_CHUNK):
+            stmt = select(UserAgent.id, *[getattr(UserAgent, f) for f in FIELDS]).where(
+                UserAgent.id.in_(missing[i:i + _LOOKUP_CHUNK])
+            )
+            for row in db.execute(stmt):
+                result[row.id] = {f: getattr(row, f) for f in FIELDS}
+                self._fields.set(row.id, result[row.id])
+        return result
+
+    def warm(self, db: Session, ua_ids: list[int]) -> int:
+        """Cache these ids (most frequent first) and their fields. Returns how many were found."""
+        found = 0
+        for i in range(0, len(ua_ids), _LOOKUP_CHUNK):
+            stmt = select(UserAgent).where(UserAgent.id.in_(ua_ids[i:i + _LOOKUP_CHUNK]))
+            for row in db.execute(stmt).scalars():
+                self._ids.set(row.ua_raw, row.id)
+                self._fields.set(row.id, {f: getattr(row, f) for f in FIELDS})
+                found += 1
+        return found
+
+    def _load(self, conn: Connection, hashes: dict[str, str], ids: dict[str, int]) -> None:
+        keys = list(hashes)
+        for i in range(0, len(keys), _LOOKUP_CHUNK):
+            stmt = select(UserAgent.id, UserAgent.ua_hash).where(UserAgent.ua_hash.in_(keys[i:i + _LOOKUP_CHUNK]))
+            for ua_id, h in conn.execute(stmt):
+                ids[hashes[h]] = ua_id
+                self._ids.set(hashes[h], ua_id)
+
+    def _insert(self, conn: Connection, hashes: dict[str, str]) -> None:
+        t = UserAgent.__table__
+        # sorted so concurrent writers take the unique index locks in the same order
+        rows = [{"ua_hash": h, "ua_raw": ua, **parse_user_agent(ua)} for h, ua in sorted(hashes.items())]
+        insert = dialect_insert(conn)
+        if insert is not None:
+            inserted = conn.execute(insert(t).on_conflict_do_nothing(index_elements=["ua_hash"]), rows).rowcount
+        else:
+            inserted = 0
+            for row in rows:
+                try:
+                    with conn.begin_nested():
+                        conn.execute(t.insert().values(**row))
+                    inserted += 1
+                except IntegrityError:
+                    pass  # another writer inserted it first
+        self.inserted += max(inserted, 0)
+
+    def clear(self) -> None:
+        self._ids.clear()
+        self._fields.clear()
+
+    def stats(self) -> dict[str, int | float | None]:
+        ids = self._ids.stats()
+        return {
+            "entries": ids["entries"],
+            "hits": ids["hits"],
+            "misses": ids["misses"],
+            "hit_ratio": ids["hit_ratio"],
+            "evictions": ids["evictions"],
+            "field_entries": len(self._fields),
+            "inserted": self.inserted,
+        }
+
+
+user_agent_ids = UserAgentIds(max_entries=settings.ua_id_cache_max_entries)
+
+register_metrics("user_agent_ids", user_agent_ids.stats)
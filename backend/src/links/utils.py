@@ -1,12 +1,43 @@
 from __future__ import annotations
 
 import hashlib
+import ipaddress
+import sys
 from urllib.parse import urlparse
 
-import httpx
 from fastapi import Request
 from user_agents import parse
 
+from src.core.cache import TTLCache
+from src.core.config import settings
+from src.core.metrics import register_metrics
+from src.geoip.providers import get_provider
+
+_EMPTY_UA: dict[str, str | None] = {
+    "device_category": None,
+    "browser_name": None,
+    "browser_version": None,
+    "os_name": None,
+    "os_version": None,
+    "engine": None,
+}
+
+
+def _sizeof_ua(key: str, value: dict[str, str | None]) -> int:
+    return sys.getsizeof(key) + sys.getsizeof(value) + sum(sys.getsizeof(v) for v in value.values())
+
+
+# Real traffic is a long tail over a small set of very common UA strings, and
+# the user_agents regex cascade is the most expensive part of enriching a click.
+ua_cache = TTLCache(
+    name="user_agent",
+    max_entries=settings.ua_cache_max_entries,
+    max_bytes=settings.ua_cache_max_bytes,
+    sizeof=_sizeof_ua,
+)
+
+register_metrics("ua_cache", ua_cache.stats)
+
 
 def get_referrer_host(request: Request) -> str | None:
     ref = request.headers.get("referer") or request.headers.get("referrer")
@@ -49,23 +80,31 @@ def make_visitor_hash(ip: str | None, ua: str | None) -> str | None:
     return hashlib.sha256(raw).hexdigest()
 
 
+def ua_hash(ua: str) -> str:
+    """Key of a user agent string in the user_agents table."""
+    return hashlib.sha256(ua.encode("utf-8")).hexdigest()
+
+
 def parse_user_agent(ua_string: str | None) -> dict[str, str | None]:
     """
     Parse user agent string and extract structured information.
     Returns a dict with: device_category, browser_name, browser_version,
     os_name, os_version, and engine.
     All values are None if parsing fails or UA is None.
+    Results are memoized per UA string (see ua_cache).
     """
     if not ua_string:
-        return {
-            "device_category": None,
-            "browser_name": None,
-            "browser_version": None,
-            "os_name": None,
-            "os_version": None,
-            "engine": None,
-        }
-    
+        return dict(_EMPTY_UA)
+
+    parsed = ua_cache.get(ua_string)
+    if parsed is None:
+        parsed = _parse_user_agent_uncached(ua_string)
+        ua_cache.set(ua_string, parsed)
+    # callers get their own copy; the cached dict is shared between threads
+    return dict(parsed)
+
+
+def _parse_user_agent_uncached(ua_string: str) -> dict[str, str | None]:
     try:
         ua = parse(ua_string)
         
@@ -130,51 +169,34 @@ def parse_user_agent(ua_string: str | None) -> dict[str, str | None]:
 
 def get_country_from_ip(ip: str | None) -> str | None:
     """
-    Look up country code from IP address using free GeoIP service.
+    Look up country code from IP address using the configured GeoIP provider.
     Returns 2-letter ISO country code (e.g., 'US', 'GB') or None if lookup fails.
     Never blocks or raises exceptions - gracefully returns None on any error.
     """
     if not ip:
         return None
-    
-    # Skip localhost/private IPs - for development, return a test country
+
+    # For localhost during development, return a test country
     # This allows testing country data functionality locally
-    if ip in ("127.0.0.1", "::1", "localhost"):
-        # For localhost during development, return a test country
-        # In production, you'd want to return None or handle this differently
+    if ip == "localhost":
+        return "US"
+
+    try:
+        addr = ipaddress.ip_address(ip.strip())
+    except ValueError:
+        return None
+    if addr.version == 6 and addr.ipv4_mapped is not None:
+        addr = addr.ipv4_mapped
+
+    if addr.is_loopback:
         return "US"  # Test country for localhost - change this if needed
-    
-    # Skip private IP ranges (but allow them to try API lookup if needed)
-    if ip.startswith(("10.", "172.16.", "192.168.")):
-        # Private IPs won't work with public GeoIP services
+
+    # Private, link-local, CGNAT, reserved, multicast... won't resolve anywhere
+    if not addr.is_global or addr.is_multicast:
         return None
-    
+
     try:
-        # Using ip-api.com free tier (no API key required, 45 req/min limit)
-        # API format: http://ip-api.com/json/{ip}?fields=countryCode
-        # Note: For localhost testing, this will fail, so we skip it above
-        with httpx.Client(timeout=3.0) as client:
-            response = client.get(
-                f"http://ip-api.com/json/{ip}",
-                params={"fields": "countryCode"},
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            # Check if the response has an error status
-            if data.get("status") == "fail":
-                # API returned an error
-                return None
-            
-            # Get country code from response
-            country_code = data.get("countryCode")
-            
-            # Return None if countryCode is empty string or missing
-            if country_code and len(country_code) == 2:
-                return country_code.upper()  # Ensure uppercase (US, GB, etc.)
-            
-            return None
+        return get_provider().lookup(addr)
     except Exception:
         # Silently fail - never block analytics due to GeoIP lookup issues
         return None
-
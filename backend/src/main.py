@@ -1,3 +1,6 @@
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
@@ -6,15 +9,74 @@ from src.core.config import settings
 from src.auth.router import router as auth_router
 from src.links.router import router as links_router
 from src.links.redirect_router import router as redirect_router
-from src.db.session import Base, engine
+from src.links.ingest import click_ingestor
+from src.links.counters import click_counter
+from src.links.slug_filter import slug_filter
+from src.links.partitions import partition_maintainer
+from src.links.retention import retention_job
+from src.geoip.providers import get_provider as get_geoip_provider
+from src.ops.router import router as ops_router
+from src.links.service import warm_user_agent_cache
+from src.db.pool import warm_pool
+from src.db.session import Base, SessionLocal, engine
+from src.db.async_session import dispose_async_engine
 
 # Import all models to ensure they're registered with SQLAlchemy Base
 import src.models.user
 import src.models.oauth_account
 import src.models.link
 import src.models.click_event
+import src.models.click_rollup
+import src.models.user_agent
+import src.models.dimension_value
+import src.models.id_block
+
+logger = logging.getLogger(__name__)
+
+
+def warm_caches() -> None:
+    """Best effort: a cold cache is only slower, never wrong."""
+    if settings.db_pool_warmup:
+        try:
+            warm_pool(engine, settings.db_pool_size)
+        except Exception:
+            logger.warning("connection pool warm-up failed", exc_info=True)
+    db = SessionLocal()
+    try:
+        warm_user_agent_cache(db, limit=settings.ua_cache_warmup_limit, days=settings.ua_cache_warmup_days)
+    except Exception:
+        logger.warning("user agent cache warm-up failed", exc_info=True)
+        db.rollback()
+    try:
+        if settings.slug_filter_enabled:
+            slug_filter.build(db)
+    except Exception:
+        # without a filter every slug goes to the database, as before
+        logger.warning("slug filter build failed", exc_info=True)
+    finally:
+        db.close()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # fail fast on a bad GEOIP_PROVIDER / missing database file
+    get_geoip_provider()
+    warm_caches()
+    click_counter.start()
+    partition_maintainer.start(engine)
+    retention_job.start()
+    if settings.click_ingest_mode == "async":
+        click_ingestor.start()
+    yield
+    # flush queued clicks before the process exits, then fold their counters
+    click_ingestor.stop(timeout=settings.click_ingest_shutdown_timeout_seconds)
+    click_counter.stop(timeout=settings.click_ingest_shutdown_timeout_seconds)
+    partition_maintainer.stop(timeout=settings.click_ingest_shutdown_timeout_seconds)
+    retention_job.stop(timeout=settings.click_ingest_shutdown_timeout_seconds)
+    await dispose_async_engine()
+
 
-app = FastAPI(debug=settings.debug)
+app = FastAPI(debug=settings.debug, lifespan=lifespan)
 
 # CORS middleware - must be added before SessionMiddleware
 # Build CORS origins list: use frontend_url from settings, plus localhost for local dev
@@ -36,6 +98,7 @@ app.add_middleware(
     allow_credentials=True,  # Required for session cookies
     allow_methods=["*"],  # Allow all methods (GET, POST, etc.)
     allow_headers=["*"],  # Allow all headers
+    expose_headers=["X-Next-Cursor"],  # link list pagination
 )
 
 app.add_middleware(
@@ -49,4 +112,5 @@ app.add_middleware(
 
 app.include_router(auth_router)
 app.include_router(links_router, prefix="/api")
+app.include_router(ops_router, prefix="/api")
 app.include_router(redirect_router)
@@ -14,6 +14,8 @@ from src.db.session import Base
 
 
 class ClickEvent(Base):
+    # On PostgreSQL the table is partitioned by month on clicked_at, with the
+    # primary key (id, clicked_at); see links/partitions.py
     __tablename__ = "click_events"
     __table_args__ = (
         Index("ix_click_events_link_clicked_at", "link_id", "clicked_at"),
@@ -34,13 +36,9 @@ class ClickEvent(Base):
         server_default=func.now(),
     )
 
-    referrer_host: Mapped[str | None] = mapped_column(
-        String(255),
-        nullable=True,
-    )
-
-    ua_raw: Mapped[str | None] = mapped_column(
-        String(1024),
+    # referrer host, dictionary-encoded (links/dictionary.py)
+    referrer_id: Mapped[int | None] = mapped_column(
+        ForeignKey("dimension_values.id"),
         nullable=True,
     )
 
@@ -54,37 +52,13 @@ class ClickEvent(Base):
         nullable=True,
     )
 
-    # Parsed user agent fields
-    device_category: Mapped[str | None] = mapped_column(
-        String(20),  # mobile, tablet, desktop, bot
-        nullable=True,
-    )
-
-    browser_name: Mapped[str | None] = mapped_column(
-        String(50),  # Chrome, Firefox, Safari, etc.
-        nullable=True,
-    )
-
-    browser_version: Mapped[str | None] = mapped_column(
-        String(20),  # e.g., "120.0.0"
-        nullable=True,
-    )
-
-    os_name: Mapped[str | None] = mapped_column(
-        String(50),  # Windows, macOS, iOS, Android, Linux
-        nullable=True,
-    )
-
-    os_version: Mapped[str | None] = mapped_column(
-        String(20),  # e.g., "11", "17.0"
-        nullable=True,
-    )
-
-    engine: Mapped[str | None] = mapped_column(
-        String(20),  # Blink, Gecko, WebKit
+    # user agent string and parsed fields, stored once per distinct string
+    ua_id: Mapped[int | None] = mapped_column(
+        ForeignKey("user_agents.id"),
         nullable=True,
     )
 
     # relationships
     link: Mapped["Link"] = relationship(back_populates="click_events")
+    user_agent: Mapped["UserAgent"] = relationship()
 
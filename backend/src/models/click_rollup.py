@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+from datetime import date, datetime
+from sqlalchemy import (
+    BigInteger,
+    Date,
+    DateTime,
+    ForeignKey,
+    Index,
+    LargeBinary,
+    String,
+)
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.db.session import Base
+
+
+class ClickRollupHourly(Base):
+    """Clicks per link per UTC hour, maintained on ingest (links/rollups.py)."""
+    __tablename__ = "click_rollup_hourly"
+    __table_args__ = (
+        Index("ix_click_rollup_hourly_hour", "hour"),
+    )
+
+    link_id: Mapped[int] = mapped_column(
+        ForeignKey("links.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+
+    hour: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        primary_key=True,
+    )
+
+    clicks: Mapped[int] = mapped_column(
+        BigInteger,
+        nullable=False,
+        server_default="0",
+    )
+
+
+class ClickRollupCountryDaily(Base):
+    """Clicks per link per country per UTC day, maintained on ingest (links/rollups.py)."""
+    __tablename__ = "click_rollup_country_daily"
+    __table_args__ = (
+        Index("ix_click_rollup_country_daily_day", "day"),
+    )
+
+    link_id: Mapped[int] = mapped_column(
+        ForeignKey("links.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+
+    day: Mapped[date] = mapped_column(
+        Date,
+        primary_key=True,
+    )
+
+    country: Mapped[str] = mapped_column(
+        String(2),
+        primary_key=True,
+    )
+
+    clicks: Mapped[int] = mapped_column(
+        BigInteger,
+        nullable=False,
+        server_default="0",
+    )
+
+
+class ClickVisitorSketchHourly(Base):
+    """
+    HyperLogLog sketch (core/hll.py) of visitor hashes per link, UTC hour and
+    country ('' when unknown), maintained on ingest (links/rollups.py).
+    """
+    __tablename__ = "click_visitor_sketch_hourly"
+    __table_args__ = (
+        Index("ix_click_visitor_sketch_hourly_hour", "hour"),
+    )
+
+    link_id: Mapped[int] = mapped_column(
+        ForeignKey("links.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+
+    hour: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        primary_key=True,
+    )
+
+    country: Mapped[str] = mapped_column(
+        String(2),
+        primary_key=True,
+    )
+
+    sketch: Mapped[bytes] = mapped_column(
+        LargeBinary,
+        nullable=False,
+    )
+
+
+class ClickAggregateDaily(Base):
+    """
+    Clicks and distinct visitors per link, UTC day and dimension value, folded
+    from raw click_events by the retention job (links/retention.py) before the
+    raw rows are deleted. `dimension` is "total" (value ''), "country",
+    "device", "browser" or "referrer"; '' stands for an unknown value.
+    """
+    __tablename__ = "click_aggregate_daily"
+    __table_args__ = (
+        Index("ix_click_aggregate_daily_day", "day"),
+    )
+
+    link_id: Mapped[int] = mapped_column(
+        ForeignKey("links.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+
+    day: Mapped[date] = mapped_column(
+        Date,
+        primary_key=True,
+    )
+
+    dimension: Mapped[str] = mapped_column(
+        String(16),
+        primary_key=True,
+    )
+
+    value: Mapped[str] = mapped_column(
+        String(255),
+        primary_key=True,
+    )
+
+    clicks: Mapped[int] = mapped_column(
+        BigInteger,
+        nullable=False,
+        server_default="0",
+    )
+
+    visitors: Mapped[int] = mapped_column(
+        BigInteger,
+        nullable=False,
+        server_default="0",
+    )
+
+
+class ClickCompaction(Base):
+    """
+    Progress of the retention job: every click event with clicked_at before
+    compacted_before and id up to folded_max_id has been folded into
+    click_aggregate_daily (and is deleted, or about to be).
+    """
+    __tablename__ = "click_compaction"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+
+    compacted_before: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+    )
+
+    folded_max_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
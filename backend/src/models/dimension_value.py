@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from sqlalchemy import String, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.db.session import Base
+
+
+class DimensionValue(Base):
+    """
+    Dictionary of click dimension values (links/dictionary.py): each distinct
+    value of a dimension gets a small integer id, and click_events stores the
+    id instead of the string (click_events.referrer_id).
+    """
+    __tablename__ = "dimension_values"
+    __table_args__ = (
+        UniqueConstraint("dimension", "value", name="uq_dimension_values_dimension_value"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+
+    dimension: Mapped[str] = mapped_column(
+        String(20),  # referrer
+        nullable=False,
+    )
+
+    value: Mapped[str] = mapped_column(
+        String(255),
+        nullable=False,
+    )
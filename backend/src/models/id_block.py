@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+from sqlalchemy import BigInteger, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.db.session import Base
+
+
+class IdBlock(Base):
+    """
+    High-water mark of an id sequence handed out in blocks (links/ids.py):
+    every id below next_value belongs to some process's block.
+    """
+    __tablename__ = "id_blocks"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+
+    next_value: Mapped[int] = mapped_column(BigInteger, nullable=False)
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from datetime import datetime
+from datetime import datetime, timezone
 from sqlalchemy import (
     BigInteger,
     Boolean,
@@ -22,6 +22,9 @@ class Link(Base):
     __table_args__ = (
         UniqueConstraint("slug", name="uq_links_slug"),
         Index("ix_links_user_created_at", "user_id", "created_at"),
+        # keyset pagination by click count / last click (see links.pagination)
+        Index("ix_links_user_click_count", "user_id", "click_count", "id"),
+        Index("ix_links_user_last_clicked_at", "user_id", "last_clicked_at", "id"),
     )
 
     id: Mapped[int] = mapped_column(primary_key=True)
@@ -32,9 +35,11 @@ class Link(Base):
         nullable=False,
     )
 
-    slug: Mapped[str | None] = mapped_column(
+    # ids come from the hi-lo allocator in links/ids.py, so the slug is known
+    # before the row is inserted
+    slug: Mapped[str] = mapped_column(
         String(32),
-        nullable=True, # must be nullable with how we calculate the slug using id
+        nullable=False,
     )
 
     target_url: Mapped[str] = mapped_column(
@@ -51,6 +56,9 @@ class Link(Base):
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         nullable=False,
+        # set client-side too so the stored value round-trips exactly into
+        # pagination cursors (SQLite's CURRENT_TIMESTAMP has no fractional seconds)
+        default=lambda: datetime.now(timezone.utc),
         server_default=func.now(),
     )
 
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from sqlalchemy import String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.db.session import Base
+
+
+class UserAgent(Base):
+    """
+    One row per distinct user agent string, with its parsed fields. Click
+    events point here through ua_id (links/user_agents.py); ua_hash is the
+    SHA-256 of the raw string, so long strings are looked up by a short key.
+    """
+    __tablename__ = "user_agents"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+
+    ua_hash: Mapped[str] = mapped_column(
+        String(64),
+        unique=True,
+        nullable=False,
+    )
+
+    ua_raw: Mapped[str] = mapped_column(
+        String(1024),
+        nullable=False,
+    )
+
+    device_category: Mapped[str | None] = mapped_column(
+        String(20),  # mobile, tablet, desktop, bot
+        nullable=True,
+    )
+
+    browser_name: Mapped[str | None] = mapped_column(
+        String(50),  # Chrome, Firefox, Safari, etc.
+        nullable=True,
+    )
+
+    browser_version: Mapped[str | None] = mapped_column(
+        String(20),  # e.g., "120.0.0"
+        nullable=True,
+    )
+
+    os_name: Mapped[str | None] = mapped_column(
+        String(50),  # Windows, macOS, iOS, Android, Linux
+        nullable=True,
+    )
+
+    os_version: Mapped[str | None] = mapped_column(
+        String(20),  # e.g., "11", "17.0"
+        nullable=True,
+    )
+
+    engine: Mapped[str | None] = mapped_column(
+        String(20),  # Blink, Gecko, WebKit
+        nullable=True,
+    )
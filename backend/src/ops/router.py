@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends, HTTPException
+
+from src.auth.dependencies import get_current_admin
+from src.core.config import settings
+from src.core.metrics import collect_metrics
+
+router = APIRouter(prefix="/ops", tags=["ops"])
+
+
+def _metrics_enabled() -> None:
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Not found")
+
+
+@router.get("/metrics", dependencies=[Depends(_metrics_enabled), Depends(get_current_admin)])
+def metrics():
+    """In-process counters (caches, queues, pools) for this worker; admins only."""
+    return collect_metrics()
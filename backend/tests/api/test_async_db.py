@@ -0,0 +1,100 @@
+"""
+API tests for the async database mode (DB_ASYNC_ENABLED).
+Routes are served through AsyncDatabase on an aiosqlite engine pointed at the
+same temporary SQLite file the sync fixtures write to.
+"""
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from src.db.async_session import AsyncDatabase, Database, get_database, to_async_url
+from src.links.service import create_link
+from src.main import app
+from src.models.click_event import ClickEvent
+from src.models.user import User
+from tests.conftest import TEST_DATABASE_URL
+
+
+@pytest.fixture
+def async_client(client):
+    """Test client whose routes run on the async engine."""
+    engine = create_async_engine(to_async_url(TEST_DATABASE_URL), poolclass=NullPool)
+    sessions = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def override_get_database():
+        async with sessions() as session:
+            yield AsyncDatabase(session)
+
+    app.dependency_overrides[get_database] = override_get_database
+    yield client
+    app.dependency_overrides.pop(get_database, None)
+
+
+@pytest.fixture
+def test_user(db_session):
+    user = User(email="test@example.com", display_name="Test User")
+    db_session.add(user)
+    db_session.commit()
+    db_session.refresh(user)
+    return user
+
+
+class TestToAsyncUrl:
+    """Test async driver selection."""
+
+    def test_driver_swap(self):
+        """Test that sync URLs map onto their async drivers."""
+        assert to_async_url("sqlite:///./app.db") == "sqlite+aiosqlite:///./app.db"
+        assert to_async_url("postgresql://u:p@h/db") == "postgresql+asyncpg://u:p@h/db"
+        assert to_async_url("postgres://u:p@h/db") == "postgresql+asyncpg://u:p@h/db"
+        assert to_async_url("postgresql+psycopg2://u:p@h/db") == "postgresql+asyncpg://u:p@h/db"
+        assert to_async_url("postgresql+asyncpg://u:p@h/db") == "postgresql+asyncpg://u:p@h/db"
+
+
+class TestDatabase:
+    def test_incomplete_implementation_fails_at_construction(self):
+        """Test that a Database subclass missing run/rollback can't be instantiated."""
+        class RunOnly(Database):
+            async def run(self, fn, /, *args, **kwargs):
+                return fn(None, *args, **kwargs)
+
+        with pytest.raises(TypeError):
+            RunOnly()
+        with pytest.raises(TypeError):
+            Database()
+
+
+class TestAsyncRoutes:
+    """Test routes served by the async engine."""
+
+    def test_redirect_and_click(self, async_client, db_session, test_user):
+        """Test redirect lookup and inline click write on the async engine."""
+        link = create_link(db_session, user_id=test_user.id, target_url="https://example.com")
+
+        response = async_client.get(f"/{link.slug}", follow_redirects=False)
+
+        assert response.status_code == 302
+        assert response.headers["location"] == "https://example.com"
+        db_session.expire_all()
+        assert db_session.query(ClickEvent).filter_by(link_id=link.id).count() == 1
+
+    def test_redirect_not_found(self, async_client):
+        """Test 404 on the async engine."""
+        assert async_client.get("/nope", follow_redirects=False).status_code == 404
+
+    def test_authenticated_routes(self, async_client, db_session, test_user):
+        """Test session auth, link creation and the dashboard on the async engine."""
+        from unittest.mock import patch
+
+        with patch("starlette.requests.Request.session", new={"user_id": test_user.id}):
+            created = async_client.post("/api/links", json={"target_url": "https://example.com/a"})
+            listed = async_client.get("/api/links")
+            dashboard = async_client.get(
+                "/api/links/dashboard",
+                params={"start_date": "2020-01-01T00:00:00Z", "end_date": "2030-01-01T00:00:00Z"},
+            )
+
+        assert created.status_code == 201
+        assert [item["id"] for item in listed.json()] == [created.json()["id"]]
+        assert dashboard.status_code == 200
+        assert dashboard.json()["kpis"]["total_links"] == 1
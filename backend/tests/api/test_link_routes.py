@@ -2,6 +2,7 @@
 API tests for link routes.
 Tests the link management endpoints with a real FastAPI test client.
 """
+import json
 import pytest
 from datetime import datetime, timezone, timedelta
 from unittest.mock import Mock
@@ -9,6 +10,7 @@ from unittest.mock import Mock
 from src.models.user import User
 from src.models.link import Link
 from src.models.click_event import ClickEvent
+from src.links.export import EXPORT_COLUMNS
 from src.links.service import create_link
 
 
@@ -80,6 +82,75 @@ class TestCreateLink:
         assert response.status_code == 422  # Validation error
 
 
+class TestBulkCreateLinks:
+    """Test POST /api/links/bulk endpoint."""
+
+    def test_bulk_json_array(self, authenticated_client, db_session, test_user):
+        """Test creating links from a JSON array of URLs and objects."""
+        response = authenticated_client.post(
+            "/api/links/bulk",
+            json=["https://example.com/a", {"target_url": "https://example.com/b"}],
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["created"] == 2 and data["failed"] == 0
+        assert [r["index"] for r in data["results"]] == [0, 1]
+        for r in data["results"]:
+            assert r["ok"] is True
+            assert r["short_url"].endswith(f"/{r['slug']}")
+            assert db_session.get(Link, r["id"]).user_id == test_user.id
+
+    def test_bulk_ndjson_partial_failure(self, authenticated_client):
+        """Test NDJSON input with invalid lines reported per item."""
+        body = "\n".join([
+            '{"target_url": "https://example.com/1"}',
+            '"not a url"',
+            '{"target_url": ',
+            '',
+            '"https://example.com/2"',
+        ]) + "\n"
+        response = authenticated_client.post(
+            "/api/links/bulk", content=body, headers={"Content-Type": "application/x-ndjson"}
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["created"] == 2 and data["failed"] == 2
+        assert [r["ok"] for r in data["results"]] == [True, False, False, True]
+        assert data["results"][2]["error"] == "invalid JSON"
+
+    def test_bulk_links_redirect(self, authenticated_client, client):
+        """Test that bulk-created links resolve."""
+        data = authenticated_client.post("/api/links/bulk", json=["https://example.com/bulk"]).json()
+        response = client.get(f"/{data['results'][0]['slug']}", follow_redirects=False)
+        assert response.status_code == 302
+        assert response.headers["location"] == "https://example.com/bulk"
+
+    def test_bulk_too_many(self, authenticated_client, monkeypatch):
+        """Test the per-request item limit for both formats."""
+        from src.core.config import settings
+        monkeypatch.setattr(settings, "bulk_links_max_items", 2)
+
+        response = authenticated_client.post("/api/links/bulk", json=["https://example.com"] * 3)
+        assert response.status_code == 413
+        response = authenticated_client.post(
+            "/api/links/bulk", content='"https://example.com"\n' * 3,
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+        assert response.status_code == 413
+
+    def test_bulk_not_an_array(self, authenticated_client):
+        """Test that a JSON body that isn't an array is rejected."""
+        response = authenticated_client.post("/api/links/bulk", json={"target_url": "https://example.com"})
+        assert response.status_code == 400
+
+    def test_bulk_unauthenticated(self, client):
+        """Test bulk creation without authentication."""
+        response = client.post("/api/links/bulk", json=["https://example.com"])
+        assert response.status_code == 401
+
+
 class TestListLinks:
     """Test GET /api/links endpoint."""
     
@@ -120,6 +191,38 @@ class TestListLinks:
         assert response.status_code == 200
         assert len(response.json()) == 2
     
+    def test_list_links_cursor(self, authenticated_client, db_session, test_user):
+        """Test walking all pages with X-Next-Cursor."""
+        created = [create_link(db_session, user_id=test_user.id, target_url=f"https://example.com/{i}") for i in range(5)]
+
+        seen, params = [], {"limit": 2}
+        while True:
+            response = authenticated_client.get("/api/links", params=params)
+            assert response.status_code == 200
+            seen.extend(link["id"] for link in response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if cursor is None:
+                break
+            params = {"limit": 2, "cursor": cursor}
+        assert seen == [l.id for l in reversed(created)]
+
+    def test_list_links_sort_by_clicks(self, authenticated_client, db_session, test_user):
+        """Test listing most-clicked links first."""
+        links = [create_link(db_session, user_id=test_user.id, target_url=f"https://example.com/{i}") for i in range(3)]
+        for link, clicks in zip(links, [5, 9, 1]):
+            link.click_count = clicks
+        db_session.commit()
+
+        response = authenticated_client.get("/api/links?sort=clicks")
+        assert response.status_code == 200
+        assert [link["id"] for link in response.json()] == [links[1].id, links[0].id, links[2].id]
+
+    @pytest.mark.parametrize("params", ["cursor=bogus", "sort=popularity"])
+    def test_list_links_invalid_paging(self, authenticated_client, params):
+        """Test that malformed cursors and unknown sorts are rejected."""
+        response = authenticated_client.get(f"/api/links?{params}")
+        assert response.status_code in (400, 422)
+
     def test_list_links_unauthenticated(self, client):
         """Test listing links without authentication."""
         response = client.get("/api/links")
@@ -177,7 +280,30 @@ class TestLinkStats:
         assert data["link"]["id"] == test_link.id
         assert "clicks_last_24h" in data
         assert "unique_visitors" in data
+        assert data["unique_visitors_exact"] is True
+        assert data["unique_visitors_error"] == 0.0
+        assert data["top_referrers"] == [{"value": None, "clicks": 1}]
+        assert data["devices"] == [{"value": None, "clicks": 1}]
         assert "recent_clicks" in data
+
+    def test_link_stats_decodes_referrers(self, authenticated_client, db_session, test_user, test_link):
+        """Test that dictionary-encoded referrer hosts come back as strings."""
+        from src.links.dictionary import referrer_hosts
+        referrer_id = referrer_hosts.encode(db_session, ["news.ycombinator.com"])["news.ycombinator.com"]
+        now = datetime.now(timezone.utc)
+        db_session.add_all([
+            ClickEvent(link_id=test_link.id, clicked_at=now - timedelta(minutes=2), referrer_id=referrer_id),
+            ClickEvent(link_id=test_link.id, clicked_at=now - timedelta(minutes=1)),
+        ])
+        db_session.commit()
+        referrer_hosts.clear()
+
+        data = authenticated_client.get(f"/api/links/{test_link.id}/stats").json()
+        assert [c["referrer_host"] for c in data["recent_clicks"]] == [None, "news.ycombinator.com"]
+        assert data["top_referrers"] == [
+            {"value": "news.ycombinator.com", "clicks": 1},
+            {"value": None, "clicks": 1},
+        ]
     
     def test_link_stats_not_found(self, authenticated_client, test_user):
         """Test getting stats for non-existent link."""
@@ -247,6 +373,87 @@ class TestUpdateLinkStatus:
         assert response.status_code == 401
 
 
+class TestExportClickEvents:
+    """Test GET /api/links/{link_id}/events/export and /api/links/events/export."""
+
+    @pytest.fixture
+    def events(self, db_session, test_user, test_link):
+        other_link = create_link(db_session, user_id=test_user.id, target_url="https://example.com/2")
+        base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        for i in range(3):
+            db_session.add(ClickEvent(link_id=test_link.id, clicked_at=base + timedelta(hours=i), country="US"))
+        db_session.add(ClickEvent(link_id=other_link.id, clicked_at=base + timedelta(hours=1), country="DE"))
+        db_session.commit()
+        return other_link
+
+    def test_export_link_csv(self, authenticated_client, test_link, events):
+        """Test exporting one link's events as CSV."""
+        response = authenticated_client.get(f"/api/links/{test_link.id}/events/export?columns=clicked_at,country")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        assert f'clicks-{test_link.slug}.csv' in response.headers["content-disposition"]
+        assert response.text.splitlines() == [
+            "clicked_at,country",
+            "2025-01-01T00:00:00+00:00,US",
+            "2025-01-01T01:00:00+00:00,US",
+            "2025-01-01T02:00:00+00:00,US",
+        ]
+
+    def test_export_link_ndjson_date_range(self, authenticated_client, test_link, events):
+        """Test NDJSON export filtered to a date range."""
+        response = authenticated_client.get(
+            f"/api/links/{test_link.id}/events/export",
+            params={"format": "ndjson", "start_date": "2025-01-01T01:00:00Z", "end_date": "2025-01-01T01:30:00Z"},
+        )
+
+        assert response.status_code == 200
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert len(rows) == 1
+        assert rows[0]["link_id"] == test_link.id
+        assert rows[0]["clicked_at"] == "2025-01-01T01:00:00+00:00"
+        assert set(rows[0]) == set(EXPORT_COLUMNS)
+
+    def test_export_all_links(self, authenticated_client, test_link, events):
+        """Test the user-wide export covers every link, oldest first."""
+        response = authenticated_client.get("/api/links/events/export?format=ndjson&columns=link_id,country")
+
+        assert response.status_code == 200
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert [r["country"] for r in rows].count("DE") == 1
+        assert {r["link_id"] for r in rows} == {test_link.id, events.id}
+
+    def test_export_empty_csv_has_header(self, authenticated_client, test_link):
+        """Test that an export without events is just the header."""
+        response = authenticated_client.get(f"/api/links/{test_link.id}/events/export?columns=id")
+        assert response.text == "id\n"
+
+    @pytest.mark.parametrize("params,status", [
+        ("columns=id,password", 400),
+        ("start_date=2025-02-01T00:00:00Z&end_date=2025-01-01T00:00:00Z", 400),
+        ("format=xlsx", 422),
+    ])
+    def test_export_invalid_params(self, authenticated_client, test_link, params, status):
+        """Test that unknown columns, inverted ranges and formats are rejected."""
+        response = authenticated_client.get(f"/api/links/{test_link.id}/events/export?{params}")
+        assert response.status_code == status
+
+    def test_export_other_users_link(self, authenticated_client, db_session):
+        """Test that another user's link can't be exported."""
+        other_user = User(email="other@example.com", display_name="Other")
+        db_session.add(other_user)
+        db_session.commit()
+        other_link = create_link(db_session, user_id=other_user.id, target_url="https://example.com/other")
+
+        response = authenticated_client.get(f"/api/links/{other_link.id}/events/export")
+        assert response.status_code == 404
+
+    def test_export_unauthenticated(self, client, test_link):
+        """Test exporting without authentication."""
+        response = client.get(f"/api/links/{test_link.id}/events/export")
+        assert response.status_code == 401
+
+
 class TestDashboard:
     """Test GET /api/links/dashboard endpoint."""
     
@@ -295,6 +502,7 @@ class TestDashboard:
         assert "total_clicks" in data["kpis"]
         assert "total_links" in data["kpis"]
         assert "unique_visitors" in data["kpis"]
+        assert data["kpis"]["unique_visitors_exact"] is True
     
     def test_dashboard_invalid_date_format(self, authenticated_client):
         """Test dashboard with invalid date format."""
@@ -303,6 +511,89 @@ class TestDashboard:
         )
         assert response.status_code == 400
     
+    def test_dashboard_buckets(self, authenticated_client, test_link):
+        """Test a requested bucket width and time zone, with empty buckets filled in."""
+        response = authenticated_client.get(
+            "/api/links/dashboard?start_date=2025-03-08T00:00:00Z&end_date=2025-03-09T00:00:00Z"
+            "&granularity=6h&tz=Europe/Berlin"
+        )
+        assert response.status_code == 200
+        points = response.json()["sparkline_data"]
+        assert [p["timestamp"] for p in points] == [
+            "2025-03-08T00:00:00+01:00",
+            "2025-03-08T06:00:00+01:00",
+            "2025-03-08T12:00:00+01:00",
+            "2025-03-08T18:00:00+01:00",
+            "2025-03-09T00:00:00+01:00",
+        ]
+        assert all(p["value"] == 0 for p in points)
+
+    @pytest.mark.parametrize("params", ["granularity=3s", "tz=Mars/Olympus", "granularity=1m"])
+    def test_dashboard_invalid_buckets(self, authenticated_client, params):
+        """Test that unsupported widths, zones and too many buckets are rejected."""
+        response = authenticated_client.get(
+            f"/api/links/dashboard?start_date=2025-01-01T00:00:00Z&end_date=2025-03-01T00:00:00Z&{params}"
+        )
+        assert response.status_code == 400
+
+    def test_dashboard_cache(self, authenticated_client, db_session, test_link):
+        """Test that repeated preset requests are served from cache until a click is persisted."""
+        from src.links.cache import dashboard_cache
+        from src.links.service import RawClick, persist_click_batch
+
+        def fetch():
+            end = datetime.now(timezone.utc)
+            start = end - timedelta(days=7)
+            return authenticated_client.get(
+                "/api/links/dashboard",
+                params={"start_date": start.isoformat(), "end_date": end.isoformat(), "preset": "7d"},
+            ).json()
+
+        hits = dashboard_cache.stats()["hits"]
+        assert fetch()["kpis"]["total_clicks"] == 0
+        assert fetch()["kpis"]["total_clicks"] == 0
+        assert dashboard_cache.stats()["hits"] == hits + 1
+
+        persist_click_batch(db_session, [RawClick(test_link.id, datetime.now(timezone.utc), None, None, None)])
+        assert fetch()["kpis"]["total_clicks"] == 1
+        assert dashboard_cache.stats()["hits"] == hits + 1
+
+    def test_dashboard_custom_range_not_snapped(self, authenticated_client, db_session, test_link):
+        """Test that a custom range ending now keeps its bounds: a click just after its end isn't counted."""
+        from src.links.service import RawClick, persist_click_batch
+
+        end = datetime.now(timezone.utc) - timedelta(minutes=1)
+        persist_click_batch(db_session, [RawClick(test_link.id, end + timedelta(milliseconds=1), None, None, None)])
+        params = {"start_date": (end - timedelta(days=1)).isoformat(), "end_date": end.isoformat()}
+
+        custom = authenticated_client.get("/api/links/dashboard", params=params).json()
+        assert custom["kpis"]["total_clicks"] == 0
+        preset = authenticated_client.get("/api/links/dashboard", params={**params, "preset": "24h"}).json()
+        assert preset["kpis"]["total_clicks"] == 1
+
+    def test_dashboard_links_pages(self, authenticated_client, db_session, test_user):
+        """Test paging the dashboard links table with links_next_cursor."""
+        created = [create_link(db_session, user_id=test_user.id, target_url=f"https://example.com/{i}") for i in range(3)]
+        params = {"start_date": "2025-01-01T00:00:00Z", "end_date": "2025-01-02T00:00:00Z", "links_limit": 2}
+
+        first = authenticated_client.get("/api/links/dashboard", params=params).json()
+        assert [l["id"] for l in first["links"]] == [created[2].id, created[1].id]
+        assert first["kpis"]["total_links"] == 3
+
+        second = authenticated_client.get(
+            "/api/links/dashboard", params={**params, "links_cursor": first["links_next_cursor"]}
+        ).json()
+        assert [l["id"] for l in second["links"]] == [created[0].id]
+        assert second["links_next_cursor"] is None
+        assert second["kpis"]["total_links"] == 3
+
+    def test_dashboard_invalid_links_cursor(self, authenticated_client):
+        """Test that a malformed links cursor is rejected."""
+        response = authenticated_client.get(
+            "/api/links/dashboard?start_date=2025-01-01T00:00:00Z&end_date=2025-01-02T00:00:00Z&links_cursor=bogus"
+        )
+        assert response.status_code == 400
+
     def test_dashboard_unauthenticated(self, client):
         """Test getting dashboard without authentication."""
         end_date = datetime.now(timezone.utc)
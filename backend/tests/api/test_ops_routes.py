@@ -0,0 +1,53 @@
+"""
+Tests for the ops endpoints.
+"""
+import pytest
+
+from src.core.config import Settings, settings
+from src.models.user import User
+
+
+@pytest.fixture
+def test_user(db_session):
+    user = User(email="Ops@Example.com", display_name="Ops")
+    db_session.add(user)
+    db_session.commit()
+    return user
+
+
+@pytest.fixture
+def authenticated_client(client, test_user):
+    from src.auth.dependencies import get_current_user
+    from src.main import app
+
+    app.dependency_overrides[get_current_user] = lambda: test_user
+    yield client
+    app.dependency_overrides.pop(get_current_user, None)
+
+
+class TestMetrics:
+    """Test GET /api/ops/metrics."""
+
+    def test_disabled(self, authenticated_client, monkeypatch):
+        """Test that the endpoint doesn't exist while disabled, the default, even for admins."""
+        assert Settings.model_fields["metrics_enabled"].default is False
+        monkeypatch.setattr(settings, "metrics_enabled", False)
+        monkeypatch.setattr(settings, "admin_emails", "ops@example.com")
+        assert authenticated_client.get("/api/ops/metrics").status_code == 404
+
+    def test_unauthenticated(self, client, monkeypatch):
+        monkeypatch.setattr(settings, "metrics_enabled", True)
+        assert client.get("/api/ops/metrics").status_code == 401
+
+    def test_not_an_admin(self, authenticated_client, monkeypatch):
+        monkeypatch.setattr(settings, "metrics_enabled", True)
+        monkeypatch.setattr(settings, "admin_emails", "someone@example.com")
+        assert authenticated_client.get("/api/ops/metrics").status_code == 403
+
+    def test_admin(self, authenticated_client, monkeypatch):
+        """Test that a listed admin (emails compared case-insensitively) gets the counters."""
+        monkeypatch.setattr(settings, "metrics_enabled", True)
+        monkeypatch.setattr(settings, "admin_emails", "someone@example.com, ops@example.com")
+        response = authenticated_client.get("/api/ops/metrics")
+        assert response.status_code == 200
+        assert "slug_filter" in response.json()
@@ -49,6 +49,30 @@ class TestRedirect:
         assert response.status_code == 404
         assert "Link not found" in response.json()["detail"]
     
+    def test_redirect_over_long_slug(self, client):
+        """Test that a slug too long to be any link's is a 404, not an error."""
+        response = client.get("/" + "a" * 50)
+
+        assert response.status_code == 404
+
+    @pytest.mark.parametrize("policy,offloaded", [("drop", False), ("block", True), ("spill", True)])
+    def test_redirect_submit_off_event_loop(self, client, test_link, monkeypatch, policy, offloaded):
+        """Test that queue policies that can wait or do file I/O submit from a worker thread."""
+        import threading
+        from src.core.config import settings
+        from src.links.ingest import click_ingestor
+
+        threads = []
+        monkeypatch.setattr(settings, "click_ingest_mode", "async")
+        monkeypatch.setattr(click_ingestor, "policy", policy)
+        monkeypatch.setattr(click_ingestor, "submit", lambda raw: threads.append(threading.current_thread()))
+
+        response = client.get(f"/{test_link.slug}", follow_redirects=False)
+
+        assert response.status_code == 302
+        assert len(threads) == 1
+        assert threads[0].name.startswith("AnyIO worker thread") == offloaded
+
     def test_redirect_inactive_link(self, client, db_session, test_link):
         """Test redirect with inactive link."""
         test_link.is_active = False
@@ -132,3 +156,41 @@ class TestRedirect:
                         db_session.refresh(test_link)
                         assert test_link.click_count == 2
 
+
+    def test_redirect_served_from_cache(self, client, db_session, test_link):
+        """Test that repeat redirects for the same slug skip the DB lookup."""
+        from src.links.cache import link_cache
+
+        client.get(f"/{test_link.slug}", follow_redirects=False)
+        with patch('src.links.service.get_active_link_by_slug') as mock_lookup:
+            response = client.get(f"/{test_link.slug}", follow_redirects=False)
+
+        assert response.status_code == 302
+        assert response.headers["location"] == test_link.target_url
+        mock_lookup.assert_not_called()
+        assert link_cache.stats()["hits"] >= 1
+
+    def test_redirect_cache_invalidated_on_status_change(self, client, db_session, test_user, test_link):
+        """Test that deactivating a link takes effect immediately despite the cache."""
+        from src.links.service import update_link_status
+
+        response = client.get(f"/{test_link.slug}", follow_redirects=False)
+        assert response.status_code == 302
+
+        update_link_status(db_session, user_id=test_user.id, link_id=test_link.id, is_active=False)
+
+        response = client.get(f"/{test_link.slug}", follow_redirects=False)
+        assert response.status_code == 404
+
+    def test_redirect_async_mode_enqueues_click(self, client, db_session, test_link):
+        """Test that in async ingest mode the redirect only enqueues the click."""
+        with patch('src.links.redirect_router.settings.click_ingest_mode', "async"):
+            with patch('src.links.redirect_router.click_ingestor') as mock_ingestor:
+                with patch('src.links.redirect_router.record_click') as mock_record:
+                    response = client.get(f"/{test_link.slug}", follow_redirects=False)
+
+        assert response.status_code == 302
+        mock_record.assert_not_called()
+        mock_ingestor.submit.assert_called_once()
+        raw = mock_ingestor.submit.call_args.args[0]
+        assert raw.link_id == test_link.id
@@ -1,7 +1,10 @@
 """
 Pytest configuration and shared fixtures for all tests.
 """
+import importlib.util
 import os
+from pathlib import Path
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
@@ -13,15 +16,31 @@ os.environ.setdefault("GOOGLE_CLIENT_ID", "test_client_id")
 os.environ.setdefault("GOOGLE_CLIENT_SECRET", "test_client_secret")
 os.environ.setdefault("GOOGLE_REDIRECT_URI", "http://localhost:8000/auth/google/callback")
 os.environ.setdefault("SESSION_SECRET_KEY", "test_secret_key_for_testing_only")
+# Write clicks and link counters inline so tests can assert on them right after the redirect
+os.environ.setdefault("CLICK_INGEST_MODE", "sync")
+os.environ.setdefault("CLICK_COUNTER_MODE", "inline")
+# Startup warm-up/filter build would query the app's own engine, not the test database
+os.environ.setdefault("UA_CACHE_WARMUP_LIMIT", "0")
+os.environ.setdefault("SLUG_FILTER_ENABLED", "false")
 
 # Import all models to ensure they're registered with SQLAlchemy Base
 import src.models.user
 import src.models.oauth_account
 import src.models.link
 import src.models.click_event
+import src.models.click_rollup
+import src.models.user_agent
+import src.models.dimension_value
+import src.models.id_block
 
 from src.main import app
 from src.db.session import Base, get_db
+from src.links.cache import dashboard_cache, link_cache
+from src.links.ids import link_ids
+from src.links.slug_filter import slug_filter
+from src.links.dictionary import referrer_hosts
+from src.links.user_agents import user_agent_ids
+from src.geoip.providers import set_provider
 
 # Create a test database (temporary file-based SQLite for testing)
 # File-based ensures all connections share the same database
@@ -47,6 +66,22 @@ def cleanup_test_db():
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=test_engine)
 
 
+@pytest.fixture(autouse=True)
+def reset_process_caches():
+    """
+    In-process caches must not leak state (rows from a previous test's
+    database, mocked GeoIP answers) from one test into the next.
+    """
+    link_cache.clear()
+    dashboard_cache.clear()
+    slug_filter.reset()
+    link_ids.reset()  # each test starts with an empty database
+    user_agent_ids.clear()
+    referrer_hosts.clear()
+    set_provider(None)
+    yield
+
+
 @pytest.fixture(scope="function")
 def db_session():
     """
@@ -71,6 +106,51 @@ def db_session():
         Base.metadata.drop_all(bind=test_engine)
 
 
+@pytest.fixture
+def session_factory(db_session):
+    """Session factory bound to the test database, for code that opens its own sessions."""
+    return TestingSessionLocal
+
+
+def load_migration(revision: str):
+    """The alembic migration module of `revision`, for tests of its helpers."""
+    path, = Path(__file__).parents[1].joinpath("alembic", "versions").glob(f"{revision}_*.py")
+    spec = importlib.util.spec_from_file_location(f"migration_{revision}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def partition_click_events(db, **kwargs) -> None:
+    """Convert db's click_events to monthly partitions the way the partitioning migration does."""
+    with db.get_bind().connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT")
+        load_migration("f6a7b8c9d0e1").partition_click_events(conn, **kwargs)
+
+
+@pytest.fixture
+def pg_session():
+    """
+    A session on the PostgreSQL database named by TEST_POSTGRES_URL, for
+    tests of PostgreSQL-only code paths; skipped when it isn't set. The
+    database is emptied before and after each test.
+    """
+    url = os.environ.get("TEST_POSTGRES_URL")
+    if not url:
+        pytest.skip("TEST_POSTGRES_URL is not set")
+    engine = create_engine(url)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
+        Base.metadata.drop_all(bind=engine)
+        engine.dispose()
+
+
 @pytest.fixture(scope="function")
 def client(db_session):
     """
@@ -0,0 +1,139 @@
+"""
+Integration tests for links/click_writer.py: COPY encoding, the writer's
+choice of COPY or executemany, and (with TEST_POSTGRES_URL) COPY itself.
+"""
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+from sqlalchemy import select
+
+from src.core.config import settings
+from src.models.user import User
+from src.models.click_event import ClickEvent
+from src.links import click_writer
+from src.links.click_writer import copy_buffer, copy_rows, write_click_events
+from src.links.service import create_link
+from src.links.dictionary import referrer_hosts
+from src.links.user_agents import user_agent_ids
+
+
+def make_user_link(db):
+    user = User(email="test@example.com", display_name="Test User")
+    db.add(user)
+    db.commit()
+    return create_link(db, user_id=user.id, target_url="https://example.com")
+
+
+def make_row(link_id: int, **overrides) -> dict:
+    row = {
+        "link_id": link_id,
+        "clicked_at": datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc),
+        "referrer_id": None,
+        "ua_id": None,
+        "visitor_hash": "a" * 64,
+        "country": "US",
+    }
+    row.update(overrides)
+    return row
+
+
+class TestCopyBuffer:
+    def test_text_format_escaping(self):
+        """Test NULLs, backslashes, tabs and line breaks are escaped for COPY text format."""
+        rows = [{"a": None, "b": "x\\y\tz\r\nw"}]
+        assert copy_buffer(rows, ["a", "b"]).getvalue() == "\\N\tx\\\\y\\tz\\r\\nw\n"
+
+    def test_datetimes_in_utc(self):
+        """Test datetimes are written as ISO 8601 in UTC, naive ones taken as UTC."""
+        plus_two = timezone(timedelta(hours=2))
+        rows = [
+            {"t": datetime(2025, 1, 1, 14, 0, tzinfo=plus_two)},
+            {"t": datetime(2025, 1, 1, 12, 0)},
+        ]
+        assert copy_buffer(rows, ["t"]).getvalue().splitlines() == [
+            "2025-01-01T12:00:00+00:00",
+            "2025-01-01T12:00:00+00:00",
+        ]
+
+    def test_copy_rows_statement(self):
+        """Test copy_rows sends one COPY of the row keys with the whole batch."""
+        cursor = MagicMock()
+        conn = MagicMock()
+        conn.connection.dbapi_connection.cursor.return_value = cursor
+
+        copy_rows(conn, "click_events", [make_row(1), make_row(2, country=None)])
+
+        sql, buffer = cursor.copy_expert.call_args.args
+        assert sql == "COPY click_events (link_id, clicked_at, referrer_id, ua_id, visitor_hash, country) FROM STDIN"
+        lines = buffer.getvalue().splitlines()
+        assert len(lines) == 2
+        assert lines[0].split("\t")[3] == "\\N"
+        assert lines[1].split("\t")[5] == "\\N"
+        cursor.close.assert_called_once()
+
+
+class TestWriteClickEvents:
+    def test_executemany_on_sqlite(self, db_session, monkeypatch):
+        """Test SQLite never takes the COPY path and rows are inserted in the transaction."""
+        link = make_user_link(db_session)
+        copy = MagicMock()
+        monkeypatch.setattr(click_writer, "copy_rows", copy)
+
+        write_click_events(db_session, [make_row(link.id), make_row(link.id, country=None)])
+        db_session.commit()
+
+        copy.assert_not_called()
+        countries = db_session.scalars(select(ClickEvent.country).order_by(ClickEvent.id)).all()
+        assert countries == ["US", None]
+
+    def test_copy_chosen_for_postgres(self, monkeypatch):
+        """Test PostgreSQL/psycopg2 uses COPY unless CLICK_COPY_ENABLED is off."""
+        db = MagicMock()
+        db.connection.return_value.dialect.name = "postgresql"
+        db.connection.return_value.dialect.driver = "psycopg2"
+        copy = MagicMock()
+        monkeypatch.setattr(click_writer, "copy_rows", copy)
+
+        write_click_events(db, [make_row(1)])
+        copy.assert_called_once()
+        db.execute.assert_not_called()
+
+        monkeypatch.setattr(settings, "click_copy_enabled", False)
+        write_click_events(db, [make_row(1)])
+        copy.assert_called_once()
+        db.execute.assert_called_once()
+
+    def test_empty_batch(self):
+        """Test an empty batch doesn't touch the session."""
+        db = MagicMock()
+        write_click_events(db, [])
+        db.connection.assert_not_called()
+
+
+class TestCopyOnPostgres:
+    def test_copy_round_trip(self, pg_session):
+        """Test COPY writes every value, escaped text and NULLs included, and rolls back with the session."""
+        link = make_user_link(pg_session)
+        ua_id = user_agent_ids.resolve(pg_session, ["line\nbreak"])["line\nbreak"]
+        referrer_ids = referrer_hosts.encode(pg_session, ["google.com", "a\tb\\c"])
+        odd = make_row(
+            link.id, referrer_id=referrer_ids["a\tb\\c"], ua_id=ua_id, visitor_hash="x\ty\\z", country=None
+        )
+        plain = make_row(link.id, referrer_id=referrer_ids["google.com"])
+
+        write_click_events(pg_session, [plain, odd])
+        pg_session.rollback()
+        assert pg_session.scalars(select(ClickEvent)).all() == []
+
+        write_click_events(pg_session, [plain, odd])
+        pg_session.commit()
+        events = pg_session.scalars(select(ClickEvent).order_by(ClickEvent.id)).all()
+        hosts = referrer_hosts.decode(pg_session, [e.referrer_id for e in events])
+        assert [
+            (hosts.get(e.referrer_id), e.user_agent and e.user_agent.ua_raw, e.visitor_hash, e.country) for e in events
+        ] == [
+            ("google.com", None, "a" * 64, "US"),
+            ("a\tb\\c", "line\nbreak", "x\ty\\z", None),
+        ]
+        assert events[0].clicked_at == datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc)
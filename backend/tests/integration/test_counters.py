@@ -0,0 +1,144 @@
+"""
+Integration tests for deferred link click counters (links/counters.py).
+"""
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from src.models.user import User
+from src.models.link import Link
+from src.models.click_event import ClickEvent
+from src.links import counters
+from src.links.counters import ClickCounter
+from src.links.service import RawClick, create_link, persist_click_batch, get_total_clicks_for_user
+
+
+@pytest.fixture
+def test_link(db_session):
+    user = User(email="test@example.com", display_name="Test User")
+    db_session.add(user)
+    db_session.commit()
+    return create_link(db_session, user_id=user.id, target_url="https://example.com")
+
+
+@pytest.fixture
+def deferred_counter(session_factory, monkeypatch):
+    """A deferred counter writing to the test database, used by persist_click_batch."""
+    counter = ClickCounter(mode="deferred", session_factory=session_factory)
+    monkeypatch.setattr("src.links.service.click_counter", counter)
+    return counter
+
+
+T1 = datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc)
+T2 = datetime(2025, 1, 1, 13, 0, tzinfo=timezone.utc)
+
+
+class TestClickCounter:
+    """Test delta accumulation, reads and folding."""
+
+    def test_invalid_mode(self):
+        """Test that unknown modes are rejected."""
+        with pytest.raises(ValueError):
+            ClickCounter(mode="sharded")
+
+    def test_add_merges_deltas(self):
+        """Test that repeated adds sum clicks and keep the latest timestamp."""
+        counter = ClickCounter()
+        counter.add({1: (2, T2)})
+        counter.add({1: (3, T1), 2: (1, T1)})
+
+        assert counter.pending(1) == (5, T2)
+        assert counter.pending(2) == (1, T1)
+        assert counter.pending(3) == (0, None)
+        assert counter.pending_total([1, 2, 3]) == 6
+
+    def test_totals_include_pending(self, db_session, test_link):
+        """Test that totals add pending clicks to the stored count and handle naive datetimes."""
+        test_link.click_count = 10
+        test_link.last_clicked_at = T1.replace(tzinfo=None)
+        counter = ClickCounter()
+
+        assert counter.totals(test_link) == (10, test_link.last_clicked_at)
+        counter.add({test_link.id: (2, T2)})
+        assert counter.totals(test_link) == (12, T2)
+
+    def test_flush_applies_deltas(self, db_session, test_link, session_factory):
+        """Test that a flush writes one summed update and clears pending state."""
+        counter = ClickCounter(session_factory=session_factory)
+        counter.add({test_link.id: (3, T2)})
+        counter.add({test_link.id: (1, T1)})
+
+        assert counter.flush() == 1
+
+        db_session.expire_all()
+        link = db_session.get(Link, test_link.id)
+        assert link.click_count == 4
+        assert link.last_clicked_at.replace(tzinfo=timezone.utc) == T2
+        assert counter.pending(test_link.id) == (0, None)
+        assert counter.stats()["flushes"] == 1
+        assert counter.flush() == 0
+
+    def test_failed_flush_keeps_deltas(self, db_session, test_link, session_factory):
+        """Test that deltas survive a failed fold and are applied by the next one."""
+        counter = ClickCounter(session_factory=session_factory)
+        counter.add({test_link.id: (2, T1)})
+
+        with patch.object(counters, "apply_click_deltas", side_effect=RuntimeError("db down")):
+            assert counter.flush() == 0
+        assert counter.pending(test_link.id) == (2, T1)
+        assert counter.stats()["failures"] == 1
+
+        assert counter.flush() == 1
+        db_session.expire_all()
+        assert db_session.get(Link, test_link.id).click_count == 2
+
+    def test_stop_flushes(self, db_session, test_link, session_factory):
+        """Test that stopping the flusher folds what is still pending."""
+        counter = ClickCounter(session_factory=session_factory, flush_interval=60)
+        counter.start()
+        counter.add({test_link.id: (1, T1)})
+        counter.stop(timeout=5)
+
+        db_session.expire_all()
+        assert db_session.get(Link, test_link.id).click_count == 1
+
+
+class TestDeferredClickWrites:
+    """Test the click writer and read API in deferred mode."""
+
+    def test_batch_defers_counter_update(self, db_session, test_link, deferred_counter):
+        """Test that events are committed while the links row is left alone until a flush."""
+        raws = [RawClick(test_link.id, T1, None, None, None), RawClick(test_link.id, T2, None, None, None)]
+        persist_click_batch(db_session, raws)
+
+        db_session.expire_all()
+        assert db_session.query(ClickEvent).count() == 2
+        link = db_session.get(Link, test_link.id)
+        assert link.click_count == 0
+        assert deferred_counter.totals(link) == (2, T2)
+        assert get_total_clicks_for_user(db_session, user_id=test_link.user_id) == 2
+
+        deferred_counter.flush()
+        db_session.expire_all()
+        link = db_session.get(Link, test_link.id)
+        assert link.click_count == 2
+        assert deferred_counter.totals(link)[0] == 2
+        assert get_total_clicks_for_user(db_session, user_id=test_link.user_id) == 2
+
+    def test_failed_insert_is_not_counted(self, db_session, test_link, deferred_counter):
+        """Test that clicks are only counted once their events are committed."""
+        with patch("src.links.service.enrich_click", side_effect=RuntimeError("boom")):
+            with pytest.raises(RuntimeError):
+                persist_click_batch(db_session, [RawClick(test_link.id, T1, None, None, None)])
+
+        assert deferred_counter.pending(test_link.id) == (0, None)
+
+    def test_list_links_shows_pending_clicks(self, client, db_session, test_link, deferred_counter):
+        """Test that the links API reports clicks that have not been folded yet."""
+        persist_click_batch(db_session, [RawClick(test_link.id, T1, None, None, None)])
+
+        with patch("starlette.requests.Request.session", new={"user_id": test_link.user_id}):
+            response = client.get("/api/links")
+
+        assert response.status_code == 200
+        assert response.json()[0]["click_count"] == 1
@@ -0,0 +1,230 @@
+"""
+Integration tests for the single-pass dashboard engine (links/dashboard.py),
+checked against the per-metric service functions it replaces.
+"""
+import pytest
+from datetime import datetime, timezone, timedelta
+
+from sqlalchemy import event
+
+from src.core.config import settings
+from src.models.user import User
+from src.models.click_event import ClickEvent
+from src.links.dashboard import build_dashboard, normalize_live_range
+from src.links.service import (
+    create_link,
+    list_links_for_user,
+    get_total_clicks_for_user,
+    get_total_links_for_user,
+    get_unique_visitor_count_for_user,
+    get_unique_visitors_per_link,
+    get_previous_period_metrics,
+    get_clicks_by_country,
+    get_clicks_time_series,
+)
+
+BASE = datetime(2025, 3, 10, 0, 0, tzinfo=timezone.utc)
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+COUNTRIES = ["US", "DE", None, "FR"]
+
+
+@pytest.fixture
+def test_user(db_session):
+    user = User(email="test@example.com", display_name="Test User")
+    db_session.add(user)
+    db_session.commit()
+    return user
+
+
+@pytest.fixture
+def links(db_session, test_user):
+    return [create_link(db_session, user_id=test_user.id, target_url=f"https://example.com/{i}") for i in range(3)]
+
+
+@pytest.fixture
+def events(db_session, test_user, links):
+    """Clicks over six days on three links, some without a country or visitor hash."""
+    other = User(email="other@example.com", display_name="Other")
+    db_session.add(other)
+    db_session.commit()
+    other_link = create_link(db_session, user_id=other.id, target_url="https://example.org")
+
+    rows = []
+    for i, minute in enumerate(range(0, 6 * 24 * 60, 23)):
+        rows.append(ClickEvent(
+            link_id=links[i % 3].id,
+            clicked_at=BASE + timedelta(minutes=minute),
+            country=COUNTRIES[i % 4],
+            visitor_hash=None if i % 11 == 0 else f"v{i % 29}",
+        ))
+        if i % 5 == 0:
+            rows.append(ClickEvent(link_id=other_link.id, clicked_at=BASE + timedelta(minutes=minute), visitor_hash="x"))
+    # one click exactly on the boundary between the two periods
+    rows.append(ClickEvent(link_id=links[0].id, clicked_at=BASE + 3 * DAY, country="US", visitor_hash="edge"))
+    db_session.add_all(rows)
+    db_session.commit()
+
+
+RANGES = [
+    (BASE + 3 * DAY, BASE + 4 * DAY),
+    (BASE + 3 * DAY, BASE + 6 * DAY),
+    (BASE + timedelta(days=3, minutes=17), BASE + timedelta(days=4, hours=9, minutes=5)),
+    (BASE + timedelta(days=2, hours=5, minutes=2), BASE + timedelta(days=2, hours=5, minutes=58)),
+    (BASE + timedelta(days=2, hours=5, minutes=30), BASE + timedelta(days=2, hours=6, minutes=30)),
+    (BASE + timedelta(days=1, hours=12), BASE + timedelta(days=3, hours=12)),
+    (BASE + 10 * DAY, BASE + 12 * DAY),
+]
+
+
+def expected(db, user_id, start, end, granularity, link_limit, tz="UTC", fill_gaps=False):
+    links = list_links_for_user(db, user_id=user_id, limit=link_limit, offset=0)
+    return {
+        "total_clicks": get_total_clicks_for_user(db, user_id=user_id, start_date=start, end_date=end),
+        "previous": get_previous_period_metrics(db, user_id=user_id, current_start=start, current_end=end),
+        "total_links": get_total_links_for_user(db, user_id=user_id),
+        "unique_visitors": get_unique_visitor_count_for_user(db, user_id=user_id, start_date=start, end_date=end),
+        "previous_unique_visitors": get_unique_visitor_count_for_user(
+            db, user_id=user_id, start_date=start - (end - start), end_date=start
+        ),
+        "time_series": get_clicks_time_series(
+            db, user_id=user_id, start_date=start, end_date=end, granularity=granularity, tz=tz, fill_gaps=fill_gaps
+        ),
+        "countries": get_clicks_by_country(db, user_id=user_id, start_date=start, end_date=end),
+        "links": [link.id for link in links],
+        "link_unique_visitors": get_unique_visitors_per_link(
+            db, link_ids=[link.id for link in links], start_date=start, end_date=end
+        ),
+    }
+
+
+def assert_matches(db, user_id, start, end, granularity="hour", link_limit=100, tz="UTC", fill_gaps=False):
+    data = build_dashboard(
+        db, user_id=user_id, start_date=start, end_date=end, granularity=granularity,
+        tz=tz, fill_gaps=fill_gaps, link_limit=link_limit,
+    )
+    want = expected(db, user_id, start, end, granularity, link_limit, tz, fill_gaps)
+    assert data.total_clicks == want["total_clicks"]
+    assert data.previous_clicks == want["previous"]["total_clicks"]
+    assert data.total_links == want["total_links"] == want["previous"]["total_links"]
+    assert data.unique_visitors == want["unique_visitors"]
+    assert data.previous_unique_visitors == want["previous_unique_visitors"]
+    assert data.previous_unique_visitors.value == want["previous"]["unique_visitors"]
+    assert data.time_series == want["time_series"]
+    assert data.countries == want["countries"]
+    assert [link.id for link in data.links] == want["links"]
+    assert data.link_unique_visitors == want["link_unique_visitors"]
+    return data
+
+
+class TestDashboardEngine:
+    """Test that build_dashboard matches the individual service functions."""
+
+    @pytest.mark.parametrize("start,end", RANGES)
+    @pytest.mark.parametrize("granularity", ["hour", "day", "month"])
+    def test_exact_counts(self, db_session, test_user, events, start, end, granularity):
+        """Test ranges small enough for exact unique visitors."""
+        data = assert_matches(db_session, test_user.id, start, end, granularity)
+        assert data.unique_visitors.exact
+
+    @pytest.mark.parametrize("granularity,tz", [("15m", "UTC"), ("day", "America/New_York"), ("day", "Asia/Kolkata")])
+    def test_buckets_and_time_zones(self, db_session, test_user, events, granularity, tz):
+        """Test gap-filled series for sub-hour widths and local days."""
+        assert_matches(
+            db_session, test_user.id, BASE + timedelta(days=3, minutes=17), BASE + timedelta(days=3, hours=20),
+            granularity, tz=tz, fill_gaps=True,
+        )
+
+    @pytest.mark.parametrize("start,end", RANGES)
+    def test_estimated_counts(self, db_session, test_user, events, monkeypatch, start, end):
+        """Test that sketch-based unique visitors match as well."""
+        monkeypatch.setattr(settings, "unique_visitors_exact_max_clicks", 0)
+        assert_matches(db_session, test_user.id, start, end)
+
+    @pytest.mark.parametrize("start,end,link_limit,exactness", [
+        # ~94 clicks now, ~31 before, ~31 on the one listed link
+        (BASE + 12 * HOUR, BASE + 2 * DAY, 1, (False, True)),
+        # ~62 clicks now, ~125 before
+        (BASE + 5 * DAY, BASE + 7 * DAY, 2, (True, False)),
+    ])
+    def test_mixed_exactness(self, db_session, test_user, events, monkeypatch, start, end, link_limit, exactness):
+        """Test ranges where the two periods and the link table decide exactness differently."""
+        monkeypatch.setattr(settings, "unique_visitors_exact_max_clicks", 80)
+        data = assert_matches(db_session, test_user.id, start, end, link_limit=link_limit)
+        assert (data.unique_visitors.exact, data.previous_unique_visitors.exact) == exactness
+
+    def test_link_limit(self, db_session, test_user, events):
+        """Test that only the listed links get unique visitors and total links still counts all."""
+        data = assert_matches(db_session, test_user.id, BASE + 3 * DAY, BASE + 4 * DAY, link_limit=2)
+        assert len(data.links) == 2
+        assert data.total_links == 3
+        assert set(data.link_unique_visitors) <= {link.id for link in data.links}
+
+    def test_query_count(self, db_session, test_user, events, monkeypatch):
+        """Test that a dashboard load is a handful of statements, whatever the range."""
+        monkeypatch.setattr(settings, "unique_visitors_exact_max_clicks", 0)
+        user_id = test_user.id
+        statements = []
+        engine = db_session.get_bind()
+        listener = lambda *args: statements.append(args[2])
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            build_dashboard(
+                db_session, user_id=user_id, start_date=BASE + timedelta(days=3, minutes=5),
+                end_date=BASE + timedelta(days=5, minutes=50), link_limit=2,
+            )
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+        # links, link count, retention watermark, hourly rollup, country rollup, raw edges, sketches
+        assert len(statements) == 7
+
+    def test_exact_counts_in_sql(self, db_session, test_user, events):
+        """Test that exact unique visitors are counted by the database, not from streamed rows."""
+        statements = []
+        engine = db_session.get_bind()
+        listener = lambda *args: statements.append(args[2])
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            data = build_dashboard(db_session, user_id=test_user.id, start_date=BASE + 3 * DAY, end_date=BASE + 5 * DAY)
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+        assert data.unique_visitors.exact and data.previous_unique_visitors.exact
+        # period, countries and listed links now, and the previous period
+        distinct_counts = [s for s in statements if "count(DISTINCT click_events.visitor_hash)" in s]
+        assert len(distinct_counts) == 4
+        assert_matches(db_session, test_user.id, BASE + 3 * DAY, BASE + 5 * DAY)
+
+    def test_no_links(self, db_session, test_user):
+        """Test a user without links."""
+        data = assert_matches(db_session, test_user.id, BASE, BASE + DAY)
+        assert data.total_clicks == 0
+        assert data.links == [] and data.time_series == [] and data.countries == []
+
+
+class TestNormalizeLiveRange:
+    """Test snapping preset ranges that end now."""
+
+    NOW = datetime(2025, 3, 10, 14, 37, 12, tzinfo=timezone.utc)
+
+    def test_presets_share_a_range(self):
+        """Test that 7d presets picked minutes apart normalize to the same hour-aligned range."""
+        a = normalize_live_range(self.NOW - 7 * DAY, self.NOW, now=self.NOW)
+        later = self.NOW + timedelta(minutes=20)
+        b = normalize_live_range(later - 7 * DAY, later, now=later)
+        assert a == b
+        start, end = a
+        assert start == datetime(2025, 3, 3, 15, tzinfo=timezone.utc)
+        assert end == datetime(2025, 3, 10, 15, tzinfo=timezone.utc) - timedelta(microseconds=1)
+
+    def test_stale_end_within_the_hour(self):
+        """Test a preset picked earlier in the page's life."""
+        picked = self.NOW - timedelta(minutes=30)
+        start, end = normalize_live_range(picked - DAY, picked, now=self.NOW)
+        assert (end - start).total_seconds() == pytest.approx(24 * 3600)
+
+    def test_historical_ranges_untouched(self):
+        """Test that ranges ending in the past or future are left alone."""
+        past = (BASE, BASE + DAY)
+        assert normalize_live_range(*past, now=self.NOW) == past
+        future = (self.NOW, self.NOW + DAY)
+        assert normalize_live_range(*future, now=self.NOW) == future
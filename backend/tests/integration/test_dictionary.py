@@ -0,0 +1,54 @@
+"""
+Integration tests for links/dictionary.py.
+"""
+from sqlalchemy import func, select
+
+from src.links.dictionary import DimensionDictionary
+from src.models.dimension_value import DimensionValue
+
+
+def count_values(db):
+    return db.scalar(select(func.count()).select_from(DimensionValue))
+
+
+class TestDimensionDictionary:
+    def test_encode_inserts_each_value_once(self, db_session):
+        referrers = DimensionDictionary("referrer", max_entries=100)
+        ids = referrers.encode(db_session, ["google.com", "t.co", "google.com", None, ""])
+
+        assert set(ids) == {"google.com", "t.co"}
+        assert len(set(ids.values())) == 2
+        assert count_values(db_session) == 2
+        assert referrers.stats()["inserted"] == 2
+
+    def test_round_trip(self, db_session):
+        referrers = DimensionDictionary("referrer", max_entries=100)
+        ids = referrers.encode(db_session, ["google.com", "t.co"])
+
+        assert referrers.decode(db_session, [*ids.values(), None, 999]) == {v: k for k, v in ids.items()}
+
+    def test_second_encode_served_from_cache(self, db_session):
+        referrers = DimensionDictionary("referrer", max_entries=100)
+        first = referrers.encode(db_session, ["t.co"])
+        hits = referrers.stats()["hits"]
+
+        assert referrers.encode(db_session, ["t.co"]) == first
+        assert referrers.stats()["hits"] == hits + 1
+
+    def test_cold_process_reuses_rows(self, db_session):
+        """Test that another process maps values and ids to the rows already stored."""
+        ids = DimensionDictionary("referrer", max_entries=100).encode(db_session, ["t.co"])
+        other = DimensionDictionary("referrer", max_entries=100)
+
+        assert other.decode(db_session, [ids["t.co"]]) == {ids["t.co"]: "t.co"}
+        assert other.encode(db_session, ["t.co"]) == ids
+        assert other.stats()["inserted"] == 0
+        assert count_values(db_session) == 1
+
+    def test_dimensions_are_separate(self, db_session):
+        referrers = DimensionDictionary("referrer", max_entries=100)
+        others = DimensionDictionary("other", max_entries=100)
+        referrer_id = referrers.encode(db_session, ["t.co"])["t.co"]
+
+        assert others.decode(db_session, [referrer_id]) == {}
+        assert others.encode(db_session, ["t.co"])["t.co"] != referrer_id
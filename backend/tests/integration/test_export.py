@@ -0,0 +1,104 @@
+"""
+Integration tests for links/export.py streaming.
+"""
+import csv
+import io
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.links import export
+from src.links.dictionary import referrer_hosts
+from src.links.export import click_export_query, parse_columns, stream_click_export
+from src.links.user_agents import user_agent_ids
+from src.models.click_event import ClickEvent
+from src.models.link import Link
+from src.models.user import User
+
+BASE = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def link(db_session):
+    user = User(email="test@example.com", display_name="Test User")
+    db_session.add(user)
+    db_session.commit()
+    link = Link(user_id=user.id, target_url="https://example.com", slug="abc1234", is_active=True)
+    db_session.add(link)
+    db_session.commit()
+    return link
+
+
+@pytest.fixture
+def events(db_session, link):
+    referrer_id = referrer_hosts.encode(db_session, ['quoted, "host"'])['quoted, "host"']
+    db_session.add_all([
+        ClickEvent(
+            link_id=link.id,
+            clicked_at=BASE + timedelta(minutes=i),
+            country=None if i % 4 == 0 else "US",
+            referrer_id=referrer_id if i == 1 else None,
+        )
+        for i in range(25)
+    ])
+    db_session.commit()
+
+
+class TestStreamClickExport:
+    def test_streams_in_batches(self, db_session, link, events, monkeypatch):
+        """Test that rows are emitted one chunk per batch rather than all at once."""
+        monkeypatch.setattr(export, "EXPORT_BATCH", 10)
+        columns = ["id", "clicked_at"]
+        chunks = list(stream_click_export(db_session, click_export_query([link.id], columns=columns), columns, "ndjson"))
+
+        assert [c.count(b"\n") for c in chunks] == [10, 10, 5]
+        rows = [json.loads(line) for chunk in chunks for line in chunk.splitlines()]
+        assert [r["clicked_at"] for r in rows] == [(BASE + timedelta(minutes=i)).isoformat() for i in range(25)]
+
+    def test_csv_round_trip(self, db_session, link, events, monkeypatch):
+        """Test that CSV output parses back to the stored values, nulls as empty fields."""
+        monkeypatch.setattr(export, "EXPORT_BATCH", 7)
+        columns = ["clicked_at", "country", "referrer_host"]
+        body = b"".join(stream_click_export(db_session, click_export_query([link.id], columns=columns), columns, "csv"))
+
+        rows = list(csv.reader(io.StringIO(body.decode())))
+        assert rows[0] == columns
+        assert len(rows) == 26
+        assert rows[1] == [BASE.isoformat(), "", ""]
+        assert rows[2] == [(BASE + timedelta(minutes=1)).isoformat(), "US", 'quoted, "host"']
+
+    def test_date_range_inclusive(self, db_session, link, events):
+        columns = ["id"]
+        stmt = click_export_query(
+            [link.id], columns=columns, start_date=BASE + timedelta(minutes=5), end_date=BASE + timedelta(minutes=9)
+        )
+        body = b"".join(stream_click_export(db_session, stmt, columns, "ndjson"))
+        assert len(body.splitlines()) == 5
+
+    def test_user_agent_columns_joined(self, db_session, link, events):
+        """Test that user agent columns come from user_agents, null for clicks without one."""
+        ua = "Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0"
+        ua_id = user_agent_ids.resolve(db_session, [ua])[ua]
+        db_session.add(ClickEvent(link_id=link.id, clicked_at=BASE + timedelta(hours=1), ua_id=ua_id))
+        db_session.commit()
+
+        columns = ["browser_name", "ua_raw"]
+        body = b"".join(stream_click_export(db_session, click_export_query([link.id], columns=columns), columns, "ndjson"))
+        rows = [json.loads(line) for line in body.splitlines()]
+        assert len(rows) == 26
+        assert rows[0] == {"browser_name": None, "ua_raw": None}
+        assert rows[-1] == {"browser_name": "Firefox", "ua_raw": ua}
+
+
+class TestParseColumns:
+    def test_default_is_all(self):
+        assert parse_columns(None) == list(export.EXPORT_COLUMNS)
+
+    def test_order_kept_and_deduplicated(self):
+        assert parse_columns("country, id,country") == ["country", "id"]
+
+    @pytest.mark.parametrize("columns", ["id,nope", ",", " "])
+    def test_invalid(self, columns):
+        with pytest.raises(ValueError):
+            parse_columns(columns)
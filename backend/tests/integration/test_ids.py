@@ -0,0 +1,101 @@
+"""
+Integration tests for links/ids.py hi-lo id allocation.
+"""
+import pytest
+from sqlalchemy import event, select
+
+from src.links.ids import IdBlockAllocator, link_ids
+from src.links.service import create_link
+from src.links.slug import slug_for_id
+from src.models.id_block import IdBlock
+from src.models.link import Link
+from src.models.user import User
+from tests.conftest import test_engine
+
+
+@pytest.fixture
+def test_user(db_session):
+    user = User(email="test@example.com", display_name="Test User")
+    db_session.add(user)
+    db_session.commit()
+    return user
+
+
+def allocator(block_size=10):
+    return IdBlockAllocator("links", Link.id, block_size=block_size)
+
+
+class TestIdBlockAllocator:
+    def test_seeded_after_existing_ids(self, db_session, test_user):
+        db_session.add(Link(id=41, user_id=test_user.id, target_url="https://example.com", slug="x"))
+        db_session.commit()
+
+        assert allocator().allocate(test_engine, 3) == [42, 43, 44]
+        assert db_session.get(IdBlock, "links").next_value == 52
+
+    def test_ids_served_from_memory_within_a_block(self, db_session):
+        ids = allocator(block_size=5)
+        first = ids.allocate(test_engine, 3)
+        rest = ids.allocate(test_engine, 2)
+        assert first + rest == list(range(first[0], first[0] + 5))
+        assert ids.stats()["blocks"] == 1
+
+        ids.next(test_engine)
+        assert ids.stats()["blocks"] == 2
+
+    def test_processes_get_disjoint_blocks(self, db_session):
+        a, b = allocator(block_size=4), allocator(block_size=4)
+        seen = []
+        for _ in range(5):
+            seen += a.allocate(test_engine, 3)
+            seen += b.allocate(test_engine, 2)
+        assert len(seen) == len(set(seen))
+
+    def test_large_request_takes_one_block(self, db_session):
+        ids = allocator(block_size=10)
+        got = ids.allocate(test_engine, 25)
+        assert got == list(range(got[0], got[0] + 25))
+        assert ids.stats()["blocks"] == 1
+
+    def test_reservation_survives_caller_rollback(self, db_session, test_user):
+        ids = allocator(block_size=10)
+        first = ids.next(test_engine)
+        db_session.add(Link(id=first, user_id=test_user.id, target_url="https://example.com", slug="x"))
+        db_session.flush()
+        db_session.rollback()
+
+        # a fresh process must not be handed the same block again
+        assert allocator(block_size=10).next(test_engine) >= first + 10
+
+
+class TestLinkIds:
+    def test_new_links_get_id_and_slug_before_insert(self, db_session, test_user):
+        link = Link(user_id=test_user.id, target_url="https://example.com", is_active=True)
+        db_session.add(link)
+        db_session.commit()
+
+        assert link.id is not None
+        assert link.slug == slug_for_id(link.id)
+
+    def test_explicit_slug_kept(self, db_session, test_user):
+        link = Link(user_id=test_user.id, target_url="https://example.com", slug="custom")
+        db_session.add(link)
+        db_session.commit()
+        assert link.slug == "custom"
+
+    def test_create_link_is_a_single_insert(self, db_session, test_user):
+        link_ids.next(test_engine)  # make sure no block fetch falls inside the measurement
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement.split()[0].upper())
+
+        event.listen(test_engine, "before_cursor_execute", record)
+        try:
+            link = create_link(db_session, user_id=test_user.id, target_url="https://example.com")
+        finally:
+            event.remove(test_engine, "before_cursor_execute", record)
+
+        assert statements.count("INSERT") == 1
+        assert "UPDATE" not in statements
+        assert db_session.execute(select(Link.slug).where(Link.id == link.id)).scalar_one() == slug_for_id(link.id)
@@ -0,0 +1,328 @@
+"""
+Integration tests for the asynchronous click ingestion pipeline (links/ingest.py).
+Workers write through a session factory bound to the test database.
+"""
+import threading
+import pytest
+from datetime import datetime, timezone
+
+from sqlalchemy.exc import OperationalError
+
+from src.models.user import User
+from src.models.link import Link
+from src.models.click_event import ClickEvent
+from src.links.dictionary import referrer_hosts
+from src.links.ingest import ClickIngestor, _dump_click, _load_click
+from src.links.service import RawClick, create_link, persist_click_batch
+
+
+@pytest.fixture
+def test_link(db_session):
+    user = User(email="test@example.com", display_name="Test User")
+    db_session.add(user)
+    db_session.commit()
+    return create_link(db_session, user_id=user.id, target_url="https://example.com")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_click(link_id: int) -> RawClick:
+    return RawClick(
+        link_id=link_id,
+        clicked_at=datetime.now(timezone.utc),
+        ip="192.168.1.100",
+        ua="Mozilla/5.0",
+        referrer_host="google.com",
+    )
+
+
+class TestPersistClickBatch:
+    """Test the batched click writer."""
+
+    def test_batch_inserts_events_and_coalesces_counters(self, db_session, test_link):
+        """Test one batch writes every event and a single summed counter update per link."""
+        other = create_link(db_session, user_id=test_link.user_id, target_url="https://example.com/2")
+        base = datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc)
+        raws = [
+            RawClick(link_id=test_link.id, clicked_at=base.replace(minute=m), ip="1.1.1.1", ua=None, referrer_host=None)
+            for m in (5, 30, 10)
+        ] + [RawClick(link_id=other.id, clicked_at=base, ip=None, ua=None, referrer_host=None)]
+
+        persist_click_batch(db_session, raws)
+
+        db_session.expire_all()
+        assert db_session.query(ClickEvent).count() == 4
+        link = db_session.get(Link, test_link.id)
+        assert link.click_count == 3
+        assert link.last_clicked_at.replace(tzinfo=timezone.utc) == base.replace(minute=30)
+        assert db_session.get(Link, other.id).click_count == 1
+
+    def test_last_clicked_at_never_moves_backwards(self, db_session, test_link):
+        """Test that an older batch doesn't overwrite a newer last_clicked_at."""
+        newer = datetime(2025, 1, 2, tzinfo=timezone.utc)
+        older = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        persist_click_batch(db_session, [RawClick(test_link.id, newer, None, None, None)])
+        persist_click_batch(db_session, [RawClick(test_link.id, older, None, None, None)])
+
+        db_session.expire_all()
+        link = db_session.get(Link, test_link.id)
+        assert link.click_count == 2
+        assert link.last_clicked_at.replace(tzinfo=timezone.utc) == newer
+
+    def test_empty_batch_is_noop(self, db_session):
+        """Test that an empty batch does nothing."""
+        persist_click_batch(db_session, [])
+        assert db_session.query(ClickEvent).count() == 0
+
+
+class TestClickIngestor:
+    """Test ClickIngestor queueing, backpressure and shutdown flush."""
+
+    def test_stop_flushes_queued_clicks(self, db_session, session_factory, test_link):
+        """Test that clicks submitted before stop() are all persisted."""
+        ingestor = ClickIngestor(max_size=100, workers=2, session_factory=session_factory)
+        ingestor.start()
+        for _ in range(5):
+            assert ingestor.submit(make_click(test_link.id)) is True
+        ingestor.stop(timeout=5)
+
+        db_session.expire_all()
+        assert db_session.query(ClickEvent).filter_by(link_id=test_link.id).count() == 5
+        assert db_session.get(Link, test_link.id).click_count == 5
+        assert ingestor.stats()["persisted"] == 5
+        assert ingestor.stats()["depth"] == 0
+
+    def test_enriches_on_worker(self, db_session, session_factory, test_link):
+        """Test that workers fill in visitor hash and parsed UA fields."""
+        ingestor = ClickIngestor(max_size=10, session_factory=session_factory)
+        ingestor.start()
+        ingestor.submit(make_click(test_link.id))
+        ingestor.stop(timeout=5)
+
+        event = db_session.query(ClickEvent).filter_by(link_id=test_link.id).one()
+        assert event.visitor_hash is not None
+        assert referrer_hosts.decode(db_session, [event.referrer_id]) == {event.referrer_id: "google.com"}
+        assert event.user_agent.ua_raw == "Mozilla/5.0"
+
+    def test_clicks_are_batched(self, db_session, session_factory, test_link):
+        """Test that queued clicks are written in batches, not one transaction each."""
+        batches = []
+
+        def recording_persist(db, batch):
+            batches.append(len(batch))
+            persist_click_batch(db, batch)
+
+        ingestor = ClickIngestor(
+            max_size=100, workers=1, batch_max_size=50, batch_max_wait=0.5,
+            session_factory=session_factory, persist=recording_persist,
+        )
+        ingestor.start()
+        for _ in range(20):
+            ingestor.submit(make_click(test_link.id))
+        ingestor.stop(timeout=5)
+
+        assert sum(batches) == 20
+        assert len(batches) < 20
+        db_session.expire_all()
+        assert db_session.get(Link, test_link.id).click_count == 20
+
+    def test_failed_batch_retried_per_click(self, db_session, session_factory, test_link):
+        """Test that one bad click doesn't take the rest of its batch down."""
+        ingestor = ClickIngestor(max_size=100, workers=1, batch_max_wait=0.5, session_factory=session_factory)
+        ingestor.start()
+        ingestor.submit(make_click(test_link.id))
+        ingestor.submit(RawClick(link_id=test_link.id, clicked_at="not-a-datetime", ip=None, ua=None, referrer_host=None))
+        ingestor.submit(make_click(test_link.id))
+        ingestor.stop(timeout=5)
+
+        stats = ingestor.stats()
+        assert stats["persisted"] == 2
+        assert stats["failed"] == 1
+        db_session.expire_all()
+        assert db_session.query(ClickEvent).filter_by(link_id=test_link.id).count() == 2
+
+    def test_submit_before_start_drops(self, session_factory):
+        """Test that nothing is accepted while the ingestor isn't running."""
+        ingestor = ClickIngestor(max_size=10, session_factory=session_factory)
+        assert ingestor.submit(make_click(1)) is False
+        assert ingestor.stats()["dropped"] == 1
+
+    def test_drop_policy_when_full(self, session_factory, test_link):
+        """Test that a full queue drops clicks under the drop policy."""
+        release = threading.Event()
+
+        def slow_persist(db, batch):
+            release.wait(5)
+
+        ingestor = ClickIngestor(max_size=1, workers=1, session_factory=session_factory, persist=slow_persist)
+        ingestor.start()
+        results = [ingestor.submit(make_click(test_link.id)) for _ in range(5)]
+        release.set()
+        ingestor.stop(timeout=5)
+
+        assert results.count(False) >= 3
+        assert ingestor.stats()["dropped"] == results.count(False)
+
+    def test_spill_policy_replays_on_stop(self, db_session, session_factory, test_link, tmp_path):
+        """Test that spilled clicks are written to disk and replayed into the DB."""
+        release = threading.Event()
+        persisted = []
+
+        def gated_persist(db, batch):
+            release.wait(5)
+            persisted.extend(batch)
+
+        spill_path = str(tmp_path / "spill.ndjson")
+        ingestor = ClickIngestor(
+            max_size=1, workers=1, policy="spill", spill_path=spill_path,
+            session_factory=session_factory, persist=gated_persist,
+        )
+        ingestor.start()
+        for _ in range(5):
+            assert ingestor.submit(make_click(test_link.id)) is True
+        release.set()
+        ingestor.stop(timeout=5)
+
+        stats = ingestor.stats()
+        assert stats["dropped"] == 0
+        assert stats["spilled"] >= 1
+        assert stats["replayed"] == stats["spilled"]
+        assert len(persisted) == 5
+        assert all(r.link_id == test_link.id for r in persisted)
+
+    def test_spill_kept_while_db_is_down(self, session_factory, test_link, tmp_path):
+        """Test that a replay during a DB outage stops at the first error and keeps every click."""
+        down = True
+        calls = []
+
+        def flaky_persist(db, batch):
+            calls.append(len(batch))
+            if down:
+                raise OperationalError("INSERT", {}, Exception("database unavailable"))
+
+        clock = FakeClock()
+        spill_path = tmp_path / "spill.ndjson"
+        spill_path.write_text("".join(_dump_click(make_click(test_link.id)) + "\n" for _ in range(3)))
+        ingestor = ClickIngestor(
+            max_size=10, policy="spill", spill_path=str(spill_path), batch_max_size=2,
+            session_factory=session_factory, persist=flaky_persist, clock=clock,
+        )
+
+        ingestor._replay_spill()
+        assert calls == [2]
+        assert ingestor.stats()["replayed"] == 0
+        assert ingestor.stats()["failed"] == 0
+        retry = (tmp_path / "spill.ndjson.retry").read_text().splitlines()
+        assert [_load_click(line)[1] for line in retry] == [0, 0, 0]
+        assert not (tmp_path / "spill.ndjson.replay").exists()
+
+        down = False
+        ingestor._replay_spill()  # backing off
+        assert calls == [2]
+        clock.now += 1
+        ingestor._replay_spill()
+        assert calls == [2, 2, 1]
+        assert ingestor.stats()["replayed"] == 3
+        assert not (tmp_path / "spill.ndjson.retry").exists()
+
+    def test_backoff_doubles_until_a_replay_succeeds(self, session_factory, test_link, tmp_path):
+        """Test that each failed replay doubles the wait before the next, up to the maximum."""
+        down = True
+
+        def flaky_persist(db, batch):
+            if down:
+                raise OperationalError("INSERT", {}, Exception("database unavailable"))
+
+        clock = FakeClock()
+        spill_path = tmp_path / "spill.ndjson"
+        spill_path.write_text(_dump_click(make_click(test_link.id)) + "\n")
+        ingestor = ClickIngestor(
+            max_size=10, policy="spill", spill_path=str(spill_path), retry_backoff=1.0, retry_backoff_max=4.0,
+            session_factory=session_factory, persist=flaky_persist, clock=clock,
+        )
+
+        waits = []
+        for _ in range(4):
+            ingestor._replay_spill()
+            waits.append(ingestor._retry_at - clock.now)
+            clock.now = ingestor._retry_at
+        assert waits == [1.0, 2.0, 4.0, 4.0]
+
+        down = False
+        ingestor._replay_spill()
+        assert ingestor.stats()["replayed"] == 1
+        assert ingestor._retry_at == 0.0
+
+    def test_poison_click_dead_lettered(self, session_factory, test_link, tmp_path):
+        """Test that a click failing every replay ends in the .dead file and no longer blocks the others."""
+        written = []
+
+        def picky_persist(db, batch):
+            if any(raw.ip == "poison" for raw in batch):
+                raise ValueError("bad row")
+            written.extend(batch)
+
+        clock = FakeClock()
+        spill_path = tmp_path / "spill.ndjson"
+        poison = RawClick(link_id=test_link.id, clicked_at=datetime.now(timezone.utc), ip="poison", ua=None, referrer_host=None)
+        spill_path.write_text(
+            _dump_click(poison) + "\nnot json\n" + _dump_click(make_click(test_link.id)) + "\n"
+        )
+        ingestor = ClickIngestor(
+            max_size=10, policy="spill", spill_path=str(spill_path), max_attempts=2,
+            session_factory=session_factory, persist=picky_persist, clock=clock,
+        )
+
+        ingestor._replay_spill()
+        assert len(written) == 1
+        assert ingestor.stats()["dead_lettered"] == 1  # the unparsable line
+
+        clock.now += 10
+        ingestor._replay_spill()
+        stats = ingestor.stats()
+        assert stats["dead_lettered"] == 2
+        assert stats["failed"] == 2
+        assert not (tmp_path / "spill.ndjson.retry").exists()
+        dead = (tmp_path / "spill.ndjson.dead").read_text().splitlines()
+        assert dead[0] == "not json"
+        assert _load_click(dead[1]) == (poison, 2)
+
+    def test_new_spills_rotate_while_clicks_wait_for_retry(self, session_factory, test_link, tmp_path):
+        """Test that clicks spilled after a failed replay are replayed too, not piled up behind the leftovers."""
+        down = True
+        written = []
+
+        def flaky_persist(db, batch):
+            if down:
+                raise OperationalError("INSERT", {}, Exception("database unavailable"))
+            written.extend(batch)
+
+        clock = FakeClock()
+        spill_path = tmp_path / "spill.ndjson"
+        spill_path.write_text(_dump_click(make_click(test_link.id)) + "\n")
+        ingestor = ClickIngestor(
+            max_size=10, policy="spill", spill_path=str(spill_path),
+            session_factory=session_factory, persist=flaky_persist, clock=clock,
+        )
+        ingestor._replay_spill()
+        assert ingestor._spill(make_click(test_link.id))
+
+        down = False
+        clock.now += 1
+        ingestor._replay_spill()
+        assert len(written) == 2
+        assert not spill_path.exists()
+        assert list(tmp_path.iterdir()) == []
+
+    def test_invalid_policy(self):
+        """Test that unknown policies are rejected."""
+        with pytest.raises(ValueError):
+            ClickIngestor(max_size=10, policy="explode")
+        with pytest.raises(ValueError):
+            ClickIngestor(max_size=10, policy="spill")
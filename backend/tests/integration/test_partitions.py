@@ -0,0 +1,248 @@
+"""
+Integration tests for links/partitions.py. Everything but the SQLite no-op
+checks needs PostgreSQL (TEST_POSTGRES_URL); the EXPLAIN tests check that
+the click_events queries in service.py and dashboard.py only scan the
+partitions of the months they ask about.
+"""
+import re
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event, select, text
+
+from src.links import partitions
+from src.links.dashboard import build_dashboard
+from src.links.export import EXPORT_COLUMNS, click_export_query
+from src.links.partitions import (
+    PartitionMaintainer,
+    ensure_partitions,
+    existing_partitions,
+    is_partitioned,
+    maintain_partitions,
+)
+from src.links.service import (
+    RawClick,
+    create_link,
+    get_clicks_by_country,
+    get_clicks_time_series,
+    get_total_clicks_for_user,
+    get_unique_visitor_count_for_user,
+    persist_click_batch,
+)
+from src.models.click_event import ClickEvent
+from src.models.user import User
+from tests.conftest import load_migration, partition_click_events, test_engine
+
+NOW = datetime(2025, 6, 15, tzinfo=timezone.utc)
+
+
+def utc(*args) -> datetime:
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def clicks(pg_session):
+    """One click a day from 2025-01-01 through 2025-06-14, in a partitioned click_events."""
+    user = User(email="test@example.com", display_name="Test User")
+    pg_session.add(user)
+    pg_session.commit()
+    link = create_link(pg_session, user_id=user.id, target_url="https://example.com")
+    day = utc(2025, 1, 1, 12)
+    raws = []
+    while day < NOW:
+        raws.append(RawClick(link.id, day, None, "Mozilla/5.0", None))
+        day += timedelta(days=1)
+    persist_click_batch(pg_session, raws)
+    pg_session.commit()
+
+    partition_click_events(pg_session, months_ahead=2, now=NOW)
+    return user, link
+
+
+@contextmanager
+def scanned_partitions(db):
+    """
+    Collect, per click_events query run in the block, the partitions
+    PostgreSQL's EXPLAIN plan would scan with the same parameters.
+    """
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "click_events" in statement:
+            statements.append((statement, parameters))
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", capture)
+    scans: list[set[str]] = []
+    try:
+        yield scans
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            plan = "\n".join(conn.exec_driver_sql("EXPLAIN " + statement, parameters).scalars())
+            scans.append(set(re.findall(r"click_events_(?:p\d{6}|default)\b", plan)))
+
+
+class TestSqliteNoop:
+    def test_maintenance_skips_sqlite(self):
+        """Test maintenance does nothing and starts no thread on SQLite."""
+        assert maintain_partitions(test_engine) == []
+        maintainer = PartitionMaintainer(interval=60)
+        maintainer.start(test_engine)
+        assert maintainer._thread is None
+
+
+class TestPartitioning:
+    def test_conversion_keeps_rows_and_ids(self, pg_session, clicks):
+        """Test converting moves every row into its month and new ids continue the sequence."""
+        conn = pg_session.connection()
+        assert is_partitioned(conn)
+        assert existing_partitions(conn) == [
+            "click_events_default",
+            *[f"click_events_p2025{m:02d}" for m in range(1, 9)],
+        ]
+        per_partition = {
+            name: n for name, n in conn.execute(text(
+                "SELECT tableoid::regclass::text, count(*) FROM click_events GROUP BY 1"
+            ))
+        }
+        assert per_partition["click_events_p202501"] == 31
+        assert per_partition["click_events_p202506"] == 14
+        assert sum(per_partition.values()) == 165
+
+        max_id = pg_session.scalar(select(ClickEvent.id).order_by(ClickEvent.id.desc()).limit(1))
+        persist_click_batch(pg_session, [RawClick(clicks[1].id, utc(2025, 6, 20), None, None, None)])
+        pg_session.commit()
+        assert pg_session.scalar(select(ClickEvent.id).where(ClickEvent.clicked_at == utc(2025, 6, 20))) == max_id + 1
+
+    def test_rows_outside_months_go_to_default(self, pg_session, clicks):
+        persist_click_batch(pg_session, [RawClick(clicks[1].id, utc(2030, 1, 1), None, None, None)])
+        pg_session.commit()
+        where = pg_session.execute(text(
+            "SELECT tableoid::regclass::text FROM click_events WHERE clicked_at = :t"
+        ), {"t": utc(2030, 1, 1)}).scalar_one()
+        assert where == "click_events_default"
+
+    def test_ensure_partitions_is_idempotent(self, pg_session, clicks):
+        conn = pg_session.connection()
+        assert ensure_partitions(conn, months_ahead=2, now=NOW) == []
+        assert ensure_partitions(conn, months_ahead=4, now=NOW) == ["click_events_p202509", "click_events_p202510"]
+
+    def test_maintainer_creates_ahead(self, pg_session, clicks, monkeypatch):
+        """Test the maintainer creates months ahead of today and reports them."""
+        monkeypatch.setattr(partitions.settings, "click_partition_months_ahead", 1)
+        maintainer = PartitionMaintainer(interval=60)
+        created = maintainer.run_once(pg_session.get_bind())
+
+        current = partitions.month_start(datetime.now(timezone.utc))
+        expected = {partitions.partition_name(partitions.add_months(current, n)) for n in range(2)}
+        assert set(created) == expected
+        assert expected <= set(existing_partitions(pg_session.connection()))
+        assert maintainer.stats()["runs"] == 1 and maintainer.stats()["failures"] == 0
+
+    def test_clicks_during_copy_are_kept(self, pg_session):
+        """Test clicks inserted while months are being copied reach the partitioned table."""
+        user = User(email="test@example.com", display_name="Test User")
+        pg_session.add(user)
+        pg_session.commit()
+        link = create_link(pg_session, user_id=user.id, target_url="https://example.com")
+        link_id = link.id
+        persist_click_batch(pg_session, [RawClick(link_id, utc(2025, 5, d), None, None, None) for d in range(1, 11)])
+        pg_session.commit()
+
+        def click_meanwhile(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith("INSERT INTO click_events_partitioned") and not inserted:
+                inserted.append(True)
+                with test_pg.begin() as other:
+                    other.execute(ClickEvent.__table__.insert().values(link_id=link_id, clicked_at=utc(2025, 5, 20)))
+
+        inserted: list[bool] = []
+        test_pg = pg_session.get_bind()
+        event.listen(test_pg, "after_cursor_execute", click_meanwhile)
+        try:
+            partition_click_events(pg_session, months_ahead=1, now=NOW)
+        finally:
+            event.remove(test_pg, "after_cursor_execute", click_meanwhile)
+
+        assert inserted
+        assert is_partitioned(pg_session.connection())
+        assert pg_session.query(ClickEvent).count() == 11
+
+    def test_rerun_after_failure_resumes(self, pg_session):
+        """Test a conversion that failed midway can be re-run without duplicating rows."""
+        user = User(email="test@example.com", display_name="Test User")
+        pg_session.add(user)
+        pg_session.commit()
+        link = create_link(pg_session, user_id=user.id, target_url="https://example.com")
+        persist_click_batch(pg_session, [RawClick(link.id, utc(2025, m, 1), None, None, None) for m in range(1, 7)])
+        pg_session.commit()
+
+        def lose_connection_in_march(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith("INSERT INTO click_events_partitioned") and parameters.get("start") == utc(2025, 3, 1):
+                raise RuntimeError("connection lost")
+
+        migration = load_migration("f6a7b8c9d0e1")
+        engine = pg_session.get_bind()
+        with engine.connect() as conn:
+            conn.execution_options(isolation_level="AUTOCOMMIT")
+            event.listen(engine, "before_cursor_execute", lose_connection_in_march)
+            try:
+                with pytest.raises(RuntimeError):
+                    migration.partition_click_events(conn, months_ahead=1, now=NOW)
+            finally:
+                event.remove(engine, "before_cursor_execute", lose_connection_in_march)
+            assert not is_partitioned(conn)
+            assert conn.execute(text("SELECT count(*) FROM click_events_partitioned")).scalar_one() == 2
+            migration.partition_click_events(conn, months_ahead=1, now=NOW)
+
+        assert is_partitioned(pg_session.connection())
+        assert pg_session.query(ClickEvent).count() == 6
+
+    def test_unpartition(self, pg_session, clicks):
+        conn = pg_session.connection()
+        load_migration("f6a7b8c9d0e1").unpartition_click_events(conn)
+        pg_session.commit()
+        assert not is_partitioned(pg_session.connection())
+        assert pg_session.scalar(select(ClickEvent.id).limit(1)) is not None
+        assert pg_session.query(ClickEvent).count() == 165
+
+
+class TestPruning:
+    """EXPLAIN the queries the service runs for a range inside March 2025."""
+
+    START, END = utc(2025, 3, 10, 9, 30), utc(2025, 3, 20, 17, 45)
+    MARCH = {"click_events_p202503"}
+
+    def test_click_totals(self, pg_session, clicks):
+        with scanned_partitions(pg_session) as scans:
+            get_total_clicks_for_user(pg_session, user_id=clicks[0].id, start_date=self.START, end_date=self.END)
+        assert scans and all(scan and scan <= self.MARCH for scan in scans)
+
+    def test_unique_visitors(self, pg_session, clicks):
+        with scanned_partitions(pg_session) as scans:
+            get_unique_visitor_count_for_user(pg_session, user_id=clicks[0].id, start_date=self.START, end_date=self.END)
+        assert scans and all(scan and scan <= self.MARCH for scan in scans)
+
+    def test_time_series_and_countries(self, pg_session, clicks):
+        with scanned_partitions(pg_session) as scans:
+            get_clicks_time_series(
+                pg_session, user_id=clicks[0].id, start_date=self.START, end_date=self.END, granularity="15m"
+            )
+            get_clicks_by_country(pg_session, user_id=clicks[0].id, start_date=self.START, end_date=self.END)
+        assert scans and all(scan and scan <= self.MARCH for scan in scans)
+
+    def test_dashboard(self, pg_session, clicks):
+        """Test the dashboard scan covers only the current and the previous period's months."""
+        with scanned_partitions(pg_session) as scans:
+            build_dashboard(pg_session, user_id=clicks[0].id, start_date=self.START, end_date=self.END)
+        assert scans and all(scan and scan <= {"click_events_p202502", "click_events_p202503"} for scan in scans)
+
+    def test_export(self, pg_session, clicks):
+        stmt = click_export_query(
+            [clicks[1].id], columns=list(EXPORT_COLUMNS), start_date=self.START, end_date=self.END
+        )
+        with scanned_partitions(pg_session) as scans:
+            pg_session.execute(stmt).all()
+        assert scans == [self.MARCH]
@@ -0,0 +1,110 @@
+"""
+Integration tests for db/pool.py: engine options, pool metrics and warm-up.
+"""
+import pytest
+from sqlalchemy import create_engine, exc, text
+from sqlalchemy.pool import QueuePool
+
+from src.core.config import settings
+from src.db.pool import PoolMetrics, engine_options, warm_pool
+
+
+@pytest.fixture
+def pooled(tmp_path, monkeypatch):
+    """An instrumented engine on a SQLite file with a pool of 2 and 1 overflow."""
+    monkeypatch.setattr(settings, "db_pool_size", 2)
+    monkeypatch.setattr(settings, "db_max_overflow", 1)
+    monkeypatch.setattr(settings, "db_pool_timeout_seconds", 0.1)
+    url = f"sqlite:///{tmp_path / 'pool.db'}"
+    metrics = PoolMetrics()
+    engine = create_engine(url, **engine_options(url, metrics))
+    metrics.instrument(engine)
+    yield engine, metrics
+    engine.dispose()
+
+
+class TestEngineOptions:
+    def test_queue_pool_settings(self, monkeypatch):
+        monkeypatch.setattr(settings, "db_pool_size", 7)
+        monkeypatch.setattr(settings, "db_max_overflow", 3)
+        options = engine_options("sqlite:///app.db", PoolMetrics())
+
+        assert issubclass(options["poolclass"], QueuePool)
+        assert options["pool_size"] == 7
+        assert options["max_overflow"] == 3
+        assert options["pool_pre_ping"] is settings.db_pool_pre_ping
+        assert options["connect_args"] == {"check_same_thread": False}
+
+    def test_sqlite_memory_has_no_pool_sizing(self):
+        options = engine_options("sqlite:///:memory:", PoolMetrics())
+        assert "poolclass" not in options and "pool_size" not in options
+
+    def test_postgres_statement_timeout(self, monkeypatch):
+        monkeypatch.setattr(settings, "db_statement_timeout_ms", 1500)
+        sync = engine_options("postgresql://u:p@db/app", PoolMetrics())
+        async_ = engine_options("postgresql+asyncpg://u:p@db/app", PoolMetrics(), is_async=True)
+
+        assert sync["connect_args"] == {"options": "-c statement_timeout=1500"}
+        assert async_["connect_args"] == {"server_settings": {"statement_timeout": "1500"}}
+
+    def test_no_statement_timeout_by_default(self, monkeypatch):
+        monkeypatch.setattr(settings, "db_statement_timeout_ms", 0)
+        assert "connect_args" not in engine_options("postgresql://u:p@db/app", PoolMetrics())
+
+
+class TestPoolMetrics:
+    def test_checkouts_in_use_and_overflow(self, pooled):
+        engine, metrics = pooled
+        conns = [engine.connect() for _ in range(3)]
+        for conn in conns:
+            conn.execute(text("SELECT 1"))
+
+        stats = metrics.stats()
+        assert stats["checkouts"] == 3
+        assert stats["in_use"] == 3
+        assert stats["overflow"] == 1
+        assert stats["connects"] == 3
+
+        for conn in conns:
+            conn.close()
+        stats = metrics.stats()
+        assert stats["in_use"] == 0
+        assert stats["max_in_use_seen"] == 3
+        assert stats["idle"] == 2
+
+    def test_timeout_counted(self, pooled):
+        engine, metrics = pooled
+        conns = [engine.connect() for _ in range(3)]
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+        for conn in conns:
+            conn.close()
+
+        stats = metrics.stats()
+        assert stats["timeouts"] == 1
+        assert stats["wait_ms_max"] >= 100
+        # averaged over all four attempts, not just the three that got a connection
+        assert stats["wait_ms_avg"] == pytest.approx(stats["wait_ms_max"] / 4, rel=0.2)
+
+    def test_survives_dispose(self, pooled):
+        engine, metrics = pooled
+        engine.dispose()
+        with engine.connect():
+            pass
+        assert metrics.stats()["checkouts"] == 1
+        assert metrics.stats()["size"] == 2
+
+
+class TestWarmPool:
+    def test_opens_pool_size_connections(self, pooled):
+        engine, metrics = pooled
+        assert warm_pool(engine, 10) == 2
+
+        stats = metrics.stats()
+        assert stats["connects"] == 2
+        assert stats["idle"] == 2
+        assert stats["in_use"] == 0
+
+    def test_unpooled_engine_skipped(self):
+        engine = create_engine("sqlite:///:memory:")
+        assert warm_pool(engine, 5) == 0
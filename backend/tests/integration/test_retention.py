@@ -0,0 +1,307 @@
+"""
+Integration tests for the raw click retention job (links/retention.py) and
+for the reads that combine its aggregates and the rollups with the raw
+events it keeps.
+"""
+import pytest
+from datetime import datetime, timezone, timedelta
+
+from sqlalchemy import func, select
+
+from src.core.config import settings
+from src.models.user import User
+from src.models.click_event import ClickEvent
+from src.models.click_rollup import ClickAggregateDaily
+from src.models.dimension_value import DimensionValue
+from src.models.user_agent import UserAgent
+from src.links.utils import ua_hash
+from src.links.dashboard import build_dashboard
+from src.links.retention import (
+    RetentionJob,
+    compacted_before,
+    delete_compacted,
+    fold_next_day,
+    run_retention,
+)
+from src.links.service import (
+    create_link,
+    get_click_breakdown,
+    get_clicks_by_country,
+    get_clicks_time_series,
+    get_total_clicks_for_user,
+    get_unique_visitor_count_for_user,
+)
+
+BASE = datetime(2025, 3, 10, 0, 0, tzinfo=timezone.utc)
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+NOW = BASE + timedelta(days=6, hours=5)
+CUTOFF = BASE + 3 * DAY  # NOW's day minus three days
+COUNTRIES = ["US", "DE", None]
+DEVICES = ["desktop", "mobile", None, "desktop"]
+BROWSERS = ["Chrome", "Firefox"]
+REFERRERS = ["google.com", None, "news.ycombinator.com", None, None]
+
+
+@pytest.fixture
+def test_user(db_session):
+    user = User(email="test@example.com", display_name="Test User")
+    db_session.add(user)
+    db_session.commit()
+    return user
+
+
+@pytest.fixture
+def links(db_session, test_user):
+    return [create_link(db_session, user_id=test_user.id, target_url=f"https://example.com/{i}") for i in range(2)]
+
+
+def add_user_agents(db) -> None:
+    """user_agents 1-4 and the referrer dictionary, ids matching make_event's ua_id and referrer_id."""
+    for n in range(4):
+        db.add(UserAgent(
+            id=n + 1, ua_hash=ua_hash(f"UA-{n}"), ua_raw=f"UA-{n}",
+            device_category=DEVICES[n], browser_name=BROWSERS[n % 2],
+        ))
+    for n, host in enumerate(REFERRERS):
+        if host is not None:
+            db.add(DimensionValue(id=n + 1, dimension="referrer", value=host))
+    db.commit()
+
+
+def make_event(link_id: int, i: int, clicked_at: datetime) -> ClickEvent:
+    return ClickEvent(
+        link_id=link_id,
+        clicked_at=clicked_at,
+        country=COUNTRIES[i % 3],
+        ua_id=i % 4 + 1,
+        referrer_id=i % 5 + 1 if REFERRERS[i % 5] is not None else None,
+        visitor_hash=None if i % 13 == 0 else f"v{i % 17}",
+    )
+
+
+@pytest.fixture
+def user_agents(db_session):
+    add_user_agents(db_session)
+
+
+@pytest.fixture
+def events(db_session, links, user_agents):
+    """Clicks every 41 minutes over six days on two links, with uneven dimension values."""
+    rows = [
+        make_event(links[i % 2].id, i, BASE + timedelta(minutes=minute))
+        for i, minute in enumerate(range(0, 6 * 24 * 60, 41))
+    ]
+    db_session.add_all(rows)
+    db_session.commit()
+    return [(e.link_id, e.clicked_at.replace(tzinfo=timezone.utc), DEVICES[e.ua_id - 1]) for e in rows]
+
+
+@pytest.fixture
+def approximate(monkeypatch):
+    """Estimate unique visitors from sketches regardless of the range size."""
+    monkeypatch.setattr(settings, "unique_visitors_exact_max_clicks", 0)
+
+
+def raw_count(db) -> int:
+    return db.scalar(select(func.count(ClickEvent.id)))
+
+
+def aggregates(db, dimension: str) -> dict[str, int]:
+    t = ClickAggregateDaily
+    stmt = select(t.value, func.sum(t.clicks)).where(t.dimension == dimension).group_by(t.value)
+    return {value: int(clicks) for value, clicks in db.execute(stmt)}
+
+
+class TestRunRetention:
+    def test_folds_and_deletes_old_days(self, db_session, session_factory, events):
+        """Test raw events before the cutoff are folded per day and dimension, then deleted."""
+        old = [e for e in events if e[1] < CUTOFF]
+
+        result = run_retention(session_factory, days=3, batch=7, now=NOW)
+
+        assert (result.days_folded, result.rows_deleted) == (3, len(old))
+        assert result.compacted_before == CUTOFF
+        assert raw_count(db_session) == len(events) - len(old)
+        assert db_session.scalar(select(func.min(ClickEvent.clicked_at))).replace(tzinfo=timezone.utc) >= CUTOFF
+
+        assert aggregates(db_session, "total") == {"": len(old)}
+        devices = {}
+        for _, _, device in old:
+            devices[device or ""] = devices.get(device or "", 0) + 1
+        assert aggregates(db_session, "device") == devices
+        per_day = db_session.execute(
+            select(ClickAggregateDaily.day, ClickAggregateDaily.clicks)
+            .where(ClickAggregateDaily.dimension == "total", ClickAggregateDaily.link_id == events[0][0])
+            .order_by(ClickAggregateDaily.day)
+        ).all()
+        assert [day for day, _ in per_day] == [(BASE + n * DAY).date() for n in range(3)]
+
+    def test_resumes_where_it_stopped(self, db_session, session_factory, events):
+        """Test runs limited to one day, or stopped between fold and delete, carry on from the watermark."""
+        assert run_retention(session_factory, days=3, batch=50, max_days=1, now=NOW).compacted_before == BASE + DAY
+        assert compacted_before(db_session) == BASE + DAY
+
+        # fold a day but don't delete it, as if the process died in between
+        assert fold_next_day(db_session, cutoff=CUTOFF) == BASE + 2 * DAY
+        assert db_session.scalar(select(func.min(ClickEvent.clicked_at))).replace(tzinfo=timezone.utc) < BASE + 2 * DAY
+
+        result = run_retention(session_factory, days=3, batch=50, now=NOW)
+        assert result.days_folded == 1
+        assert aggregates(db_session, "total") == {"": sum(1 for e in events if e[1] < CUTOFF)}
+        assert raw_count(db_session) == sum(1 for e in events if e[1] >= CUTOFF)
+
+        # nothing left to do
+        again = run_retention(session_factory, days=3, batch=50, now=NOW)
+        assert (again.days_folded, again.rows_deleted) == (0, 0)
+
+    def test_late_events_are_added(self, db_session, session_factory, links, events):
+        """Test clicks written late for an already compacted day are added to its aggregates."""
+        run_retention(session_factory, days=3, batch=50, now=NOW)
+        before = aggregates(db_session, "total")[""]
+
+        db_session.add(make_event(links[0].id, 1, BASE + DAY + timedelta(minutes=7)))
+        db_session.commit()
+        result = run_retention(session_factory, days=3, batch=50, now=NOW)
+
+        assert (result.days_folded, result.rows_deleted) == (1, 1)
+        assert aggregates(db_session, "total") == {"": before + 1}
+        assert raw_count(db_session) == sum(1 for e in events if e[1] >= CUTOFF)
+
+    def test_skips_empty_days(self, db_session, session_factory, links, user_agents):
+        """Test days without clicks are stepped over in one fold."""
+        db_session.add_all([make_event(links[0].id, 0, BASE), make_event(links[0].id, 1, BASE + 5 * DAY)])
+        db_session.commit()
+
+        result = run_retention(session_factory, days=0, batch=50, now=NOW)
+
+        assert (result.days_folded, result.rows_deleted) == (2, 2)
+        assert result.compacted_before == BASE + 6 * DAY
+
+    def test_nothing_to_compact(self, db_session, session_factory, events):
+        """Test no watermark is created while every event is newer than the cutoff."""
+        result = run_retention(session_factory, days=30, batch=50, now=NOW)
+        assert (result.days_folded, result.rows_deleted, result.compacted_before) == (0, 0, None)
+        assert delete_compacted(db_session, batch=50) == 0
+
+
+class TestCombinedReads:
+    """Test the service and dashboard give the same answers before and after compaction."""
+
+    # no clicks at exactly an aligned instant before the watermark, which
+    # compacted ranges can't tell apart from the rest of their hour
+    RANGES = [
+        (BASE + HOUR, BASE + 6 * DAY),
+        (BASE + DAY + 5 * HOUR, BASE + 4 * DAY + 9 * HOUR),
+        (BASE + 2 * DAY, BASE + 5 * DAY + timedelta(minutes=30)),
+    ]
+
+    def snapshot(self, db, user_id, link_ids):
+        results = []
+        for start, end in self.RANGES:
+            results.append((
+                get_total_clicks_for_user(db, user_id=user_id, start_date=start, end_date=end),
+                get_clicks_time_series(db, user_id=user_id, start_date=start, end_date=end, granularity="hour"),
+                get_clicks_by_country(db, user_id=user_id, start_date=start.replace(hour=0), end_date=end),
+                get_unique_visitor_count_for_user(db, user_id=user_id, start_date=start, end_date=end),
+                get_click_breakdown(db, link_ids=link_ids, dimension="referrer", start_date=start.replace(hour=0), end_date=end),
+                get_click_breakdown(db, link_ids=link_ids, dimension="browser"),
+            ))
+            data = build_dashboard(db, user_id=user_id, start_date=start, end_date=end)
+            results.append((data.total_clicks, data.previous_clicks, data.time_series))
+        return results
+
+    def test_reads_unchanged(self, db_session, session_factory, test_user, links, events, approximate):
+        """Test totals, series, countries, estimated uniques and breakdowns survive compaction."""
+        link_ids = [link.id for link in links]
+        before = self.snapshot(db_session, test_user.id, link_ids)
+        run_retention(session_factory, days=3, batch=50, now=NOW)
+        db_session.expire_all()
+        assert self.snapshot(db_session, test_user.id, link_ids) == before
+
+    def test_dashboard_countries_match_service(self, db_session, session_factory, test_user, events, approximate):
+        """Test the dashboard widens a compacted country range to whole days like get_clicks_by_country."""
+        run_retention(session_factory, days=3, batch=50, now=NOW)
+        for start, end in self.RANGES:
+            data = build_dashboard(db_session, user_id=test_user.id, start_date=start, end_date=end)
+            assert data.countries == get_clicks_by_country(db_session, user_id=test_user.id, start_date=start, end_date=end)
+
+    def test_sub_hour_series_keeps_compacted_clicks(self, db_session, session_factory, test_user, events):
+        """Test compacted clicks land in the bucket their hour starts in."""
+        run_retention(session_factory, days=3, batch=50, now=NOW)
+        start, end = BASE + DAY + timedelta(minutes=20), BASE + 4 * DAY
+        series = get_clicks_time_series(db_session, user_id=test_user.id, start_date=start, end_date=end, granularity="15m")
+
+        assert sum(p["value"] for p in series) == sum(1 for e in events if BASE + DAY <= e[1] <= end)
+        compacted = [datetime.fromisoformat(p["timestamp"]) for p in series][1:]
+        assert all(t.minute == 0 for t in compacted if t < CUTOFF)
+
+    def test_compacted_uniques_are_estimated(self, db_session, session_factory, test_user, events):
+        """Test unique visitors of a range reaching before the watermark are never counted exactly."""
+        run_retention(session_factory, days=3, batch=50, now=NOW)
+        count = get_unique_visitor_count_for_user(
+            db_session, user_id=test_user.id, start_date=BASE, end_date=BASE + 2 * DAY
+        )
+        assert not count.exact and count.value > 0
+        assert get_unique_visitor_count_for_user(
+            db_session, user_id=test_user.id, start_date=CUTOFF, end_date=CUTOFF + DAY
+        ).exact
+
+    def test_breakdown(self, db_session, session_factory, links, events):
+        """Test breakdowns across the watermark: None for missing values, ordered by clicks."""
+        run_retention(session_factory, days=3, batch=50, now=NOW)
+        breakdown = get_click_breakdown(db_session, link_ids=[links[0].id], dimension="device")
+
+        expected = {}
+        for link_id, _, device in events:
+            if link_id == links[0].id:
+                expected[device] = expected.get(device, 0) + 1
+        assert {item["value"]: item["clicks"] for item in breakdown} == expected
+        assert [item["clicks"] for item in breakdown] == sorted(expected.values(), reverse=True)
+        assert len(get_click_breakdown(db_session, link_ids=[links[0].id], dimension="device", limit=1)) == 1
+
+
+class TestRetentionJob:
+    def test_disabled_without_days(self):
+        """Test the job starts no thread while CLICK_RETENTION_DAYS is 0."""
+        job = RetentionJob(days=0, interval=60)
+        job.start()
+        assert job._thread is None
+
+    def test_run_once_stats(self, db_session, session_factory, events, monkeypatch):
+        """Test a run is reported in the job's metrics."""
+        monkeypatch.setattr(settings, "click_retention_batch_pause_ms", 0)
+        job = RetentionJob(days=3, interval=60, session_factory=session_factory)
+        result = job.run_once()
+
+        stats = job.stats()
+        assert stats["runs"] == 1 and stats["failures"] == 0
+        assert stats["rows_deleted"] == result.rows_deleted > 0
+        assert stats["compacted_before"] == result.compacted_before.isoformat()
+
+
+class TestOnPostgres:
+    def test_partitioned_round_trip(self, pg_session):
+        """Test folding (ON CONFLICT upserts) and batched deletes on a partitioned click_events."""
+        from sqlalchemy.orm import sessionmaker
+        from tests.conftest import partition_click_events
+
+        user = User(email="test@example.com", display_name="Test User")
+        pg_session.add(user)
+        pg_session.commit()
+        add_user_agents(pg_session)
+        link = create_link(pg_session, user_id=user.id, target_url="https://example.com")
+        times = [BASE + timedelta(minutes=minute) for minute in range(0, 6 * 24 * 60, 41)]
+        pg_session.add_all(make_event(link.id, i, t) for i, t in enumerate(times))
+        pg_session.commit()
+        partition_click_events(pg_session, months_ahead=1, now=NOW)
+        total = get_total_clicks_for_user(pg_session, user_id=user.id, start_date=BASE, end_date=NOW)
+
+        factory = sessionmaker(autoflush=False, bind=pg_session.get_bind())
+        result = run_retention(factory, days=3, batch=20, max_days=2, now=NOW)
+        result = run_retention(factory, days=3, batch=20, now=NOW)
+
+        assert result.compacted_before == CUTOFF
+        assert aggregates(pg_session, "total") == {"": sum(1 for t in times if t < CUTOFF)}
+        assert raw_count(pg_session) == sum(1 for t in times if t >= CUTOFF)
+        assert get_total_clicks_for_user(pg_session, user_id=user.id, start_date=BASE, end_date=NOW) == total
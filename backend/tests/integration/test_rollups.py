@@ -0,0 +1,331 @@
+"""
+Integration tests for the click rollup tables (links/rollups.py) and the
+service functions that read from them.
+"""
+import pytest
+from datetime import datetime, timezone, timedelta
+
+from src.models.user import User
+from src.models.click_event import ClickEvent
+from src.core.config import settings
+from src.core.hll import HyperLogLog
+from src.models.click_rollup import ClickRollupHourly, ClickRollupCountryDaily, ClickVisitorSketchHourly
+from zoneinfo import ZoneInfo
+
+from src.links.buckets import bucket_grid
+from src.links.rollups import HOUR, DAY, split_range
+from src.links.service import (
+    RawClick,
+    create_link,
+    persist_click_batch,
+    get_total_clicks_for_user,
+    get_clicks_by_country,
+    get_clicks_time_series,
+    count_clicks_last_24h,
+    get_unique_visitor_count_for_user,
+    get_unique_visitors_per_link,
+)
+
+BASE = datetime(2025, 3, 10, 0, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def test_user(db_session):
+    user = User(email="test@example.com", display_name="Test User")
+    db_session.add(user)
+    db_session.commit()
+    return user
+
+
+@pytest.fixture
+def test_link(db_session, test_user):
+    return create_link(db_session, user_id=test_user.id, target_url="https://example.com")
+
+
+@pytest.fixture
+def events(db_session, test_link):
+    """Clicks spread over three days at uneven minutes, in two countries."""
+    times = [BASE + timedelta(minutes=m) for m in range(0, 3 * 24 * 60, 37)]
+    db_session.add_all(
+        ClickEvent(link_id=test_link.id, clicked_at=t, country="US" if i % 3 else "DE", visitor_hash=f"v{i % 7}")
+        for i, t in enumerate(times)
+    )
+    db_session.commit()
+    return times
+
+
+def raw_count(times, start, end):
+    return sum(1 for t in times if start <= t <= end)
+
+
+def raw_visitors(times, start, end, country=None):
+    return len({
+        f"v{i % 7}" for i, t in enumerate(times)
+        if start <= t <= end and country in (None, "US" if i % 3 else "DE")
+    })
+
+
+@pytest.fixture
+def approximate(monkeypatch):
+    """Estimate unique visitors from sketches regardless of the range size."""
+    monkeypatch.setattr(settings, "unique_visitors_exact_max_clicks", 0)
+
+
+class TestSplitRange:
+    """Test splitting ranges into whole units and raw edges."""
+
+    def test_aligned_range(self):
+        """Test that an aligned range is all rollup with only a zero-width tail."""
+        split = split_range(BASE, BASE + 3 * HOUR, unit=HOUR)
+        assert (split.rollup_start, split.rollup_end) == (BASE, BASE + 3 * HOUR)
+        assert split.head is None
+        assert split.tail == (BASE + 3 * HOUR, BASE + 3 * HOUR)
+
+    def test_unaligned_range(self):
+        """Test partial hours at both edges."""
+        start, end = BASE + timedelta(minutes=10), BASE + timedelta(hours=5, minutes=20)
+        split = split_range(start, end, unit=HOUR)
+        assert split.head == (start, BASE + HOUR)
+        assert split.tail == (BASE + 5 * HOUR, end)
+        assert not split.raw_only
+
+    def test_sub_unit_range_is_raw_only(self):
+        """Test that a range without a whole hour is read from raw events only."""
+        split = split_range(BASE + timedelta(minutes=10), BASE + timedelta(minutes=50), unit=HOUR)
+        assert split.raw_only
+
+    def test_open_ended(self):
+        """Test ranges missing one side."""
+        split = split_range(None, BASE + timedelta(days=1, hours=3), unit=DAY)
+        assert split.rollup_start is None
+        assert split.rollup_end == BASE + DAY
+
+    def test_compacted_start_widens_to_unit(self):
+        """Test an edge before the retention watermark is read from the rollup as a whole hour."""
+        start, end = BASE + timedelta(minutes=10), BASE + timedelta(days=2, minutes=20)
+        split = split_range(start, end, unit=HOUR, raw_from=BASE + DAY)
+        assert split.compacted
+        assert (split.start, split.rollup_start) == (BASE, BASE)
+        assert split.head is None
+        assert split.tail == (BASE + 2 * DAY, end)
+
+    def test_compacted_range_has_no_raw_edges(self):
+        """Test a range wholly before the watermark is served by whole hours only."""
+        start, end = BASE + timedelta(minutes=10), BASE + timedelta(minutes=50)
+        split = split_range(start, end, unit=HOUR, raw_from=BASE + DAY)
+        assert split.compacted and not split.raw_only
+        assert (split.rollup_start, split.rollup_end) == (BASE, BASE + HOUR)
+        assert split.head is None and split.tail is None
+
+    def test_range_after_watermark(self):
+        """Test ranges after the watermark split as before."""
+        start = BASE + timedelta(days=1, minutes=10)
+        split = split_range(start, start + 2 * HOUR, unit=HOUR, raw_from=BASE + DAY)
+        assert not split.compacted
+        assert split.head == (start, BASE + DAY + HOUR)
+        assert split_range(None, start, unit=HOUR, raw_from=BASE + DAY).compacted
+
+
+class TestRollupMaintenance:
+    """Test that writes keep the rollup tables in step."""
+
+    def test_batch_writer_updates_rollups(self, db_session, test_link):
+        """Test that the batch writer increments hourly and country rollups."""
+        with_country = lambda t: RawClick(test_link.id, t, "8.8.8.8", None, None)
+        from unittest.mock import patch
+
+        with patch("src.links.service.get_country_from_ip", return_value="US"):
+            persist_click_batch(db_session, [with_country(BASE), with_country(BASE + timedelta(minutes=30))])
+            persist_click_batch(db_session, [with_country(BASE + timedelta(hours=1))])
+
+        hourly = {r.hour.replace(tzinfo=timezone.utc): r.clicks for r in db_session.query(ClickRollupHourly)}
+        assert hourly == {BASE: 2, BASE + HOUR: 1}
+        country = db_session.query(ClickRollupCountryDaily).one()
+        assert (country.day, country.country, country.clicks) == (BASE.date(), "US", 3)
+
+    def test_orm_insert_and_delete(self, db_session, test_link):
+        """Test that events added or deleted through the ORM adjust the rollups."""
+        event = ClickEvent(link_id=test_link.id, clicked_at=BASE, country="FR")
+        db_session.add(event)
+        db_session.add(ClickEvent(link_id=test_link.id, clicked_at=BASE))
+        db_session.commit()
+        assert db_session.query(ClickRollupHourly).one().clicks == 2
+
+        db_session.delete(event)
+        db_session.commit()
+        assert db_session.query(ClickRollupHourly).one().clicks == 1
+        assert db_session.query(ClickRollupCountryDaily).one().clicks == 0
+
+    def test_visitor_sketches(self, db_session, test_link):
+        """Test that sketches are kept per hour and country, and that deletes leave them alone."""
+        first = ClickEvent(link_id=test_link.id, clicked_at=BASE, country="FR", visitor_hash="a")
+        db_session.add_all([
+            first,
+            ClickEvent(link_id=test_link.id, clicked_at=BASE, country="FR", visitor_hash="b"),
+            ClickEvent(link_id=test_link.id, clicked_at=BASE, visitor_hash="a"),
+            ClickEvent(link_id=test_link.id, clicked_at=BASE + HOUR, country="FR"),
+        ])
+        db_session.commit()
+        db_session.add(ClickEvent(link_id=test_link.id, clicked_at=BASE, country="FR", visitor_hash="c"))
+        db_session.commit()
+
+        rows = {r.country: HyperLogLog.from_bytes(r.sketch).estimate() for r in db_session.query(ClickVisitorSketchHourly)}
+        assert rows == {"FR": 3, "": 1}
+
+        db_session.delete(first)
+        db_session.commit()
+        assert HyperLogLog.from_bytes(db_session.get(ClickVisitorSketchHourly, (test_link.id, BASE, "FR")).sketch).estimate() == 3
+
+    def test_server_default_timestamp_is_rolled_up(self, db_session, test_link):
+        """Test that events without an explicit clicked_at are still counted."""
+        db_session.add(ClickEvent(link_id=test_link.id))
+        db_session.commit()
+        assert db_session.query(ClickRollupHourly).one().clicks == 1
+
+
+class TestRollupReads:
+    """Test that rollup-backed reads match counting raw events."""
+
+    RANGES = [
+        (BASE, BASE + 2 * DAY),
+        (BASE + timedelta(minutes=13), BASE + timedelta(days=1, hours=7, minutes=41)),
+        (BASE + timedelta(hours=5, minutes=2), BASE + timedelta(hours=5, minutes=58)),
+        (BASE + timedelta(hours=5, minutes=30), BASE + timedelta(hours=6, minutes=30)),
+        (BASE - DAY, BASE + 10 * DAY),
+    ]
+
+    @pytest.mark.parametrize("start,end", RANGES)
+    def test_total_clicks(self, db_session, test_user, events, start, end):
+        """Test total clicks for aligned, unaligned and sub-hour ranges."""
+        assert get_total_clicks_for_user(db_session, user_id=test_user.id, start_date=start, end_date=end) == raw_count(
+            events, start, end
+        )
+
+    @pytest.mark.parametrize("start,end", RANGES)
+    def test_time_series(self, db_session, test_user, events, start, end):
+        """Test that hourly series buckets match raw counts."""
+        series = get_clicks_time_series(
+            db_session, user_id=test_user.id, start_date=start, end_date=end, granularity="hour"
+        )
+        expected = {}
+        for t in events:
+            if start <= t <= end:
+                hour = t.replace(minute=0).isoformat()
+                expected[hour] = expected.get(hour, 0) + 1
+        assert {p["timestamp"]: p["value"] for p in series} == expected
+
+    def test_daily_series(self, db_session, test_user, events):
+        """Test day buckets roll up from hours."""
+        series = get_clicks_time_series(
+            db_session, user_id=test_user.id, start_date=BASE, end_date=BASE + 3 * DAY, granularity="day"
+        )
+        assert [p["timestamp"] for p in series] == [(BASE + i * DAY).isoformat() for i in range(3)]
+        assert sum(p["value"] for p in series) == len(events)
+
+    @pytest.mark.parametrize("start,end", RANGES)
+    def test_clicks_by_country(self, db_session, test_user, events, start, end):
+        """Test that per-country clicks match raw counts across partial days."""
+        result = get_clicks_by_country(db_session, user_id=test_user.id, start_date=start, end_date=end)
+        expected = {}
+        for i, t in enumerate(events):
+            if start <= t <= end:
+                country = "US" if i % 3 else "DE"
+                expected[country] = expected.get(country, 0) + 1
+        assert {r["country_code"]: r["clicks"] for r in result} == expected
+
+    @pytest.mark.parametrize("granularity,tz", [
+        ("15m", "UTC"), ("5m", "Asia/Kathmandu"), ("day", "America/New_York"), ("day", "Asia/Kolkata"), ("week", "UTC"),
+    ])
+    def test_buckets_and_time_zones(self, db_session, test_user, events, granularity, tz):
+        """Test sub-hour, local-day and week buckets against raw events, gap-filled."""
+        start, end = BASE + timedelta(hours=3, minutes=7), BASE + timedelta(hours=9, minutes=52)
+        if granularity in ("day", "week"):
+            end = BASE + 3 * DAY
+        series = get_clicks_time_series(
+            db_session, user_id=test_user.id, start_date=start, end_date=end,
+            granularity=granularity, tz=tz, fill_gaps=True,
+        )
+        grid = bucket_grid(start, end, granularity, tz)
+        assert [p["timestamp"] for p in series] == [e.astimezone(ZoneInfo(tz)).isoformat() for e in grid.edges[:-1]]
+        expected = [0] * len(grid)
+        for t in events:
+            if start <= t <= end:
+                expected[grid.index(t)] += 1
+        assert [p["value"] for p in series] == expected
+
+    def test_gap_fill(self, db_session, test_user, events):
+        """Test that empty buckets are only returned with fill_gaps."""
+        start, end = BASE - 2 * DAY, BASE + DAY
+        sparse = get_clicks_time_series(db_session, user_id=test_user.id, start_date=start, end_date=end, granularity="day")
+        filled = get_clicks_time_series(
+            db_session, user_id=test_user.id, start_date=start, end_date=end, granularity="day", fill_gaps=True
+        )
+        assert [p["value"] for p in filled][:2] == [0, 0]
+        assert len(filled) == 4
+        assert [p for p in filled if p["value"]] == sparse
+
+    def test_whole_hours_not_read_from_raw(self, db_session, test_user, test_link, events):
+        """Test that whole hours are answered from the rollup, not click_events."""
+        # remove raw rows without going through the ORM hooks
+        db_session.execute(ClickEvent.__table__.delete())
+        db_session.commit()
+
+        total = get_total_clicks_for_user(db_session, user_id=test_user.id, start_date=BASE, end_date=BASE + DAY)
+        assert total == raw_count(events, BASE, BASE + DAY - timedelta(microseconds=1))
+
+    def test_clicks_last_24h(self, db_session, test_link):
+        """Test the link stats 24h count including the current partial hour."""
+        now = datetime.now(timezone.utc)
+        db_session.add_all([
+            ClickEvent(link_id=test_link.id, clicked_at=now - timedelta(minutes=1)),
+            ClickEvent(link_id=test_link.id, clicked_at=now - timedelta(hours=5)),
+            ClickEvent(link_id=test_link.id, clicked_at=now - timedelta(hours=25)),
+        ])
+        db_session.commit()
+        assert count_clicks_last_24h(db_session, link_id=test_link.id) == 2
+
+
+class TestUniqueVisitorSketches:
+    """Test unique-visitor counts estimated from hourly sketches."""
+
+    RANGES = TestRollupReads.RANGES
+
+    @pytest.mark.parametrize("start,end", RANGES)
+    def test_user_uniques(self, db_session, test_user, events, approximate, start, end):
+        """Test that sketch estimates match distinct raw visitors at small cardinalities."""
+        count = get_unique_visitor_count_for_user(db_session, user_id=test_user.id, start_date=start, end_date=end)
+        assert count.value == raw_visitors(events, start, end)
+        split = split_range(start, end, unit=HOUR)
+        assert count.exact == split.raw_only
+        assert count.error == (0.0 if count.exact else pytest.approx(0.01625))
+
+    def test_exact_below_threshold(self, db_session, test_user, events):
+        """Test that ranges with few clicks are counted exactly."""
+        count = get_unique_visitor_count_for_user(
+            db_session, user_id=test_user.id, start_date=BASE, end_date=BASE + 2 * DAY
+        )
+        assert count.exact and count.error == 0.0
+        assert count.value == raw_visitors(events, BASE, BASE + 2 * DAY)
+
+    @pytest.mark.parametrize("start,end", RANGES[:2])
+    def test_country_uniques(self, db_session, test_user, events, approximate, start, end):
+        """Test per-country visitors from sketches."""
+        result = get_clicks_by_country(db_session, user_id=test_user.id, start_date=start, end_date=end)
+        assert {r["country_code"]: r["unique_visitors"] for r in result} == {
+            country: raw_visitors(events, start, end, country) for country in ("US", "DE")
+        }
+
+    def test_per_link_uniques(self, db_session, test_user, test_link, events, approximate):
+        """Test per-link visitors from sketches, leaving out links without visitors."""
+        other = create_link(db_session, user_id=test_user.id, target_url="https://example.org")
+        start, end = BASE + timedelta(minutes=13), BASE + DAY
+        result = get_unique_visitors_per_link(db_session, link_ids=[test_link.id, other.id], start_date=start, end_date=end)
+        assert result == {test_link.id: raw_visitors(events, start, end)}
+
+    def test_whole_hours_read_from_sketches(self, db_session, test_user, events, approximate):
+        """Test that whole hours are answered from sketches, not click_events."""
+        db_session.execute(ClickEvent.__table__.delete())
+        db_session.commit()
+
+        count = get_unique_visitor_count_for_user(db_session, user_id=test_user.id, start_date=BASE, end_date=BASE + DAY)
+        assert count.value == 7
@@ -9,11 +9,14 @@ from unittest.mock import Mock
 from src.models.user import User
 from src.models.link import Link
 from src.models.click_event import ClickEvent
+from src.links.slug import slug_for_id
 from src.links.service import (
     create_link,
+    create_links_bulk,
     get_active_link_by_slug,
     record_click,
     list_links_for_user,
+    list_links_page,
     get_link_for_user,
     count_clicks_last_24h,
     recent_click_events,
@@ -26,6 +29,7 @@ from src.links.service import (
     get_clicks_time_series,
     get_previous_period_metrics,
     update_link_status,
+    warm_user_agent_cache,
 )
 
 
@@ -125,6 +129,36 @@ class TestGetActiveLinkBySlug:
         found_link = get_active_link_by_slug(db_session, slug=test_link.slug)
         assert found_link is None
 
+    def test_get_active_link_by_legacy_slug(self, db_session, test_user):
+        """Test that links with slugs from the old codec are still found."""
+        from src.links.slug import legacy_slug_for_id, slug_for_id
+
+        link = Link(user_id=test_user.id, target_url="https://example.com", slug=legacy_slug_for_id(1), is_active=True)
+        db_session.add(link)
+        db_session.commit()
+
+        assert get_active_link_by_slug(db_session, slug=link.slug).id == link.id
+        # the current codec's slug for the same id is not an alias
+        assert get_active_link_by_slug(db_session, slug=slug_for_id(link.id)) is None
+
+    def test_get_active_link_by_slug_uses_primary_key(self, db_session, test_link):
+        """Test that current-codec slugs are looked up by id."""
+        statements = []
+        from sqlalchemy import event
+
+        def capture(conn, cursor, statement, params, context, executemany):
+            statements.append((statement, params))
+
+        event.listen(db_session.get_bind(), "before_cursor_execute", capture)
+        try:
+            assert get_active_link_by_slug(db_session, slug=test_link.slug).id == test_link.id
+        finally:
+            event.remove(db_session.get_bind(), "before_cursor_execute", capture)
+
+        statement, params = statements[-1]
+        assert "links.id = ?" in statement
+        assert test_link.id in params
+
 
 class TestRecordClick:
     """Test record_click function."""
@@ -233,6 +267,71 @@ class TestListLinksForUser:
         assert other_link.id not in link_ids
 
 
+class TestListLinksPage:
+    """Test keyset pagination with list_links_page."""
+
+    @pytest.fixture
+    def links(self, db_session, test_user):
+        # ties on every sort column, so the id tie-break is exercised
+        base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        links = []
+        for i in range(7):
+            link = Link(
+                user_id=test_user.id,
+                target_url=f"https://example.com/{i}",
+                is_active=True,
+                created_at=base + timedelta(minutes=i // 2),
+                click_count=i % 3,
+                last_clicked_at=None if i % 3 == 0 else base + timedelta(hours=i % 2),
+            )
+            db_session.add(link)
+            links.append(link)
+        db_session.commit()
+        return links
+
+    def walk(self, db_session, user_id, sort, limit):
+        seen, cursor = [], None
+        while True:
+            page = list_links_page(db_session, user_id=user_id, limit=limit, sort=sort, cursor=cursor)
+            assert len(page.items) <= limit
+            seen.extend(l.id for l in page.items)
+            if page.next_cursor is None:
+                return seen
+            cursor = page.next_cursor
+
+    @pytest.mark.parametrize("sort,key", [
+        ("created", lambda l: (l.created_at, l.id)),
+        ("clicks", lambda l: (l.click_count, l.id)),
+        ("last_clicked", lambda l: (l.last_clicked_at is not None, l.last_clicked_at or datetime.min, l.id)),
+    ])
+    @pytest.mark.parametrize("limit", [1, 2, 3, 7, 10])
+    def test_pages_cover_sorted_links(self, db_session, test_user, links, sort, key, limit):
+        expected = [l.id for l in sorted(links, key=key, reverse=True)]
+        assert self.walk(db_session, test_user.id, sort, limit) == expected
+
+    def test_links_created_through_service(self, db_session, test_user):
+        created = [create_link(db_session, user_id=test_user.id, target_url=f"https://example.com/{i}") for i in range(5)]
+        assert self.walk(db_session, test_user.id, "created", 2) == [l.id for l in reversed(created)]
+
+    def test_offset_after_cursor(self, db_session, test_user, links):
+        first = list_links_page(db_session, user_id=test_user.id, limit=2, sort="clicks")
+        page = list_links_page(db_session, user_id=test_user.id, limit=2, sort="clicks", cursor=first.next_cursor, offset=1)
+        everything = self.walk(db_session, test_user.id, "clicks", 10)
+        assert [l.id for l in page.items] == everything[3:5]
+
+    def test_only_own_links(self, db_session, test_user, links):
+        other = User(email="other@example.com", display_name="Other User")
+        db_session.add(other)
+        db_session.commit()
+        create_link(db_session, user_id=other.id, target_url="https://example.com/other")
+        assert sorted(self.walk(db_session, test_user.id, "created", 3)) == sorted(l.id for l in links)
+
+    def test_cursor_from_other_sort_rejected(self, db_session, test_user, links):
+        page = list_links_page(db_session, user_id=test_user.id, limit=2, sort="created")
+        with pytest.raises(ValueError):
+            list_links_page(db_session, user_id=test_user.id, limit=2, sort="clicks", cursor=page.next_cursor)
+
+
 class TestGetLinkForUser:
     """Test get_link_for_user function."""
     
@@ -531,3 +630,90 @@ class TestAnalyticsFunctions:
         assert isinstance(result["total_links"], int)
         assert isinstance(result["unique_visitors"], int)
 
+
+
+class TestWarmUserAgentCache:
+    """Test warm_user_agent_cache function."""
+
+    def test_warms_most_frequent_recent_uas(self, db_session, test_link):
+        """Test that the user_agents ids of the top recent UA strings are loaded into the cache."""
+        from src.links.user_agents import user_agent_ids
+        ids = user_agent_ids.resolve(db_session, ["UA-common", "UA-rare", "UA-old"])
+        user_agent_ids.clear()
+
+        now = datetime.now(timezone.utc)
+        rows = [("UA-common", now)] * 3 + [("UA-rare", now)] + [("UA-old", now - timedelta(days=10))] * 5
+        for ua, ts in rows:
+            db_session.add(ClickEvent(link_id=test_link.id, ua_id=ids[ua], clicked_at=ts))
+        db_session.commit()
+
+        warmed = warm_user_agent_cache(db_session, limit=1, days=1)
+
+        assert warmed == 1
+        assert user_agent_ids.stats()["entries"] == 1
+        hits = user_agent_ids.stats()["hits"]
+        assert user_agent_ids.resolve(db_session, ["UA-common"]) == {"UA-common": ids["UA-common"]}
+        assert user_agent_ids.stats()["hits"] == hits + 1
+
+    def test_disabled_with_zero_limit(self, db_session):
+        """Test that a zero limit skips the query entirely."""
+        assert warm_user_agent_cache(db_session, limit=0) == 0
+
+
+class TestCreateLinksBulk:
+    """Test create_links_bulk."""
+
+    def test_creates_links_with_slugs(self, db_session, test_user):
+        urls = [f"https://example.com/{i}" for i in range(5)]
+        results = create_links_bulk(db_session, user_id=test_user.id, target_urls=urls)
+
+        assert [r.target_url for r in results] == urls
+        assert all(r.error is None for r in results)
+        assert len({r.id for r in results}) == 5
+        for r in results:
+            link = db_session.get(Link, r.id)
+            assert link.slug == r.slug == slug_for_id(r.id)
+            assert link.user_id == test_user.id
+            assert link.is_active is True
+            assert get_active_link_by_slug(db_session, slug=r.slug).id == r.id
+
+    def test_ids_continue_after_existing_links(self, db_session, test_user):
+        existing = create_link(db_session, user_id=test_user.id, target_url="https://example.com/first")
+        results = create_links_bulk(db_session, user_id=test_user.id, target_urls=["https://example.com/a"])
+        later = create_link(db_session, user_id=test_user.id, target_url="https://example.com/last")
+
+        assert existing.id < results[0].id < later.id
+
+    def test_chunks(self, db_session, test_user, monkeypatch):
+        import src.links.service as service
+        monkeypatch.setattr(service, "BULK_INSERT_CHUNK", 2)
+        results = create_links_bulk(
+            db_session, user_id=test_user.id, target_urls=[f"https://example.com/{i}" for i in range(5)]
+        )
+        assert sorted(r.id for r in results) == [r.id for r in results]
+        assert get_total_links_for_user(db_session, user_id=test_user.id) == 5
+
+    def test_failed_chunk_reported_and_others_kept(self, db_session, test_user, monkeypatch):
+        import src.links.service as service
+        from sqlalchemy.exc import OperationalError
+
+        monkeypatch.setattr(service, "BULK_INSERT_CHUNK", 2)
+        real = service.link_ids.allocate
+        calls = []
+
+        def flaky(engine, n=1):
+            calls.append(n)
+            if len(calls) == 2:
+                raise OperationalError("UPDATE", {}, Exception("connection lost"))
+            return real(engine, n)
+
+        monkeypatch.setattr(service.link_ids, "allocate", flaky)
+        results = create_links_bulk(
+            db_session, user_id=test_user.id, target_urls=[f"https://example.com/{i}" for i in range(5)]
+        )
+
+        assert [r.error is None for r in results] == [True, True, False, False, True]
+        assert get_total_links_for_user(db_session, user_id=test_user.id) == 3
+
+    def test_empty(self, db_session, test_user):
+        assert create_links_bulk(db_session, user_id=test_user.id, target_urls=[]) == []
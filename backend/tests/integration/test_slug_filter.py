@@ -0,0 +1,156 @@
+"""
+Integration tests for the slug Bloom filter (links/slug_filter.py).
+"""
+import pytest
+from unittest.mock import patch
+
+from src.models.user import User
+from src.models.link import Link
+from src.links.ids import IdBlockAllocator
+from src.links.service import create_link, create_links_bulk, resolve_active_link
+from src.links.slug import slug_for_id
+from src.links.slug_filter import SlugFilter, slug_filter
+from tests.conftest import test_engine
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def test_user(db_session):
+    user = User(email="test@example.com", display_name="Test User")
+    db_session.add(user)
+    db_session.commit()
+    return user
+
+
+class TestSlugFilter:
+    """Test building, refreshing and querying the filter."""
+
+    def test_not_ready_passes_everything(self, db_session):
+        """Test that an unbuilt filter never rejects."""
+        assert SlugFilter().might_exist(db_session, "anything") is True
+
+    def test_build_sizes_from_row_count(self, db_session, test_user):
+        """Test that capacity is the row count times headroom, with a floor."""
+        for i in range(5):
+            create_link(db_session, user_id=test_user.id, target_url=f"https://example.com/{i}")
+        filt = SlugFilter(headroom=3.0, min_capacity=10)
+        filt.build(db_session)
+
+        stats = filt.stats()
+        assert stats["ready"] is True
+        assert stats["items"] == 5
+        assert stats["capacity"] == 15
+        assert stats["memory_bytes"] > 0
+
+        small = SlugFilter(min_capacity=100)
+        small.build(db_session)
+        assert small.stats()["capacity"] == 100
+
+    def test_rejects_unknown_and_passes_known(self, db_session, test_user):
+        """Test that built slugs pass and unknown ones are rejected."""
+        link = create_link(db_session, user_id=test_user.id, target_url="https://example.com")
+        clock = FakeClock()
+        filt = SlugFilter(min_capacity=100, clock=clock)
+        filt.build(db_session)
+
+        assert filt.might_exist(db_session, link.slug) is True
+        assert filt.might_exist(db_session, "zzzzzzzz") is False
+        assert filt.stats()["rejected"] == 1
+
+    def test_stale_negative_refreshes(self, db_session, test_user):
+        """Test that a link created elsewhere is found after a refresh on a negative."""
+        clock = FakeClock()
+        filt = SlugFilter(min_capacity=100, refresh_interval=1.0, clock=clock)
+        filt.build(db_session)
+
+        # created without going through this filter, like another worker process would
+        link = Link(user_id=test_user.id, target_url="https://example.com", slug="elsewhere")
+        db_session.add(link)
+        db_session.commit()
+
+        assert filt.might_exist(db_session, "elsewhere") is False  # refreshed too recently
+        clock.now += 2
+        assert filt.might_exist(db_session, "elsewhere") is True
+        assert filt.stats()["refreshes"] == 1
+
+    def test_id_from_an_older_block_found_after_build(self, db_session, test_user):
+        """Test that a link inserted late from another process's older id block is not rejected."""
+        other_process = IdBlockAllocator("links", Link.id, block_size=10)
+        late_id = other_process.next(test_engine)
+        create_links_bulk(
+            db_session, user_id=test_user.id, target_urls=[f"https://example.com/{i}" for i in range(2000)]
+        )
+        filt = SlugFilter(min_capacity=100, clock=FakeClock())
+        filt.build(db_session)
+
+        db_session.add(Link(id=late_id, user_id=test_user.id, target_url="https://example.com", slug=slug_for_id(late_id)))
+        db_session.commit()
+
+        assert filt.might_exist(db_session, slug_for_id(late_id)) is True
+        assert filt.stats()["late_found"] == 1
+        # added to the filter: the next check needs no query
+        assert filt.might_exist(db_session, slug_for_id(late_id)) is True
+        assert filt.stats()["late_found"] == 1
+
+    def test_unknown_id_below_watermark_rejected(self, db_session, test_user):
+        """Test that a slug decoding to a missing id below the watermark is still rejected."""
+        unused_id = IdBlockAllocator("links", Link.id, block_size=10).next(test_engine)
+        create_links_bulk(db_session, user_id=test_user.id, target_urls=["https://a.example", "https://b.example"])
+        filt = SlugFilter(min_capacity=100, clock=FakeClock())
+        filt.build(db_session)
+
+        assert filt.might_exist(db_session, slug_for_id(unused_id)) is False
+        assert filt.stats()["late_found"] == 0
+
+    def test_grows_when_over_capacity(self, db_session, test_user, session_factory):
+        """Test that exceeding capacity triggers a rebuild sized for the new row count."""
+        filt = SlugFilter(min_capacity=2, headroom=1.0, session_factory=session_factory)
+        filt.build(db_session)
+        with patch("src.links.service.slug_filter", filt), \
+                patch("src.links.slug_filter.threading.Thread") as thread:
+            thread.side_effect = lambda target, **kw: type("T", (), {"start": staticmethod(target)})()
+            for i in range(3):
+                create_link(db_session, user_id=test_user.id, target_url=f"https://example.com/{i}")
+
+        stats = filt.stats()
+        assert stats["rebuilds"] == 2
+        assert stats["capacity"] == 3
+        assert stats["items"] == 3
+
+
+class TestResolveWithFilter:
+    """Test the redirect lookup with the process-wide filter built."""
+
+    def test_unknown_slug_skips_db(self, db_session, test_user):
+        """Test that a rejected slug never reaches get_active_link_by_slug."""
+        slug_filter.build(db_session)
+        with patch("src.links.service.get_active_link_by_slug") as lookup:
+            assert resolve_active_link(db_session, slug="nope1234") is None
+        lookup.assert_not_called()
+
+    def test_created_link_resolves(self, db_session, test_user):
+        """Test that create_link adds to the filter so the new slug resolves immediately."""
+        slug_filter.build(db_session)
+        link = create_link(db_session, user_id=test_user.id, target_url="https://example.com")
+
+        resolved = resolve_active_link(db_session, slug=link.slug)
+        assert resolved is not None
+        assert resolved.id == link.id
+
+    def test_inactive_link_counted_as_passed_not_found(self, db_session, test_user):
+        """Test that a slug passing the filter but missing in the DB is counted."""
+        link = create_link(db_session, user_id=test_user.id, target_url="https://example.com")
+        link.is_active = False
+        db_session.commit()
+        slug_filter.build(db_session)
+        before = slug_filter.stats()["passed_not_found"]
+
+        assert resolve_active_link(db_session, slug=link.slug) is None
+        assert slug_filter.stats()["passed_not_found"] == before + 1
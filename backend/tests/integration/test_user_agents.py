@@ -0,0 +1,56 @@
+"""
+Integration tests for links/user_agents.py.
+"""
+from sqlalchemy import func, select
+
+from src.links.user_agents import UserAgentIds
+from src.links.utils import ua_hash
+from src.models.user_agent import UserAgent
+
+FIREFOX = "Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0"
+IPHONE = (
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 "
+    "(KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1"
+)
+
+
+def count_agents(db):
+    return db.scalar(select(func.count()).select_from(UserAgent))
+
+
+class TestUserAgentIds:
+    def test_resolve_inserts_each_string_once(self, db_session):
+        ids = UserAgentIds(max_entries=100)
+        got = ids.resolve(db_session, [FIREFOX, IPHONE, FIREFOX, None, ""])
+
+        assert set(got) == {FIREFOX, IPHONE}
+        assert count_agents(db_session) == 2
+        row = db_session.get(UserAgent, got[FIREFOX])
+        assert (row.ua_hash, row.ua_raw, row.browser_name) == (ua_hash(FIREFOX), FIREFOX, "Firefox")
+        assert ids.stats()["inserted"] == 2
+
+    def test_second_resolve_served_from_cache(self, db_session):
+        ids = UserAgentIds(max_entries=100)
+        first = ids.resolve(db_session, [FIREFOX])
+        hits = ids.stats()["hits"]
+
+        assert ids.resolve(db_session, [FIREFOX]) == first
+        assert ids.stats()["hits"] == hits + 1
+
+    def test_other_process_sees_existing_row(self, db_session):
+        """Test that a cold cache finds the row another writer inserted instead of adding one."""
+        first = UserAgentIds(max_entries=100).resolve(db_session, [IPHONE])
+        other = UserAgentIds(max_entries=100)
+
+        assert other.resolve(db_session, [IPHONE]) == first
+        assert other.stats()["inserted"] == 0
+        assert count_agents(db_session) == 1
+
+    def test_fields(self, db_session):
+        ids = UserAgentIds(max_entries=100)
+        got = ids.resolve(db_session, [FIREFOX, IPHONE])
+
+        fields = ids.fields(db_session, [got[IPHONE], None, 999])
+        assert list(fields) == [got[IPHONE]]
+        assert fields[got[IPHONE]]["device_category"] == "mobile"
+        assert fields[got[IPHONE]]["os_name"] == "iOS"
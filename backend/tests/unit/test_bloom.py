@@ -0,0 +1,48 @@
+"""
+Unit tests for the Bloom filter in core/bloom.py.
+"""
+import pytest
+
+from src.core.bloom import BloomFilter
+
+
+class TestBloomFilter:
+    """Test BloomFilter behaviour."""
+
+    def test_invalid_arguments(self):
+        """Test that nonsensical sizes are rejected."""
+        with pytest.raises(ValueError):
+            BloomFilter(capacity=0)
+        with pytest.raises(ValueError):
+            BloomFilter(capacity=10, fp_rate=1.5)
+
+    def test_no_false_negatives(self):
+        """Test that every added item is reported as present."""
+        bloom = BloomFilter(capacity=1000)
+        items = [f"slug{i}" for i in range(1000)]
+        for item in items:
+            bloom.add(item)
+        assert all(bloom.might_contain(item) for item in items)
+
+    def test_false_positive_rate_near_target(self):
+        """Test that the observed false-positive rate at capacity is close to the target."""
+        bloom = BloomFilter(capacity=2000, fp_rate=0.01)
+        for i in range(2000):
+            bloom.add(f"in-{i}")
+        false_positives = sum(bloom.might_contain(f"out-{i}") for i in range(20000))
+        assert false_positives / 20000 < 0.03
+        assert bloom.estimated_fp_rate() == pytest.approx(0.01, rel=0.2)
+
+    def test_sizing(self):
+        """Test that bits and hash count follow the standard formulas."""
+        bloom = BloomFilter(capacity=10_000, fp_rate=0.01)
+        assert bloom.num_bits == 95_851
+        assert bloom.num_hashes == 7
+        assert bloom.memory_bytes == 11_982
+
+    def test_repeat_add_not_counted(self):
+        """Test that adding the same item twice counts it once."""
+        bloom = BloomFilter(capacity=100)
+        assert bloom.add("a") is True
+        assert bloom.add("a") is False
+        assert bloom.count == 1
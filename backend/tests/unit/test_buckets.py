@@ -0,0 +1,130 @@
+"""
+Unit tests for time-series bucketing in links/buckets.py.
+"""
+import pytest
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import column, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from src.links.buckets import (
+    MAX_BUCKETS,
+    Granularity,
+    bucket_grid,
+    epoch_bucket,
+    fill_counts,
+    parse_granularity,
+)
+
+UTC = timezone.utc
+
+
+class TestParseGranularity:
+    """Test granularity names and widths."""
+
+    @pytest.mark.parametrize("value,expected", [
+        ("hour", Granularity(1, "h")),
+        ("day", Granularity(1, "d")),
+        ("week", Granularity(1, "w")),
+        ("month", Granularity(1, "mo")),
+        ("5m", Granularity(5, "m")),
+        ("15m", Granularity(15, "m")),
+        ("6h", Granularity(6, "h")),
+        ("2w", Granularity(2, "w")),
+    ])
+    def test_valid(self, value, expected):
+        """Test accepted spellings."""
+        assert parse_granularity(value) == expected
+
+    @pytest.mark.parametrize("value", ["", "minute", "0m", "-5m", "5s", "2mo", "15 m"])
+    def test_invalid(self, value):
+        """Test that anything else is rejected."""
+        with pytest.raises(ValueError):
+            parse_granularity(value)
+
+    def test_fixed_seconds(self):
+        """Test that only minute and hour widths are fixed."""
+        assert parse_granularity("15m").fixed_seconds == 900
+        assert parse_granularity("6h").fixed_seconds == 6 * 3600
+        assert parse_granularity("day").fixed_seconds is None
+
+
+class TestBucketGrid:
+    """Test bucket edges, labels and alignment."""
+
+    def test_hourly_utc(self):
+        """Test that hour buckets start at the hour containing start and cover end."""
+        grid = bucket_grid(datetime(2025, 3, 8, 10, 17, tzinfo=UTC), datetime(2025, 3, 8, 13, 0, tzinfo=UTC), "hour")
+        assert grid.edges[0] == datetime(2025, 3, 8, 10, tzinfo=UTC)
+        assert grid.edges[-1] == datetime(2025, 3, 8, 14, tzinfo=UTC)
+        assert len(grid) == 4
+        assert grid.hour_aligned
+
+    def test_days_across_dst(self):
+        """Test that local days are 23 hours long on the day clocks spring forward."""
+        grid = bucket_grid(
+            datetime(2025, 3, 8, 12, tzinfo=UTC), datetime(2025, 3, 10, 12, tzinfo=UTC), "day", "America/New_York"
+        )
+        widths = [grid.edges[i + 1] - grid.edges[i] for i in range(len(grid))]
+        assert widths == [timedelta(hours=24), timedelta(hours=23), timedelta(hours=24)]
+        assert grid.series([1, 2, 3], fill_gaps=True)[1]["timestamp"] == "2025-03-09T00:00:00-05:00"
+        assert grid.hour_aligned
+
+    def test_weeks_start_on_monday(self):
+        """Test week buckets."""
+        grid = bucket_grid(datetime(2025, 3, 8, tzinfo=UTC), datetime(2025, 3, 20, tzinfo=UTC), "week")
+        assert [e.date().isoformat() for e in grid.edges] == ["2025-03-03", "2025-03-10", "2025-03-17", "2025-03-24"]
+
+    def test_months(self):
+        """Test calendar month buckets."""
+        grid = bucket_grid(datetime(2024, 12, 15, tzinfo=UTC), datetime(2025, 2, 3, tzinfo=UTC), "month")
+        assert [e.date().isoformat() for e in grid.edges] == ["2024-12-01", "2025-01-01", "2025-02-01", "2025-03-01"]
+
+    def test_sub_hour_in_offset_zone(self):
+        """Test that 15 minute buckets in a +05:45 zone aren't hour aligned."""
+        grid = bucket_grid(
+            datetime(2025, 3, 8, 10, 20, tzinfo=UTC), datetime(2025, 3, 8, 11, 0, tzinfo=UTC), "15m", "Asia/Kathmandu"
+        )
+        assert grid.edges[0] == datetime(2025, 3, 8, 10, 15, tzinfo=UTC)
+        assert grid.base_seconds == 900
+        assert not grid.hour_aligned
+
+    def test_half_hour_zone_days(self):
+        """Test that day buckets in a +05:30 zone fall back to half-hour cells."""
+        grid = bucket_grid(datetime(2025, 3, 8, tzinfo=UTC), datetime(2025, 3, 10, tzinfo=UTC), "day", "Asia/Kolkata")
+        assert grid.edges[0] == datetime(2025, 3, 7, 18, 30, tzinfo=UTC)
+        assert grid.base_seconds % 1800 == 0 and not grid.hour_aligned
+
+    def test_fill_counts(self):
+        """Test mapping instants onto buckets, leaving empty buckets at zero."""
+        grid = bucket_grid(datetime(2025, 3, 8, tzinfo=UTC), datetime(2025, 3, 10, 23, tzinfo=UTC), "day")
+        counts = {datetime(2025, 3, 8, 5, tzinfo=UTC): 2, datetime(2025, 3, 10, 23, tzinfo=UTC): 1}
+        assert fill_counts(grid, counts) == [2, 0, 1]
+        assert [p["value"] for p in grid.series([2, 0, 1], fill_gaps=False)] == [2, 1]
+
+    @pytest.mark.parametrize("granularity,tz,end", [
+        ("5m", "UTC", timedelta(days=30)),
+        ("day", "Not/AZone", timedelta(days=1)),
+        ("day", "UTC", timedelta(days=-1)),
+        ("day", "UTC", timedelta(days=MAX_BUCKETS + 1)),
+    ])
+    def test_rejected(self, granularity, tz, end):
+        """Test too many buckets, unknown zones and inverted ranges."""
+        start = datetime(2025, 3, 8, tzinfo=UTC)
+        with pytest.raises(ValueError):
+            bucket_grid(start, start + end, granularity, tz)
+
+
+class TestEpochBucket:
+    """Test the SQL epoch bucketing construct."""
+
+    def test_compiles_per_dialect(self):
+        """Test integer epoch division on SQLite and PostgreSQL."""
+        stmt = select(epoch_bucket(column("clicked_at"), 900))
+        assert "strftime('%s', clicked_at) AS INTEGER) / 900" in str(stmt.compile(dialect=sqlite.dialect()))
+        assert "EXTRACT(EPOCH FROM clicked_at)) AS BIGINT) / 900" in str(stmt.compile(dialect=postgresql.dialect()))
+
+    def test_width_is_part_of_cache_key(self):
+        """Test that statements with different widths don't share a cached compilation."""
+        a = select(epoch_bucket(column("clicked_at"), 300))
+        b = select(epoch_bucket(column("clicked_at"), 900))
+        assert a._generate_cache_key() != b._generate_cache_key()
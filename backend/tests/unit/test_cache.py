@@ -0,0 +1,177 @@
+"""
+Unit tests for the in-process TTL/LRU cache in core/cache.py and the
+dashboard response cache built on it in links/cache.py.
+"""
+import pytest
+
+from src.core.cache import TTLCache
+from src.links.cache import DashboardCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache:
+    """Test TTLCache behaviour."""
+
+    def test_get_miss_and_hit(self):
+        """Test basic get/set and hit/miss counters."""
+        cache = TTLCache(name="t", max_entries=10)
+        assert cache.get("a") is None
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_ratio"] == 0.5
+
+    def test_lru_eviction_by_entries(self):
+        """Test that the least recently used entry is evicted first."""
+        cache = TTLCache(name="t", max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")  # "b" is now least recently used
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert cache.stats()["evictions"] == 1
+
+    def test_eviction_by_bytes(self):
+        """Test that the memory cap evicts entries."""
+        cache = TTLCache(name="t", max_entries=100, max_bytes=30, sizeof=lambda k, v: 10)
+        for key in "abcd":
+            cache.set(key, key)
+
+        assert len(cache) == 3
+        assert cache.stats()["bytes"] == 30
+        assert cache.get("a") is None
+
+    def test_oversized_entry_not_stored(self):
+        """Test that an entry larger than max_bytes is skipped."""
+        cache = TTLCache(name="t", max_entries=10, max_bytes=5, sizeof=lambda k, v: 10)
+        assert cache.set("a", 1) is False
+        assert len(cache) == 0
+
+    def test_ttl_expiry(self):
+        """Test that entries expire after their TTL."""
+        clock = FakeClock()
+        cache = TTLCache(name="t", max_entries=10, ttl_seconds=5, clock=clock)
+        cache.set("a", 1)
+
+        clock.now = 4.9
+        assert cache.get("a") == 1
+        clock.now = 5.0
+        assert cache.get("a") is None
+        assert cache.stats()["expirations"] == 1
+
+    def test_invalidate(self):
+        """Test explicit invalidation."""
+        cache = TTLCache(name="t", max_entries=10)
+        cache.set("a", 1)
+        cache.invalidate("a")
+
+        assert cache.get("a") is None
+        assert cache.stats()["invalidations"] == 1
+
+    def test_set_skipped_after_concurrent_invalidation(self):
+        """Test that a value read before an invalidation is not cached."""
+        cache = TTLCache(name="t", max_entries=10)
+        generation = cache.generation()
+        cache.invalidate("a")
+
+        assert cache.set("a", "stale", generation=generation) is False
+        assert cache.get("a") is None
+
+    def test_on_evict(self):
+        """Test that entries evicted to make room are reported, and expired ones are not."""
+        clock = FakeClock()
+        evicted = []
+        cache = TTLCache(name="t", max_entries=2, ttl_seconds=5, clock=clock, on_evict=lambda k, v: evicted.append((k, v)))
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.set("c", 3)
+        assert evicted == [("a", 1)]
+
+        clock.now = 5.0
+        assert cache.get("b") is None
+        assert evicted == [("a", 1)]
+
+    def test_invalid_max_entries(self):
+        """Test that max_entries must be positive."""
+        with pytest.raises(ValueError):
+            TTLCache(name="t", max_entries=0)
+
+
+class TestDashboardCache:
+    """Test DashboardCache versioning."""
+
+    def make(self):
+        return DashboardCache(max_entries=10, ttl_seconds=60, max_bytes=1024)
+
+    def test_hit_until_click(self):
+        """Test that a click on a watched link makes the user's entries unreachable."""
+        cache = self.make()
+        version = cache.version(1)
+        cache.watch(1, [10, 11])
+        cache.set(1, "7d", b"{}", version=version)
+        assert cache.get(1, "7d") == b"{}"
+        assert cache.get(2, "7d") is None
+
+        cache.links_clicked([99])
+        assert cache.get(1, "7d") == b"{}"
+        cache.links_clicked([11])
+        assert cache.get(1, "7d") is None
+        assert cache.stats()["version_bumps"] == 1
+
+    def test_click_during_computation(self):
+        """Test that a response computed across a click is never served."""
+        cache = self.make()
+        version = cache.version(1)
+        cache.watch(1, [10])
+        cache.links_clicked([10])
+        cache.set(1, "7d", b"stale", version=version)
+        assert cache.get(1, "7d") is None
+
+    def test_invalidate_user_and_stats(self):
+        """Test explicit invalidation and the reported memory."""
+        cache = self.make()
+        cache.set(1, "7d", b"x" * 100, version=cache.version(1))
+        stats = cache.stats()
+        assert stats["entries"] == 1 and stats["bytes"] > 100
+        cache.invalidate_user(1)
+        assert cache.get(1, "7d") is None
+        assert cache.stats()["hit_ratio"] == 0.0
+
+    def test_versions_are_bounded_and_never_reused(self):
+        """Test that a user whose version was evicted can't reach entries stored under an older one."""
+        cache = DashboardCache(max_entries=1, ttl_seconds=60, max_bytes=1024)
+        version = cache.version(1)
+        cache.watch(1, [10])
+        cache.links_clicked([10])
+        cache.set(1, "7d", b"stale", version=version)
+
+        for user_id in range(2, 20):
+            cache.version(user_id)
+        assert cache.stats()["versioned_users"] == 10
+        assert cache.get(1, "7d") is None
+        assert cache.version(1) != version
+
+    def test_owner_eviction_invalidates(self):
+        """Test that forgetting who owns a link drops the owner's entries, as its clicks can't reach them anymore."""
+        cache = DashboardCache(max_entries=1, ttl_seconds=60, max_bytes=1024)
+        version = cache.version(1)
+        cache.watch(1, [10])
+        cache.set(1, "7d", b"{}", version=version)
+        assert cache.get(1, "7d") == b"{}"
+
+        cache.watch(2, range(100, 200))
+        assert cache.stats()["watched_links"] == 100
+        assert cache.get(1, "7d") is None
@@ -0,0 +1,227 @@
+"""
+Unit tests for the offline GeoIP engine (src/geoip).
+Databases are built into tmp_path from small CSV fixtures.
+"""
+import ipaddress
+import pytest
+from unittest.mock import patch
+
+from src.geoip.convert import convert, build_ranges, parse_rows
+from src.geoip.database import GeoIPDatabase, GeoIPDatabaseError, write_database
+from src.geoip.providers import GeoIPProvider, LocalProvider, NullProvider, create_provider, set_provider
+from src.links.utils import get_country_from_ip
+
+
+CSV_RANGES = """\
+ip_from,ip_to,country_code
+1.0.0.0,1.0.0.255,AU
+1.0.1.0,1.0.3.255,CN
+16777216,16777471,AU
+8.8.8.0,8.8.8.255,us
+9.9.9.9,9.9.9.9,-
+2001:db8::,2001:db8:ffff:ffff:ffff:ffff:ffff:ffff,DE
+"""
+
+CSV_CIDR = """\
+network,country
+81.2.69.0/24,GB
+2a02:c7e::/32,GB
+"""
+
+
+@pytest.fixture
+def geo_db(tmp_path):
+    src = tmp_path / "ranges.csv"
+    src.write_text(CSV_RANGES + CSV_CIDR.split("\n", 1)[1])
+    dest = tmp_path / "geo.bin"
+    convert(str(src), str(dest))
+    db = GeoIPDatabase(str(dest))
+    yield db
+    db.close()
+
+
+def ip(value):
+    return ipaddress.ip_address(value)
+
+
+class TestGeoIPDatabase:
+    """Test building and querying a GEO1 database."""
+
+    def test_ipv4_lookup(self, geo_db):
+        """Test lookups inside, at the edges of, and between ranges."""
+        assert geo_db.lookup(ip("1.0.0.0")) == "AU"
+        assert geo_db.lookup(ip("1.0.0.255")) == "AU"
+        assert geo_db.lookup(ip("1.0.2.7")) == "CN"
+        assert geo_db.lookup(ip("8.8.8.8")) == "US"
+        assert geo_db.lookup(ip("81.2.69.160")) == "GB"
+        assert geo_db.lookup(ip("0.255.255.255")) is None
+        assert geo_db.lookup(ip("1.0.4.0")) is None
+        assert geo_db.lookup(ip("255.255.255.255")) is None
+
+    def test_ipv6_lookup(self, geo_db):
+        """Test IPv6 ranges and IPv4-mapped addresses."""
+        assert geo_db.lookup(ip("2001:db8::1")) == "DE"
+        assert geo_db.lookup(ip("2a02:c7e:1234::1")) == "GB"
+        assert geo_db.lookup(ip("2001:db9::1")) is None
+        assert geo_db.lookup(ip("::ffff:8.8.8.8")) == "US"
+
+    def test_unknown_country_skipped(self, geo_db):
+        """Test that '-' country rows are not stored."""
+        assert geo_db.lookup(ip("9.9.9.9")) is None
+
+    def test_duplicate_and_adjacent_ranges(self):
+        """Test that overlaps are dropped and same-country neighbours merged."""
+        parsed = list(parse_rows([["1.0.0.0", "1.0.0.255", "AU"], ["1.0.1.0", "1.0.1.255", "AU"], ["1.0.0.10", "1.0.0.20", "NZ"]]))
+        v4, v6, dropped = build_ranges(parsed)
+        assert v4 == [(int(ip("1.0.0.0")), int(ip("1.0.1.255")), "AU")]
+        assert v6 == []
+        assert dropped == 1
+
+    def test_write_rejects_unsorted(self, tmp_path):
+        """Test that unsorted input is rejected."""
+        with pytest.raises(GeoIPDatabaseError):
+            write_database(str(tmp_path / "x.bin"), [(10, 20, "US"), (5, 6, "US")], [])
+
+    def test_open_rejects_garbage(self, tmp_path):
+        """Test that a non-GEO1 file is rejected."""
+        path = tmp_path / "bad.bin"
+        path.write_bytes(b"not a geoip database at all")
+        with pytest.raises(GeoIPDatabaseError):
+            GeoIPDatabase(str(path))
+
+
+class TestProviders:
+    """Test provider selection and the get_country_from_ip front door."""
+
+    def test_provider_needs_lookup(self):
+        """Test that a provider without lookup() fails at construction, not on first use."""
+        class Nameless(GeoIPProvider):
+            name = "nameless"
+
+        with pytest.raises(TypeError):
+            Nameless()
+
+    def test_create_provider(self, tmp_path):
+        """Test building providers by name."""
+        assert isinstance(create_provider("none"), NullProvider)
+        with pytest.raises(ValueError):
+            create_provider("local")
+        with pytest.raises(ValueError):
+            create_provider("carrier-pigeon")
+
+    def test_get_country_uses_local_provider(self, geo_db):
+        """Test that get_country_from_ip resolves through the configured provider."""
+        set_provider(LocalProvider(geo_db.path))
+        try:
+            assert get_country_from_ip("8.8.8.8") == "US"
+            assert get_country_from_ip("2a02:c7e::1") == "GB"
+            # documentation range: in the file, but never a real client
+            assert get_country_from_ip("2001:db8::1") is None
+            assert get_country_from_ip("5.5.5.5") is None
+        finally:
+            set_provider(None)
+
+    def test_non_global_addresses_skip_provider(self):
+        """Test that private/reserved ranges are detected by network, not string prefix."""
+        with patch('src.links.utils.get_provider') as mock_provider:
+            for addr in ("172.20.1.1", "172.31.255.1", "100.64.0.1", "169.254.1.1",
+                         "fc00::1", "fe80::1", "0.0.0.0", "224.0.0.1", "not-an-ip"):
+                assert get_country_from_ip(addr) is None, addr
+            mock_provider.assert_not_called()
+
+
+class CountingProvider:
+    name = "counting"
+
+    def __init__(self, answers=None, error=None, delay=None):
+        self.calls = 0
+        self.answers = answers or {}
+        self.error = error
+        self.delay = delay
+
+    def lookup(self, addr):
+        self.calls += 1
+        if self.delay:
+            self.delay.wait(5)
+        if self.error:
+            raise self.error
+        return self.answers.get(str(addr))
+
+
+def make_cached(inner, **kwargs):
+    from src.geoip.providers import CachingProvider
+    options = dict(max_entries=100, ttl_seconds=60, negative_ttl_seconds=60, error_ttl_seconds=60)
+    options.update(kwargs)
+    return CachingProvider(inner, **options)
+
+
+class TestCachingProvider:
+    """Test the prefix-keyed GeoIP cache."""
+
+    def test_prefix_key(self):
+        """Test /24 and /48 grouping."""
+        from src.geoip.providers import prefix_key
+        assert prefix_key(ip("8.8.8.1")) == prefix_key(ip("8.8.8.254"))
+        assert prefix_key(ip("8.8.8.1")) != prefix_key(ip("8.8.9.1"))
+        assert prefix_key(ip("2a02:c7e:1::1")) == prefix_key(ip("2a02:c7e:1:ffff::1"))
+        assert prefix_key(ip("2a02:c7e:1::1")) != prefix_key(ip("2a02:c7e:2::1"))
+
+    def test_same_prefix_hits_cache(self):
+        """Test that addresses in the same /24 share one upstream lookup."""
+        inner = CountingProvider({"8.8.8.8": "US"})
+        cached = make_cached(inner)
+
+        assert cached.lookup(ip("8.8.8.8")) == "US"
+        assert cached.lookup(ip("8.8.8.200")) == "US"
+        assert inner.calls == 1
+        assert cached.stats()["hits"] == 1
+
+    def test_negative_and_error_caching(self):
+        """Test that empty answers and failures are cached too."""
+        empty = CountingProvider()
+        cached = make_cached(empty)
+        assert cached.lookup(ip("5.5.5.5")) is None
+        assert cached.lookup(ip("5.5.5.6")) is None
+        assert empty.calls == 1
+
+        failing = CountingProvider(error=RuntimeError("rate limited"))
+        cached = make_cached(failing)
+        assert cached.lookup(ip("5.5.5.5")) is None
+        assert cached.lookup(ip("5.5.5.5")) is None
+        assert failing.calls == 1
+        assert cached.stats()["upstream_errors"] == 1
+
+    def test_error_ttl_is_short(self):
+        """Test that a cached error expires on its own TTL."""
+        failing = CountingProvider(error=RuntimeError("down"))
+        cached = make_cached(failing, error_ttl_seconds=0)
+        cached.lookup(ip("5.5.5.5"))
+        cached.lookup(ip("5.5.5.5"))
+        assert failing.calls == 2
+
+    def test_single_flight(self):
+        """Test that concurrent misses for one prefix make a single upstream call."""
+        import threading
+
+        gate = threading.Event()
+        inner = CountingProvider({"8.8.8.8": "US", "8.8.8.9": "US"}, delay=gate)
+        cached = make_cached(inner)
+        results = []
+        threads = [
+            threading.Thread(target=lambda a=a: results.append(cached.lookup(ip(a))))
+            for a in ("8.8.8.8", "8.8.8.9", "8.8.8.8", "8.8.8.9")
+        ]
+        for t in threads:
+            t.start()
+        # wait until the followers are parked on the leader's flight
+        for _ in range(500):
+            if cached.stats()["coalesced"] == 3:
+                break
+            threading.Event().wait(0.01)
+        gate.set()
+        for t in threads:
+            t.join(5)
+
+        assert results == ["US"] * 4
+        assert inner.calls == 1
+        assert cached.stats()["coalesced"] == 3
@@ -0,0 +1,74 @@
+"""
+Unit tests for the HyperLogLog sketch in core/hll.py.
+"""
+import pytest
+
+from src.core.hll import HyperLogLog
+
+
+class TestHyperLogLog:
+    """Test HyperLogLog estimates, merging and serialization."""
+
+    def test_invalid_precision(self):
+        """Test that unsupported precisions are rejected."""
+        with pytest.raises(ValueError):
+            HyperLogLog(3)
+        with pytest.raises(ValueError):
+            HyperLogLog(17)
+
+    def test_empty(self):
+        """Test that an empty sketch estimates zero."""
+        assert HyperLogLog().estimate() == 0
+
+    def test_small_cardinalities_are_near_exact(self):
+        """Test that linear counting makes small counts (almost) exact and ignores repeats."""
+        sketch = HyperLogLog()
+        for i in range(200):
+            sketch.add(f"visitor-{i % 50}")
+        assert sketch.estimate() == 50
+
+    @pytest.mark.parametrize("n", [10_000, 100_000])
+    def test_large_cardinalities_within_error(self, n):
+        """Test that estimates are within three standard errors."""
+        sketch = HyperLogLog()
+        for i in range(n):
+            sketch.add(f"visitor-{i}")
+        assert abs(sketch.estimate() - n) / n < 3 * HyperLogLog.relative_error()
+
+    def test_merge_is_union(self):
+        """Test that merging sketches estimates the size of the union."""
+        a, b, both = HyperLogLog(), HyperLogLog(), HyperLogLog()
+        for i in range(5000):
+            a.add(f"v{i}")
+            both.add(f"v{i}")
+        for i in range(2500, 8000):
+            b.add(f"v{i}")
+            both.add(f"v{i}")
+        a.merge(b)
+        assert a.estimate() == both.estimate()
+
+    def test_merge_precision_mismatch(self):
+        """Test that sketches of different precision can't be merged."""
+        with pytest.raises(ValueError):
+            HyperLogLog(12).merge(HyperLogLog(10))
+        with pytest.raises(ValueError):
+            HyperLogLog(12).merge_bytes(HyperLogLog(10).to_bytes())
+
+    @pytest.mark.parametrize("n", [0, 3, 5000])
+    def test_round_trip(self, n):
+        """Test that sparse and dense encodings restore the same registers."""
+        sketch = HyperLogLog()
+        for i in range(n):
+            sketch.add(f"v{i}")
+        restored = HyperLogLog.from_bytes(sketch.to_bytes())
+        assert restored.estimate() == sketch.estimate()
+        assert restored.to_bytes() == sketch.to_bytes()
+
+    def test_sparse_encoding_is_small(self):
+        """Test that a sketch of a few visitors stores a few bytes, not every register."""
+        sketch = HyperLogLog()
+        sketch.add("only-visitor")
+        assert len(sketch.to_bytes()) == 5
+        for i in range(20_000):
+            sketch.add(f"v{i}")
+        assert len(sketch.to_bytes()) == 2 + 4096
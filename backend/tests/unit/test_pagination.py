@@ -0,0 +1,61 @@
+"""
+Unit tests for links/pagination.py cursors.
+"""
+import base64
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from src.links.pagination import decode_cursor, encode_cursor
+from src.models.link import Link
+
+
+def make_link(**kw):
+    return Link(id=42, user_id=1, target_url="https://example.com", **kw)
+
+
+class TestCursor:
+    def test_round_trip_created(self):
+        created = datetime(2025, 3, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+        cursor = encode_cursor("created", make_link(created_at=created))
+        assert decode_cursor("created", cursor) == (created, 42)
+
+    def test_naive_timestamps_are_utc(self):
+        cursor = encode_cursor("created", make_link(created_at=datetime(2025, 3, 1, 12)))
+        assert decode_cursor("created", cursor) == (datetime(2025, 3, 1, 12, tzinfo=timezone.utc), 42)
+
+    def test_round_trip_clicks(self):
+        assert decode_cursor("clicks", encode_cursor("clicks", make_link(click_count=17))) == (17, 42)
+
+    def test_round_trip_never_clicked(self):
+        cursor = encode_cursor("last_clicked", make_link(last_clicked_at=None))
+        assert decode_cursor("last_clicked", cursor) == (None, 42)
+
+    def test_cursor_is_url_safe(self):
+        cursor = encode_cursor("created", make_link(created_at=datetime(2025, 3, 1, tzinfo=timezone.utc)))
+        assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+
+    def test_other_sort_rejected(self):
+        cursor = encode_cursor("clicks", make_link(click_count=1))
+        with pytest.raises(ValueError):
+            decode_cursor("created", cursor)
+
+    @pytest.mark.parametrize("payload", [
+        ["clicks", "many", 1],
+        ["clicks", 1, "1"],
+        ["created", None, 1],
+        ["created", "yesterday", 1],
+        ["clicks", 1],
+        {"sort": "clicks"},
+    ])
+    def test_bad_payload_rejected(self, payload):
+        cursor = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+        sort = payload[0] if isinstance(payload, list) else "clicks"
+        with pytest.raises(ValueError):
+            decode_cursor(sort, cursor)
+
+    @pytest.mark.parametrize("cursor", ["", "not a cursor", "%%%", "AAAA"])
+    def test_garbage_rejected(self, cursor):
+        with pytest.raises(ValueError):
+            decode_cursor("created", cursor)
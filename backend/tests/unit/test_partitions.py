@@ -0,0 +1,28 @@
+"""
+Unit tests for links/partitions.py month arithmetic and partition DDL.
+"""
+from datetime import datetime, timedelta, timezone
+
+from src.links.partitions import add_months, create_partition_sql, month_start, partition_name
+
+
+class TestMonths:
+    def test_month_start_is_utc(self):
+        """Test the month is taken in UTC, naive values being UTC already."""
+        plus_two = timezone(timedelta(hours=2))
+        assert month_start(datetime(2025, 3, 1, 1, 0, tzinfo=plus_two)) == datetime(2025, 2, 1, tzinfo=timezone.utc)
+        assert month_start(datetime(2025, 3, 31, 23, 59)) == datetime(2025, 3, 1, tzinfo=timezone.utc)
+
+    def test_add_months_across_years(self):
+        month = datetime(2025, 11, 1, tzinfo=timezone.utc)
+        assert add_months(month, 2) == datetime(2026, 1, 1, tzinfo=timezone.utc)
+        assert add_months(month, -11) == datetime(2024, 12, 1, tzinfo=timezone.utc)
+
+    def test_partition_ddl(self):
+        """Test a month's partition covers [first of month, first of next month) in UTC."""
+        month = datetime(2025, 12, 15, tzinfo=timezone.utc)
+        assert partition_name(month_start(month)) == "click_events_p202512"
+        assert create_partition_sql(month) == (
+            "CREATE TABLE IF NOT EXISTS click_events_p202512 PARTITION OF click_events "
+            "FOR VALUES FROM ('2025-12-01T00:00:00+00:00') TO ('2026-01-01T00:00:00+00:00')"
+        )
@@ -3,7 +3,7 @@ Unit tests for slug generation functionality.
 These tests don't require a database or any external dependencies.
 """
 import pytest
-from src.links.slug import slug_for_id, base62_encode, shuffle_64
+from src.links.slug import slug_for_id, id_for_slug, legacy_slug_for_id, base62_encode, shuffle_64
 
 
 class TestBase62Encode:
@@ -110,3 +110,48 @@ class TestSlugForId:
         # All slugs should be unique
         assert len(slugs) == len(set(slugs))
 
+
+
+class TestIdForSlug:
+    """Test decoding slugs back to ids."""
+
+    def test_round_trip(self):
+        """Test that every slug decodes to the id it was made from."""
+        for test_id in list(range(0, 1000)) + [62**6 - 1, 62**6, 62**6 + 62**8 - 1, 62**6 + 62**8, 10**15]:
+            assert id_for_slug(slug_for_id(test_id)) == test_id
+
+    def test_no_collisions(self):
+        """Test that a large run of ids produces unique slugs."""
+        slugs = {slug_for_id(i) for i in range(50_000)}
+        assert len(slugs) == 50_000
+
+    def test_length_grows_with_domain(self):
+        """Test fixed-width slugs per domain and growth once a domain is exhausted."""
+        assert len(slug_for_id(0)) == 7
+        assert slug_for_id(62**6 - 1).startswith("0")
+        assert len(slug_for_id(62**6)) == 8
+        assert len(slug_for_id(62**6 + 62**8)) == 9
+
+    def test_disjoint_from_legacy_slugs(self):
+        """Test that legacy slugs are never decoded as current ones."""
+        for test_id in range(1, 2000):
+            legacy = legacy_slug_for_id(test_id)
+            assert id_for_slug(legacy) is None
+
+    def test_invalid_slugs(self):
+        """Test that malformed strings decode to None."""
+        assert id_for_slug("") is None
+        assert id_for_slug("abc") is None
+        assert id_for_slug("0ab-def") is None
+        assert id_for_slug("1234567") is None
+
+    def test_over_long_slugs(self):
+        """Test that strings longer than any BIGINT id's slug decode to None."""
+        assert id_for_slug(slug_for_id(2**63 - 1)) == 2**63 - 1
+        assert id_for_slug("a" * (len(slug_for_id(2**63 - 1)) + 1)) is None
+        assert id_for_slug("a" * 50) is None
+
+    def test_negative_id_raises(self):
+        """Test that negative ids are rejected."""
+        with pytest.raises(ValueError):
+            slug_for_id(-1)
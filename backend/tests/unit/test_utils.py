@@ -256,6 +256,49 @@ class TestParseUserAgent:
         assert "device_category" in result
 
 
+class TestParseUserAgentCache:
+    """Test memoization of parse_user_agent."""
+
+    UA = "Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0"
+
+    def setup_method(self):
+        from src.links.utils import ua_cache
+        ua_cache.clear()
+
+    def test_repeat_ua_parsed_once(self):
+        """Test that the same UA string only runs the parser once."""
+        from src.links.utils import parse as real_parse
+
+        with patch('src.links.utils.parse', side_effect=real_parse) as mock_parse:
+            first = parse_user_agent(self.UA)
+            second = parse_user_agent(self.UA)
+
+        assert mock_parse.call_count == 1
+        assert first == second
+        assert first["browser_name"] == "Firefox"
+
+    def test_returned_dict_is_a_copy(self):
+        """Test that mutating a result doesn't poison the cache."""
+        result = parse_user_agent(self.UA)
+        result["browser_name"] = "tampered"
+
+        assert parse_user_agent(self.UA)["browser_name"] == "Firefox"
+
+    def test_cache_stats(self):
+        """Test that hits and misses are counted."""
+        from src.links.utils import ua_cache
+        before = ua_cache.stats()
+
+        parse_user_agent(self.UA)
+        parse_user_agent(self.UA)
+        parse_user_agent(None)  # never touches the cache
+
+        stats = ua_cache.stats()
+        assert stats["misses"] - before["misses"] == 1
+        assert stats["hits"] - before["hits"] == 1
+        assert stats["entries"] == 1
+
+
 class TestGetCountryFromIP:
     """Test get_country_from_ip function."""
     
@@ -275,7 +318,7 @@ class TestGetCountryFromIP:
         assert get_country_from_ip("172.16.0.1") is None
         assert get_country_from_ip("192.168.1.1") is None
     
-    @patch('src.links.utils.httpx.Client')
+    @patch('src.geoip.providers.httpx.Client')
     def test_successful_country_lookup(self, mock_client_class):
         """Test successful country lookup from API."""
         # Mock successful API response
@@ -297,7 +340,7 @@ class TestGetCountryFromIP:
         result = get_country_from_ip("8.8.8.8")
         assert result == "GB"
     
-    @patch('src.links.utils.httpx.Client')
+    @patch('src.geoip.providers.httpx.Client')
     def test_api_error_status(self, mock_client_class):
         """Test when API returns error status."""
         mock_response = Mock()
@@ -315,7 +358,7 @@ class TestGetCountryFromIP:
         result = get_country_from_ip("8.8.8.8")
         assert result is None
     
-    @patch('src.links.utils.httpx.Client')
+    @patch('src.geoip.providers.httpx.Client')
     def test_api_http_error(self, mock_client_class):
         """Test when API returns HTTP error."""
         mock_response = Mock()
@@ -332,7 +375,7 @@ class TestGetCountryFromIP:
         result = get_country_from_ip("8.8.8.8")
         assert result is None
     
-    @patch('src.links.utils.httpx.Client')
+    @patch('src.geoip.providers.httpx.Client')
     def test_api_timeout(self, mock_client_class):
         """Test when API request times out."""
         mock_client_instance = MagicMock()
@@ -346,7 +389,7 @@ class TestGetCountryFromIP:
         result = get_country_from_ip("8.8.8.8")
         assert result is None
     
-    @patch('src.links.utils.httpx.Client')
+    @patch('src.geoip.providers.httpx.Client')
     def test_country_code_uppercase(self, mock_client_class):
         """Test that country code is returned in uppercase."""
         mock_response = Mock()
@@ -367,7 +410,7 @@ class TestGetCountryFromIP:
         result = get_country_from_ip("8.8.8.8")
         assert result == "GB"
     
-    @patch('src.links.utils.httpx.Client')
+    @patch('src.geoip.providers.httpx.Client')
     def test_invalid_country_code_length(self, mock_client_class):
         """Test when country code is not 2 characters."""
         mock_response = Mock()
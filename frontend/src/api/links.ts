@@ -5,6 +5,7 @@ import type {
   LinkListItem,
   LinkStatsResponse,
 } from '@/types/api'
+import type { DateRangePreset } from '@/types/analytics'
 
 /**
  * Links API endpoints
@@ -44,12 +45,15 @@ export const getLinkStats = async (linkId: number): Promise<LinkStatsResponse> =
  */
 export const getDashboardData = async (
   startDate: string, // ISO datetime string
-  endDate: string    // ISO datetime string
+  endDate: string,   // ISO datetime string
+  preset?: DateRangePreset
 ): Promise<import('@/types/api').DashboardResponse> => {
   const response = await apiClient.get<import('@/types/api').DashboardResponse>('/api/links/dashboard', {
     params: {
       start_date: startDate,
       end_date: endDate,
+      // lets the server hour-align a preset range; custom ranges are kept as picked
+      preset: preset === 'custom' ? undefined : preset,
     },
   })
   return response.data
@@ -116,7 +116,7 @@ function DashboardContent() {
       try {
         const startDate = dateRange.start.toISOString()
         const endDate = dateRange.end.toISOString()
-        const data = await getDashboardData(startDate, endDate)
+        const data = await getDashboardData(startDate, endDate, dateRange.preset)
         
         setKpis(transformKPIs(data))
         setCountries(transformCountries(data))
@@ -222,7 +222,7 @@ function DashboardContent() {
       // Refresh dashboard data to show the new link
       const startDate = dateRange.start.toISOString()
       const endDate = dateRange.end.toISOString()
-      const data = await getDashboardData(startDate, endDate)
+      const data = await getDashboardData(startDate, endDate, dateRange.preset)
       
       setKpis(transformKPIs(data))
       setCountries(transformCountries(data))
@@ -45,10 +45,18 @@ export interface ClickEventItem {
   engine: string | null
 }
 
+export interface BreakdownItem {
+  value: string | null
+  clicks: number
+}
+
 export interface LinkStatsResponse {
   link: LinkListItem
   clicks_last_24h: number
   unique_visitors: number
+  top_referrers: BreakdownItem[]
+  devices: BreakdownItem[]
+  browsers: BreakdownItem[]
   recent_clicks: ClickEventItem[]
 }
 
@@ -105,5 +113,6 @@ export interface DashboardResponse {
   sparkline_data: SparklinePoint[]
   countries: CountryData[]
   links: LinkTableData[]
+  links_next_cursor?: string | null
 }
 